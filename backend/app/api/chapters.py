@@ -1,13 +1,19 @@
 """
 章节路由 - 章节 CRUD 和批量导入相关接口
 """
+import asyncio
+import json
+
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
+from fastapi.responses import StreamingResponse
 from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models.novel import Chapter
-from app.repositories import NovelRepository, ChapterRepository, CharacterRepository, SceneRepository, PropRepository
-from app.api.deps import get_novel_repo, get_chapter_repo, get_character_repo, get_scene_repo, get_prop_repo
+from app.repositories import NovelRepository, ChapterRepository, CharacterRepository, SceneRepository, PropRepository, ShotRepository, TaskRepository
+from app.api.deps import get_novel_repo, get_chapter_repo, get_character_repo, get_scene_repo, get_prop_repo, get_task_repo
+from app.schemas.novel import BatchChapterSplitRequest
+from app.services.scheduler import enqueue_task
 from app.utils.time_utils import format_datetime
 from app.utils.text_utils import detect_encoding, parse_chapters_from_text
 
@@ -290,10 +296,131 @@ async def split_chapter(
         chapter=chapter,
         character_names=character_names,
         scene_names=scene_names,
-        prop_names=prop_names
+        prop_names=prop_names,
+        # 已有分镜时为重新拆分，不复用缓存的 LLM 响应
+        use_cache=ShotRepository(db).count_by_chapter(chapter_id) == 0
     )
 
 
+@router.post("/{novel_id}/chapters/{chapter_id}/split/stream")
+async def split_chapter_stream(novel_id: str, chapter_id: str):
+    """
+    流式拆分章节（SSE），每个分镜写入后立即推送：
+        {"type": "shot", "shot": {...}}
+        {"type": "done", "success": bool, "message": str, "data": {...}}
+    """
+    from app.core.database import SessionLocal
+    from app.services.novel_service import NovelService
+
+    def format_sse(data: dict) -> str:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def event_generator():
+        # 流式响应在请求依赖释放后才执行，使用独立的数据库会话
+        db = SessionLocal()
+        try:
+            chapter = ChapterRepository(db).get_by_id(chapter_id, novel_id)
+            novel = NovelRepository(db).get_by_id(novel_id)
+            if not chapter or not novel:
+                yield format_sse({"type": "done", "success": False, "message": "章节不存在" if not chapter else "小说不存在"})
+                return
+
+            queue: asyncio.Queue = asyncio.Queue()
+
+            async def on_shot_created(shot: dict):
+                await queue.put({"type": "shot", "shot": shot})
+
+            async def run_split():
+                try:
+                    result = await NovelService(db).split_chapter(
+                        novel=novel,
+                        chapter=chapter,
+                        character_names=CharacterRepository(db).get_names_by_novel(novel_id),
+                        scene_names=SceneRepository(db).get_names_by_novel(novel_id),
+                        prop_names=PropRepository(db).get_names_by_novel(novel_id),
+                        on_shot_created=on_shot_created,
+                        use_cache=ShotRepository(db).count_by_chapter(chapter_id) == 0
+                    )
+                except Exception as e:
+                    result = {"success": False, "message": f"拆分异常: {str(e)}"}
+                await queue.put({"type": "done", **result})
+
+            split_task = asyncio.create_task(run_split())
+            try:
+                while True:
+                    event = await queue.get()
+                    yield format_sse(event)
+                    if event["type"] == "done":
+                        break
+            finally:
+                # 客户端断开时仍等待拆分完成，保证分镜数据完整写入
+                await split_task
+        finally:
+            db.close()
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+
+@router.post("/{novel_id}/chapters/split-batch", response_model=dict)
+async def split_chapters_batch(
+    novel_id: str,
+    data: BatchChapterSplitRequest = BatchChapterSplitRequest(),
+    novel_repo: NovelRepository = Depends(get_novel_repo),
+    chapter_repo: ChapterRepository = Depends(get_chapter_repo),
+    task_repo: TaskRepository = Depends(get_task_repo)
+):
+    """
+    批量拆分章节为分镜（创建一个小说级后台任务）
+
+    按章节并发拆分，内容自上次拆分后未变化的章节默认跳过，进度与失败章节通过任务报告
+    """
+    novel = novel_repo.get_by_id(novel_id)
+    if not novel:
+        raise HTTPException(status_code=404, detail="小说不存在")
+
+    # 检查是否已有进行中的批量拆分任务
+    existing_task = task_repo.get_active_novel_task(novel_id, "novel_split_chapters")
+    if existing_task:
+        return {
+            "success": True,
+            "message": "已有进行中的批量拆分任务",
+            "data": {"taskId": existing_task.id, "status": existing_task.status}
+        }
+
+    if data.chapter_ids:
+        chapters = chapter_repo.list_by_ids(novel_id, data.chapter_ids)
+    else:
+        chapters = chapter_repo.get_by_range(novel_id, data.start_chapter, data.end_chapter)
+    chapters = [c for c in chapters if (c.content or "").strip()]
+
+    if not chapters:
+        return {
+            "success": True,
+            "message": "没有需要拆分的章节",
+            "data": {"taskId": None, "chapterCount": 0}
+        }
+
+    task = task_repo.create_novel_split_task(novel_id, novel.title, len(chapters))
+    print(f"[SplitChaptersBatch] Created task {task.id} for {len(chapters)} chapters")
+
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        chapter_ids=[c.id for c in chapters],
+        force=data.force
+    )
+
+    return {
+        "success": True,
+        "message": f"已创建批量拆分任务，共 {len(chapters)} 个章节",
+        "data": {"taskId": task.id, "status": "pending", "chapterCount": len(chapters)}
+    }
+
 # ==================== 批量导入 ====================
 
 @router.post("/{novel_id}/chapters/batch-import/preview", response_model=dict)
@@ -296,7 +296,9 @@ async def generate_appearance(
         appearance = await get_llm_service().generate_character_appearance(
             character_name=character.name,
             description=character.description,
-            style="anime"
+            style="anime",
+            # 已有外貌描述时为重新生成，不复用缓存的 LLM 响应
+            use_cache=not character.appearance
         )
         
         # 更新角色
@@ -320,11 +322,12 @@ async def generate_appearance(
 @router.post("/{character_id}/generate-portrait", response_model=dict)
 async def generate_character_portrait(
     character_id: str,
+    force: bool = Query(False, description="跳过生成结果记忆，强制重新生成"),
     db: Session = Depends(get_db)
 ):
     """生成角色人设图任务"""
     character_service = CharacterService(db)
-    return character_service.create_character_portrait_task(character_id)
+    return character_service.create_character_portrait_task(character_id, use_memo=not force)
 
 
 @router.post("/{character_id}/upload-image", response_model=dict)
@@ -486,11 +489,12 @@ async def upload_character_audio(
 @router.post("/{character_id}/generate-voice", response_model=dict)
 async def generate_character_voice(
     character_id: str,
+    force: bool = Query(False, description="跳过生成结果记忆，强制重新生成"),
     db: Session = Depends(get_db)
 ):
     """生成角色音色任务"""
     character_service = CharacterService(db)
-    return character_service.create_character_voice_task(character_id)
+    return character_service.create_character_voice_task(character_id, use_memo=not force)
 
 
 @router.get("/{character_id}/voice/status", response_model=dict)
@@ -0,0 +1,102 @@
+"""
+任务事件推送路由 - WebSocket / SSE 实时推送任务状态
+
+连接建立后先发送一次进行中任务的快照，之后推送合并后的增量事件：
+    {"type": "snapshot", "tasks": [...]}
+    {"type": "tasks", "events": [...]}
+"""
+import asyncio
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import run_db
+from app.repositories import TaskRepository
+from app.services.scheduler import get_task_event_bus, task_event_payload
+
+router = APIRouter()
+
+
+def _load_snapshot(novel_id: Optional[str], chapter_id: Optional[str]) -> list:
+    db = SessionLocal()
+    try:
+        tasks = TaskRepository(db).list_active_tasks(novel_id=novel_id, chapter_id=chapter_id)
+        return [task_event_payload(t) for t in tasks]
+    finally:
+        db.close()
+
+
+@router.websocket("/tasks/ws")
+async def task_events_ws(
+    websocket: WebSocket,
+    novel_id: Optional[str] = None,
+    chapter_id: Optional[str] = None,
+):
+    """WebSocket 推送任务事件（可按小说/章节过滤）"""
+    await websocket.accept()
+    bus = get_task_event_bus()
+    # 先订阅再取快照，避免两者之间的事件丢失
+    subscription = bus.subscribe(novel_id=novel_id, chapter_id=chapter_id)
+
+    async def receive_until_closed():
+        # 客户端无需发送消息，只用于感知断开
+        while True:
+            await websocket.receive_text()
+
+    receiver = asyncio.create_task(receive_until_closed())
+    try:
+        snapshot = await run_db(_load_snapshot, novel_id, chapter_id)
+        await websocket.send_json({"type": "snapshot", "tasks": snapshot})
+
+        heartbeat = get_settings().TASK_EVENT_HEARTBEAT_INTERVAL
+        while not receiver.done():
+            batch = await subscription.next_batch(timeout=heartbeat)
+            if batch:
+                await websocket.send_json({"type": "tasks", "events": batch})
+            else:
+                await websocket.send_json({"type": "ping"})
+    except (WebSocketDisconnect, RuntimeError):
+        pass
+    finally:
+        bus.unsubscribe(subscription)
+        receiver.cancel()
+
+
+@router.get("/tasks/stream")
+async def task_events_stream(
+    request: Request,
+    novel_id: Optional[str] = None,
+    chapter_id: Optional[str] = None,
+):
+    """SSE 推送任务事件（可按小说/章节过滤）"""
+    bus = get_task_event_bus()
+    subscription = bus.subscribe(novel_id=novel_id, chapter_id=chapter_id)
+
+    def format_sse(data: dict) -> str:
+        return f"data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+    async def event_generator():
+        try:
+            snapshot = await run_db(_load_snapshot, novel_id, chapter_id)
+            yield format_sse({"type": "snapshot", "tasks": snapshot})
+
+            heartbeat = get_settings().TASK_EVENT_HEARTBEAT_INTERVAL
+            while not await request.is_disconnected():
+                batch = await subscription.next_batch(timeout=heartbeat)
+                if batch:
+                    yield format_sse({"type": "tasks", "events": batch})
+                else:
+                    # SSE 注释行作为心跳，保持连接不被代理断开
+                    yield ": ping\n\n"
+        finally:
+            bus.unsubscribe(subscription)
+
+    return StreamingResponse(
+        event_generator(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -6,6 +6,7 @@ import httpx
 from urllib.parse import urlparse
 
 from app.core.config import get_settings
+from app.core.http_client import http_client
 from app.services.comfyui_monitor import get_monitor, init_monitor
 from app.services.llm_service import LLMService
 
@@ -24,7 +25,7 @@ async def get_real_gpu_stats():
     """从 Windows GPU 监控服务获取真实 GPU 和系统数据"""
     gpu_monitor_host = get_gpu_monitor_host()
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_client(gpu_monitor_host) as client:
             response = await client.get(
                 f"{gpu_monitor_host}/gpu-stats",
                 timeout=2.0  # 短超时，快速失败
@@ -54,7 +55,7 @@ async def get_comfyui_system_stats():
     queue_running = 0
     queue_pending = 0
 
-    async with httpx.AsyncClient() as client:
+    async with http_client(settings.COMFYUI_HOST) as client:
         response = await client.get(
             f"{settings.COMFYUI_HOST}/system_stats",
             timeout=5.0
@@ -178,6 +179,36 @@ async def check_llm():
         )
 
 
+@router.get("/llm-limiter")
+async def get_llm_limiter_stats():
+    """获取 LLM 限流状态（各 Key 的并发上限、占用、剩余额度与冷却时间）"""
+    from app.services.llm import get_llm_limiter
+    return {
+        "success": True,
+        "data": {
+            "enabled": get_settings().LLM_RATE_LIMIT_ENABLED,
+            "providers": get_llm_limiter().stats(),
+        }
+    }
+
+
+@router.get("/llm-router")
+async def get_llm_router_stats():
+    """获取 LLM 多厂商路由状态（各厂商/模型的熔断状态与近期耗时分位数）"""
+    from app.services.llm import get_llm_route_stats
+    return {
+        "success": True,
+        "data": {
+            "fallback_providers": [
+                {"provider": f.get("provider"), "model": f.get("model")}
+                for f in get_settings().LLM_FALLBACK_PROVIDERS
+            ],
+            "hedge_enabled": get_settings().LLM_HEDGE_ENABLED,
+            **get_llm_route_stats().stats(),
+        }
+    }
+
+
 # 兼容旧接口
 @router.get("/deepseek")
 async def check_deepseek():
@@ -297,7 +328,7 @@ async def get_system_status():
 async def get_comfyui_queue():
     """获取 ComfyUI 队列信息"""
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_client(settings.COMFYUI_HOST) as client:
             response = await client.get(
                 f"{settings.COMFYUI_HOST}/queue",
                 timeout=5.0
@@ -318,13 +349,50 @@ async def get_comfyui_queue():
         return {"status": "error", "queue_size": 0, "error": str(e)}
 
 
+@router.get("/comfyui-backends")
+async def get_comfyui_backends():
+    """获取 ComfyUI 主机池状态（健康状态与队列深度）"""
+    from app.services.comfyui import get_backend_pool
+    pool = get_backend_pool()
+    await pool.refresh()
+    return {"success": True, "data": pool.stats()}
+
+
+@router.get("/comfyui-affinity")
+async def get_comfyui_affinity_stats():
+    """获取 ComfyUI 任务按模型分组调度的统计（模型切换次数、避免的切换次数、等待超时次数）"""
+    from app.services.scheduler import get_task_scheduler
+    return {"success": True, "data": get_task_scheduler().model_affinity.stats()}
+
+
+@router.get("/task-lanes")
+async def get_task_lane_stats():
+    """获取交互/批量通道的 ComfyUI 任务排队数、执行中数量与近期等待时间"""
+    from app.core.db_executor import run_db
+    from app.services.scheduler import get_task_scheduler
+    return {"success": True, "data": await run_db(get_task_scheduler().lane_stats)}
+
+
+@router.get("/comfyui-memo")
+async def get_comfyui_memo_stats():
+    """获取 ComfyUI 生成结果记忆状态（条目数、固定文件总大小与命中率）"""
+    from app.services.comfyui import get_generation_memo
+    return {"success": True, "data": await get_generation_memo().stats()}
+
+
+@router.delete("/comfyui-memo")
+async def clear_comfyui_memo():
+    """清空 ComfyUI 生成结果记忆并删除固定的输出文件"""
+    from app.services.comfyui import get_generation_memo
+    removed = await get_generation_memo().clear()
+    return {"success": True, "data": {"removed": removed}, "message": f"已清除 {removed} 条生成结果记忆"}
+
+
 @router.get("/comfyui-test")
 async def test_comfyui_connection():
     """测试 ComfyUI 连接并返回原始数据"""
-    import httpx
-    
     try:
-        async with httpx.AsyncClient() as client:
+        async with http_client(settings.COMFYUI_HOST) as client:
             # 测试 system_stats
             stats_response = await client.get(
                 f"{settings.COMFYUI_HOST}/system_stats",
@@ -376,7 +444,7 @@ async def get_system_gpu_stats():
         # 获取 ComfyUI 队列信息
         queue_size = 0
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client(settings.COMFYUI_HOST) as client:
                 queue_response = await client.get(
                     f"{settings.COMFYUI_HOST}/queue",
                     timeout=3.0
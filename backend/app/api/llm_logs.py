@@ -3,7 +3,7 @@ LLM 调用日志 API 路由
 
 LLM 调用日志相关的路由定义
 """
-from fastapi import APIRouter, Depends, Query
+from fastapi import APIRouter, Depends, Query, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 from typing import Optional
@@ -11,7 +11,7 @@ from datetime import datetime, timezone, timedelta
 
 from app.core.database import get_db
 from app.models.llm_log import LLMLog
-from app.repositories import LLMLogRepository
+from app.repositories import LLMLogRepository, LLMLogRollupRepository
 
 router = APIRouter()
 
@@ -83,7 +83,9 @@ async def get_llm_logs(
                     "chapter_id": log.chapter_id,
                     "character_id": log.character_id,
                     "used_proxy": log.used_proxy,
-                    "duration": log.duration  # 添加耗时字段
+                    "duration": log.duration,  # 添加耗时字段
+                    "cached": bool(log.cached),
+                    "route": log.route
                 }
                 for log in logs
             ],
@@ -114,6 +116,82 @@ async def get_log_filters(llmlog_repo: LLMLogRepository = Depends(get_llmlog_rep
     }
 
 
+def _to_utc_naive(dt: datetime) -> datetime:
+    """查询时间转为 UTC（未带时区的时间按上海时间处理）"""
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=SHANGHAI_TZ)
+    return dt.astimezone(UTC_TZ).replace(tzinfo=None)
+
+
+@router.get("/analytics")
+async def get_llm_analytics(
+    start: Optional[datetime] = Query(None, description="起始时间，默认最近 24 小时"),
+    end: Optional[datetime] = Query(None, description="结束时间，默认当前时间"),
+    interval: str = Query("hour", description="时间粒度: hour/day"),
+    group_by: str = Query("provider,model,task_type", description="分组维度，逗号分隔: provider/model/task_type"),
+    provider: Optional[str] = Query(None, description="LLM厂商筛选"),
+    model: Optional[str] = Query(None, description="模型筛选"),
+    task_type: Optional[str] = Query(None, description="任务类型筛选"),
+    db: Session = Depends(get_db)
+):
+    """
+    获取 LLM 调用统计（请求量、错误率、耗时 p50/p95/p99、响应长度分布）
+
+    数据来自写入日志时增量维护的小时汇总表，不扫描原始日志。
+    """
+    from app.services.llm.analytics import INTERVALS, GROUP_FIELDS, summarize_rollups
+
+    if interval not in INTERVALS:
+        raise HTTPException(status_code=400, detail=f"不支持的时间粒度: {interval}")
+    dimensions = [d.strip() for d in group_by.split(",") if d.strip()]
+    invalid = [d for d in dimensions if d not in GROUP_FIELDS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的分组维度: {', '.join(invalid)}")
+
+    end_utc = _to_utc_naive(end) if end else datetime.utcnow()
+    start_utc = _to_utc_naive(start) if start else end_utc - timedelta(hours=24)
+    # 汇总按整点存储，起始时间向下取整到小时
+    start_utc = start_utc.replace(minute=0, second=0, microsecond=0)
+
+    rows = LLMLogRollupRepository(db).list_range(
+        start=start_utc,
+        end=end_utc,
+        provider=provider,
+        model=model,
+        task_type=task_type
+    )
+    data = summarize_rollups(rows, interval=interval, group_by=dimensions)
+    data.update({
+        "start": to_shanghai_time(start_utc),
+        "end": to_shanghai_time(end_utc),
+        "interval": interval,
+        "group_by": dimensions,
+    })
+    return {"success": True, "data": data}
+
+
+@router.get("/cache/stats")
+async def get_llm_cache_stats():
+    """获取 LLM 响应缓存统计（条目数、命中/未命中次数）"""
+    from app.services.llm import get_llm_cache
+    return {"success": True, "data": await get_llm_cache().stats()}
+
+
+@router.delete("/cache")
+async def clear_llm_cache():
+    """清空 LLM 响应缓存"""
+    from app.services.llm import get_llm_cache
+    removed = await get_llm_cache().clear()
+    return {"success": True, "data": {"removed": removed}, "message": f"已清除 {removed} 条缓存"}
+
+
+@router.get("/sink/stats")
+async def get_llm_log_sink_stats():
+    """获取日志批量写入统计（待写、已写入、因积压丢弃的条数）"""
+    from app.services.llm import get_llm_log_sink
+    return {"success": True, "data": get_llm_log_sink().stats()}
+
+
 @router.get("/{log_id}")
 async def get_llm_log_detail(
     log_id: str, 
@@ -142,6 +220,8 @@ async def get_llm_log_detail(
             "chapter_id": log.chapter_id,
             "character_id": log.character_id,
             "used_proxy": log.used_proxy,
-            "duration": log.duration  # 添加耗时字段
+            "duration": log.duration,  # 添加耗时字段
+            "cached": bool(log.cached),
+            "route": log.route
         }
     }
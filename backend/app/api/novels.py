@@ -6,10 +6,11 @@ from sqlalchemy.orm import Session
 
 from app.core.database import get_db
 from app.models.novel import Novel
-from app.schemas.novel import NovelCreate
-from app.repositories import NovelRepository, ChapterRepository, CharacterRepository, PromptTemplateRepository
+from app.schemas.novel import NovelCreate, FillAppearancesRequest
+from app.repositories import NovelRepository, ChapterRepository, CharacterRepository, PromptTemplateRepository, TaskRepository
 from app.services.novel_service import NovelService
-from app.api.deps import get_novel_repo, get_chapter_repo, get_character_repo
+from app.services.scheduler import enqueue_task
+from app.api.deps import get_novel_repo, get_chapter_repo, get_character_repo, get_task_repo
 from app.utils.time_utils import format_datetime
 
 router = APIRouter()
@@ -235,3 +236,62 @@ async def parse_props(
         is_incremental=is_incremental,
         prop_repo=prop_repo
     )
+
+
+@router.post("/{novel_id}/fill-appearances", response_model=dict)
+async def fill_appearances(
+    novel_id: str,
+    data: FillAppearancesRequest = FillAppearancesRequest(),
+    db: Session = Depends(get_db),
+    novel_repo: NovelRepository = Depends(get_novel_repo),
+    task_repo: TaskRepository = Depends(get_task_repo)
+):
+    """
+    批量补全小说中缺失的角色外貌、场景设定、道具外观（创建一个小说级后台任务）
+
+    多个实体打包为一次 LLM 请求并发生成，生成失败的实体自动重试
+    """
+    from app.services.appearance_batch_service import APPEARANCE_ENTITY_TYPES, collect_missing_entities
+
+    novel = novel_repo.get_by_id(novel_id)
+    if not novel:
+        raise HTTPException(status_code=404, detail="小说不存在")
+
+    invalid = [t for t in data.entity_types if t not in APPEARANCE_ENTITY_TYPES]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的实体类型: {', '.join(invalid)}")
+
+    # 检查是否已有进行中的批量生成任务
+    existing_task = task_repo.get_active_novel_task(novel_id, "novel_fill_appearances")
+    if existing_task:
+        return {
+            "success": True,
+            "message": "已有进行中的批量生成描述任务",
+            "data": {"taskId": existing_task.id, "status": existing_task.status}
+        }
+
+    missing = collect_missing_entities(db, novel_id, data.entity_types)
+    counts = {t: len(items) for t, items in missing.items()}
+    entity_count = sum(counts.values())
+    if not entity_count:
+        return {
+            "success": True,
+            "message": "没有缺少描述的角色、场景或道具",
+            "data": {"taskId": None, "entityCount": 0}
+        }
+
+    task = task_repo.create_novel_appearance_task(novel_id, novel.title, entity_count)
+    print(f"[FillAppearances] Created task {task.id} for {entity_count} entities: {counts}")
+
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        entity_types=list(missing),
+        style=data.style
+    )
+
+    return {
+        "success": True,
+        "message": f"已创建批量生成描述任务，共 {entity_count} 个实体",
+        "data": {"taskId": task.id, "status": "pending", "entityCount": entity_count, "counts": counts}
+    }
@@ -408,6 +408,7 @@ async def parse_props(
 @router.post("/{prop_id}/generate-image", response_model=dict)
 async def generate_prop_image(
     prop_id: str,
+    force: bool = Query(False, description="跳过生成结果记忆，强制重新生成"),
     db: Session = Depends(get_db)
 ):
     """
@@ -419,7 +420,7 @@ async def generate_prop_image(
     from app.services.prop_image_service import PropService
 
     prop_service = PropService(db)
-    result = prop_service.create_prop_image_task(prop_id, db)
+    result = prop_service.create_prop_image_task(prop_id, db, use_memo=not force)
 
     if not result.get("success"):
         raise HTTPException(status_code=400, detail=result.get("message"))
@@ -503,7 +504,9 @@ async def generate_prop_appearance(
         appearance = await get_llm_service().generate_prop_appearance(
             prop_name=prop.name,
             description=prop.description,
-            style="anime"
+            style="anime",
+            # 已有外观描述时为重新生成，不复用缓存的 LLM 响应
+            use_cache=not prop.appearance
         )
 
         # 更新道具
@@ -294,7 +294,9 @@ async def generate_scene_setting(
         setting = await get_llm_service().generate_scene_setting(
             scene_name=scene.name,
             description=scene.description,
-            style="anime"
+            style="anime",
+            # 已有场景设定时为重新生成，不复用缓存的 LLM 响应
+            use_cache=not scene.setting
         )
 
         # 更新场景
@@ -368,11 +370,12 @@ async def parse_scenes(
 @router.post("/{scene_id}/generate-image", response_model=dict)
 async def generate_scene_image(
     scene_id: str,
+    force: bool = Query(False, description="跳过生成结果记忆，强制重新生成"),
     db: Session = Depends(get_db)
 ):
     """生成场景图任务"""
     scene_service = SceneService(db)
-    return scene_service.create_scene_image_task(scene_id)
+    return scene_service.create_scene_image_task(scene_id, use_memo=not force)
 
 
 @router.post("/{scene_id}/upload-image", response_model=dict)
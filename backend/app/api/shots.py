@@ -3,7 +3,6 @@
 """
 
 import json
-import asyncio
 from typing import Optional
 from fastapi import APIRouter, Depends, HTTPException, UploadFile, File
 from fastapi.responses import FileResponse
@@ -16,14 +15,11 @@ from app.models.task import Task
 from app.models.workflow import Workflow
 from app.services.comfyui import ComfyUIService
 from app.services.file_storage import file_storage
-from app.services.novel_service import (
-    NovelService,
-    generate_shot_task,
-    generate_shot_video_task,
-    generate_transition_video_task,
-)
+from app.services.novel_service import NovelService
 from app.repositories.shot_repository import ShotRepository
 from app.services.task_service import TaskService
+from app.services.scheduler import enqueue_task
+from app.constants import TASK_PRIORITY_LOW
 from app.repositories import (
     NovelRepository,
     ChapterRepository,
@@ -37,6 +33,7 @@ from app.services.audio_reference_service import AudioReferenceService
 from app.schemas.shot import (
     TransitionVideoRequest,
     BatchTransitionRequest,
+    BatchShotImageRequest,
     MergeVideosRequest,
     ShotUpdate,
     ShotResponse,
@@ -72,6 +69,7 @@ async def generate_shot_image(
     novel_id: str,
     chapter_id: str,
     shot_id: str,
+    force: bool = False,
     db: Session = Depends(get_db),
     novel_repo: NovelRepository = Depends(get_novel_repo),
     chapter_repo: ChapterRepository = Depends(get_chapter_repo),
@@ -79,7 +77,7 @@ async def generate_shot_image(
     workflow_repo: WorkflowRepository = Depends(get_workflow_repo),
     shot_repo: ShotRepository = Depends(get_shot_repo),
 ):
-    """为指定分镜生成图片（创建后台任务）"""
+    """为指定分镜生成图片（创建后台任务，force 为 True 时跳过生成结果记忆）"""
     # 获取章节
     chapter = chapter_repo.get_by_id(chapter_id, novel_id)
 
@@ -144,11 +142,15 @@ async def generate_shot_image(
 
     print(f"[GenerateShot] Created task {task.id} for shot {shot_id}")
 
-    # 启动后台任务
-    asyncio.create_task(
-        generate_shot_task(
-            task.id, novel_id, chapter_id, shot_index, shot_description, workflow.id
-        )
+    # 加入任务队列
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        chapter_id=chapter_id,
+        shot_index=shot_index,
+        shot_description=shot_description,
+        workflow_id=workflow.id,
+        use_memo=not force,
     )
 
     return {
@@ -158,6 +160,98 @@ async def generate_shot_image(
     }
 
 
+@router.post(
+    "/{novel_id}/chapters/{chapter_id}/shots/generate-batch", response_model=dict
+)
+async def generate_chapter_shot_images(
+    novel_id: str,
+    chapter_id: str,
+    data: BatchShotImageRequest = BatchShotImageRequest(),
+    chapter_repo: ChapterRepository = Depends(get_chapter_repo),
+    task_repo: TaskRepository = Depends(get_task_repo),
+    workflow_repo: WorkflowRepository = Depends(get_workflow_repo),
+    shot_repo: ShotRepository = Depends(get_shot_repo),
+):
+    """
+    章节批量生成分镜图（创建一个汇总后台任务）
+
+    先生成缺少的角色/场景/道具图并合并角色图，再将各分镜任务交给调度器执行
+    """
+    chapter = chapter_repo.get_by_id(chapter_id, novel_id)
+
+    if not chapter:
+        raise HTTPException(status_code=404, detail="章节不存在")
+
+    # 检查是否已有进行中的批量任务
+    existing_task = task_repo.get_active_chapter_task(chapter_id, "chapter_shot_images")
+    if existing_task:
+        return {
+            "success": True,
+            "message": "已有进行中的批量生成任务",
+            "data": {"taskId": existing_task.id, "status": existing_task.status},
+        }
+
+    shots = shot_repo.get_by_chapter(chapter_id)
+    if data.shot_ids:
+        selected = set(data.shot_ids)
+        shots = [s for s in shots if s.id in selected]
+    if not data.regenerate:
+        shots = [s for s in shots if not s.image_url]
+
+    if not shots:
+        return {
+            "success": True,
+            "message": "没有需要生成图片的分镜",
+            "data": {"taskId": None, "shotCount": 0},
+        }
+
+    # 获取分镜生图工作流
+    if data.workflow_id:
+        workflow = workflow_repo.get_by_id(data.workflow_id)
+        if not workflow:
+            raise HTTPException(status_code=400, detail="指定的工作流不存在")
+    else:
+        workflow = workflow_repo.get_active_by_type("shot")
+
+    if not workflow:
+        raise HTTPException(status_code=400, detail="未配置分镜生图工作流")
+
+    is_valid, error_msg = TaskService.validate_workflow_node_mapping(workflow, "shot")
+    if not is_valid:
+        raise HTTPException(status_code=400, detail=error_msg)
+
+    task = task_repo.create_chapter_shot_images_task(
+        novel_id=novel_id,
+        chapter_id=chapter_id,
+        chapter_title=chapter.title,
+        shot_count=len(shots),
+        workflow_id=workflow.id,
+        workflow_name=workflow.name,
+    )
+
+    print(f"[GenerateShotBatch] Created task {task.id} for {len(shots)} shots")
+
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        chapter_id=chapter_id,
+        shot_ids=[s.id for s in shots],
+        workflow_id=workflow.id,
+        use_memo=not data.regenerate,
+    )
+
+    return {
+        "success": True,
+        "message": f"已创建批量生成任务，共 {len(shots)} 个分镜",
+        "data": {
+            "taskId": task.id,
+            "status": "pending",
+            "shotCount": len(shots),
+            "shotIds": [s.id for s in shots],
+        },
+    }
+
+
 # ==================== 分镜视频生成 ====================
 
 
@@ -280,13 +374,17 @@ async def generate_shot_video(
     # 更新 Shot 表状态为 generating
     shot_repo.update_video_status(shot, "generating", task_id=task.id)
 
-    # 启动后台任务
-    asyncio.create_task(
-        generate_shot_video_task(
-            task.id, novel_id, chapter_id, shot_index, workflow.id, shot_image_url,
-            use_keyframes=request.use_keyframes,
-            use_reference_audio=request.use_reference_audio
-        )
+    # 加入任务队列
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        chapter_id=chapter_id,
+        shot_index=shot_index,
+        workflow_id=workflow.id,
+        shot_image_url=shot_image_url,
+        use_keyframes=request.use_keyframes,
+        use_reference_audio=request.use_reference_audio,
+        use_memo=not request.force,
     )
 
     return {
@@ -389,17 +487,16 @@ async def generate_transition_video(
         f"[Transition] Created task {task.id} for transition {from_index}->{to_index} using workflow {workflow.name}"
     )
 
-    # 启动后台任务
-    asyncio.create_task(
-        generate_transition_video_task(
-            task.id,
-            novel_id,
-            chapter_id,
-            from_index,
-            to_index,
-            workflow.id,
-            frame_count,
-        )
+    # 加入任务队列
+    enqueue_task(
+        task,
+        novel_id=novel_id,
+        chapter_id=chapter_id,
+        from_index=from_index,
+        to_index=to_index,
+        workflow_id=workflow.id,
+        frame_count=frame_count,
+        use_memo=not data.force,
     )
 
     return {
@@ -481,16 +578,15 @@ async def generate_all_transitions(
         )
         task_ids.append(task.id)
 
-        asyncio.create_task(
-            generate_transition_video_task(
-                task.id,
-                novel_id,
-                chapter_id,
-                from_idx,
-                to_idx,
-                workflow.id,
-                frame_count,
-            )
+        enqueue_task(
+            task,
+            priority=TASK_PRIORITY_LOW,
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            from_index=from_idx,
+            to_index=to_idx,
+            workflow_id=workflow.id,
+            frame_count=frame_count,
         )
 
     return {
@@ -823,7 +919,8 @@ async def generate_shot_audio(
         workflow=workflow,
         character_repo=character_repo,
         task_repo=task_repo,
-        shot_id=shot_id
+        shot_id=shot_id,
+        use_memo=not request.force
     )
 
     return result
@@ -1583,6 +1680,7 @@ async def generate_keyframe_image(
     shot_id: str,
     frame_index: int,
     workflow_id: Optional[str] = None,
+    force: bool = False,
     db: Session = Depends(get_db),
     novel_repo: NovelRepository = Depends(get_novel_repo),
     chapter_repo: ChapterRepository = Depends(get_chapter_repo),
@@ -1599,6 +1697,7 @@ async def generate_keyframe_image(
         shot_id: 分镜 ID
         frame_index: 关键帧序号（从0开始）
         workflow_id: 可选的工作流 ID
+        force: 跳过生成结果记忆，强制重新生成
 
     Returns:
         生成任务信息
@@ -1620,7 +1719,7 @@ async def generate_keyframe_image(
 
     keyframe_service = ShotKeyframeService()
     success, task_id, message = await keyframe_service.generate_keyframe_image(
-        db, shot_id, frame_index, workflow_id
+        db, shot_id, frame_index, workflow_id, use_memo=not force
     )
 
     return {
@@ -51,6 +51,17 @@ from app.constants.llm import (
     # 文本截断限制
     NOVEL_TEXT_MAX_LENGTH,
     CHAPTER_CONTENT_MAX_LENGTH,
+    SPLIT_WINDOW_CONTEXT_LENGTH,
+    SPLIT_WINDOW_OVERLAP_SHOTS,
+    # 分块并行解析
+    DEFAULT_EXTRACTION_CHUNK_TOKENS,
+    DEFAULT_EXTRACTION_CONCURRENCY,
+    # 批量生成外貌/场景设定
+    APPEARANCE_BATCH_MAX_ITEMS,
+    APPEARANCE_BATCH_MAX_CHARS,
+    APPEARANCE_BATCH_ITEM_TOKENS,
+    APPEARANCE_BATCH_MAX_RETRIES,
+    BATCH_APPEARANCE_OUTPUT_INSTRUCTION,
     # 默认提示词模板
     DEFAULT_PARSE_CHARACTERS_PROMPT,
     CHAPTER_RANGE_PLACEHOLDER,
@@ -66,6 +77,23 @@ from app.constants.llm import (
     get_prop_appearance_prompt,
 )
 
+from app.constants.task import (
+    # 任务优先级
+    TASK_PRIORITY_NORMAL,
+    TASK_PRIORITY_LOW,
+    # 调度通道
+    TASK_LANE_INTERACTIVE,
+    TASK_LANE_BULK,
+    TASK_LANES,
+    task_lane,
+    # 任务类型分组与并发
+    COMFYUI_TASK_TYPES,
+    AGGREGATE_TASK_TYPES,
+    DEFAULT_TASK_TYPE_CONCURRENCY,
+    # 等待时间目标
+    DEFAULT_COMFYUI_WAIT_SLO,
+)
+
 from app.constants.prompt_template import (
     # 提示词模板类型
     PromptTemplateType,
@@ -116,6 +144,15 @@ __all__ = [
     "LOG_ERROR_MESSAGE_MAX_LENGTH",
     "NOVEL_TEXT_MAX_LENGTH",
     "CHAPTER_CONTENT_MAX_LENGTH",
+    "SPLIT_WINDOW_CONTEXT_LENGTH",
+    "SPLIT_WINDOW_OVERLAP_SHOTS",
+    "DEFAULT_EXTRACTION_CHUNK_TOKENS",
+    "DEFAULT_EXTRACTION_CONCURRENCY",
+    "APPEARANCE_BATCH_MAX_ITEMS",
+    "APPEARANCE_BATCH_MAX_CHARS",
+    "APPEARANCE_BATCH_ITEM_TOKENS",
+    "APPEARANCE_BATCH_MAX_RETRIES",
+    "BATCH_APPEARANCE_OUTPUT_INSTRUCTION",
     "DEFAULT_PARSE_CHARACTERS_PROMPT",
     "CHAPTER_RANGE_PLACEHOLDER",
     "DEFAULT_CHAPTER_RANGE_DESCRIPTION",
@@ -127,6 +164,17 @@ __all__ = [
     "get_character_appearance_prompt",
     "get_scene_setting_prompt",
     "get_prop_appearance_prompt",
+    # Task
+    "TASK_PRIORITY_NORMAL",
+    "TASK_PRIORITY_LOW",
+    "TASK_LANE_INTERACTIVE",
+    "TASK_LANE_BULK",
+    "TASK_LANES",
+    "task_lane",
+    "COMFYUI_TASK_TYPES",
+    "AGGREGATE_TASK_TYPES",
+    "DEFAULT_TASK_TYPE_CONCURRENCY",
+    "DEFAULT_COMFYUI_WAIT_SLO",
     # Prompt Template
     "PromptTemplateType",
     "PROMPT_TEMPLATE_TYPES",
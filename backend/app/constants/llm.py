@@ -42,6 +42,36 @@ NOVEL_TEXT_MAX_LENGTH = 15000
 # 章节内容最大长度
 CHAPTER_CONTENT_MAX_LENGTH = 15000
 
+# 超长章节分窗口拆分时，携带的上一窗口结尾文本长度（衔接上下文）
+SPLIT_WINDOW_CONTEXT_LENGTH = 800
+
+# 相邻窗口拼接时，检查重复分镜的窗口开头分镜数
+SPLIT_WINDOW_OVERLAP_SHOTS = 3
+
+
+# ==================== 分块并行解析 ====================
+
+# 单个文本块的 token 预算
+DEFAULT_EXTRACTION_CHUNK_TOKENS = 8000
+
+# 分块解析的最大并发 LLM 请求数
+DEFAULT_EXTRACTION_CONCURRENCY = 4
+
+
+# ==================== 批量生成外貌/场景设定 ====================
+
+# 单次请求最多包含的角色/场景/道具数
+APPEARANCE_BATCH_MAX_ITEMS = 15
+
+# 单次请求中实体名称与描述的总字符数上限
+APPEARANCE_BATCH_MAX_CHARS = 6000
+
+# 每个实体预留的输出 token 数（决定单次请求的 max_tokens）
+APPEARANCE_BATCH_ITEM_TOKENS = 400
+
+# 批量结果缺失的实体最多重新请求的轮数
+APPEARANCE_BATCH_MAX_RETRIES = 2
+
 
 # ==================== 默认提示词模板 ====================
 
@@ -265,3 +295,12 @@ Ancient Chinese sword, ornate golden hilt with dragon patterns, blade made of po
 
 # 道具外观生成失败时的默认回退格式
 DEFAULT_PROP_APPEARANCE_FALLBACK = "{prop_name}, item design, prop, high quality, detailed"
+
+# 批量生成时追加到单个生成提示词后的输出格式要求
+BATCH_APPEARANCE_OUTPUT_INSTRUCTION = """
+
+【批量生成】
+本次会提供多个条目，每个条目带有编号 id。请按上述要求分别为每个条目生成描述，
+只返回 JSON 对象，格式为：{"items": [{"id": "条目编号", "text": "该条目的描述"}]}
+- 每个输入条目都必须返回一项，id 与输入保持一致
+- 各条目的描述相互独立，不要互相引用"""
@@ -0,0 +1,85 @@
+"""
+任务调度相关常量定义
+
+包含任务优先级、调度通道、任务类型分组、默认并发上限、等待时间目标等
+"""
+
+from typing import Dict, FrozenSet, Optional
+
+
+# ==================== 任务优先级（数值越大越先执行） ====================
+
+# 默认优先级（用户单次触发的生成任务）
+TASK_PRIORITY_NORMAL = 0
+
+# 批量生成任务
+TASK_PRIORITY_LOW = -10
+
+
+# ==================== 调度通道 ====================
+
+# 用户单次触发的生成（默认及更高优先级）
+TASK_LANE_INTERACTIVE = "interactive"
+
+# 批量生成（低于默认优先级）
+TASK_LANE_BULK = "bulk"
+
+TASK_LANES = (TASK_LANE_INTERACTIVE, TASK_LANE_BULK)
+
+
+def task_lane(priority: Optional[int]) -> str:
+    """按优先级划分调度通道"""
+    return TASK_LANE_BULK if (priority or 0) < TASK_PRIORITY_NORMAL else TASK_LANE_INTERACTIVE
+
+
+# ==================== 任务类型分组 ====================
+
+# 需要提交到 ComfyUI 执行的任务类型，共享 ComfyUI 并发上限
+COMFYUI_TASK_TYPES: FrozenSet[str] = frozenset({
+    "shot_image",
+    "shot_video",
+    "transition_video",
+    "keyframe_image",
+    "character_portrait",
+    "character_voice",
+    "character_audio",
+    "narrator_audio",
+    "scene_image",
+    "prop_image",
+})
+
+
+# 批量汇总任务：只编排子任务或按独立的并发配置执行，执行期间等待时间长，
+# 不占用全局 worker 名额（仍受单类型并发上限约束），避免占满名额使其子任务无法执行
+AGGREGATE_TASK_TYPES: FrozenSet[str] = frozenset({
+    "chapter_shot_images",
+    "novel_split_chapters",
+    "novel_fill_appearances",
+})
+
+
+# ==================== 默认并发上限 ====================
+
+# 各任务类型的默认并发上限（未列出的类型使用 TASK_DEFAULT_CONCURRENCY 配置）
+DEFAULT_TASK_TYPE_CONCURRENCY: Dict[str, int] = {
+    "shot_video": 1,
+    "transition_video": 1,
+}
+
+
+# ==================== 等待时间目标 ====================
+
+# ComfyUI 任务从创建到领取的等待时间目标（秒）
+# 按模型分组调度时，超过目标的任务不再让位于同一优先级内当前模型组的任务
+DEFAULT_COMFYUI_WAIT_SLO: Dict[str, int] = {
+    "character_voice": 120,
+    "character_audio": 120,
+    "narrator_audio": 120,
+    "character_portrait": 600,
+    "scene_image": 600,
+    "prop_image": 600,
+    "shot_image": 600,
+    "keyframe_image": 600,
+    "shot_video": 1800,
+    "transition_video": 1800,
+}
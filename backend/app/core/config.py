@@ -1,7 +1,9 @@
 """应用配置 - 支持从环境变量和数据库加载"""
 from pydantic_settings import BaseSettings
 from functools import lru_cache
-from typing import Optional
+from typing import Any, Dict, List, Optional
+
+from app.constants import DEFAULT_EXTRACTION_CHUNK_TOKENS, DEFAULT_EXTRACTION_CONCURRENCY
 
 
 class Settings(BaseSettings):
@@ -11,6 +13,7 @@ class Settings(BaseSettings):
     
     # Database
     DATABASE_URL: str = "sqlite:///./novelflow.db"
+    SQLITE_WAL_MODE: bool = True  # SQLite 启用 WAL 日志，后台任务写入时不阻塞接口读取
     
     # Redis
     REDIS_URL: str = "redis://localhost:6379/0"
@@ -23,6 +26,11 @@ class Settings(BaseSettings):
     LLM_MAX_TOKENS: Optional[int] = 393216  # 最大token数
     LLM_TEMPERATURE: Optional[str] = None  # 温度参数
     
+    # 分块并行解析（角色/场景/道具）
+    LLM_EXTRACTION_CHUNK_TOKENS: int = DEFAULT_EXTRACTION_CHUNK_TOKENS  # 单个文本块 token 预算
+    LLM_EXTRACTION_CONCURRENCY: int = DEFAULT_EXTRACTION_CONCURRENCY  # 最大并发 LLM 请求数
+    CHAPTER_SPLIT_CONCURRENCY: int = 3  # 批量拆分章节时同时拆分的章节数
+    
     # Proxy Configuration (代理配置)
     PROXY_ENABLED: bool = False
     HTTP_PROXY: Optional[str] = None
@@ -32,8 +40,76 @@ class Settings(BaseSettings):
     DEEPSEEK_API_URL: str = "https://api.deepseek.com"
     DEEPSEEK_API_KEY: str = ""
     
+    # HTTP 连接池（ComfyUI / LLM / 文件下载共用）
+    HTTP_POOL_MAX_CONNECTIONS: int = 100  # 每个上游的最大连接数
+    HTTP_POOL_MAX_KEEPALIVE: int = 20  # 每个上游保持的空闲长连接数
+    HTTP_POOL_KEEPALIVE_EXPIRY: float = 30.0  # 空闲长连接过期时间（秒）
+    HTTP2_ENABLED: bool = True  # 安装 h2 时启用 HTTP/2
+    
+    # 任务调度
+    TASK_BACKEND: str = "sqlite"  # sqlite（进程内执行）| celery（Redis 分发到 worker）
+    TASK_MAX_WORKERS: int = 8  # 同时执行的任务总数上限
+    TASK_COMFYUI_CONCURRENCY: int = 2  # 同时提交到 ComfyUI 的任务数上限
+    TASK_COMFYUI_INTERACTIVE_RESERVED: int = 1  # 为交互任务预留的 ComfyUI 并发名额，批量任务最多占用其余名额（至少 1 个）
+    TASK_DEFAULT_CONCURRENCY: int = 2  # 单个任务类型的默认并发上限
+    TASK_TYPE_CONCURRENCY: Dict[str, int] = {}  # 按任务类型覆盖并发上限，如 {"shot_image": 3}
+    TASK_LEASE_SECONDS: int = 120  # 任务租约时长，执行期间定期续约
+    TASK_POLL_INTERVAL: float = 2.0  # 调度器空闲时扫描待执行任务的间隔（秒）
+    TASK_MAX_ATTEMPTS: int = 2  # 任务中断后最多执行次数（含首次）
+    TASK_PROGRESS_FLUSH_INTERVAL: float = 0.5  # 任务进度合并写入间隔（秒）
+    TASK_EVENT_COALESCE_INTERVAL: float = 0.25  # 任务事件推送合并窗口（秒）
+    TASK_EVENT_HEARTBEAT_INTERVAL: float = 15.0  # 推送连接无事件时的心跳间隔（秒）
+    TASK_MODEL_AFFINITY_ENABLED: bool = True  # ComfyUI 任务按所需模型分组领取，减少模型切换
+    TASK_MODEL_AFFINITY_MAX_SKIPS: int = 8  # 当前模型组最多连续插队次数，超出后切换到等待最久的其他模型组
+    TASK_WAIT_SLO: Dict[str, int] = {}  # 按任务类型覆盖等待时间目标（秒），超过目标的任务在同一优先级内优先领取
+    
+    # 视频合并配置
+    VIDEO_NORMALIZE_WORKERS: int = 0  # 片段标准化并行进程数，0 表示 CPU 核数
+    VIDEO_NORMALIZE_CACHE_MAX_MB: int = 5120  # 标准化片段缓存上限（MB），超出后淘汰最久未使用的
+    
+    # LLM 响应缓存（相同厂商、模型、提示词的请求直接返回上次结果）
+    LLM_CACHE_ENABLED: bool = False  # 默认关闭，开启后重跑拆分/解析无需重新调用 LLM
+    LLM_CACHE_MAX_ENTRIES: int = 5000  # 缓存最大条目数，超出后淘汰最久未使用的
+    LLM_CACHE_TTL: float = 604800.0  # 缓存有效期（秒），默认 7 天
+    
+    # LLM 调用日志批量写入
+    LLM_LOG_BATCH_SIZE: int = 50  # 每批写入的日志条数，队列达到该数量时立即写入
+    LLM_LOG_FLUSH_INTERVAL: float = 2.0  # 日志最长写入间隔（秒）
+    LLM_LOG_QUEUE_SIZE: int = 2000  # 待写日志上限，超出后丢弃最早的日志
+    LLM_LOG_COMPRESS_MIN_LENGTH: int = 4096  # 提示词/响应超过该长度时压缩存储，0 表示不压缩
+    
+    # LLM 限流与重试（按 API Key 独立计算）
+    LLM_RATE_LIMIT_ENABLED: bool = True  # 是否启用限流与自适应并发
+    LLM_KEY_RPM: int = 0  # 每个 Key 每分钟请求数上限，0 表示不限
+    LLM_KEY_TPM: int = 0  # 每个 Key 每分钟 token 数上限（按提示词长度估算），0 表示不限
+    LLM_KEY_INITIAL_CONCURRENCY: int = 4  # 每个 Key 的初始并发上限
+    LLM_KEY_MAX_CONCURRENCY: int = 16  # 自适应并发上限的最大值
+    LLM_LATENCY_TARGET: float = 120.0  # 单次请求耗时超过该值（秒）时下调并发
+    LLM_MAX_RETRIES: int = 2  # 限流、服务端错误、连接错误的最大重试次数
+    LLM_RETRY_BASE_DELAY: float = 2.0  # 重试基础等待时间（秒），按次数指数增长并加随机抖动
+    
+    # LLM 多厂商路由（对冲请求、故障切换与熔断）
+    LLM_FALLBACK_PROVIDERS: List[Dict[str, Any]] = []  # 备用厂商/模型（按优先级排列），如 [{"provider": "openai", "model": "gpt-4o-mini", "api_url": "...", "api_key": "...", "max_tokens": 16384}]，与主厂商不同的厂商需填写自己的 api_url/api_key，为空时不启用路由
+    LLM_HEDGE_ENABLED: bool = True  # 主请求超过其近期 p95 耗时未返回时向下一个厂商发起对冲请求
+    LLM_HEDGE_MIN_DELAY: float = 10.0  # 发起对冲请求前的最短等待时间（秒）
+    LLM_HEDGE_DEFAULT_DELAY: float = 90.0  # 耗时样本不足时发起对冲请求前的等待时间（秒）
+    LLM_HEDGE_MIN_SAMPLES: int = 10  # 按 p95 计算等待时间所需的最少样本数
+    LLM_CIRCUIT_FAILURE_THRESHOLD: int = 3  # 厂商/模型连续失败该次数后熔断
+    LLM_CIRCUIT_OPEN_SECONDS: float = 60.0  # 熔断时长（秒），之后放行一次试探请求
+    
     # ComfyUI
     COMFYUI_HOST: str = "http://127.0.0.1:8188"
+    COMFYUI_HOSTS: List[str] = []  # 额外的 ComfyUI 主机（多 GPU 渲染节点），与 COMFYUI_HOST 组成主机池
+    COMFYUI_HEALTH_CHECK_INTERVAL: float = 10.0  # 主机池健康检查与队列深度刷新间隔（秒）
+    COMFYUI_HISTORY_MAX_FAILURES: int = 5  # 等待结果时 /history 连续请求失败达到该次数即判定主机不可用，任务立即失败
+    COMFYUI_INTERACTIVE_FRONT: bool = True  # 交互任务提交时插到 ComfyUI 队列最前，不排在已提交的批量任务之后
+    COMFYUI_AFFINITY_SLACK: int = 2  # 已持有参考图的主机比最空闲主机多出的任务数不超过该值时优先选用
+    COMFYUI_UPLOAD_CACHE_ENABLED: bool = True  # 相同内容的参考图/音频只上传一次
+    COMFYUI_UPLOAD_CACHE_SIZE: int = 1024  # 上传缓存最大条目数
+    COMFYUI_UPLOAD_CACHE_TTL: float = 86400.0  # 上传缓存有效期（秒），过期后重新上传
+    COMFYUI_MEMO_ENABLED: bool = True  # 规范化后完全相同的工作流直接返回上次的生成结果（生成任务的种子保存在任务参数中，重试时可命中）
+    COMFYUI_MEMO_MAX_ENTRIES: int = 2000  # 生成结果记忆最大条目数，超出后淘汰最久未使用的
+    COMFYUI_MEMO_MAX_BYTES: int = 5 * 1024 * 1024 * 1024  # 记忆固定保存的输出文件总大小上限（字节）
     SYSTEM_STATUS_SOURCE: str = "comfyui"
     
     # Output
@@ -105,12 +181,34 @@ def reload_settings_from_db(db_config: dict) -> None:
         _settings_instance.PARSE_CHARACTERS_PROMPT = db_config["parse_characters_prompt"]
 
 
+# 影响 HTTP 连接池的配置项
+_HTTP_POOL_KEYS = {
+    "COMFYUI_HOST",
+    "PROXY_ENABLED",
+    "HTTP_PROXY",
+    "HTTPS_PROXY",
+    "HTTP_POOL_MAX_CONNECTIONS",
+    "HTTP_POOL_MAX_KEEPALIVE",
+    "HTTP_POOL_KEEPALIVE_EXPIRY",
+    "HTTP2_ENABLED",
+}
+
+
 def update_settings(updates: dict) -> None:
     """更新内存中的设置"""
     global _settings_instance
     if _settings_instance is None:
         _settings_instance = Settings()
     
+    changed_keys = set()
     for key, value in updates.items():
         if hasattr(_settings_instance, key.upper()):
+            if getattr(_settings_instance, key.upper()) != value:
+                changed_keys.add(key.upper())
             setattr(_settings_instance, key.upper(), value)
+    
+    # 主机地址、代理或连接池参数变更时，后续请求改用新建的连接池
+    if changed_keys & _HTTP_POOL_KEYS:
+        from app.core.http_client import get_http_pool
+        get_http_pool().invalidate()
+
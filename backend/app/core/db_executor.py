@@ -0,0 +1,62 @@
+"""
+数据库执行线程
+
+后台生成任务中的同步 SQLAlchemy 写操作（commit）放到专用线程中执行，
+避免 SQLite 提交时的磁盘同步阻塞事件循环、拖慢同时在处理的接口请求。
+SQLite 同一时刻只允许一个写事务，使用单线程执行器让后台写入排队，而不是在锁上忙等。
+
+注意：会话不是线程安全的，调用方需在 await 返回前不再使用同一会话（协程内顺序 await 即可满足）。
+"""
+import asyncio
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from sqlalchemy.orm import Session
+
+T = TypeVar("T")
+
+_executor: Optional[ThreadPoolExecutor] = None
+# 标记当前线程是否为数据库执行线程（在其中同步调用 run_db_sync 时直接执行，避免自身等待）
+_executor_thread = threading.local()
+
+
+def _mark_executor_thread():
+    _executor_thread.active = True
+
+
+def get_db_executor() -> ThreadPoolExecutor:
+    """获取数据库执行线程"""
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix="db-writer", initializer=_mark_executor_thread
+        )
+    return _executor
+
+
+def shutdown_db_executor():
+    """关闭数据库执行线程（等待已提交的写入完成）"""
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=True)
+        _executor = None
+
+
+async def run_db(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在数据库执行线程中运行同步函数"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(get_db_executor(), functools.partial(fn, *args, **kwargs))
+
+
+def run_db_sync(fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """在数据库执行线程中运行同步函数并等待结果（不在事件循环中的调用方，如脚本、Celery worker 线程）"""
+    if getattr(_executor_thread, "active", False):
+        return fn(*args, **kwargs)
+    return get_db_executor().submit(functools.partial(fn, *args, **kwargs)).result()
+
+
+async def async_commit(db: Session) -> None:
+    """在数据库执行线程中提交会话"""
+    await run_db(db.commit)
@@ -0,0 +1,194 @@
+"""
+HTTP 连接池管理
+
+进程内按上游（协议 + 主机 + 端口）和代理配置复用 httpx.AsyncClient，
+保持长连接，避免每次请求/轮询都重新进行 TCP/TLS 握手。
+连接池在 main.py lifespan 中创建并在关闭时释放。
+"""
+import asyncio
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Set, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from app.core.config import get_settings
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# 连接池键：(上游 origin, 代理地址, 是否读取环境变量代理)
+PoolKey = Tuple[str, Optional[str], bool]
+
+
+def _origin(url: str) -> str:
+    """提取 URL 的 scheme://host:port 部分"""
+    parts = urlsplit(url)
+    if not parts.scheme or not parts.netloc:
+        return url.rstrip("/")
+    return f"{parts.scheme}://{parts.netloc}".lower()
+
+
+class HTTPClientPool:
+    """按上游划分的 httpx.AsyncClient 连接池"""
+
+    def __init__(self):
+        self._clients: Dict[PoolKey, httpx.AsyncClient] = {}
+        # 配置变更后退役的客户端，借出的请求全部归还后关闭
+        self._retired: List[httpx.AsyncClient] = []
+        # 客户端 -> 进行中的借用数（http_client 上下文）
+        self._borrowed: Dict[httpx.AsyncClient, int] = {}
+        self._closing: Set[asyncio.Task] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _build_client(self, proxy: Optional[str], trust_env: bool) -> httpx.AsyncClient:
+        settings = get_settings()
+        limits = httpx.Limits(
+            max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+            keepalive_expiry=settings.HTTP_POOL_KEEPALIVE_EXPIRY,
+        )
+        return httpx.AsyncClient(
+            proxy=proxy,
+            trust_env=trust_env,
+            limits=limits,
+            http2=settings.HTTP2_ENABLED and HTTP2_AVAILABLE,
+        )
+
+    def get_client(
+        self,
+        url: str,
+        proxy: Optional[str] = None,
+        trust_env: bool = True
+    ) -> httpx.AsyncClient:
+        """
+        获取指定上游的共享客户端
+
+        Args:
+            url: 请求地址或上游基础地址
+            proxy: 代理地址，None 表示不显式指定
+            trust_env: 是否读取 HTTP_PROXY 等环境变量（本地服务应传 False）
+        """
+        # 客户端连接绑定事件循环，循环变化时（如测试中）退役全部客户端，旧循环上的借用不再计数
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            loop = None
+        if loop is not self._loop:
+            self._borrowed.clear()
+            self._loop = loop
+            self.invalidate()
+        else:
+            self._close_drained()
+
+        key = (_origin(url), proxy or None, trust_env)
+        client = self._clients.get(key)
+        if client is None or client.is_closed:
+            client = self._build_client(proxy or None, trust_env)
+            self._clients[key] = client
+        return client
+
+    def invalidate(self):
+        """配置（主机地址、代理、连接池参数）变更后调用，后续请求使用新建的连接池"""
+        self._retired.extend(self._clients.values())
+        self._clients.clear()
+        self._close_drained()
+
+    def borrow(self, client: httpx.AsyncClient):
+        """记录借出的客户端（退役后等待归还再关闭）"""
+        self._borrowed[client] = self._borrowed.get(client, 0) + 1
+
+    def give_back(self, client: httpx.AsyncClient):
+        """归还客户端，退役客户端的最后一个借用归还后关闭"""
+        count = self._borrowed.get(client, 0) - 1
+        if count > 0:
+            self._borrowed[client] = count
+        else:
+            self._borrowed.pop(client, None)
+        self._close_drained()
+
+    def _close_drained(self):
+        """在当前事件循环中关闭没有进行中请求的退役客户端（不在事件循环中时留到下次）"""
+        if not self._retired:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        drained = [client for client in self._retired if client not in self._borrowed]
+        if not drained:
+            return
+        self._retired = [client for client in self._retired if client in self._borrowed]
+        task = loop.create_task(self._aclose(drained))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    @staticmethod
+    async def _aclose(clients: List[httpx.AsyncClient]):
+        for client in clients:
+            try:
+                await client.aclose()
+            except Exception as e:
+                print(f"[HTTPClientPool] 关闭客户端失败: {e}")
+
+    async def close(self):
+        """关闭所有客户端"""
+        clients = list(self._clients.values()) + self._retired
+        self._clients.clear()
+        self._retired.clear()
+        self._borrowed.clear()
+        await self._aclose(clients)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+
+
+# 全局连接池实例
+_http_pool: Optional[HTTPClientPool] = None
+
+
+def get_http_pool() -> HTTPClientPool:
+    """获取连接池实例"""
+    global _http_pool
+    if _http_pool is None:
+        _http_pool = HTTPClientPool()
+    return _http_pool
+
+
+def init_http_pool() -> HTTPClientPool:
+    """初始化连接池（应用启动时调用）"""
+    global _http_pool
+    _http_pool = HTTPClientPool()
+    return _http_pool
+
+
+async def close_http_pool():
+    """关闭连接池（应用关闭时调用）"""
+    global _http_pool
+    if _http_pool is not None:
+        await _http_pool.close()
+        _http_pool = None
+
+
+@asynccontextmanager
+async def http_client(
+    url: str,
+    proxy: Optional[str] = None,
+    trust_env: bool = True
+) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    借用连接池中的共享客户端
+
+    用法与 `async with httpx.AsyncClient() as client` 相同，但退出时不关闭客户端
+    （配置变更后退役的客户端在全部借用归还后关闭）。
+    """
+    pool = get_http_pool()
+    client = pool.get_client(url, proxy=proxy, trust_env=trust_env)
+    pool.borrow(client)
+    try:
+        yield client
+    finally:
+        pool.give_back(client)
@@ -3,14 +3,17 @@ from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
 
 from app.api import characters, tasks, config, health, test_cases, workflows, files, prompt_templates, llm_logs, scenes, props
-from app.api import novels, chapters, shots
+from app.api import novels, chapters, shots, events
 from app.core.database import engine, Base
 # 导入所有模型以确保创建表
 from app.models.novel import Novel, Chapter, Character, Scene, Prop
 from app.models.task import Task
 from app.models.test_case import TestCase
 from app.models.prompt_template import PromptTemplate
-from app.models.llm_log import LLMLog
+from app.models.llm_log import LLMLog, LLMLogRollup
+from app.models.llm_cache import LLMCacheEntry
+from app.models.generation_memo import GenerationMemo
+from app.models.chapter_extraction import ChapterExtraction
 from app.models.system_config import SystemConfig  # 导入系统配置模型
 
 
@@ -33,6 +36,10 @@ async def lifespan(app: FastAPI):
     finally:
         db.close()
     
+    # 初始化共享 HTTP 连接池
+    from app.core.http_client import init_http_pool, close_http_pool
+    init_http_pool()
+    
     # 启动 ComfyUI 监控器
     from app.services.comfyui_monitor import init_monitor
     from app.core.config import get_settings
@@ -41,10 +48,40 @@ async def lifespan(app: FastAPI):
     monitor = init_monitor(settings.COMFYUI_HOST)
     await monitor.start()
     
+    # 启动 ComfyUI 任务事件监听（WebSocket 推送任务完成）
+    from app.services.comfyui.events import get_event_hub, all_event_hubs
+    event_hub = get_event_hub()
+    await event_hub.start()
+
+    # 启动 ComfyUI 主机池健康检查（配置了多台主机时生效）
+    from app.services.comfyui.backends import get_backend_pool
+    backend_pool = get_backend_pool()
+    for host in backend_pool.hosts[1:]:
+        await get_event_hub(host).start()
+    await backend_pool.start()
+    
+    # 启动任务调度器（恢复中断的任务并开始调度）
+    from app.services.scheduler import init_task_scheduler
+    task_scheduler = init_task_scheduler()
+    await task_scheduler.start()
+    
     yield
     
     # Shutdown
+    await task_scheduler.stop()
+    from app.services.scheduler import get_progress_writer
+    from app.services.llm.log_sink import get_llm_log_sink
+    from app.core.db_executor import shutdown_db_executor
+    await get_progress_writer().stop()
+    await get_llm_log_sink().stop()
+    shutdown_db_executor()
+    from app.services.file_storage import shutdown_video_normalize_pool
+    shutdown_video_normalize_pool()
+    await backend_pool.stop()
+    for hub in all_event_hubs():
+        await hub.stop()
     await monitor.stop()
+    await close_http_pool()
 
 
 app = FastAPI(
@@ -86,6 +123,7 @@ app.include_router(workflows.router, prefix="/api/workflows", tags=["workflows"]
 app.include_router(files.router, prefix="/api/files", tags=["files"])
 app.include_router(prompt_templates.router, prefix="/api/prompt-templates", tags=["prompt-templates"])
 app.include_router(llm_logs.router, prefix="/api/llm-logs", tags=["llm-logs"])
+app.include_router(events.router, prefix="/api/events", tags=["events"])
 
 
 @app.get("/")
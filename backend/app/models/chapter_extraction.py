@@ -0,0 +1,30 @@
+"""章节实体解析记录模型"""
+from sqlalchemy import Column, String, Text, DateTime, Index
+from sqlalchemy.sql import func
+from app.core.database import Base
+from app.models.novel import generate_uuid
+
+
+class ChapterExtraction(Base):
+    """
+    章节的角色/场景/道具解析记录
+
+    记录章节在某个提示词模板版本下最近一次解析时的内容指纹与解析出的实体名称，
+    增量解析时只重新解析指纹或模板版本变化的章节。
+    """
+    __tablename__ = "chapter_extractions"
+
+    id = Column(String, primary_key=True, default=generate_uuid)
+    novel_id = Column(String, nullable=False, index=True)
+    chapter_id = Column(String, nullable=False)
+    extraction_type = Column(String, nullable=False)  # characters / scenes / props
+    template_version = Column(String, nullable=False)  # 解析提示词模板内容指纹
+    content_hash = Column(String, nullable=False)  # 解析时的章节内容指纹
+    entity_names = Column(Text, default="[]")  # 解析出的实体名称（JSON 数组）
+
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+
+# 每个章节每种解析类型只保留最近一次记录
+Index('ix_chapter_extractions_chapter_type', ChapterExtraction.chapter_id, ChapterExtraction.extraction_type, unique=True)
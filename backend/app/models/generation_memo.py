@@ -0,0 +1,19 @@
+"""ComfyUI 生成结果记忆模型"""
+from sqlalchemy import Column, String, DateTime, Integer
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class GenerationMemo(Base):
+    __tablename__ = "comfyui_generation_memo"
+
+    # 规范化工作流摘要（上传文件名替换为内容摘要）
+    digest = Column(String, primary_key=True)
+
+    kind = Column(String, nullable=False)  # image / video / audio
+    output_path = Column(String, nullable=False)  # 固定保存的输出文件路径
+    size_bytes = Column(Integer, default=0)
+
+    created_at = Column(DateTime, server_default=func.now())
+    last_used_at = Column(DateTime, server_default=func.now(), index=True)  # 按最近使用淘汰
+    hit_count = Column(Integer, default=0)
@@ -0,0 +1,21 @@
+"""LLM 响应缓存模型"""
+from sqlalchemy import Column, String, Text, DateTime, Integer
+from sqlalchemy.sql import func
+from app.core.database import Base
+
+
+class LLMCacheEntry(Base):
+    __tablename__ = "llm_response_cache"
+
+    # 厂商、模型、提示词、温度、响应格式的规范化哈希
+    key = Column(String, primary_key=True)
+
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    task_type = Column(String, nullable=True)
+
+    response = Column(Text, nullable=False)
+
+    created_at = Column(DateTime, server_default=func.now(), index=True)
+    last_used_at = Column(DateTime, server_default=func.now(), index=True)  # 按最近使用淘汰
+    hit_count = Column(Integer, default=0)
@@ -1,9 +1,46 @@
 """LLM调用日志模型"""
-from sqlalchemy import Column, String, Text, DateTime, Integer, JSON, Boolean, Float
+import base64
+import zlib
+
+from sqlalchemy import Column, String, Text, DateTime, Integer, JSON, Boolean, Float, Index
 from sqlalchemy.sql import func
+from sqlalchemy.types import TypeDecorator
 from app.core.database import Base
 import uuid
 
+# 压缩内容前缀（未压缩的历史数据按原文读取）
+_COMPRESSED_PREFIX = "zlib+b64:"
+
+
+class CompressedText(TypeDecorator):
+    """
+    超过 LLM_LOG_COMPRESS_MIN_LENGTH 的文本以 zlib 压缩后存储，读取时自动解压
+
+    提示词与响应多为重复度较高的中文文本，压缩后通常只占原大小的三分之一左右。
+    """
+    impl = Text
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        from app.core.config import get_settings
+        min_length = get_settings().LLM_LOG_COMPRESS_MIN_LENGTH
+        if min_length <= 0 or len(value) < min_length:
+            return value
+        compressed = _COMPRESSED_PREFIX + base64.b64encode(
+            zlib.compress(value.encode("utf-8"), 6)
+        ).decode("ascii")
+        return compressed if len(compressed) < len(value.encode("utf-8")) else value
+
+    def process_result_value(self, value, dialect):
+        if value is None or not value.startswith(_COMPRESSED_PREFIX):
+            return value
+        try:
+            return zlib.decompress(base64.b64decode(value[len(_COMPRESSED_PREFIX):])).decode("utf-8")
+        except (ValueError, zlib.error):
+            return value
+
 
 class LLMLog(Base):
     __tablename__ = "llm_logs"
@@ -18,11 +55,11 @@ class LLMLog(Base):
     model = Column(String, nullable=False)     # deepseek-chat, gpt-4o, etc.
     
     # 提示词
-    system_prompt = Column(Text, nullable=True)
-    user_prompt = Column(Text, nullable=False)
+    system_prompt = Column(CompressedText, nullable=True)
+    user_prompt = Column(CompressedText, nullable=False)
     
     # LLM响应
-    response = Column(Text, nullable=True)
+    response = Column(CompressedText, nullable=True)
     
     # 状态
     status = Column(String, default="success")  # success, error
@@ -41,3 +78,51 @@ class LLMLog(Base):
     
     # 请求耗时（秒）
     duration = Column(Float, nullable=True)  # 请求耗时，单位秒
+    
+    # 是否命中响应缓存（命中时未实际调用 LLM，耗时为 0）
+    cached = Column(Boolean, default=False)
+    
+    # 多厂商路由决策（primary / hedge / failover 及原因），未启用路由时为空
+    route = Column(Text, nullable=True)
+
+
+# 分页筛选与统计查询使用的索引
+Index('ix_llm_logs_created', LLMLog.created_at)
+Index('ix_llm_logs_provider_model_created', LLMLog.provider, LLMLog.model, LLMLog.created_at)
+Index('ix_llm_logs_task_type_created', LLMLog.task_type, LLMLog.created_at)
+Index('ix_llm_logs_status_created', LLMLog.status, LLMLog.created_at)
+Index('ix_llm_logs_novel_created', LLMLog.novel_id, LLMLog.created_at)
+
+
+class LLMLogRollup(Base):
+    """
+    LLM 调用按小时汇总的统计（写入日志时增量更新）
+
+    耗时与响应长度以固定分桶的直方图计数存储，统计接口据此估算 p50/p95/p99，
+    无需扫描原始日志。
+    """
+    __tablename__ = "llm_log_rollups"
+
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    bucket_start = Column(DateTime, nullable=False)  # 小时起点（UTC）
+    provider = Column(String, nullable=False)
+    model = Column(String, nullable=False)
+    task_type = Column(String, nullable=False, default="")  # 未记录任务类型时为空字符串
+
+    requests = Column(Integer, default=0)  # 调用次数（含缓存命中）
+    errors = Column(Integer, default=0)  # 失败次数
+    cached = Column(Integer, default=0)  # 缓存命中次数（不计入耗时统计）
+    duration_count = Column(Integer, default=0)  # 有耗时记录的实际调用次数
+    duration_sum = Column(Float, default=0.0)
+    duration_max = Column(Float, default=0.0)
+    duration_histogram = Column(Text, default="[]")  # 耗时分桶计数（JSON 数组）
+    response_chars_sum = Column(Integer, default=0)
+    response_chars_max = Column(Integer, default=0)
+    response_histogram = Column(Text, default="[]")  # 响应长度分桶计数（JSON 数组）
+
+
+Index(
+    'ix_llm_log_rollups_bucket_dims',
+    LLMLogRollup.bucket_start, LLMLogRollup.provider, LLMLogRollup.model, LLMLogRollup.task_type,
+    unique=True
+)
@@ -38,6 +38,7 @@ class Task(Base):
 
     # ComfyUI相关
     comfyui_prompt_id = Column(String, nullable=True, index=True)  # ComfyUI 任务查询
+    comfyui_host = Column(String, nullable=True)  # 执行任务的 ComfyUI 主机
 
     # 工作流信息
     workflow_id = Column(String, nullable=True)
@@ -45,6 +46,14 @@ class Task(Base):
     workflow_json = Column(Text, nullable=True)
     prompt_text = Column(Text, nullable=True)
 
+    # 调度信息
+    priority = Column(Integer, default=0)  # 数值越大越先执行
+    payload = Column(Text, nullable=True)  # 任务处理函数参数（JSON），为空表示不由调度器执行
+    attempts = Column(Integer, default=0)  # 已执行次数
+    max_attempts = Column(Integer, default=1)  # 中断后最多执行次数
+    lease_owner = Column(String, nullable=True)  # 持有租约的调度器/worker 标识
+    lease_expires_at = Column(DateTime(timezone=True), nullable=True)  # 租约过期时间
+
     # 时间戳
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     started_at = Column(DateTime(timezone=True), nullable=True)
@@ -56,3 +65,5 @@ class Task(Base):
 Index('ix_tasks_novel_type_status', Task.novel_id, Task.type, Task.status)
 # 复合索引：按状态查询待处理任务
 Index('ix_tasks_status_created', Task.status, Task.created_at)
+# 复合索引：调度器按优先级领取待执行任务
+Index('ix_tasks_status_priority_created', Task.status, Task.priority, Task.created_at)
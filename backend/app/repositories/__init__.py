@@ -13,7 +13,10 @@ from .task import TaskRepository
 from .workflow import WorkflowRepository
 from .prompt_template import PromptTemplateRepository
 from .test_case import TestCaseRepository
-from .llm_log import LLMLogRepository
+from .llm_log import LLMLogRepository, LLMLogRollupRepository
+from .llm_cache import LLMCacheRepository
+from .generation_memo import GenerationMemoRepository
+from .chapter_extraction import ChapterExtractionRepository
 from .shot_repository import ShotRepository
 
 __all__ = [
@@ -27,5 +30,9 @@ __all__ = [
     "PromptTemplateRepository",
     "TestCaseRepository",
     "LLMLogRepository",
+    "LLMLogRollupRepository",
+    "LLMCacheRepository",
+    "GenerationMemoRepository",
+    "ChapterExtractionRepository",
     "ShotRepository",
 ]
@@ -0,0 +1,52 @@
+"""
+ChapterExtraction Repository 层
+
+封装章节实体解析记录的查询与写入
+"""
+import json
+from typing import Dict, List
+
+from sqlalchemy.orm import Session
+
+from app.models.chapter_extraction import ChapterExtraction
+
+
+class ChapterExtractionRepository:
+    """章节实体解析记录数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get_map_by_novel(self, novel_id: str, extraction_type: str) -> Dict[str, ChapterExtraction]:
+        """获取小说某种解析类型的全部记录（{章节ID: 记录}）"""
+        records = self.db.query(ChapterExtraction).filter(
+            ChapterExtraction.novel_id == novel_id,
+            ChapterExtraction.extraction_type == extraction_type
+        ).all()
+        return {r.chapter_id: r for r in records}
+
+    def upsert(
+        self,
+        novel_id: str,
+        chapter_id: str,
+        extraction_type: str,
+        template_version: str,
+        content_hash: str,
+        entity_names: List[str]
+    ) -> ChapterExtraction:
+        """写入章节解析记录（已存在时覆盖），不提交事务"""
+        record = self.db.query(ChapterExtraction).filter(
+            ChapterExtraction.chapter_id == chapter_id,
+            ChapterExtraction.extraction_type == extraction_type
+        ).first()
+        if record is None:
+            record = ChapterExtraction(
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                extraction_type=extraction_type
+            )
+            self.db.add(record)
+        record.template_version = template_version
+        record.content_hash = content_hash
+        record.entity_names = json.dumps(entity_names, ensure_ascii=False)
+        return record
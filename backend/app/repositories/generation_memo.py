@@ -0,0 +1,103 @@
+"""
+GenerationMemo Repository 层
+
+封装 ComfyUI 生成结果记忆的数据库读写与淘汰逻辑
+"""
+from datetime import datetime
+from typing import List, Optional
+
+from sqlalchemy import func
+from sqlalchemy.orm import Session
+
+from app.models.generation_memo import GenerationMemo
+
+
+class GenerationMemoRepository:
+    """ComfyUI 生成结果记忆数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, digest: str) -> Optional[GenerationMemo]:
+        """获取记忆条目并记录命中"""
+        entry = self.db.query(GenerationMemo).filter(GenerationMemo.digest == digest).first()
+        if entry is None:
+            return None
+        entry.last_used_at = datetime.utcnow()
+        entry.hit_count = (entry.hit_count or 0) + 1
+        self.db.commit()
+        return entry
+
+    def put(self, digest: str, kind: str, output_path: str, size_bytes: int) -> Optional[str]:
+        """
+        写入记忆（已存在时覆盖）
+
+        Returns:
+            被覆盖条目原来的输出文件路径（与新路径不同时，由调用方删除）
+        """
+        now = datetime.utcnow()
+        entry = self.db.query(GenerationMemo).filter(GenerationMemo.digest == digest).first()
+        replaced = None
+        if entry is None:
+            entry = GenerationMemo(digest=digest, hit_count=0)
+            self.db.add(entry)
+        elif entry.output_path != output_path:
+            replaced = entry.output_path
+        entry.kind = kind
+        entry.output_path = output_path
+        entry.size_bytes = size_bytes
+        entry.created_at = now
+        entry.last_used_at = now
+        self.db.commit()
+        return replaced
+
+    def delete(self, digest: str) -> None:
+        self.db.query(GenerationMemo).filter(GenerationMemo.digest == digest).delete(
+            synchronize_session=False
+        )
+        self.db.commit()
+
+    def totals(self) -> tuple:
+        """(条目数, 输出文件总字节数)"""
+        count, size = self.db.query(
+            func.count(GenerationMemo.digest), func.coalesce(func.sum(GenerationMemo.size_bytes), 0)
+        ).one()
+        return int(count), int(size)
+
+    def evict(self, max_entries: int, max_bytes: int) -> List[str]:
+        """
+        超出条目数或总大小上限时按最近使用时间淘汰
+
+        Returns:
+            被淘汰条目的输出文件路径（由调用方删除）
+        """
+        count, size = self.totals()
+        if count <= max_entries and size <= max_bytes:
+            return []
+
+        removed = []
+        digests = []
+        for digest, output_path, size_bytes in (
+            self.db.query(GenerationMemo.digest, GenerationMemo.output_path, GenerationMemo.size_bytes)
+            .order_by(GenerationMemo.last_used_at.asc())
+            .all()
+        ):
+            if count <= max_entries and size <= max_bytes:
+                break
+            digests.append(digest)
+            removed.append(output_path)
+            count -= 1
+            size -= size_bytes or 0
+
+        self.db.query(GenerationMemo).filter(GenerationMemo.digest.in_(digests)).delete(
+            synchronize_session=False
+        )
+        self.db.commit()
+        return removed
+
+    def clear(self) -> List[str]:
+        """清空记忆，返回所有输出文件路径"""
+        paths = [row[0] for row in self.db.query(GenerationMemo.output_path).all()]
+        self.db.query(GenerationMemo).delete(synchronize_session=False)
+        self.db.commit()
+        return paths
@@ -0,0 +1,90 @@
+"""
+LLMCache Repository 层
+
+封装 LLM 响应缓存的数据库读写与淘汰逻辑
+"""
+from datetime import datetime, timedelta
+from typing import Optional
+
+from sqlalchemy.orm import Session
+
+from app.models.llm_cache import LLMCacheEntry
+
+
+class LLMCacheRepository:
+    """LLM 响应缓存数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def get(self, key: str, ttl_seconds: float) -> Optional[LLMCacheEntry]:
+        """获取未过期的缓存条目并记录命中"""
+        entry = self.db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).first()
+        if entry is None:
+            return None
+        now = datetime.utcnow()
+        if entry.created_at and entry.created_at < now - timedelta(seconds=ttl_seconds):
+            self.db.delete(entry)
+            self.db.commit()
+            return None
+        entry.last_used_at = now
+        entry.hit_count = (entry.hit_count or 0) + 1
+        self.db.commit()
+        return entry
+
+    def put(self, key: str, provider: str, model: str, response: str, task_type: str = None) -> None:
+        """写入缓存（已存在时覆盖）"""
+        now = datetime.utcnow()
+        entry = self.db.query(LLMCacheEntry).filter(LLMCacheEntry.key == key).first()
+        if entry is None:
+            entry = LLMCacheEntry(key=key, hit_count=0)
+            self.db.add(entry)
+        entry.provider = provider
+        entry.model = model
+        entry.task_type = task_type
+        entry.response = response
+        entry.created_at = now
+        entry.last_used_at = now
+        self.db.commit()
+
+    def delete(self, key: str) -> bool:
+        """删除缓存条目"""
+        removed = self.db.query(LLMCacheEntry).filter(
+            LLMCacheEntry.key == key
+        ).delete(synchronize_session=False)
+        self.db.commit()
+        return removed > 0
+
+    def count(self) -> int:
+        return self.db.query(LLMCacheEntry).count()
+
+    def evict(self, max_entries: int, ttl_seconds: float) -> int:
+        """
+        删除过期条目，并在超出数量上限时按最近使用时间淘汰
+
+        Returns:
+            删除的条目数
+        """
+        cutoff = datetime.utcnow() - timedelta(seconds=ttl_seconds)
+        removed = self.db.query(LLMCacheEntry).filter(
+            LLMCacheEntry.created_at < cutoff
+        ).delete(synchronize_session=False)
+
+        overflow = self.count() - max_entries
+        if overflow > 0:
+            stale_keys = [
+                row[0] for row in self.db.query(LLMCacheEntry.key)
+                .order_by(LLMCacheEntry.last_used_at.asc())
+                .limit(overflow).all()
+            ]
+            removed += self.db.query(LLMCacheEntry).filter(
+                LLMCacheEntry.key.in_(stale_keys)
+            ).delete(synchronize_session=False)
+
+        self.db.commit()
+        return removed
+
+    def clear(self) -> int:
+        removed = self.db.query(LLMCacheEntry).delete(synchronize_session=False)
+        self.db.commit()
+        return removed
@@ -3,11 +3,13 @@ LLMLog Repository 层
 
 封装LLM调用日志相关的数据库查询逻辑
 """
+import json
+from datetime import datetime
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
 from sqlalchemy import desc
 
-from app.models.llm_log import LLMLog
+from app.models.llm_log import LLMLog, LLMLogRollup
 
 
 class LLMLogRepository:
@@ -83,3 +85,76 @@ class LLMLogRepository:
         """删除日志"""
         self.db.delete(log)
         self.db.commit()
+
+
+
+class LLMLogRollupRepository:
+    """LLM 调用小时汇总数据仓库"""
+
+    def __init__(self, db: Session):
+        self.db = db
+
+    def merge(self, deltas: Dict[tuple, Any]) -> None:
+        """
+        将汇总增量累加到对应的小时汇总行（不存在时创建），不提交事务
+
+        Args:
+            deltas: {(小时起点, 厂商, 模型, 任务类型): RollupDelta}
+        """
+        for (bucket_start, provider, model, task_type), delta in deltas.items():
+            row = self.db.query(LLMLogRollup).filter(
+                LLMLogRollup.bucket_start == bucket_start,
+                LLMLogRollup.provider == provider,
+                LLMLogRollup.model == model,
+                LLMLogRollup.task_type == task_type
+            ).first()
+            if row is None:
+                row = LLMLogRollup(
+                    bucket_start=bucket_start,
+                    provider=provider,
+                    model=model,
+                    task_type=task_type
+                )
+                self.db.add(row)
+            else:
+                # 与已有计数合并
+                from app.services.llm.analytics import RollupDelta
+                merged = RollupDelta.from_row(row)
+                merged.merge(delta)
+                delta = merged
+            row.requests = delta.requests
+            row.errors = delta.errors
+            row.cached = delta.cached
+            row.duration_count = delta.duration_count
+            row.duration_sum = delta.duration_sum
+            row.duration_max = delta.duration_max
+            row.duration_histogram = json.dumps(delta.duration_histogram)
+            row.response_chars_sum = delta.response_chars_sum
+            row.response_chars_max = delta.response_chars_max
+            row.response_histogram = json.dumps(delta.response_histogram)
+
+    def list_range(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        provider: Optional[str] = None,
+        model: Optional[str] = None,
+        task_type: Optional[str] = None
+    ) -> List[LLMLogRollup]:
+        """获取时间范围内的汇总行（UTC，按时间升序）"""
+        query = self.db.query(LLMLogRollup)
+        if start:
+            query = query.filter(LLMLogRollup.bucket_start >= start)
+        if end:
+            query = query.filter(LLMLogRollup.bucket_start < end)
+        if provider:
+            query = query.filter(LLMLogRollup.provider == provider)
+        if model:
+            query = query.filter(LLMLogRollup.model == model)
+        if task_type:
+            query = query.filter(LLMLogRollup.task_type == task_type)
+        return query.order_by(LLMLogRollup.bucket_start).all()
+
+    def delete_all(self) -> int:
+        """清空汇总（重新回填前使用），不提交事务"""
+        return self.db.query(LLMLogRollup).delete()
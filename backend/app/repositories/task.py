@@ -3,18 +3,29 @@ Task Repository 层
 
 封装任务相关的数据库查询逻辑
 """
+from datetime import datetime, timedelta
 from typing import List, Optional, Dict, Any
 from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func
 
+from app.constants import TASK_LANES, task_lane
 from app.models.task import Task
 
+# Session.info 中记录批量 UPDATE 涉及的任务ID（query.update 不经过 flush，
+# 任务事件推送在提交前据此读取最新状态，见 services/scheduler/events.py）
+BULK_UPDATED_TASKS_KEY = "bulk_updated_tasks"
+
 
 class TaskRepository:
     """任务数据仓库"""
     
     def __init__(self, db: Session):
         self.db = db
+
+    def _record_bulk_update(self, task_ids: List[str]) -> None:
+        """记录批量 UPDATE 涉及的任务，提交时推送任务事件"""
+        if task_ids:
+            self.db.info.setdefault(BULK_UPDATED_TASKS_KEY, set()).update(task_ids)
     
     def list_all(self, limit: int = 50) -> List[Task]:
         """获取所有任务（按创建时间倒序）"""
@@ -99,11 +110,16 @@ class TaskRepository:
             Task.status.in_(["pending", "running"])
         ).first()
     
-    def list_active_tasks(self) -> List[Task]:
-        """获取所有进行中或待处理的任务"""
-        return self.db.query(Task).filter(
+    def list_active_tasks(self, novel_id: Optional[str] = None, chapter_id: Optional[str] = None) -> List[Task]:
+        """获取所有进行中或待处理的任务（可按小说/章节筛选）"""
+        query = self.db.query(Task).filter(
             Task.status.in_(["pending", "running"])
-        ).all()
+        )
+        if novel_id:
+            query = query.filter(Task.novel_id == novel_id)
+        if chapter_id:
+            query = query.filter(Task.chapter_id == chapter_id)
+        return query.all()
     
     def create(self, task: Task) -> Task:
         """创建任务"""
@@ -255,6 +271,75 @@ class TaskRepository:
         )
         return self.create(task)
 
+    def create_chapter_shot_images_task(
+        self,
+        novel_id: str,
+        chapter_id: str,
+        chapter_title: str,
+        shot_count: int,
+        workflow_id: str,
+        workflow_name: str
+    ) -> Task:
+        """创建章节批量分镜图生成任务（汇总各分镜任务进度）"""
+        task = Task(
+            type="chapter_shot_images",
+            name=f"批量生成分镜图: {chapter_title}",
+            description=f"为章节 '{chapter_title}' 的 {shot_count} 个分镜生成图片",
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            status="pending",
+            workflow_id=workflow_id,
+            workflow_name=workflow_name
+        )
+        return self.create(task)
+
+    def create_novel_split_task(self, novel_id: str, novel_title: str, chapter_count: int) -> Task:
+        """创建小说批量拆分章节任务"""
+        task = Task(
+            type="novel_split_chapters",
+            name=f"批量拆分章节: {novel_title}",
+            description=f"将小说 '{novel_title}' 的 {chapter_count} 个章节拆分为分镜",
+            novel_id=novel_id,
+            status="pending"
+        )
+        return self.create(task)
+
+    def create_novel_appearance_task(self, novel_id: str, novel_title: str, entity_count: int) -> Task:
+        """创建小说批量补全外貌/场景设定任务"""
+        task = Task(
+            type="novel_fill_appearances",
+            name=f"批量生成描述: {novel_title}",
+            description=f"为小说 '{novel_title}' 中 {entity_count} 个缺少外貌/设定描述的角色、场景、道具生成描述",
+            novel_id=novel_id,
+            status="pending"
+        )
+        return self.create(task)
+
+    def get_active_novel_task(self, novel_id: str, task_type: str) -> Optional[Task]:
+        """获取小说级进行中的任务"""
+        return self.db.query(Task).filter(
+            Task.novel_id == novel_id,
+            Task.type == task_type,
+            Task.status.in_(["pending", "running"])
+        ).first()
+
+    def get_active_chapter_task(self, chapter_id: str, task_type: str) -> Optional[Task]:
+        """获取章节级进行中的任务"""
+        return self.db.query(Task).filter(
+            Task.chapter_id == chapter_id,
+            Task.type == task_type,
+            Task.status.in_(["pending", "running"])
+        ).first()
+
+    def count_by_status(self, task_ids: List[str]) -> Dict[str, int]:
+        """统计指定任务的各状态数量"""
+        if not task_ids:
+            return {}
+        rows = self.db.query(Task.status, func.count(Task.id)).filter(
+            Task.id.in_(task_ids)
+        ).group_by(Task.status).all()
+        return {status: count for status, count in rows}
+
     def create_shot_video_task(
         self,
         novel_id: str,
@@ -395,3 +480,122 @@ class TaskRepository:
             Task.name.like(f"%镜{shot_index}%"),
             Task.status.in_(["pending", "running"])
         ).first()
+
+    # ==================== 调度器 ====================
+
+    def count_leased_by_type(self) -> Dict[str, int]:
+        """统计各类型持有租约（正在执行）的任务数"""
+        rows = self.db.query(Task.type, func.count(Task.id)).filter(
+            Task.status == "running",
+            Task.lease_owner.isnot(None)
+        ).group_by(Task.type).all()
+        return {task_type: count for task_type, count in rows}
+
+    def count_by_lane(self, task_types, status: str, leased_only: bool = False) -> Dict[str, int]:
+        """按调度通道统计指定类型、状态的任务数"""
+        query = self.db.query(Task.priority, func.count(Task.id)).filter(
+            Task.type.in_(task_types),
+            Task.status == status
+        )
+        if leased_only:
+            query = query.filter(Task.lease_owner.isnot(None))
+        counts = {lane: 0 for lane in TASK_LANES}
+        for priority, count in query.group_by(Task.priority).all():
+            counts[task_lane(priority)] += count
+        return counts
+
+    def list_claimable(self, task_types: List[str], limit: int = 50) -> List[Task]:
+        """获取可领取的待执行任务（按优先级、创建时间排序）"""
+        return self.db.query(Task).filter(
+            Task.status == "pending",
+            Task.payload.isnot(None),
+            Task.lease_owner.is_(None),
+            Task.type.in_(task_types)
+        ).order_by(Task.priority.desc(), Task.created_at.asc()).limit(limit).all()
+
+    def claim(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        """
+        原子领取任务：仅当任务仍为 pending 且无人持有租约时成功
+
+        Returns:
+            是否领取成功
+        """
+        now = datetime.utcnow()
+        updated = self.db.query(Task).filter(
+            Task.id == task_id,
+            Task.status == "pending",
+            Task.lease_owner.is_(None)
+        ).update({
+            Task.status: "running",
+            Task.lease_owner: owner,
+            Task.lease_expires_at: now + timedelta(seconds=lease_seconds),
+            Task.attempts: func.coalesce(Task.attempts, 0) + 1,
+        }, synchronize_session=False)
+        if updated:
+            self._record_bulk_update([task_id])
+        self.db.commit()
+        return updated == 1
+
+    def renew_lease(self, task_id: str, owner: str, lease_seconds: int) -> bool:
+        """续约，租约已被他人接管时返回 False"""
+        updated = self.db.query(Task).filter(
+            Task.id == task_id,
+            Task.lease_owner == owner
+        ).update({
+            Task.lease_expires_at: datetime.utcnow() + timedelta(seconds=lease_seconds)
+        }, synchronize_session=False)
+        self.db.commit()
+        return updated == 1
+
+    def release_lease(self, task_id: str, owner: str) -> None:
+        """释放租约"""
+        updated = self.db.query(Task).filter(
+            Task.id == task_id,
+            Task.lease_owner == owner
+        ).update({
+            Task.lease_owner: None,
+            Task.lease_expires_at: None,
+        }, synchronize_session=False)
+        if updated:
+            self._record_bulk_update([task_id])
+        self.db.commit()
+
+    def dequeue_pending(self, task_ids: List[str], error_message: str, current_step: str) -> int:
+        """
+        将尚未被领取的待执行任务标记为失败
+
+        Returns:
+            移除的任务数
+        """
+        pending_ids = [
+            row[0] for row in self.db.query(Task.id).filter(
+                Task.id.in_(task_ids),
+                Task.status == "pending",
+                Task.lease_owner.is_(None),
+            ).all()
+        ]
+        if not pending_ids:
+            return 0
+        count = self.db.query(Task).filter(
+            Task.id.in_(pending_ids),
+            Task.status == "pending",
+            Task.lease_owner.is_(None),
+        ).update({
+            Task.status: "failed",
+            Task.error_message: error_message,
+            Task.current_step: current_step,
+        }, synchronize_session=False)
+        self._record_bulk_update(pending_ids)
+        self.db.commit()
+        return count
+
+    def list_running(self) -> List[Task]:
+        """获取所有 running 状态的任务"""
+        return self.db.query(Task).filter(Task.status == "running").all()
+
+    def set_comfyui_host(self, task_id: str, host: str) -> None:
+        """记录任务执行所在的 ComfyUI 主机"""
+        self.db.query(Task).filter(Task.id == task_id).update(
+            {Task.comfyui_host: host}, synchronize_session=False
+        )
+        self.db.commit()
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import List, Optional, Any
 from datetime import datetime
 
@@ -49,6 +49,23 @@ class ChapterCreate(ChapterBase):
     pass
 
 
+class BatchChapterSplitRequest(BaseModel):
+    """小说批量拆分章节请求"""
+    start_chapter: Optional[int] = Field(None, description="起始章节号，为空表示第一章")
+    end_chapter: Optional[int] = Field(None, description="结束章节号，为空表示最后一章")
+    chapter_ids: Optional[List[str]] = Field(None, description="指定章节ID列表，优先于章节范围")
+    force: bool = Field(False, description="是否重新拆分内容未变化的章节")
+
+
+class FillAppearancesRequest(BaseModel):
+    """批量补全外貌/场景设定请求"""
+    entity_types: List[str] = Field(
+        default_factory=lambda: ["character", "scene", "prop"],
+        description="需要补全的实体类型：character / scene / prop"
+    )
+    style: str = Field("anime", description="画风风格")
+
+
 class ChapterResponse(ChapterBase):
     id: str
     novel_id: str
@@ -37,6 +37,7 @@ class ShotAudioRequest(BaseModel):
     """单分镜音频生成请求"""
 
     dialogues: List[DialogueData] = Field(..., description="台词列表")
+    force: bool = Field(False, description="跳过生成结果记忆，强制重新生成")
 
 
 class BatchShotAudioRequest(BaseModel):
@@ -52,6 +53,15 @@ class TransitionVideoRequest(BaseModel):
     to_index: int = Field(..., ge=1, description="结束分镜索引(1-based)")
     frame_count: int = Field(49, description="总帧数（8的倍数+1）")
     workflow_id: Optional[str] = Field(None, description="指定工作流ID")
+    force: bool = Field(False, description="跳过生成结果记忆，强制重新生成")
+
+
+class BatchShotImageRequest(BaseModel):
+    """章节批量生成分镜图请求"""
+
+    shot_ids: Optional[List[str]] = Field(None, description="指定分镜ID列表，为空表示整个章节")
+    regenerate: bool = Field(False, description="是否重新生成已有图片的分镜（同时跳过生成结果记忆）")
+    workflow_id: Optional[str] = Field(None, description="指定工作流ID")
 
 
 class BatchTransitionRequest(BaseModel):
@@ -157,3 +167,4 @@ class GenerateVideoRequest(BaseModel):
     use_keyframes: bool = Field(True, description="是否使用关键帧（如果存在）")
     use_reference_audio: bool = Field(True, description="是否使用参考音频（如果存在）")
     workflow_id: Optional[str] = Field(None, description="指定工作流ID")
+    force: bool = Field(False, description="跳过生成结果记忆，强制重新生成")
@@ -0,0 +1,245 @@
+"""
+批量生成角色外貌/场景设定/道具外观服务
+
+小说级任务（novel_fill_appearances）负责：
+1. 读取小说中外貌（场景为环境设定）为空的角色、场景、道具
+2. 按 APPEARANCE_BATCH_MAX_ITEMS / APPEARANCE_BATCH_MAX_CHARS 将同类实体打包，一次请求生成多个
+3. 各批次并发请求（并发上限 LLM_EXTRACTION_CONCURRENCY），每批完成即写入数据库并报告进度
+4. 响应中缺失的实体重新打包重试，最多 APPEARANCE_BATCH_MAX_RETRIES 轮，仍失败的实体汇总到任务错误信息
+"""
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.constants import (
+    APPEARANCE_BATCH_MAX_ITEMS,
+    APPEARANCE_BATCH_MAX_CHARS,
+    APPEARANCE_BATCH_MAX_RETRIES,
+)
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import async_commit, run_db
+from app.models.novel import Character, Novel, Prop, Scene
+from app.models.task import Task
+from app.services.scheduler import finish_task, load_task_status, report_progress
+
+# 实体类型 -> (模型, 描述字段, 显示名称)
+APPEARANCE_ENTITY_TYPES = {
+    "character": (Character, "appearance", "角色"),
+    "scene": (Scene, "setting", "场景"),
+    "prop": (Prop, "appearance", "道具"),
+}
+
+GenerateBatch = Callable[[List[Dict[str, str]]], Awaitable[Dict[str, str]]]
+
+
+def pack_appearance_batches(
+    entities: Sequence[Dict[str, str]],
+    max_items: int = APPEARANCE_BATCH_MAX_ITEMS,
+    max_chars: int = APPEARANCE_BATCH_MAX_CHARS,
+) -> List[List[Dict[str, str]]]:
+    """按条目数与名称+描述字符数上限打包（单个超长实体单独成批）"""
+    batches: List[List[Dict[str, str]]] = []
+    current: List[Dict[str, str]] = []
+    current_chars = 0
+    for entity in entities:
+        size = len(entity.get("name") or "") + len(entity.get("description") or "")
+        if current and (len(current) >= max_items or current_chars + size > max_chars):
+            batches.append(current)
+            current, current_chars = [], 0
+        current.append(entity)
+        current_chars += size
+    if current:
+        batches.append(current)
+    return batches
+
+
+async def generate_in_batches(
+    entities: Sequence[Dict[str, str]],
+    generate_batch: GenerateBatch,
+    on_batch: Optional[Callable[[Dict[str, str]], Awaitable[None]]] = None,
+    max_retries: int = APPEARANCE_BATCH_MAX_RETRIES,
+    semaphore: Optional[asyncio.Semaphore] = None,
+) -> Dict[str, str]:
+    """
+    分批并发生成，只对结果缺失的实体重试
+
+    Args:
+        entities: [{"id", "name", "description"}]
+        generate_batch: 生成单批的函数，返回 {实体ID: 描述}
+        on_batch: 每批完成后的回调（用于写入数据库、报告进度）
+        max_retries: 缺失实体的最大重试轮数
+        semaphore: 限制并发批次数（多种实体同时生成时共用），默认按 LLM_EXTRACTION_CONCURRENCY 新建
+
+    Returns:
+        {实体ID: 描述}（仅包含生成成功的实体）
+    """
+    semaphore = semaphore or _new_semaphore()
+    results: Dict[str, str] = {}
+
+    async def run_one(batch: List[Dict[str, str]]):
+        async with semaphore:
+            try:
+                generated = await generate_batch(batch)
+            except Exception as e:
+                print(f"[AppearanceBatch] 批次生成异常: {e}")
+                generated = {}
+        # 只接受本批次内的实体
+        generated = {k: v for k, v in generated.items() if any(e["id"] == k for e in batch)}
+        results.update(generated)
+        if on_batch and generated:
+            await on_batch(generated)
+
+    pending = list(entities)
+    for attempt in range(max_retries + 1):
+        if not pending:
+            break
+        if attempt:
+            print(f"[AppearanceBatch] 第 {attempt} 次重试 {len(pending)} 个缺失的实体")
+        await asyncio.gather(*(run_one(batch) for batch in pack_appearance_batches(pending)))
+        pending = [e for e in pending if e["id"] not in results]
+    return results
+
+
+def _new_semaphore() -> asyncio.Semaphore:
+    return asyncio.Semaphore(max(1, get_settings().LLM_EXTRACTION_CONCURRENCY))
+
+
+def collect_missing_entities(db, novel_id: str, entity_types: Sequence[str]) -> Dict[str, List[Dict[str, str]]]:
+    """获取描述字段为空的实体（{实体类型: [{"id", "name", "description"}]}）"""
+    missing = {}
+    for entity_type in entity_types:
+        model, field, _ = APPEARANCE_ENTITY_TYPES[entity_type]
+        query = db.query(model).filter(model.novel_id == novel_id)
+        if model is Character:
+            # 旁白角色不需要外貌描述
+            query = query.filter(Character.is_narrator.isnot(True))
+        rows = [r for r in query.order_by(model.created_at).all() if not (getattr(r, field) or "").strip()]
+        if rows:
+            missing[entity_type] = [
+                {"id": r.id, "name": r.name, "description": r.description or ""} for r in rows
+            ]
+    return missing
+
+
+# ==================== 后台任务 ====================
+
+
+async def fill_novel_appearances_task(
+    task_id: str,
+    novel_id: str,
+    entity_types: List[str],
+    style: str = "anime",
+):
+    """
+    后台任务：批量补全小说中缺失的角色外貌、场景设定、道具外观
+
+    Args:
+        task_id: 任务ID
+        novel_id: 小说ID
+        entity_types: 需要补全的实体类型（character / scene / prop）
+        style: 画风风格
+    """
+    from app.services.llm_service import LLMService
+
+    db = SessionLocal()
+    task = None
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return
+
+        task.status = "running"
+        task.started_at = datetime.utcnow()
+        task.current_step = "读取缺失描述的实体..."
+        await async_commit(db)
+
+        if not db.query(Novel).filter(Novel.id == novel_id).first():
+            await finish_task(db, task, "failed", "小说不存在", error_message="小说不存在")
+            return
+
+        missing = await run_db(_collect_missing, novel_id, entity_types)
+        total = sum(len(items) for items in missing.values())
+        if not total:
+            await finish_task(db, task, "completed", "没有缺失描述的实体")
+            return
+
+        llm_service = LLMService()
+        semaphore = _new_semaphore()
+        state = {"done": 0}
+        failed: List[str] = []
+        print(f"[NovelFillAppearances {task_id}] Novel: {novel_id}, entities: {total}")
+
+        async def fill_type(entity_type: str, entities: List[Dict[str, str]]):
+            model, field, label = APPEARANCE_ENTITY_TYPES[entity_type]
+
+            async def generate_batch(batch):
+                # 任务被终止后不再发起新的请求
+                if await run_db(load_task_status, task_id) != "running":
+                    return {}
+                return await llm_service.generate_appearances_batch(
+                    entity_type=entity_type, entities=batch, style=style, novel_id=novel_id
+                )
+
+            async def on_batch(generated):
+                await run_db(_save_descriptions, model, field, generated)
+                state["done"] += len(generated)
+                report_progress(
+                    task_id,
+                    current_step=f"生成描述中 {state['done']}/{total}",
+                    progress=100 * state["done"] // total,
+                )
+
+            results = await generate_in_batches(entities, generate_batch, on_batch=on_batch, semaphore=semaphore)
+            failed.extend(f"{label}: {e['name']}" for e in entities if e["id"] not in results)
+
+        # 角色、场景、道具的批次共用并发上限同时生成
+        await asyncio.gather(*(fill_type(t, entities) for t, entities in missing.items()))
+
+        if await run_db(load_task_status, task_id) != "running":
+            print(f"[NovelFillAppearances {task_id}] Task stopped after {state['done']}/{total} entities")
+            return
+
+        error_message = "\n".join(failed) if failed else None
+        if len(failed) == total:
+            await finish_task(db, task, "failed", "全部实体描述生成失败", error_message=error_message)
+        else:
+            summary = f"完成 {total - len(failed)}/{total}"
+            if failed:
+                summary += f"，失败 {len(failed)}"
+            await finish_task(db, task, "completed", summary, error_message=error_message)
+        print(f"[NovelFillAppearances {task_id}] Done: total={total}, failed={len(failed)}")
+
+    except Exception as e:
+        print(f"[NovelFillAppearances {task_id}] Error: {e}")
+        import traceback
+
+        traceback.print_exc()
+
+        try:
+            if task is not None:
+                await finish_task(db, task, "failed", "任务异常", error_message=str(e))
+        except Exception:
+            pass
+    finally:
+        db.close()
+
+
+def _collect_missing(novel_id: str, entity_types: List[str]) -> Dict[str, List[Dict[str, str]]]:
+    db = SessionLocal()
+    try:
+        return collect_missing_entities(db, novel_id, entity_types)
+    finally:
+        db.close()
+
+
+def _save_descriptions(model, field: str, generated: Dict[str, str]):
+    db = SessionLocal()
+    try:
+        for row in db.query(model).filter(model.id.in_(list(generated))).all():
+            # 生成期间用户已手动填写的描述不覆盖
+            if not (getattr(row, field) or "").strip():
+                setattr(row, field, generated[row.id])
+        db.commit()
+    finally:
+        db.close()
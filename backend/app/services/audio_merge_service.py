@@ -171,7 +171,7 @@ class AudioMergeService:
         Returns:
             本地文件路径
         """
-        import httpx
+        from app.core.http_client import http_client
 
         try:
             # 如果已经是本地文件路径
@@ -191,7 +191,7 @@ class AudioMergeService:
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
                 temp_path = temp_dir / f"{safe_name}_{timestamp}.flac"
 
-                async with httpx.AsyncClient() as client:
+                async with http_client(audio_url) as client:
                     response = await client.get(audio_url, timeout=60.0)
                     if response.status_code == 200:
                         with open(temp_path, "wb") as f:
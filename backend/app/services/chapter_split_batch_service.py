@@ -0,0 +1,189 @@
+"""
+小说批量拆分章节服务
+
+小说级任务（novel_split_chapters）负责：
+1. 一次性读取小说的角色/场景/道具名称列表，所有章节共用
+2. 跳过内容指纹与上次拆分时一致且已有分镜的章节
+3. 按 CHAPTER_SPLIT_CONCURRENCY 并发调用 NovelService.split_chapter，每个章节使用独立的数据库会话
+4. 逐章报告进度，单个章节失败不影响其他章节，失败章节汇总到任务错误信息
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, List
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import async_commit, run_db
+from app.models.novel import Chapter, Novel
+from app.models.task import Task
+from app.repositories import CharacterRepository, PropRepository, SceneRepository
+from app.repositories.shot_repository import ShotRepository
+from app.services.scheduler import finish_task, load_task_status, report_progress
+from app.utils.text_utils import content_hash
+
+
+def chapter_split_is_current(chapter: Chapter, shot_count: int) -> bool:
+    """章节内容自上次拆分后未变化且已有分镜时返回 True"""
+    if shot_count <= 0 or not chapter.parsed_data:
+        return False
+    try:
+        parsed = json.loads(chapter.parsed_data)
+    except (TypeError, ValueError):
+        return False
+    return isinstance(parsed, dict) and parsed.get("content_hash") == content_hash(chapter.content)
+
+
+def summarize_split_progress(done: int, skipped: int, failed: int, total: int) -> str:
+    step = f"章节拆分中 {done}/{total}"
+    extras = []
+    if skipped:
+        extras.append(f"跳过 {skipped}")
+    if failed:
+        extras.append(f"失败 {failed}")
+    if extras:
+        step += f"（{'，'.join(extras)}）"
+    return step
+
+
+# ==================== 后台任务 ====================
+
+
+async def split_novel_chapters_task(
+    task_id: str,
+    novel_id: str,
+    chapter_ids: List[str],
+    force: bool = False,
+):
+    """
+    后台任务：批量拆分小说章节
+
+    Args:
+        task_id: 任务ID
+        novel_id: 小说ID
+        chapter_ids: 需要拆分的章节ID列表（按章节号排序）
+        force: 为 True 时重新拆分内容未变化的章节
+    """
+    db = SessionLocal()
+    task = None
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return
+
+        task.status = "running"
+        task.started_at = datetime.utcnow()
+        task.current_step = "读取角色/场景/道具..."
+        await async_commit(db)
+
+        novel = db.query(Novel).filter(Novel.id == novel_id).first()
+        if not novel:
+            await finish_task(db, task, "failed", "小说不存在", error_message="小说不存在")
+            return
+
+        # 名称列表只读取一次，所有章节共用
+        names = {
+            "character_names": CharacterRepository(db).get_names_by_novel(novel_id),
+            "scene_names": SceneRepository(db).get_names_by_novel(novel_id),
+            "prop_names": PropRepository(db).get_names_by_novel(novel_id),
+        }
+
+        total = len(chapter_ids)
+        state = {"done": 0, "skipped": 0, "failed": []}
+        semaphore = asyncio.Semaphore(max(1, get_settings().CHAPTER_SPLIT_CONCURRENCY))
+        print(f"[NovelSplitChapters {task_id}] Novel: {novel_id}, chapters: {total}, force: {force}")
+
+        def on_chapter_done():
+            state["done"] += 1
+            report_progress(
+                task_id,
+                current_step=summarize_split_progress(
+                    state["done"], state["skipped"], len(state["failed"]), total
+                ),
+                progress=100 * state["done"] // total if total else 100,
+            )
+
+        async def split_one(chapter_id: str):
+            async with semaphore:
+                # 任务被终止后不再拆分剩余章节
+                if await run_db(load_task_status, task_id) != "running":
+                    return
+                outcome = await _split_chapter(novel_id, chapter_id, names, force)
+                if outcome == "skipped":
+                    state["skipped"] += 1
+                elif outcome != "completed":
+                    state["failed"].append(outcome)
+                on_chapter_done()
+
+        await asyncio.gather(*(split_one(chapter_id) for chapter_id in chapter_ids))
+
+        if await run_db(load_task_status, task_id) != "running":
+            print(f"[NovelSplitChapters {task_id}] Task stopped after {state['done']}/{total} chapters")
+            return
+
+        failed = state["failed"]
+        error_message = "\n".join(failed) if failed else None
+        if total and len(failed) == total:
+            await finish_task(db, task, "failed", "全部章节拆分失败", error_message=error_message)
+        else:
+            summary = f"完成 {total - len(failed)}/{total}"
+            if state["skipped"]:
+                summary += f"（内容未变化跳过 {state['skipped']}）"
+            if failed:
+                summary += f"，失败 {len(failed)}"
+            await finish_task(db, task, "completed", summary, error_message=error_message)
+        print(
+            f"[NovelSplitChapters {task_id}] Done: total={total}, "
+            f"skipped={state['skipped']}, failed={len(failed)}"
+        )
+
+    except Exception as e:
+        print(f"[NovelSplitChapters {task_id}] Error: {e}")
+        import traceback
+
+        traceback.print_exc()
+
+        try:
+            if task is not None:
+                await finish_task(db, task, "failed", "任务异常", error_message=str(e))
+        except Exception:
+            pass
+    finally:
+        db.close()
+
+
+async def _split_chapter(novel_id: str, chapter_id: str, names: Dict[str, List[str]], force: bool) -> str:
+    """
+    拆分单个章节
+
+    Returns:
+        "completed" / "skipped"，失败时返回 "章节标题: 错误信息"
+    """
+    from app.services.novel_service import NovelService
+
+    db = SessionLocal()
+    title = chapter_id
+    try:
+        chapter = db.query(Chapter).filter(Chapter.id == chapter_id, Chapter.novel_id == novel_id).first()
+        novel = db.query(Novel).filter(Novel.id == novel_id).first()
+        if not chapter or not novel:
+            return f"{chapter_id}: 章节不存在"
+        title = chapter.title
+        if not (chapter.content or "").strip():
+            return f"{title}: 章节内容为空"
+        if not force and chapter_split_is_current(chapter, ShotRepository(db).count_by_chapter(chapter_id)):
+            return "skipped"
+
+        # 强制重新拆分时不复用缓存的 LLM 响应
+        result = await NovelService(db).split_chapter(
+            novel=novel, chapter=chapter, use_cache=not force, **names
+        )
+        if result.get("success"):
+            return "completed"
+        error = result.get("message") or (result.get("data") or {}).get("error") or "拆分失败"
+        return f"{title}: {error}"
+    except Exception as e:
+        print(f"[NovelSplitChapters] Chapter {chapter_id} error: {e}")
+        return f"{title}: {e}"
+    finally:
+        db.close()
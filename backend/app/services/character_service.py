@@ -4,7 +4,6 @@
 封装角色相关的业务逻辑
 """
 import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -14,8 +13,10 @@ from app.models.novel import Character
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.repositories import TaskRepository, WorkflowRepository, CharacterRepository
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task, report_progress
 from app.services.prompt_builder import build_character_prompt, get_style
 
 
@@ -31,7 +32,8 @@ class CharacterService:
     def create_character_voice_task(
         self,
         character_id: str,
-        db: Session = None
+        db: Session = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         创建角色音色生成任务
@@ -39,6 +41,7 @@ class CharacterService:
         Args:
             character_id: 角色ID
             db: 数据库会话
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
 
         Returns:
             创建结果
@@ -87,14 +90,13 @@ class CharacterService:
 
         db.commit()
 
-        # 启动后台任务
-        asyncio.create_task(
-            self._generate_voice_task(
-                task.id,
-                character_id,
-                character.name,
-                character.voice_prompt
-            )
+        # 加入任务队列
+        enqueue_task(
+            task,
+            character_id=character_id,
+            character_name=character.name,
+            voice_prompt=character.voice_prompt,
+            use_memo=use_memo
         )
 
         return {
@@ -111,7 +113,8 @@ class CharacterService:
         task_id: str,
         character_id: str,
         character_name: str,
-        voice_prompt: str
+        voice_prompt: str,
+        use_memo: bool = True
     ):
         """
         后台任务：生成角色音色
@@ -121,6 +124,7 @@ class CharacterService:
             character_id: 角色ID
             character_name: 角色名称
             voice_prompt: 音色提示词
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
         """
         from app.core.database import SessionLocal
         db = SessionLocal()
@@ -148,7 +152,7 @@ class CharacterService:
             # 更新任务状态为运行中
             task.status = "running"
             task.started_at = datetime.utcnow()
-            db.commit()
+            await async_commit(db)
 
             # 获取工作流JSON字符串
             workflow_json_str = workflow.workflow_json if workflow else None
@@ -179,7 +183,7 @@ class CharacterService:
             # 保存构建后的完整工作流到任务
             task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
             task.prompt_text = f"音色: {voice_prompt}\n文本: {test_text}"
-            db.commit()
+            await async_commit(db)
 
             # 调用 ComfyUI 生成音频
             result = await self.comfyui_service.generate_voice(
@@ -189,7 +193,8 @@ class CharacterService:
                 novel_id=task.novel_id,
                 character_name=character_name,
                 node_mapping=node_mapping,
-                workflow=submitted_workflow
+                workflow=submitted_workflow,
+                use_memo=use_memo
             )
 
             print(f"[VoiceTask] Generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -198,8 +203,7 @@ class CharacterService:
                 audio_url = result.get("audio_url")
 
                 # 下载音频到本地存储
-                task.current_step = "下载音频到服务器..."
-                db.commit()
+                report_progress(task.id, current_step="下载音频到服务器...")
 
                 try:
                     local_path = await file_storage.download_audio(
@@ -217,11 +221,11 @@ class CharacterService:
                         task.current_step = "生成完成，音频已保存"
                     else:
                         # 下载失败，使用原始URL
-                        task.result_url = audio_url
+                        task.result_url = file_storage.fallback_url(audio_url)
                         task.current_step = "生成完成，使用远程音频"
                 except Exception as e:
                     print(f"[VoiceTask] Failed to download audio: {e}")
-                    task.result_url = audio_url
+                    task.result_url = file_storage.fallback_url(audio_url)
                     task.current_step = "生成完成，使用远程音频"
 
                 task.status = "completed"
@@ -237,20 +241,21 @@ class CharacterService:
                 task.error_message = result.get("message", "生成失败")
                 task.current_step = "生成失败"
 
-            db.commit()
+            await async_commit(db)
 
         except Exception as e:
             task.status = "failed"
             task.error_message = str(e)
             task.current_step = "任务异常"
-            db.commit()
+            await async_commit(db)
         finally:
             db.close()
     
     def create_character_portrait_task(
         self, 
         character_id: str,
-        db: Session = None
+        db: Session = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         创建角色人设图生成任务
@@ -258,6 +263,7 @@ class CharacterService:
         Args:
             character_id: 角色ID
             db: 数据库会话
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
             
         Returns:
             创建结果
@@ -313,15 +319,14 @@ class CharacterService:
         character.portrait_task_id = task.id
         db.commit()
         
-        # 启动后台任务
-        asyncio.create_task(
-            self._generate_portrait_task(
-                task.id,
-                character_id,
-                character.name,
-                character.appearance,
-                character.description
-            )
+        # 加入任务队列
+        enqueue_task(
+            task,
+            character_id=character_id,
+            name=character.name,
+            appearance=character.appearance,
+            description=character.description,
+            use_memo=use_memo
         )
         
         return {
@@ -339,7 +344,8 @@ class CharacterService:
         character_id: str,
         name: str,
         appearance: str,
-        description: str
+        description: str,
+        use_memo: bool = True
     ):
         """
         后台任务：生成角色人设图
@@ -350,6 +356,7 @@ class CharacterService:
             name: 角色名称
             appearance: 外貌描述
             description: 角色描述
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
         """
         from app.core.database import SessionLocal
         db = SessionLocal()
@@ -377,7 +384,7 @@ class CharacterService:
             # 更新任务状态为运行中
             task.status = "running"
             task.started_at = datetime.utcnow()
-            db.commit()
+            await async_commit(db)
 
             # 获取角色所属小说
             character = character_repo.get_by_id(character_id)
@@ -405,7 +412,7 @@ class CharacterService:
 
             # 保存提示词
             task.prompt_text = prompt
-            db.commit()
+            await async_commit(db)
 
             # 获取工作流JSON字符串
             workflow_json_str = workflow.workflow_json if workflow else None
@@ -432,12 +439,13 @@ class CharacterService:
                 character_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                style=style
+                style=style,
+                workflow_key=workflow_cache_key(workflow)
             )
 
             # 保存构建后的完整工作流到任务，让用户可以立即查看
             task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
-            db.commit()
+            await async_commit(db)
             print(f"[Task] Saved submitted workflow to task")
 
             # 调用 ComfyUI 生成图片（使用已构建的工作流）
@@ -448,7 +456,8 @@ class CharacterService:
                 character_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                workflow=submitted_workflow  # 传递已构建的工作流，避免重复构建
+                workflow=submitted_workflow,  # 传递已构建的工作流，避免重复构建
+                use_memo=use_memo
             )
 
             print(f"[Task] Generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -457,8 +466,7 @@ class CharacterService:
                 image_url = result.get("image_url")
 
                 # 下载图片到本地存储
-                task.current_step = "下载图片到服务器..."
-                db.commit()
+                report_progress(task.id, current_step="下载图片到服务器...")
 
                 try:
                     local_path = await file_storage.download_image(
@@ -476,11 +484,11 @@ class CharacterService:
                         task.current_step = "生成完成，图片已保存"
                     else:
                         # 下载失败，使用原始URL
-                        task.result_url = image_url
+                        task.result_url = file_storage.fallback_url(image_url)
                         task.current_step = "生成完成，使用远程图片"
                 except Exception as e:
                     print(f"[Task] Failed to download image: {e}")
-                    task.result_url = image_url
+                    task.result_url = file_storage.fallback_url(image_url)
                     task.current_step = "生成完成，使用远程图片"
 
                 task.status = "completed"
@@ -502,7 +510,7 @@ class CharacterService:
                 if character:
                     character.generating_status = "failed"
 
-            db.commit()
+            await async_commit(db)
 
         except Exception as e:
             task.status = "failed"
@@ -517,7 +525,7 @@ class CharacterService:
             except:
                 pass
 
-            db.commit()
+            await async_commit(db)
         finally:
             db.close()
     
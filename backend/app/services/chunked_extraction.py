@@ -0,0 +1,174 @@
+"""
+分块并行实体解析引擎
+
+将长篇小说按章节/段落切分为受 token 预算约束的文本块，在并发上限内并行调用 LLM
+解析每个文本块（map），再按名称去重并逐字段合并各块结果（reduce）。
+角色、道具、场景解析共用此引擎。
+"""
+import asyncio
+import re
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Sequence
+
+from app.core.config import get_settings
+from app.models.novel import Chapter
+from app.utils.text_chunker import TextChunk, chunk_chapters
+
+
+# 单个文本块的解析函数：输入文本块，返回 {"<list_key>": [...], "error": "..."(可选)}
+ChunkExtractFn = Callable[[TextChunk], Awaitable[Dict[str, Any]]]
+
+
+def normalize_entity_name(name: str) -> str:
+    """实体名称归一化，用于跨文本块去重（忽略空白与大小写）"""
+    return re.sub(r'\s+', '', name or '').casefold()
+
+
+def _merge_value(current: Any, incoming: Any) -> Any:
+    """字段级合并：字符串取信息量更大的一方，列表取并集，字典递归合并"""
+    if current in (None, "", [], {}):
+        return incoming
+    if incoming in (None, "", [], {}):
+        return current
+    if isinstance(current, str) and isinstance(incoming, str):
+        if incoming.strip() in current:
+            return current
+        if current.strip() in incoming:
+            return incoming
+        return incoming if len(incoming) > len(current) else current
+    if isinstance(current, list) and isinstance(incoming, list):
+        merged = list(current)
+        for item in incoming:
+            if item not in merged:
+                merged.append(item)
+        return merged
+    if isinstance(current, dict) and isinstance(incoming, dict):
+        merged = dict(current)
+        for key, value in incoming.items():
+            merged[key] = _merge_value(merged.get(key), value)
+        return merged
+    return current
+
+
+def merge_entities(chunk_entities: Sequence[List[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """
+    合并多个文本块解析出的实体列表
+
+    按归一化名称去重，保留首次出现的名称写法和顺序，其余字段逐字段合并。
+
+    Args:
+        chunk_entities: 按文本块顺序排列的实体列表
+
+    Returns:
+        去重合并后的实体列表
+    """
+    merged: Dict[str, Dict[str, Any]] = {}
+    for entities in chunk_entities:
+        for entity in entities or []:
+            if not isinstance(entity, dict):
+                continue
+            name = str(entity.get("name") or "").strip()
+            key = normalize_entity_name(name)
+            if not key:
+                continue
+            if key not in merged:
+                merged[key] = {**entity, "name": name}
+                continue
+            target = merged[key]
+            for field, value in entity.items():
+                if field == "name":
+                    continue
+                target[field] = _merge_value(target.get(field), value)
+    return list(merged.values())
+
+
+class ChunkedExtractor:
+    """分块并行实体解析器"""
+
+    def __init__(self, max_tokens: int = None, concurrency: int = None):
+        settings = get_settings()
+        self.max_tokens = max_tokens or settings.LLM_EXTRACTION_CHUNK_TOKENS
+        self.concurrency = max(1, concurrency or settings.LLM_EXTRACTION_CONCURRENCY)
+
+    def build_chunks(
+        self,
+        chapters: Sequence[Chapter],
+        max_chars: Optional[int] = None,
+    ) -> List[TextChunk]:
+        """按章节边界构建文本块"""
+        ordered = sorted(chapters, key=lambda c: c.number)
+        return chunk_chapters(
+            [(c.number, c.title or "", c.content or "") for c in ordered],
+            max_tokens=self.max_tokens,
+            max_chars=max_chars,
+        )
+
+    async def extract(
+        self,
+        chunks: Sequence[TextChunk],
+        extract_fn: ChunkExtractFn,
+        list_key: str,
+    ) -> Dict[str, Any]:
+        """
+        并发解析所有文本块并合并结果
+
+        Args:
+            chunks: 文本块列表
+            extract_fn: 单块解析函数
+            list_key: 结果中实体列表的键名（characters / scenes / props）
+
+        Returns:
+            {
+                list_key: 合并后的实体列表,
+                "chunk_count": 文本块数,
+                "failed_chunks": [{"index": int, "sourceRange": str, "error": str}],
+                "chapter_entities": {章节号: [实体名称]}（仅包含所在文本块全部解析成功的章节）,
+                "error": str (仅当全部文本块失败时)
+            }
+        """
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run_one(chunk: TextChunk) -> Dict[str, Any]:
+            async with semaphore:
+                try:
+                    return await extract_fn(chunk)
+                except Exception as e:
+                    return {"error": f"{type(e).__name__}: {e}"}
+
+        print(f"[ChunkedExtractor] {list_key}: {len(chunks)} 个文本块, 并发 {self.concurrency}")
+        results = await asyncio.gather(*(run_one(chunk) for chunk in chunks))
+
+        failed_chunks = []
+        succeeded = []
+        failed_numbers = set()
+        chapter_entities: Dict[int, List[str]] = {}
+        for chunk, result in zip(chunks, results):
+            if result.get("error"):
+                failed_chunks.append({
+                    "index": chunk.index,
+                    "sourceRange": chunk.source_range,
+                    "error": result["error"],
+                })
+                failed_numbers.update(chunk.chapter_numbers)
+                print(f"[ChunkedExtractor] 文本块 {chunk.index} ({chunk.source_range}) 解析失败: {result['error']}")
+            else:
+                entities = result.get(list_key, [])
+                succeeded.append(entities)
+                names = [
+                    str(e.get("name") or "").strip()
+                    for e in entities or [] if isinstance(e, dict) and e.get("name")
+                ]
+                for number in chunk.chapter_numbers:
+                    chapter_names = chapter_entities.setdefault(number, [])
+                    chapter_names.extend(n for n in names if n not in chapter_names)
+
+        merged = {
+            list_key: merge_entities(succeeded),
+            "chunk_count": len(chunks),
+            "failed_chunks": failed_chunks,
+            "chapter_entities": {
+                number: names for number, names in chapter_entities.items() if number not in failed_numbers
+            },
+        }
+        if chunks and not succeeded:
+            merged["error"] = failed_chunks[0]["error"]
+        return merged
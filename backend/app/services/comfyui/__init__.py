@@ -3,16 +3,37 @@ ComfyUI 服务模块
 
 提供与 ComfyUI 的交互能力，包括：
 - HTTP 客户端通信
-- 工作流构建和修改
+- 多主机负载均衡与故障切换
+- WebSocket 任务事件监听
+- 输入文件上传缓存
+- 生成结果记忆
+- 工作流构建和修改（模板编译缓存）
 - 高级业务方法
 """
 
 from .service import ComfyUIService
 from .client import ComfyUIClient
 from .workflows import WorkflowBuilder
+from .compiled import CompiledWorkflow, get_compiled_workflow, workflow_cache_key
+from .backends import ComfyUIBackendPool, get_backend_pool
+from .events import ComfyUIEventHub, get_event_hub
+from .upload_cache import ComfyUIUploadCache, get_upload_cache
+from .memo import ComfyUIGenerationMemo, get_generation_memo, upload_digests
 
 __all__ = [
     "ComfyUIService",
     "ComfyUIClient", 
     "WorkflowBuilder",
+    "CompiledWorkflow",
+    "get_compiled_workflow",
+    "workflow_cache_key",
+    "ComfyUIBackendPool",
+    "get_backend_pool",
+    "ComfyUIEventHub",
+    "get_event_hub",
+    "ComfyUIUploadCache",
+    "get_upload_cache",
+    "ComfyUIGenerationMemo",
+    "get_generation_memo",
+    "upload_digests",
 ]
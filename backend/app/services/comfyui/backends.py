@@ -0,0 +1,204 @@
+"""
+ComfyUI 主机池
+
+COMFYUI_HOST 与 COMFYUI_HOSTS 组成主机池（每台主机一块 GPU）：
+- 定期请求各主机 /queue，记录健康状态与队列深度
+- 选择负载最低的健康主机；已持有任务参考图（上传缓存命中）的主机负载相差不大时优先，
+  相同参考图的分镜集中到同一主机，避免重复上传
+- 提交失败的主机标记为不可用，任务切换到其他主机
+
+只配置一台主机时不做选择，行为与单主机一致。
+"""
+import asyncio
+import time
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional
+
+from app.core.config import get_settings
+from app.core.http_client import http_client
+
+
+@dataclass
+class ComfyUIBackend:
+    """单台 ComfyUI 主机状态"""
+    url: str
+    healthy: bool = True
+    queue_running: int = 0
+    queue_pending: int = 0
+    # 上次刷新队列深度后本进程分配到该主机的任务数
+    assigned: int = 0
+    failures: int = 0
+    last_checked: float = 0.0
+
+    @property
+    def load(self) -> int:
+        return self.queue_running + self.queue_pending + self.assigned
+
+    def to_dict(self) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "queue_running": self.queue_running,
+            "queue_pending": self.queue_pending,
+            "assigned": self.assigned,
+            "load": self.load,
+            "failures": self.failures,
+        }
+
+
+def _normalize(url: str) -> str:
+    return url.rstrip("/")
+
+
+class ComfyUIBackendPool:
+    """ComfyUI 主机池"""
+
+    def __init__(self, hosts: List[str] = None):
+        # 未指定时从配置读取（主机配置可在运行中修改）
+        self._fixed_hosts = [_normalize(h) for h in hosts] if hosts else None
+        self._backends: Dict[str, ComfyUIBackend] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    # ==================== 主机列表 ====================
+
+    @property
+    def hosts(self) -> List[str]:
+        if self._fixed_hosts is not None:
+            return list(self._fixed_hosts)
+        settings = get_settings()
+        hosts = []
+        for url in [settings.COMFYUI_HOST, *settings.COMFYUI_HOSTS]:
+            url = _normalize(url or "")
+            if url and url not in hosts:
+                hosts.append(url)
+        return hosts
+
+    @property
+    def is_multi(self) -> bool:
+        return len(self.hosts) > 1
+
+    def backends(self) -> List[ComfyUIBackend]:
+        """按配置顺序返回主机状态（同步配置变更）"""
+        hosts = self.hosts
+        for url in hosts:
+            if url not in self._backends:
+                self._backends[url] = ComfyUIBackend(url=url)
+        for url in list(self._backends):
+            if url not in hosts:
+                del self._backends[url]
+        return [self._backends[url] for url in hosts]
+
+    def get(self, url: str) -> Optional[ComfyUIBackend]:
+        return self._backends.get(_normalize(url))
+
+    # ==================== 健康检查 ====================
+
+    async def check(self, backend: ComfyUIBackend) -> bool:
+        """请求 /queue 刷新队列深度，失败则标记不可用"""
+        try:
+            async with http_client(backend.url) as client:
+                response = await client.get(f"{backend.url}/queue", timeout=5.0)
+            if response.status_code != 200:
+                raise RuntimeError(f"HTTP {response.status_code}")
+            data = response.json()
+            backend.queue_running = len(data.get("queue_running", []))
+            backend.queue_pending = len(data.get("queue_pending", []))
+            backend.assigned = 0
+            if not backend.healthy:
+                print(f"[ComfyUIPool] 主机恢复可用: {backend.url}")
+            backend.healthy = True
+            backend.failures = 0
+        except Exception as e:
+            backend.failures += 1
+            if backend.healthy:
+                print(f"[ComfyUIPool] 主机不可用: {backend.url}: {e}")
+            backend.healthy = False
+        backend.last_checked = time.monotonic()
+        return backend.healthy
+
+    async def refresh(self):
+        """刷新所有主机状态"""
+        backends = self.backends()
+        if backends:
+            await asyncio.gather(*(self.check(b) for b in backends))
+
+    async def start(self):
+        """启动定期健康检查（单主机时不启动）"""
+        if self._task is not None and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run_loop(self):
+        while True:
+            if self.is_multi:
+                try:
+                    await self.refresh()
+                except Exception as e:
+                    print(f"[ComfyUIPool] 健康检查失败: {e}")
+            await asyncio.sleep(get_settings().COMFYUI_HEALTH_CHECK_INTERVAL)
+
+    # ==================== 选择主机 ====================
+
+    def select(self, preferred: Iterable[str] = (), exclude: Iterable[str] = ()) -> Optional[str]:
+        """
+        选择执行任务的主机
+
+        Args:
+            preferred: 优先的主机（已持有参考图），负载不超过最低负载 + COMFYUI_AFFINITY_SLACK 时选用
+            exclude: 排除的主机（如刚提交失败的主机）
+
+        Returns:
+            主机地址；没有可用主机时返回 None
+        """
+        excluded = {_normalize(url) for url in exclude}
+        candidates = [b for b in self.backends() if b.url not in excluded]
+        healthy = [b for b in candidates if b.healthy]
+        # 全部不可用时仍尝试（可能已恢复，提交失败会再次切换）
+        candidates = healthy or candidates
+        if not candidates:
+            return None
+
+        least = min(candidates, key=lambda b: b.load)
+        chosen = least
+        slack = get_settings().COMFYUI_AFFINITY_SLACK
+        by_url = {b.url: b for b in candidates}
+        for url in preferred:
+            backend = by_url.get(_normalize(url))
+            if backend is not None and backend.load <= least.load + slack:
+                chosen = backend
+                break
+
+        chosen.assigned += 1
+        return chosen.url
+
+    def mark_unhealthy(self, url: str):
+        """提交失败时标记主机不可用，等待下次健康检查恢复"""
+        backend = self.get(url)
+        if backend is not None and backend.healthy:
+            backend.healthy = False
+            backend.failures += 1
+            print(f"[ComfyUIPool] 主机标记为不可用: {backend.url}")
+
+    def stats(self) -> List[Dict]:
+        return [b.to_dict() for b in self.backends()]
+
+
+# 全局主机池实例
+_backend_pool: Optional[ComfyUIBackendPool] = None
+
+
+def get_backend_pool() -> ComfyUIBackendPool:
+    """获取主机池实例"""
+    global _backend_pool
+    if _backend_pool is None:
+        _backend_pool = ComfyUIBackendPool()
+    return _backend_pool
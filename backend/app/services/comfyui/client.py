@@ -4,31 +4,98 @@ ComfyUI HTTP 客户端
 负责与 ComfyUI 服务的所有 HTTP 通信
 """
 import json
+import os
 
-import httpx
-import uuid
 import asyncio
-from typing import Dict, Any, Optional, List
+from contextvars import ContextVar
+from typing import Dict, Any, Optional, List, Callable
+
+import httpx
+
+from app.core.http_client import http_client
+from .backends import get_backend_pool
+from .events import get_event_hub
+from .upload_cache import content_filename, get_upload_cache
+
+
+# 当前任务选定的 ComfyUI 主机（每个任务协程独立，同一任务的上传与提交使用同一主机）
+_task_host: ContextVar[Optional[str]] = ContextVar("comfyui_task_host", default=None)
 
 
 class ComfyUIClient:
     """ComfyUI HTTP 客户端"""
     
-    def __init__(self):
-        self.client_id = str(uuid.uuid4())
+    def __init__(self, host: str = None):
+        # 指定主机（如取消任务时访问任务所在主机）；为空时使用当前任务选定的主机或 COMFYUI_HOST
+        self._host = host.rstrip("/") if host else None
     
     @property
     def base_url(self) -> str:
         """动态获取当前的 ComfyUI 主机地址"""
+        host = self._host or _task_host.get()
+        if host:
+            return host
         from app.core.config import get_settings
         return get_settings().COMFYUI_HOST
+
+    @property
+    def client_id(self) -> str:
+        # 与事件中心共享 client_id，ComfyUI 据此将执行事件推送到同一条 WebSocket
+        return self._event_hub().client_id
+
+    def _event_hub(self):
+        host = self._host or _task_host.get()
+        return get_event_hub(host) if host else get_event_hub()
+
+    # ==================== 主机选择 ====================
+
+    def _choose_backend(self, preferred: List[str] = (), exclude: List[str] = ()) -> None:
+        """配置了主机池且当前任务尚未选定主机时，选择负载最低（或已持有参考图）的主机"""
+        if self._host or (_task_host.get() and not exclude):
+            return
+        pool = get_backend_pool()
+        if not pool.is_multi:
+            return
+        url = pool.select(preferred=preferred, exclude=exclude)
+        if url:
+            _task_host.set(url)
+            print(f"[ComfyUIPool] 任务分配到主机: {url}")
+
+    async def _failover(self, workflow: Dict[str, Any] = None) -> bool:
+        """
+        当前主机不可用时切换到其他主机，并将工作流引用的已上传文件上传到新主机
+
+        Returns:
+            是否已切换
+        """
+        pool = get_backend_pool()
+        if self._host or not pool.is_multi:
+            return False
+        old_host = self.base_url
+        pool.mark_unhealthy(old_host)
+        self._choose_backend(exclude=[old_host])
+        if self.base_url == old_host:
+            return False
+
+        # 内容寻址文件名与主机无关，新主机上传后工作流无需修改
+        if workflow is not None:
+            text = json.dumps(workflow, ensure_ascii=False)
+            for entry in get_upload_cache().find_referenced(old_host, text):
+                result = await self._upload_file(
+                    entry.source_path, entry.kind, entry.mime_type, timeout=60.0, _allow_failover=False
+                )
+                if not result.get("success"):
+                    print(f"[ComfyUIPool] 迁移输入文件失败: {entry.source_path}: {result.get('message')}")
+                    return False
+        print(f"[ComfyUIPool] 主机 {old_host} 不可用，任务切换到 {self.base_url}")
+        return True
     
     # ==================== 健康检查 ====================
     
     async def check_health(self) -> bool:
         """检查 ComfyUI 服务状态"""
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client(self.base_url) as client:
                 response = await client.get(
                     f"{self.base_url}/system_stats",
                     timeout=5.0
@@ -50,51 +117,11 @@ class ComfyUIClient:
             {
                 "success": bool,
                 "filename": str,  # ComfyUI 中的文件名
+                "digest": str,  # 文件内容摘要（启用上传缓存或生成结果记忆时）
                 "message": str
             }
         """
-        try:
-            import os
-            from pathlib import Path
-
-            if not os.path.exists(image_path):
-                return {
-                    "success": False,
-                    "message": f"图片文件不存在: {image_path}"
-                }
-
-            filename = os.path.basename(image_path)
-
-            async with httpx.AsyncClient() as client:
-                with open(image_path, 'rb') as f:
-                    files = {'image': (filename, f, 'image/png')}
-                    data = {'type': 'input', 'overwrite': 'true'}
-
-                    response = await client.post(
-                        f"{self.base_url}/upload/image",
-                        files=files,
-                        data=data,
-                        timeout=30.0
-                    )
-
-                if response.status_code == 200:
-                    result = response.json()
-                    return {
-                        "success": True,
-                        "filename": result.get('name', filename),
-                        "message": "上传成功"
-                    }
-                else:
-                    return {
-                        "success": False,
-                        "message": f"上传失败: {response.text}"
-                    }
-
-        except Exception as e:
-            return {
-                "success": False,
-                "message": f"上传图片失败: {str(e)}"
-            }
+        return await self._upload_file(image_path, "image", "image/png", timeout=30.0)
 
     async def upload_audio(self, audio_path: str) -> Dict[str, Any]:
         """
@@ -110,33 +137,116 @@ class ComfyUIClient:
                 "message": str
             }
         """
+        # 根据文件扩展名确定 MIME 类型
+        ext = os.path.splitext(audio_path)[1].lower()
+        mime_types = {
+            '.flac': 'audio/flac',
+            '.wav': 'audio/wav',
+            '.mp3': 'audio/mpeg',
+            '.ogg': 'audio/ogg',
+            '.m4a': 'audio/mp4',
+            '.aac': 'audio/aac'
+        }
+        return await self._upload_file(
+            audio_path, "audio", mime_types.get(ext, 'audio/flac'), timeout=60.0
+        )
+
+    async def _upload_file(
+        self,
+        path: str,
+        kind: str,
+        mime_type: str,
+        timeout: float,
+        force: bool = False,
+        _allow_failover: bool = True
+    ) -> Dict[str, Any]:
+        """
+        上传输入文件，ComfyUI 已持有相同内容时跳过上传
+
+        Args:
+            path: 本地文件路径
+            kind: 文件类型（image / audio），用于提示信息
+            mime_type: MIME 类型
+            timeout: 上传超时（秒）
+            force: 忽略缓存强制上传
+        """
+        result = await self._upload_to_backend(path, kind, mime_type, timeout, force)
+        # 主机无法连接时切换主机重新上传（之前上传的文件在提交时迁移）
+        if result.get("connection_error") and _allow_failover and await self._failover():
+            result = await self._upload_to_backend(path, kind, mime_type, timeout, force)
+        return result
+
+    async def _upload_to_backend(
+        self,
+        path: str,
+        kind: str,
+        mime_type: str,
+        timeout: float,
+        force: bool
+    ) -> Dict[str, Any]:
+        label = "图片" if kind == "image" else "音频"
+        if not os.path.exists(path):
+            return {
+                "success": False,
+                "message": f"{label}文件不存在: {path}"
+            }
+
+        from app.core.config import get_settings
+        settings = get_settings()
+        if not settings.COMFYUI_UPLOAD_CACHE_ENABLED:
+            self._choose_backend()
+            result = await self._post_upload(path, os.path.basename(path), kind, mime_type, timeout)
+            # 内容摘要供生成结果记忆识别输入内容
+            if result.get("success") and settings.COMFYUI_MEMO_ENABLED:
+                try:
+                    result["digest"] = await get_upload_cache().file_digest(path)
+                except OSError:
+                    pass
+            return result
+
+        cache = get_upload_cache()
         try:
-            import os
-            from pathlib import Path
+            digest = await cache.file_digest(path)
+        except OSError as e:
+            return {
+                "success": False,
+                "message": f"读取{label}文件失败: {str(e)}"
+            }
+
+        # 优先选择已持有该文件的主机
+        self._choose_backend(preferred=cache.hosts_with(digest))
+        base_url = self.base_url
 
-            if not os.path.exists(audio_path):
+        async with cache.lock(base_url, digest):
+            entry = None if force else cache.get(base_url, digest)
+            if entry is not None:
                 return {
-                    "success": False,
-                    "message": f"音频文件不存在: {audio_path}"
+                    "success": True,
+                    "filename": entry.filename,
+                    "digest": digest,
+                    "message": "文件已存在，跳过上传",
+                    "cached": True
                 }
+            result = await self._post_upload(
+                path, content_filename(path, digest), kind, mime_type, timeout
+            )
+            if result.get("success"):
+                cache.put(base_url, digest, result["filename"], path, kind, mime_type)
+                result["digest"] = digest
+        return result
 
-            filename = os.path.basename(audio_path)
-
-            # 根据文件扩展名确定 MIME 类型
-            ext = os.path.splitext(filename)[1].lower()
-            mime_types = {
-                '.flac': 'audio/flac',
-                '.wav': 'audio/wav',
-                '.mp3': 'audio/mpeg',
-                '.ogg': 'audio/ogg',
-                '.m4a': 'audio/mp4',
-                '.aac': 'audio/aac'
-            }
-            mime_type = mime_types.get(ext, 'audio/flac')
-
-            async with httpx.AsyncClient() as client:
-                with open(audio_path, 'rb') as f:
-                    # ComfyUI 使用 /upload/image 端点上传所有文件类型
+    async def _post_upload(
+        self,
+        path: str,
+        filename: str,
+        kind: str,
+        mime_type: str,
+        timeout: float
+    ) -> Dict[str, Any]:
+        """调用 /upload/image 上传文件（ComfyUI 使用该端点上传所有文件类型）"""
+        try:
+            async with http_client(self.base_url) as client:
+                with open(path, 'rb') as f:
                     files = {'image': (filename, f, mime_type)}
                     data = {'type': 'input', 'overwrite': 'true'}
 
@@ -144,7 +254,7 @@ class ComfyUIClient:
                         f"{self.base_url}/upload/image",
                         files=files,
                         data=data,
-                        timeout=60.0
+                        timeout=timeout
                     )
 
                 if response.status_code == 200:
@@ -160,29 +270,64 @@ class ComfyUIClient:
                         "message": f"上传失败: {response.status_code}: {response.text}"
                     }
 
+        except httpx.TransportError as e:
+            label = "图片" if kind == "image" else "音频"
+            return {
+                "success": False,
+                "message": f"上传{label}失败: {str(e)}",
+                "connection_error": True
+            }
         except Exception as e:
+            label = "图片" if kind == "image" else "音频"
             return {
                 "success": False,
-                "message": f"上传音频失败: {str(e)}"
+                "message": f"上传{label}失败: {str(e)}"
             }
+
+    async def _reupload_stale_inputs(self, error_text: str) -> bool:
+        """ComfyUI 报告缓存的输入文件缺失时重新上传，返回是否有文件被重新上传"""
+        stale = get_upload_cache().invalidate_referenced(self.base_url, error_text)
+        reuploaded = False
+        for entry in stale:
+            result = await self._upload_file(
+                entry.source_path, entry.kind, entry.mime_type, timeout=60.0, force=True
+            )
+            if result.get("success"):
+                reuploaded = True
+            else:
+                print(f"[UploadCache] 重新上传失败: {entry.source_path}: {result.get('message')}")
+        return reuploaded
     
     # ==================== 任务提交 ====================
     
-    async def queue_prompt(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
-        """提交任务到 ComfyUI"""
+    async def queue_prompt(
+        self,
+        workflow: Dict[str, Any],
+        _retry_stale: bool = True,
+        _allow_failover: bool = True
+    ) -> Dict[str, Any]:
+        """提交任务到 ComfyUI（交互通道的任务插到队列最前）"""
+        self._choose_backend()
+        body = {
+            "prompt": workflow,
+            "client_id": self.client_id
+        }
+        if self._submit_front():
+            body["front"] = True
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client(self.base_url) as client:
                 response = await client.post(
                     f"{self.base_url}/prompt",
-                    json={
-                        "prompt": workflow,
-                        "client_id": self.client_id
-                    },
+                    json=body,
                     timeout=30.0
                 )
                 
                 if response.status_code == 200:
                     data = response.json()
+                    # 执行进度事件按 prompt_id 推送给当前任务的订阅者
+                    from app.services.scheduler.events import get_task_event_bus
+                    get_task_event_bus().bind_prompt(data.get("prompt_id"))
+                    await self._record_task_host()
                     return {
                         "success": True,
                         "prompt_id": data.get("prompt_id")
@@ -198,6 +343,13 @@ class ComfyUIClient:
                     except:
                         pass
                     
+                    # 引用的已缓存输入文件在 ComfyUI 中缺失时，重新上传后重试一次
+                    if _retry_stale and response.status_code == 400:
+                        if await self._reupload_stale_inputs(response.text):
+                            return await self.queue_prompt(
+                                workflow, _retry_stale=False, _allow_failover=_allow_failover
+                            )
+
                     print(f"Queue prompt failed: {response.status_code} - {error_text}")
                     return {
                         "success": False,
@@ -206,13 +358,208 @@ class ComfyUIClient:
                     
         except Exception as e:
             print(f"Queue prompt error: {e}")
+            # 主机无法连接时切换到其他主机重试一次
+            if (
+                _allow_failover
+                and isinstance(e, httpx.TransportError)
+                and await self._failover(workflow)
+            ):
+                return await self.queue_prompt(workflow, _retry_stale=_retry_stale, _allow_failover=False)
             return {
                 "success": False,
                 "error": f"连接 ComfyUI 失败: {str(e)}"
             }
+
+    @staticmethod
+    def _submit_front() -> bool:
+        """当前执行的任务属于交互通道时，插到 ComfyUI 队列中已提交的批量 prompt 之前"""
+        from app.core.config import get_settings
+        from app.constants import TASK_LANE_INTERACTIVE
+        from app.services.scheduler.events import get_current_lane
+        return get_current_lane() == TASK_LANE_INTERACTIVE and get_settings().COMFYUI_INTERACTIVE_FRONT
+
+    async def _record_task_host(self):
+        """记录当前任务执行所在的 ComfyUI 主机"""
+        from app.services.scheduler.events import get_current_task
+        current = get_current_task()
+        if not current:
+            return
+        from app.core.db_executor import run_db
+        try:
+            await run_db(_set_task_host, current["id"], self.base_url)
+        except Exception as e:
+            print(f"[ComfyUIPool] 记录任务主机失败: {e}")
     
     # ==================== 结果等待 ====================
     
+    async def _fetch_history(self, prompt_id: str) -> Optional[Dict[str, Any]]:
+        """获取单个任务的 /history 记录，未完成时返回 None"""
+        async with http_client(self.base_url) as client:
+            response = await client.get(
+                f"{self.base_url}/history/{prompt_id}",
+                timeout=10.0
+            )
+            if response.status_code == 200:
+                return response.json().get(prompt_id)
+        return None
+
+    @staticmethod
+    def _history_error(prompt_history: Dict[str, Any]) -> Optional[str]:
+        """从 /history 记录中提取错误信息，无错误返回 None"""
+        status = prompt_history.get("status", {})
+        if status.get("status_str") != "error":
+            return None
+        error_msg = "未知错误"
+        messages = status.get("messages")
+        if messages and len(messages) > 0:
+            msg_item = messages[0]
+            if isinstance(msg_item, (list, tuple)) and len(msg_item) > 1:
+                error_msg = str(msg_item[1])
+            else:
+                error_msg = str(msg_item)
+        return error_msg
+
+    async def _wait_for_completion(
+        self,
+        prompt_id: str,
+        parse_outputs: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        timeout: int,
+        poll_interval: float,
+        max_poll_interval: float = 10.0
+    ) -> Dict[str, Any]:
+        """
+        等待任务完成并解析输出
+
+        WebSocket 已连接时等待事件中心推送完成事件，完成后只获取一次 /history；
+        连接断开时退回 /history 轮询，轮询间隔按 1.5 倍退避至 max_poll_interval。
+        /history 连续请求失败 COMFYUI_HISTORY_MAX_FAILURES 次时标记主机不可用并立即返回失败。
+        """
+        from app.core.config import get_settings
+        max_failures = get_settings().COMFYUI_HISTORY_MAX_FAILURES
+        hub = self._event_hub()
+        hub.ensure_started()
+        waiter = hub.register(prompt_id)
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + timeout
+        # None 表示需要立即核对一次 /history（首次等待、或断线重连后可能漏掉事件）
+        checked_epoch = None
+        interval = poll_interval
+        failures = 0
+
+        try:
+            while True:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return {
+                        "success": False,
+                        "message": f"任务超时 ({timeout}s)"
+                    }
+
+                if waiter.future.done():
+                    outcome = waiter.future.result()
+                    if outcome.get("status") == "error":
+                        return {
+                            "success": False,
+                            "message": outcome.get("message", "未知错误")
+                        }
+                    return await self._collect_result(prompt_id, waiter.outputs, parse_outputs)
+
+                if hub.connected and checked_epoch == hub.connection_epoch:
+                    # 等待完成事件，定期醒来检查超时与连接状态
+                    try:
+                        await asyncio.wait_for(asyncio.shield(waiter.future), timeout=min(remaining, 30.0))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                # 首次注册 / 断线重连后核对一次，或断线期间退避轮询
+                epoch = hub.connection_epoch if hub.connected else None
+                try:
+                    prompt_history = await self._fetch_history(prompt_id)
+                    failures = 0
+                except Exception as e:
+                    failures += 1
+                    print(f"Wait for result error ({failures}/{max_failures}): {e}")
+                    if failures >= max_failures:
+                        get_backend_pool().mark_unhealthy(self.base_url)
+                        return {
+                            "success": False,
+                            "message": f"ComfyUI 主机连续 {failures} 次无法访问: {e}"
+                        }
+                    prompt_history = None
+
+                if prompt_history is not None:
+                    result = self._result_from_history(prompt_history, parse_outputs)
+                    if result:
+                        return result
+
+                if epoch is not None:
+                    checked_epoch = epoch
+                    interval = poll_interval
+                    continue
+
+                try:
+                    await asyncio.wait_for(asyncio.shield(waiter.future), timeout=min(interval, remaining))
+                except asyncio.TimeoutError:
+                    pass
+                interval = min(interval * 1.5, max_poll_interval)
+        finally:
+            hub.unregister(prompt_id)
+
+    def _result_from_history(
+        self,
+        prompt_history: Dict[str, Any],
+        parse_outputs: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]]
+    ) -> Optional[Dict[str, Any]]:
+        """由 /history 记录构造结果，任务未结束时返回 None"""
+        outputs = prompt_history.get("outputs", {})
+        if outputs:
+            result = parse_outputs(outputs)
+            if result:
+                return result
+
+        error_msg = self._history_error(prompt_history)
+        if error_msg:
+            return {
+                "success": False,
+                "message": error_msg
+            }
+
+        if prompt_history.get("status", {}).get("completed"):
+            return {
+                "success": False,
+                "message": "任务已完成但未找到输出结果"
+            }
+        return None
+
+    async def _collect_result(
+        self,
+        prompt_id: str,
+        ws_outputs: Dict[str, Any],
+        parse_outputs: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+        retries: int = 3
+    ) -> Dict[str, Any]:
+        """收到完成事件后获取一次 /history 并解析，失败时使用 executed 事件中的输出"""
+        for attempt in range(retries):
+            try:
+                prompt_history = await self._fetch_history(prompt_id)
+                if prompt_history is not None:
+                    result = self._result_from_history(prompt_history, parse_outputs)
+                    if result:
+                        return result
+            except Exception as e:
+                print(f"Fetch history error: {e}")
+            await asyncio.sleep(0.5 * (attempt + 1))
+
+        if ws_outputs:
+            result = parse_outputs(ws_outputs)
+            if result:
+                return result
+        return {
+            "success": False,
+            "message": "任务已完成但未找到输出结果"
+        }
+
     async def wait_for_result(
         self,
         prompt_id: str,
@@ -227,60 +574,16 @@ class ComfyUIClient:
             prompt_id: ComfyUI 任务 ID
             workflow: 提交的工作流，用于识别正确的 SaveImage 节点
             save_image_node_id: 配置的 SaveImage 节点 ID，优先使用
+            timeout: 超时时间（秒）
+            poll_interval: WebSocket 断开时的初始轮询间隔（秒）
         """
         print(f"ComfyUI Waiting for result: prompt_id={prompt_id}, workflow_json:\n{json.dumps(workflow, indent=2, ensure_ascii=True)}")
-        start_time = asyncio.get_event_loop().time()
-
-        while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed > timeout:
-                return {
-                    "success": False,
-                    "message": f"任务超时 ({timeout}s)"
-                }
-
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        f"{self.base_url}/history/{prompt_id}",
-                        timeout=10.0
-                    )
-
-                    if response.status_code == 200:
-                        history = response.json()
-
-                        if prompt_id in history:
-                            prompt_history = history[prompt_id]
-                            outputs = prompt_history.get("outputs", {})
-
-                            if outputs:
-                                result = self._parse_outputs(
-                                    outputs, workflow, save_image_node_id
-                                )
-                                if result:
-                                    return result
-
-                            # 检查是否有错误
-                            status = prompt_history.get("status", {})
-                            if status.get("status_str") == "error":
-                                error_msg = "未知错误"
-                                messages = status.get("messages")
-                                if messages and len(messages) > 0:
-                                    msg_item = messages[0]
-                                    if isinstance(msg_item, (list, tuple)) and len(msg_item) > 1:
-                                        error_msg = str(msg_item[1])
-                                    else:
-                                        error_msg = str(msg_item)
-                                return {
-                                    "success": False,
-                                    "message": error_msg
-                                }
-
-                    await asyncio.sleep(poll_interval)
-
-            except Exception as e:
-                print(f"Wait for result error: {e}")
-                await asyncio.sleep(poll_interval)
+        return await self._wait_for_completion(
+            prompt_id,
+            lambda outputs: self._parse_outputs(outputs, workflow, save_image_node_id),
+            timeout=timeout,
+            poll_interval=poll_interval
+        )
 
     async def wait_for_audio_result(
         self,
@@ -297,60 +600,14 @@ class ComfyUIClient:
             workflow: 提交的工作流
             save_audio_node_id: 配置的 SaveAudio 节点 ID
             timeout: 超时时间（秒）
-            poll_interval: 轮询间隔（秒）
+            poll_interval: WebSocket 断开时的初始轮询间隔（秒）
         """
-        start_time = asyncio.get_event_loop().time()
-
-        while True:
-            elapsed = asyncio.get_event_loop().time() - start_time
-            if elapsed > timeout:
-                return {
-                    "success": False,
-                    "message": f"任务超时 ({timeout}s)"
-                }
-
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        f"{self.base_url}/history/{prompt_id}",
-                        timeout=10.0
-                    )
-
-                    if response.status_code == 200:
-                        history = response.json()
-
-                        if prompt_id in history:
-                            prompt_history = history[prompt_id]
-                            outputs = prompt_history.get("outputs", {})
-
-                            if outputs:
-                                result = self._parse_audio_outputs(
-                                    outputs, workflow, save_audio_node_id
-                                )
-                                if result:
-                                    return result
-
-                            # 检查是否有错误
-                            status = prompt_history.get("status", {})
-                            if status.get("status_str") == "error":
-                                error_msg = "未知错误"
-                                messages = status.get("messages")
-                                if messages and len(messages) > 0:
-                                    msg_item = messages[0]
-                                    if isinstance(msg_item, (list, tuple)) and len(msg_item) > 1:
-                                        error_msg = str(msg_item[1])
-                                    else:
-                                        error_msg = str(msg_item)
-                                return {
-                                    "success": False,
-                                    "message": error_msg
-                                }
-
-                    await asyncio.sleep(poll_interval)
-
-            except Exception as e:
-                print(f"Wait for audio result error: {e}")
-                await asyncio.sleep(poll_interval)
+        return await self._wait_for_completion(
+            prompt_id,
+            lambda outputs: self._parse_audio_outputs(outputs, workflow, save_audio_node_id),
+            timeout=timeout,
+            poll_interval=poll_interval
+        )
     
     def _parse_outputs(
         self,
@@ -542,7 +799,7 @@ class ComfyUIClient:
     async def get_queue_info(self) -> Dict[str, Any]:
         """获取 ComfyUI 队列信息"""
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client(self.base_url) as client:
                 response = await client.get(
                     f"{self.base_url}/queue",
                     timeout=10.0
@@ -562,7 +819,7 @@ class ComfyUIClient:
         
         for attempt in range(1, max_retries + 1):
             try:
-                async with httpx.AsyncClient() as client:
+                async with http_client(self.base_url) as client:
                     print(f"[ComfyUI] Clearing queue (attempt {attempt}/{max_retries})")
                     response = await client.post(
                         f"{self.base_url}/queue",
@@ -595,7 +852,7 @@ class ComfyUIClient:
     async def delete_from_queue(self, prompt_id: str) -> Dict[str, Any]:
         """从队列中删除等待执行的任务"""
         try:
-            async with httpx.AsyncClient() as client:
+            async with http_client(self.base_url) as client:
                 print(f"[ComfyUI] Deleting prompt {prompt_id} from queue")
                 response = await client.post(
                     f"{self.base_url}/queue",
@@ -616,7 +873,7 @@ class ComfyUIClient:
         
         for attempt in range(1, max_retries + 1):
             try:
-                async with httpx.AsyncClient() as client:
+                async with http_client(self.base_url) as client:
                     response = await client.post(
                         f"{self.base_url}/interrupt",
                         timeout=10.0
@@ -689,3 +946,13 @@ class ComfyUIClient:
                 result["not_found"].append(pid)
         
         return result
+
+
+def _set_task_host(task_id: str, host: str):
+    from app.core.database import SessionLocal
+    from app.repositories import TaskRepository
+    db = SessionLocal()
+    try:
+        TaskRepository(db).set_comfyui_host(task_id, host)
+    finally:
+        db.close()
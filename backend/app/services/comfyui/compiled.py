@@ -0,0 +1,226 @@
+"""
+ComfyUI 工作流模板编译缓存
+
+工作流模板按 (工作流ID, 更新时间, 内容长度) 缓存解析结果，编译时一次性记录所有需要写入的节点输入（补丁点）：
+提示词、随机种子、图片尺寸、##STYLE## 等占位符、SaveImage 保存路径、参考图（LoadImage）与参考音频（LoadAudio）节点。
+构建提交用的工作流时只需对节点做一次结构复制，再按补丁点写入，不再重复 json.loads 和多次遍历全部节点。
+同时记录模型加载节点使用的模型文件，任务调度据此把需要相同模型的任务排在一起。
+"""
+import copy
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Hashable, Iterable, List, Optional, Tuple
+
+from app.utils.text_utils import content_hash
+
+# 编译缓存保留的模板数
+COMPILED_WORKFLOW_CACHE_SIZE = 64
+
+# 带随机种子的采样器节点类型
+SEED_NODE_TYPES = {
+    "KSampler", "KSamplerAdvanced", "SamplerCustom",
+    "SamplerCustomAdvanced", "RandomNoise", "PainterSamplerLTXV",
+}
+SEED_INPUT_NAMES = ("seed", "noise_seed")
+
+# 按画面比例设置宽高的节点类型
+SIZE_NODE_TYPES = {"EmptySD3LatentImage", "EmptyFlux2LatentImage", "EmptyLatentImage", "Flux2Scheduler"}
+
+# 占位符（按替换顺序）
+STYLE_PLACEHOLDER = "##STYLE##"
+SCENE_PLACEHOLDER = "##SCENE##"
+CHARACTERS_PLACEHOLDER = "##CHARACTERS##"
+PROPS_PLACEHOLDER = "##PROPS##"
+PLACEHOLDERS = (STYLE_PLACEHOLDER, SCENE_PLACEHOLDER, CHARACTERS_PLACEHOLDER, PROPS_PLACEHOLDER)
+
+# 模型加载节点（类型名包含 Loader）中表示模型文件的输入
+MODEL_INPUT_SUFFIXES = ("_name", "_path")
+MODEL_INPUT_NAMES = {"text_encoder"}
+
+# 未指定提示词节点时，自动注入提示词的文本内容
+PROMPT_MARKER = "{CHARACTER_PROMPT}"
+EMPTY_PROMPT_TEXTS = ("", "prompt here")
+
+# 节点输入引用 (节点ID, 输入名)
+InputRef = Tuple[str, str]
+
+
+class CompiledWorkflow:
+    """
+    编译后的工作流模板
+
+    graph 为解析后的模板（只读，不能直接提交），通过 instantiate() 获取可修改的副本。
+    """
+
+    def __init__(self, graph: Dict[str, Any]):
+        self.graph = graph
+        self.is_ui_format = "nodes" in graph
+        # 随机种子输入
+        self.seed_inputs: List[InputRef] = []
+        # 宽高输入
+        self.size_inputs: List[InputRef] = []
+        # 含占位符的输入及其包含的占位符
+        self.placeholder_inputs: List[Tuple[str, str, Tuple[str, ...]]] = []
+        # 文本为字符串的节点 (节点ID, 是否为自动注入提示词的文本)
+        self.text_nodes: List[Tuple[str, bool]] = []
+        # 未找到提示词节点时回退使用的 CLIPTextEncode 节点
+        self.fallback_prompt_node: Optional[str] = None
+        # 按节点类型索引的节点ID（保持工作流中的顺序）
+        self.nodes_by_type: Dict[str, List[str]] = {}
+        # 需要加载的模型文件（checkpoint / UNet / VAE / CLIP / LoRA 等）
+        self.model_files: FrozenSet[str] = frozenset()
+        if not self.is_ui_format:
+            self._index()
+
+    def _index(self):
+        for node_id, node in self.graph.items():
+            if not isinstance(node, dict):
+                continue
+            node_id = str(node_id)
+            class_type = node.get("class_type", "")
+            inputs = node.get("inputs", {})
+            self.nodes_by_type.setdefault(class_type, []).append(node_id)
+
+            if "Loader" in class_type:
+                self.model_files |= {
+                    value for key, value in inputs.items()
+                    if isinstance(value, str) and (key.endswith(MODEL_INPUT_SUFFIXES) or key in MODEL_INPUT_NAMES)
+                }
+
+            if class_type in SEED_NODE_TYPES:
+                self.seed_inputs.extend((node_id, name) for name in SEED_INPUT_NAMES if name in inputs)
+            if class_type in SIZE_NODE_TYPES:
+                self.size_inputs.extend((node_id, name) for name in ("width", "height") if name in inputs)
+
+            for key, value in inputs.items():
+                if isinstance(value, str):
+                    found = tuple(p for p in PLACEHOLDERS if p in value)
+                    if found:
+                        self.placeholder_inputs.append((node_id, key, found))
+
+            text = inputs.get("text")
+            if "text" in inputs and isinstance(text, str):
+                self.text_nodes.append((node_id, PROMPT_MARKER in text or text in EMPTY_PROMPT_TEXTS))
+
+            if class_type == "CLIPTextEncode" and self.fallback_prompt_node is None:
+                if isinstance(text, str):
+                    if any(kw in text.lower() for kw in ["negative", "bad", "worst"]):
+                        continue
+                    if "三视图" in text or "正面" in text:
+                        continue
+                self.fallback_prompt_node = node_id
+
+    def instantiate(self) -> "WorkflowSubmission":
+        """结构复制模板（节点、inputs 和连接列表），得到可修改的提交工作流"""
+        if self.is_ui_format:
+            return WorkflowSubmission(copy.deepcopy(self.graph), self)
+        return WorkflowSubmission({node_id: _copy_node(node) for node_id, node in self.graph.items()}, self)
+
+    def set_seed(self, workflow: Dict[str, Any], seed: int):
+        """按补丁点设置随机种子"""
+        for node_id, name in self.seed_inputs:
+            if node_id in workflow:
+                workflow[node_id]["inputs"][name] = seed
+
+    def set_size(self, workflow: Dict[str, Any], width: int, height: int):
+        """按补丁点设置潜空间/调度器宽高"""
+        for node_id, name in self.size_inputs:
+            if node_id in workflow:
+                workflow[node_id]["inputs"][name] = width if name == "width" else height
+
+    def replace_placeholders(
+        self,
+        workflow: Dict[str, Any],
+        replacements: Dict[str, Optional[str]],
+        extra_inputs: Iterable[InputRef] = (),
+    ):
+        """
+        按补丁点替换占位符（替换值为空的占位符保持原样）
+
+        Args:
+            workflow: 提交工作流
+            replacements: {占位符: 替换内容}
+            extra_inputs: 构建过程中新写入、可能包含占位符的输入（如注入的提示词）
+        """
+        active = [(p, replacements[p]) for p in PLACEHOLDERS if replacements.get(p)]
+        if not active:
+            return
+        refs = [(node_id, key) for node_id, key, _ in self.placeholder_inputs]
+        refs.extend(extra_inputs)
+        for node_id, key in refs:
+            inputs = workflow.get(node_id, {}).get("inputs", {})
+            value = inputs.get(key)
+            if not isinstance(value, str):
+                continue
+            for placeholder, replacement in active:
+                if placeholder in value:
+                    value = value.replace(placeholder, replacement)
+                    print(f"[Workflow] Replaced {placeholder} with '{replacement}' in node {node_id}.{key}")
+            inputs[key] = value
+
+
+class WorkflowSubmission(dict):
+    """由编译模板生成的提交工作流，template 指向其模板，便于按索引查找节点"""
+
+    def __init__(self, nodes: Dict[str, Any], template: CompiledWorkflow):
+        super().__init__(nodes)
+        self.template = template
+
+
+def _copy_node(node: Any) -> Any:
+    if not isinstance(node, dict) or "inputs" not in node:
+        return dict(node) if isinstance(node, dict) else node
+    inputs = {key: list(value) if isinstance(value, list) else value for key, value in node["inputs"].items()}
+    return {**node, "inputs": inputs}
+
+
+def find_nodes_by_type(workflow: Dict[str, Any], class_type: str) -> List[str]:
+    """查找指定类型的节点ID（编译模板生成的工作流直接使用索引）"""
+    template = getattr(workflow, "template", None)
+    if template is not None:
+        return [node_id for node_id in template.nodes_by_type.get(class_type, []) if node_id in workflow]
+    return [
+        node_id for node_id, node in workflow.items()
+        if isinstance(node, dict) and node.get("class_type") == class_type
+    ]
+
+
+def workflow_cache_key(workflow) -> Optional[Hashable]:
+    """工作流记录的编译缓存键（ID + 更新时间 + 内容长度）"""
+    if workflow is None or not getattr(workflow, "id", None):
+        return None
+    return (workflow.id, workflow.updated_at or workflow.created_at, len(workflow.workflow_json or ""))
+
+
+_cache: "OrderedDict[Hashable, CompiledWorkflow]" = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def get_compiled_workflow(workflow_json: str, cache_key: Hashable = None) -> CompiledWorkflow:
+    """
+    获取编译后的工作流模板
+
+    Args:
+        workflow_json: 工作流 JSON 字符串
+        cache_key: 缓存键（通常为 workflow_cache_key(workflow)），未提供时按内容指纹缓存
+    """
+    key = cache_key if cache_key is not None else ("content", content_hash(workflow_json))
+    with _cache_lock:
+        compiled = _cache.get(key)
+        if compiled is not None:
+            _cache.move_to_end(key)
+            return compiled
+
+    compiled = CompiledWorkflow(json.loads(workflow_json))
+    with _cache_lock:
+        _cache[key] = compiled
+        while len(_cache) > COMPILED_WORKFLOW_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return compiled
+
+
+def clear_compiled_workflows():
+    """清空编译缓存"""
+    with _cache_lock:
+        _cache.clear()
@@ -0,0 +1,237 @@
+"""
+ComfyUI WebSocket 事件中心
+
+进程内每台 ComfyUI 主机共享一个 client_id 和一条 /ws 连接，将 executing / executed / execution_error
+等事件分发给按 prompt_id 等待的 Future，避免每个任务轮询 /history。
+连接断开期间 connected 为 False，等待方退回 HTTP 轮询。
+"""
+import asyncio
+import json
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+try:
+    import websockets
+    WEBSOCKETS_AVAILABLE = True
+except ImportError:
+    WEBSOCKETS_AVAILABLE = False
+    print("[ComfyUIEvents] websockets 库未安装，将使用 HTTP 轮询获取任务结果")
+
+
+# 已完成但尚无人等待的任务结果保留数量（覆盖提交与注册之间的竞态）
+_RECENT_RESULTS_LIMIT = 512
+
+
+class PromptWaiter:
+    """单个 prompt 的等待句柄"""
+
+    def __init__(self, prompt_id: str, future: asyncio.Future):
+        self.prompt_id = prompt_id
+        self.future = future
+        # executed 事件携带的节点输出，/history 获取失败时兜底使用
+        self.outputs: Dict[str, Any] = {}
+
+
+class ComfyUIEventHub:
+    """ComfyUI WebSocket 事件中心"""
+
+    def __init__(self, host: str = None):
+        # 固定连接的主机（主机池中的其他主机），为空时跟随 COMFYUI_HOST 配置
+        self._host = host
+        self.client_id = str(uuid.uuid4())
+        self.connected = False
+        # 每次（重新）连接成功递增，等待方据此判断断线期间是否可能漏掉事件
+        self.connection_epoch = 0
+        self._waiters: Dict[str, PromptWaiter] = {}
+        self._recent: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._recent_outputs: Dict[str, Dict[str, Any]] = {}
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def base_url(self) -> str:
+        """动态获取当前的 ComfyUI 主机地址"""
+        if self._host:
+            return self._host
+        from app.core.config import get_settings
+        return get_settings().COMFYUI_HOST
+
+    def _ws_url(self, base_url: str) -> str:
+        ws_base = base_url.replace("http://", "ws://").replace("https://", "wss://")
+        return f"{ws_base.rstrip('/')}/ws?clientId={self.client_id}"
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """启动事件监听"""
+        if self._running or not WEBSOCKETS_AVAILABLE:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def stop(self):
+        """停止事件监听，未完成的等待方退回轮询"""
+        self._running = False
+        self.connected = False
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def ensure_started(self):
+        """在当前事件循环中按需启动（脚本、测试或 Celery worker 中未经过 lifespan 时）"""
+        if not WEBSOCKETS_AVAILABLE:
+            return
+        # 监听任务所在的事件循环已结束（如 worker 每个任务一次 asyncio.run）时需重新启动
+        if self._running and self._task is not None and not self._task.done():
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._running = True
+        self._task = asyncio.create_task(self._run_loop())
+
+    # ==================== 等待注册 ====================
+
+    def register(self, prompt_id: str) -> PromptWaiter:
+        """注册 prompt 等待句柄；若该任务已完成则返回已就绪的句柄"""
+        waiter = self._waiters.get(prompt_id)
+        if waiter and not waiter.future.done():
+            return waiter
+
+        future = asyncio.get_running_loop().create_future()
+        waiter = PromptWaiter(prompt_id, future)
+        recent = self._recent.pop(prompt_id, None)
+        waiter.outputs = self._recent_outputs.pop(prompt_id, {})
+        if recent is not None:
+            future.set_result(recent)
+        else:
+            self._waiters[prompt_id] = waiter
+        return waiter
+
+    def unregister(self, prompt_id: str):
+        """移除等待句柄"""
+        self._waiters.pop(prompt_id, None)
+
+    def _resolve(self, prompt_id: str, outcome: Dict[str, Any]):
+        waiter = self._waiters.pop(prompt_id, None)
+        if waiter:
+            if not waiter.future.done():
+                waiter.future.set_result(outcome)
+            return
+        self._recent[prompt_id] = outcome
+        while len(self._recent) > _RECENT_RESULTS_LIMIT:
+            old_id, _ = self._recent.popitem(last=False)
+            self._recent_outputs.pop(old_id, None)
+
+    # ==================== 事件处理 ====================
+
+    async def _run_loop(self):
+        """连接主循环，断线后指数退避重连"""
+        retry_count = 0
+        while self._running:
+            base_url = self.base_url
+            try:
+                async with websockets.connect(
+                    self._ws_url(base_url), ping_interval=20, ping_timeout=10, max_size=None
+                ) as ws:
+                    self.connected = True
+                    self.connection_epoch += 1
+                    retry_count = 0
+                    print(f"[ComfyUIEvents] WebSocket 已连接: {base_url} (client_id={self.client_id})")
+
+                    while self._running:
+                        try:
+                            message = await asyncio.wait_for(ws.recv(), timeout=5.0)
+                        except asyncio.TimeoutError:
+                            # 主机地址变更时重连到新地址
+                            if self.base_url != base_url:
+                                print("[ComfyUIEvents] ComfyUI 地址已变更，重新连接")
+                                break
+                            continue
+                        # 二进制消息为预览图，忽略
+                        if isinstance(message, str):
+                            self.handle_message(json.loads(message))
+            except asyncio.CancelledError:
+                self.connected = False
+                raise
+            except Exception as e:
+                retry_count += 1
+                delay = min(2 ** retry_count, 30)
+                self.connected = False
+                print(f"[ComfyUIEvents] WebSocket 连接断开: {e}, {delay}s 后重连")
+                await asyncio.sleep(delay)
+                continue
+            self.connected = False
+
+    def handle_message(self, data: Dict[str, Any]):
+        """分发一条 WebSocket 消息"""
+        msg_type = data.get("type")
+        payload = data.get("data") or {}
+        if not isinstance(payload, dict):
+            return
+        prompt_id = payload.get("prompt_id")
+        if not prompt_id:
+            return
+
+        if msg_type in ("progress", "executing", "execution_error", "execution_interrupted"):
+            # 推送节点与采样步数给任务事件订阅者
+            from app.services.scheduler.events import get_task_event_bus
+            get_task_event_bus().handle_comfyui_message(msg_type, payload)
+
+        if msg_type == "executed":
+            # 节点输出
+            output = payload.get("output")
+            node_id = payload.get("node")
+            if node_id is not None and output:
+                waiter = self._waiters.get(prompt_id)
+                target = waiter.outputs if waiter else self._recent_outputs.setdefault(prompt_id, {})
+                target[str(node_id)] = output
+
+        elif msg_type == "executing":
+            # node 为 None 表示整个 prompt 执行结束（此时 /history 已写入）
+            if payload.get("node") is None:
+                self._resolve(prompt_id, {"status": "success"})
+
+        elif msg_type == "execution_error":
+            error_msg = payload.get("exception_message") or "未知错误"
+            node_type = payload.get("node_type")
+            if node_type:
+                error_msg = f"{node_type}: {error_msg}"
+            self._resolve(prompt_id, {"status": "error", "message": error_msg})
+
+        elif msg_type == "execution_interrupted":
+            self._resolve(prompt_id, {"status": "error", "message": "任务已中断"})
+
+
+# 全局事件中心实例（COMFYUI_HOST）
+_event_hub: Optional[ComfyUIEventHub] = None
+# 主机池中其他主机的事件中心
+_host_hubs: Dict[str, ComfyUIEventHub] = {}
+
+
+def get_event_hub(host: str = None) -> ComfyUIEventHub:
+    """获取事件中心实例（指定主机时返回该主机的事件中心）"""
+    global _event_hub
+    if host:
+        from app.core.config import get_settings
+        host = host.rstrip("/")
+        if host != get_settings().COMFYUI_HOST.rstrip("/"):
+            hub = _host_hubs.get(host)
+            if hub is None:
+                hub = _host_hubs[host] = ComfyUIEventHub(host)
+            return hub
+    if _event_hub is None:
+        _event_hub = ComfyUIEventHub()
+    return _event_hub
+
+
+def all_event_hubs() -> List[ComfyUIEventHub]:
+    """获取所有已创建的事件中心"""
+    hubs = [_event_hub] if _event_hub is not None else []
+    return hubs + list(_host_hubs.values())
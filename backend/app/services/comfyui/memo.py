@@ -0,0 +1,231 @@
+"""
+ComfyUI 生成结果记忆
+
+提交前计算规范化工作流摘要，与之前完全相同的工作流（提示词、种子、尺寸、模型、参考图内容）直接返回上次的输出：
+- 上传的输入文件名替换为文件内容摘要，相同内容以不同文件名上传仍视为相同输入
+- 忽略不影响生成内容的字段（节点 _meta、保存节点的 filename_prefix）
+- 输出文件下载后固定保存在 user_story/.cache/generation_memo，命中时返回本地文件 URI（file://）
+- 按条目数与文件总大小上限淘汰最久未使用的条目，并删除其固定的文件
+- COMFYUI_MEMO_ENABLED 为 False 或调用方传入 use_memo=False 时不读写
+"""
+import asyncio
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+from app.core.config import get_settings
+from app.core.db_executor import run_db
+from app.repositories.generation_memo import GenerationMemoRepository
+
+# 不影响生成内容的输入
+IGNORED_INPUTS = {"filename_prefix"}
+
+# 输出类型 -> 结果中的 URL 字段（按优先级）
+OUTPUT_URL_KEYS = {"video": "video_url", "image": "image_url", "audio": "audio_url"}
+DEFAULT_EXTENSIONS = {"video": ".mp4", "image": ".png", "audio": ".flac"}
+
+# 每写入多少条执行一次淘汰
+_EVICT_EVERY = 20
+
+
+def canonical_workflow_digest(
+    workflow: Dict[str, Any],
+    input_digests: Optional[Dict[str, str]] = None,
+    output_node_id: Optional[str] = None
+) -> str:
+    """
+    计算规范化工作流摘要
+
+    Args:
+        workflow: 提交的工作流
+        input_digests: 本次提交上传的输入文件名 -> 内容摘要
+        output_node_id: 读取结果的输出节点（不同输出节点视为不同请求）
+    """
+    input_digests = input_digests or {}
+    nodes = {}
+    for node_id, node in workflow.items():
+        if not isinstance(node, dict):
+            nodes[str(node_id)] = node
+            continue
+        inputs = {}
+        for key, value in node.get("inputs", {}).items():
+            if key in IGNORED_INPUTS:
+                continue
+            if isinstance(value, str) and value in input_digests:
+                value = {"content": input_digests[value]}
+            inputs[key] = value
+        nodes[str(node_id)] = {"class_type": node.get("class_type"), "inputs": inputs}
+
+    canonical = json.dumps(
+        {"nodes": nodes, "output": str(output_node_id) if output_node_id else None},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def upload_digests(*upload_results: Optional[Dict[str, Any]]) -> Dict[str, str]:
+    """本次提交上传结果中的 {ComfyUI 文件名: 内容摘要}"""
+    return {
+        result["filename"]: result["digest"]
+        for result in upload_results
+        if result and result.get("success") and result.get("digest")
+    }
+
+
+def _result_output(result: Dict[str, Any]) -> Tuple[Optional[str], Optional[str]]:
+    """生成结果中的 (输出类型, 输出 URL)"""
+    for kind, key in OUTPUT_URL_KEYS.items():
+        if result.get(key):
+            return kind, result[key]
+    return None, None
+
+
+def _output_extension(url: str, kind: str) -> str:
+    filename = parse_qs(urlparse(url).query).get("filename", [""])[0] or urlparse(url).path
+    ext = os.path.splitext(filename)[1]
+    return ext if ext else DEFAULT_EXTENSIONS[kind]
+
+
+def _write_file(path: Path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(content)
+    os.replace(tmp_path, path)
+
+
+def _remove_files(paths: List[str]):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        except OSError as e:
+            print(f"[GenerationMemo] 删除固定的输出文件失败 {path}: {e}")
+
+
+class ComfyUIGenerationMemo:
+    """ComfyUI 生成结果记忆"""
+
+    def __init__(self, session_factory: Callable = None, memo_dir: str = None):
+        if session_factory is None:
+            from app.core.database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self._memo_dir = Path(memo_dir) if memo_dir else None
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().COMFYUI_MEMO_ENABLED
+
+    @property
+    def memo_dir(self) -> Path:
+        if self._memo_dir is None:
+            from app.services.file_storage import file_storage
+            self._memo_dir = file_storage.base_dir / ".cache" / "generation_memo"
+        return self._memo_dir
+
+    def _run(self, fn_name: str, *args):
+        db = self._session_factory()
+        try:
+            return getattr(GenerationMemoRepository(db), fn_name)(*args)
+        finally:
+            db.close()
+
+    def _get(self, digest: str) -> Optional[Tuple[str, str]]:
+        db = self._session_factory()
+        try:
+            entry = GenerationMemoRepository(db).get(digest)
+            return (entry.kind, entry.output_path) if entry is not None else None
+        finally:
+            db.close()
+
+    async def lookup(self, digest: str) -> Optional[Dict[str, Any]]:
+        """查找记忆的生成结果，未命中返回 None"""
+        try:
+            entry = await run_db(self._get, digest)
+            # 固定的文件被手动删除时视为未命中
+            if entry is not None and not os.path.exists(entry[1]):
+                await run_db(self._run, "delete", digest)
+                entry = None
+        except Exception as e:
+            print(f"[GenerationMemo] 读取记忆失败：{e}")
+            entry = None
+
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        kind, output_path = entry
+        print(f"[GenerationMemo] 命中 {digest[:12]}，复用输出 {output_path}")
+        return {
+            "success": True,
+            OUTPUT_URL_KEYS[kind]: Path(output_path).as_uri(),
+            "message": "生成成功（复用相同工作流的结果）",
+            "memo_hit": True,
+        }
+
+    async def store(self, digest: str, result: Dict[str, Any]):
+        """下载并固定保存生成结果，定期淘汰超出上限的条目"""
+        kind, url = _result_output(result)
+        if not url:
+            return
+        from app.services.file_storage import file_storage
+
+        settings = get_settings()
+        path = self.memo_dir / f"{digest}{_output_extension(url, kind)}"
+        self._writes += 1
+        evict = self._writes % _EVICT_EVERY == 1
+        try:
+            content = await file_storage.fetch_url_content(url, timeout=120.0)
+            await asyncio.to_thread(_write_file, path, content)
+            replaced = await run_db(self._run, "put", digest, kind, str(path), len(content))
+            stale = [replaced] if replaced else []
+            if evict:
+                stale += await run_db(
+                    self._run, "evict", settings.COMFYUI_MEMO_MAX_ENTRIES, settings.COMFYUI_MEMO_MAX_BYTES
+                )
+            if stale:
+                await asyncio.to_thread(_remove_files, stale)
+                print(f"[GenerationMemo] 淘汰 {len(stale)} 个输出")
+        except Exception as e:
+            print(f"[GenerationMemo] 保存生成结果失败：{e}")
+
+    async def clear(self) -> int:
+        """清空记忆并删除固定的输出文件"""
+        paths = await run_db(self._run, "clear")
+        await asyncio.to_thread(_remove_files, paths)
+        return len(paths)
+
+    async def stats(self) -> Dict[str, Any]:
+        entries, total_bytes = await run_db(self._run, "totals")
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": entries,
+            "total_bytes": total_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# 全局记忆实例
+_generation_memo: Optional[ComfyUIGenerationMemo] = None
+
+
+def get_generation_memo() -> ComfyUIGenerationMemo:
+    """获取生成结果记忆实例"""
+    global _generation_memo
+    if _generation_memo is None:
+        _generation_memo = ComfyUIGenerationMemo()
+    return _generation_memo
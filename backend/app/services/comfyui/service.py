@@ -3,21 +3,20 @@ ComfyUI 服务
 
 高级业务方法，组合客户端和工作流构建器
 """
-from typing import Dict, Any, Optional, List
+from typing import Dict, Any, Optional, List, Callable, Awaitable
 
 from .client import ComfyUIClient
+from .compiled import find_nodes_by_type, get_compiled_workflow
+from .memo import canonical_workflow_digest, get_generation_memo, upload_digests
 from .workflows import WorkflowBuilder
-from app.utils.workflow_disconnect import (
-    disconnect_reference_chain,
-    disconnect_unuploaded_reference_nodes,
-)
+from app.utils.workflow_disconnect import WorkflowGraph, prune_unreachable_nodes
 
 
 class ComfyUIService:
     """ComfyUI 服务封装"""
     
     def __init__(self, base_url: str = None):
-        self.client = ComfyUIClient()
+        self.client = ComfyUIClient(host=base_url)
         self.builder = WorkflowBuilder()
     
     @property
@@ -39,6 +38,62 @@ class ComfyUIService:
             "shot_video": "ltx-2"
         }
     
+    # ==================== 任务执行 ====================
+
+    async def run_workflow(
+        self,
+        workflow: Dict[str, Any],
+        output_node_id: Optional[str] = None,
+        timeout: int = 7200,
+        audio: bool = False,
+        use_memo: bool = True,
+        on_queued: Callable[[str], Awaitable[None]] = None,
+        input_digests: Optional[Dict[str, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        提交工作流并等待结果
+
+        与之前完全相同的工作流直接返回记忆的输出，不再提交 ComfyUI
+
+        Args:
+            workflow: 已注入参数和上传文件的工作流
+            output_node_id: 读取结果的输出节点
+            timeout: 等待超时（秒）
+            audio: 是否读取音频输出
+            use_memo: 是否使用生成结果记忆（强制重新生成时传 False）
+            on_queued: 提交成功后以 prompt_id 调用的回调（如保存到任务记录）
+            input_digests: 本次提交上传的输入文件名 -> 内容摘要（见 memo.upload_digests）
+
+        Returns:
+            生成结果，附带 prompt_id；命中记忆时附带 memo_hit
+        """
+        memo = get_generation_memo()
+        digest = None
+        if use_memo and memo.enabled:
+            digest = canonical_workflow_digest(workflow, input_digests, output_node_id)
+            memo_result = await memo.lookup(digest)
+            if memo_result:
+                return memo_result
+
+        queue_result = await self.client.queue_prompt(workflow)
+        if not queue_result.get("success"):
+            return {"success": False, "message": queue_result.get("error", "提交任务失败")}
+
+        prompt_id = queue_result.get("prompt_id")
+        if on_queued:
+            await on_queued(prompt_id)
+
+        if audio:
+            result = await self.client.wait_for_audio_result(prompt_id, workflow, output_node_id, timeout=timeout)
+        else:
+            result = await self.client.wait_for_result(prompt_id, workflow, output_node_id, timeout=timeout)
+        result = result or {"success": False, "message": "生成失败"}
+        result["prompt_id"] = prompt_id
+
+        if digest and result.get("success"):
+            await memo.store(digest, result)
+        return result
+
     # ==================== 图片生成 ====================
     
     async def generate_character_image(
@@ -49,9 +104,10 @@ class ComfyUIService:
         character_name: str = None,
         aspect_ratio: str = None,
         node_mapping: Dict[str, str] = None,
+        use_memo: bool = True,
         **kwargs
     ) -> Dict[str, Any]:
-        """生成角色人设图"""
+        """生成角色人设图（use_memo=False 时跳过生成结果记忆）"""
         try:
             workflow = kwargs.get('workflow') or self.builder.build_character_workflow(
                 prompt=prompt,
@@ -63,25 +119,13 @@ class ComfyUIService:
                 **{k: v for k, v in kwargs.items() if k != 'workflow'}
             )
             
-            queue_result = await self.client.queue_prompt(workflow)
-            
-            if not queue_result.get("success"):
-                return {
-                    "success": False,
-                    "message": queue_result.get("error", "提交任务失败")
-                }
-            
-            prompt_id = queue_result.get("prompt_id")
             save_image_node_id = node_mapping.get("save_image_node_id") if node_mapping else None
-            
-            result = await self.client.wait_for_result(
-                prompt_id, workflow, save_image_node_id, timeout=7200
-            )
+            result = await self.run_workflow(workflow, save_image_node_id, use_memo=use_memo)
             
             return {
-                "success": result.get("success") if result else False,
-                "image_url": result.get("image_url") if result else None,
-                "message": str(result.get("message", "生成成功" if (result and result.get("success")) else "生成失败")) if result else "生成失败",
+                "success": result.get("success", False),
+                "image_url": result.get("image_url"),
+                "message": str(result.get("message", "生成成功" if result.get("success") else "生成失败")),
                 "submitted_workflow": workflow
             }
             
@@ -119,9 +163,16 @@ class ComfyUIService:
         scene_reference_path: Optional[str] = None,
         seed: Optional[int] = None,
         workflow: Dict[str, Any] = None,
-        style: str = "anime style, high quality, detailed"
+        style: str = "anime style, high quality, detailed",
+        workflow_key: Any = None,
+        use_memo: bool = True,
+        input_digests: Optional[Dict[str, str]] = None
     ) -> Dict[str, Any]:
-        """使用指定工作流生成分镜图片"""
+        """
+        使用指定工作流生成分镜图片（use_memo=False 时跳过生成结果记忆）
+
+        传入已注入参考图的 workflow 时，input_digests 为调用方上传参考图的文件名 -> 内容摘要
+        """
         try:
             if workflow is None:
                 workflow = self.builder.build_shot_workflow(
@@ -130,30 +181,31 @@ class ComfyUIService:
                     node_mapping=node_mapping,
                     aspect_ratio=aspect_ratio,
                     seed=seed,
-                    style=style
+                    style=style,
+                    workflow_key=workflow_key
                 )
             
             save_image_node_id = node_mapping.get("save_image_node_id")
             uploaded_filenames = []
+            input_digests = dict(input_digests or {})
             
             # 上传角色参考图
             if character_reference_path:
                 upload_result = await self.client.upload_image(character_reference_path)
                 if upload_result.get("success"):
                     uploaded_filenames.append(upload_result.get("filename"))
+                    input_digests.update(upload_digests(upload_result))
             
             # 上传场景参考图
             if scene_reference_path:
                 upload_result = await self.client.upload_image(scene_reference_path)
                 if upload_result.get("success"):
                     uploaded_filenames.append(upload_result.get("filename"))
+                    input_digests.update(upload_digests(upload_result))
             
             # 设置参考图到 LoadImage 节点
             if uploaded_filenames:
-                loadimage_nodes = [
-                    nid for nid, node in workflow.items()
-                    if node.get("class_type") == "LoadImage"
-                ]
+                loadimage_nodes = find_nodes_by_type(workflow, "LoadImage")
                 
                 for i, filename in enumerate(uploaded_filenames):
                     if i < len(loadimage_nodes):
@@ -162,23 +214,16 @@ class ComfyUIService:
                         print(f"[ComfyUI] Set reference to LoadImage node {node_id}: {filename}")
             
             # 提交任务
-            queue_result = await self.client.queue_prompt(workflow)
-            
-            if not queue_result.get("success"):
-                return {"success": False, "message": queue_result.get("error", "提交任务失败")}
-            
-            prompt_id = queue_result.get("prompt_id")
-            
-            result = await self.client.wait_for_result(
-                prompt_id, workflow, save_image_node_id, timeout=7200
+            result = await self.run_workflow(
+                workflow, save_image_node_id, use_memo=use_memo, input_digests=input_digests
             )
             
             return {
-                "success": result.get("success") if result else False,
-                "image_url": result.get("image_url") if result else None,
-                "message": str(result.get("message")) if result and result.get("message") else "",
+                "success": result.get("success", False),
+                "image_url": result.get("image_url"),
+                "message": str(result.get("message")) if result.get("message") else "",
                 "submitted_workflow": workflow,
-                "prompt_id": prompt_id
+                "prompt_id": result.get("prompt_id")
             }
             
         except Exception as e:
@@ -202,7 +247,9 @@ class ComfyUIService:
         scene_setting: Optional[str] = None,
         prop_appearances: Optional[Dict[str, str]] = None,
         reference_audio_path: Optional[str] = None,
-        keyframe_paths: Optional[List[str]] = None
+        keyframe_paths: Optional[List[str]] = None,
+        workflow_key: Any = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """使用指定工作流生成分镜视频 (LTX2)
 
@@ -210,6 +257,8 @@ class ComfyUIService:
             reference_audio_path: 参考音频本地路径，用于口型同步
             keyframe_paths: 关键帧图片本地路径列表，用于视频生成
             duration_seconds: 视频时长秒数（优先于 frame_count）
+            workflow_key: 工作流模板编译缓存键
+            use_memo: 是否使用生成结果记忆
         """
         try:
             workflow = self.builder.build_video_workflow(
@@ -223,26 +272,27 @@ class ComfyUIService:
                 style=style,
                 character_appearances=character_appearances,
                 scene_setting=scene_setting,
-                prop_appearances=prop_appearances
+                prop_appearances=prop_appearances,
+                workflow_key=workflow_key
             )
 
             reference_image_node_id = node_mapping.get("reference_image_node_id", "12")
+            uploads = []
 
             # 上传参考图片
             if character_reference_path:
                 upload_result = await self.client.upload_image(character_reference_path)
 
                 if upload_result.get("success"):
+                    uploads.append(upload_result)
                     uploaded_filename = upload_result.get("filename")
 
                     if reference_image_node_id in workflow:
                         workflow[reference_image_node_id]["inputs"]["image"] = uploaded_filename
                     else:
                         # 自动查找 LoadImage 节点
-                        for node_id, node in workflow.items():
-                            if node.get("class_type") == "LoadImage":
-                                workflow[node_id]["inputs"]["image"] = uploaded_filename
-                                break
+                        for node_id in find_nodes_by_type(workflow, "LoadImage")[:1]:
+                            workflow[node_id]["inputs"]["image"] = uploaded_filename
                 else:
                     return {"success": False, "message": f"图片上传失败: {upload_result.get('message')}"}
 
@@ -251,6 +301,7 @@ class ComfyUIService:
                 audio_upload_result = await self.client.upload_audio(reference_audio_path)
 
                 if audio_upload_result.get("success"):
+                    uploads.append(audio_upload_result)
                     uploaded_audio_filename = audio_upload_result.get("filename")
                     print(f"[ComfyUI] Audio uploaded: {uploaded_audio_filename}")
 
@@ -263,11 +314,9 @@ class ComfyUIService:
                         print(f"[ComfyUI] Set audio to node {reference_audio_node_id}")
                     else:
                         # 尝试查找 LoadAudio 节点
-                        for node_id, node in workflow.items():
-                            if node.get("class_type") == "LoadAudio":
-                                workflow[node_id]["inputs"]["audio"] = uploaded_audio_filename
-                                print(f"[ComfyUI] Set audio to LoadAudio node {node_id}")
-                                break
+                        for node_id in find_nodes_by_type(workflow, "LoadAudio")[:1]:
+                            workflow[node_id]["inputs"]["audio"] = uploaded_audio_filename
+                            print(f"[ComfyUI] Set audio to LoadAudio node {node_id}")
                 else:
                     print(f"[ComfyUI] Audio upload failed: {audio_upload_result.get('message')}")
                     # 音频上传失败不阻止视频生成，只是没有口型同步
@@ -284,6 +333,7 @@ class ComfyUIService:
                     keyframe_upload_result = await self.client.upload_image(keyframe_path)
 
                     if keyframe_upload_result.get("success"):
+                        uploads.append(keyframe_upload_result)
                         uploaded_keyframe_filename = keyframe_upload_result.get("filename")
                         print(f"[ComfyUI] Keyframe {keyframe_index} uploaded: {uploaded_keyframe_filename}")
 
@@ -305,6 +355,7 @@ class ComfyUIService:
                 key for key in node_mapping
                 if key.startswith("keyframe_node_")
             ]
+            graph = WorkflowGraph(workflow)
             for kf_key in keyframe_keys:
                 node_id = node_mapping.get(kf_key)
                 if node_id and str(node_id) in workflow:
@@ -313,28 +364,25 @@ class ComfyUIService:
                     image_value = workflow[node_id_str].get("inputs", {}).get("image", "")
                     # 如果没有有效图片，断开下游参考链路
                     if not image_value or image_value in ["", ""]:
-                        disconnect_reference_chain(workflow, node_id_str)
+                        graph.disconnect_reference_chain(node_id_str)
                         print(f"[ComfyUI] Disconnected {kf_key} {node_id_str} - no image uploaded")
 
+            # 删除断开后无法到达输出节点的子图
+            prune_unreachable_nodes(workflow, graph, node_mapping)
+
             # 提交任务
-            queue_result = await self.client.queue_prompt(workflow)
-            
-            if not queue_result.get("success"):
-                return {"success": False, "message": queue_result.get("error", "提交任务失败")}
-            
-            prompt_id = queue_result.get("prompt_id")
             video_save_node_id = node_mapping.get("video_save_node_id", "1")
-            
-            result = await self.client.wait_for_result(
-                prompt_id, workflow, video_save_node_id, timeout=7200
+            result = await self.run_workflow(
+                workflow, video_save_node_id, use_memo=use_memo, input_digests=upload_digests(*uploads)
             )
+
             video_url = result.get("video_url") or result.get("image_url")
             return {
-                "success": result.get("success") if result else False,
+                "success": result.get("success", False),
                 "video_url": video_url,
-                "message": str(result.get("message")) if result and result.get("message") else "",
+                "message": str(result.get("message")) if result.get("message") else "",
                 "submitted_workflow": workflow,
-                "prompt_id": prompt_id
+                "prompt_id": result.get("prompt_id")
             }
             
         except Exception as e:
@@ -348,12 +396,13 @@ class ComfyUIService:
         first_image_path: str,
         last_image_path: str,
         aspect_ratio: str = "16:9",
-        frame_count: Optional[int] = None
+        frame_count: Optional[int] = None,
+        workflow_key: Any = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
-        """生成转场视频 (首帧+尾帧)"""
+        """生成转场视频 (首帧+尾帧)，use_memo=False 时跳过生成结果记忆"""
         try:
-            import json
-            workflow = json.loads(workflow_json)
+            workflow = get_compiled_workflow(workflow_json, workflow_key).instantiate()
             
             first_image_node_id = node_mapping.get("first_image_node_id", "98")
             last_image_node_id = node_mapping.get("last_image_node_id", "106")
@@ -381,29 +430,22 @@ class ComfyUIService:
             if frame_count and frame_count_node_id:
                 self.builder._set_value(workflow, frame_count_node_id, frame_count)
             
-            # 设置随机种子
-            import random
-            self.builder._set_random_seed(workflow, random.randint(1, 2**32))
+            # 设置种子（任务重试时沿用同一种子）
+            self.builder._set_random_seed(workflow, self.builder._task_seed())
             
             # 提交任务
-            queue_result = await self.client.queue_prompt(workflow)
-            
-            if not queue_result.get("success"):
-                return {"success": False, "message": queue_result.get("error", "提交任务失败")}
-            
-            prompt_id = queue_result.get("prompt_id")
-            
-            result = await self.client.wait_for_result(
-                prompt_id, workflow, video_save_node_id, timeout=7200
+            result = await self.run_workflow(
+                workflow, video_save_node_id, use_memo=use_memo,
+                input_digests=upload_digests(first_upload, last_upload)
             )
             
             video_url = result.get("video_url") or result.get("image_url")
             return {
-                "success": result.get("success") if result else False,
+                "success": result.get("success", False),
                 "video_url": video_url,
-                "message": str(result.get("message")) if result and result.get("message") else "",
+                "message": str(result.get("message")) if result.get("message") else "",
                 "submitted_workflow": workflow,
-                "prompt_id": prompt_id
+                "prompt_id": result.get("prompt_id")
             }
             
         except Exception as e:
@@ -449,7 +491,8 @@ class ComfyUIService:
         novel_id: str = None,
         character_name: str = None,
         node_mapping: Dict[str, str] = None,
-        workflow: Dict[str, Any] = None
+        workflow: Dict[str, Any] = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         生成角色音色
@@ -462,6 +505,7 @@ class ComfyUIService:
             character_name: 角色名称
             node_mapping: 节点映射配置
             workflow: 预构建的工作流
+            use_memo: 是否使用生成结果记忆
 
         Returns:
             {"success": bool, "audio_url": str, "message": str}
@@ -477,25 +521,15 @@ class ComfyUIService:
                     node_mapping=node_mapping
                 )
 
-            queue_result = await self.client.queue_prompt(workflow)
-
-            if not queue_result.get("success"):
-                return {
-                    "success": False,
-                    "message": queue_result.get("error", "提交任务失败")
-                }
-
-            prompt_id = queue_result.get("prompt_id")
             save_audio_node_id = node_mapping.get("save_audio_node_id") if node_mapping else None
-
-            result = await self.client.wait_for_audio_result(
-                prompt_id, workflow, save_audio_node_id, timeout=600
+            result = await self.run_workflow(
+                workflow, save_audio_node_id, timeout=600, audio=True, use_memo=use_memo
             )
 
             return {
-                "success": result.get("success") if result else False,
-                "audio_url": result.get("audio_url") if result else None,
-                "message": str(result.get("message")) if result and result.get("message") else "生成失败",
+                "success": result.get("success", False),
+                "audio_url": result.get("audio_url"),
+                "message": str(result.get("message")) if result.get("message") else "生成失败",
                 "submitted_workflow": workflow
             }
 
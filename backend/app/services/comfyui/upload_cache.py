@@ -0,0 +1,203 @@
+"""
+ComfyUI 上传缓存
+
+按文件内容（BLAKE2b 摘要）记录 ComfyUI 已持有的输入文件：
+- 上传时使用内容寻址文件名（原文件名 + 摘要前缀），不同内容不会互相覆盖
+- 同一内容再次上传时直接复用文件名，跳过上传
+- 缓存按 ComfyUI 主机区分，LRU + TTL 淘汰
+- ComfyUI 报告输入文件缺失时（如 ComfyUI 清理了 input 目录）失效对应条目并重新上传
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+# 计算摘要时每次读取的块大小
+_HASH_CHUNK_SIZE = 1024 * 1024
+# 摘要截取长度（十六进制字符）
+_DIGEST_PREFIX_LENGTH = 16
+
+
+@dataclass
+class UploadCacheEntry:
+    """已上传文件记录"""
+    filename: str  # ComfyUI 中的文件名
+    source_path: str  # 本地源文件路径（用于失效后重新上传）
+    kind: str  # image / audio
+    mime_type: str
+    uploaded_at: float
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_filename(path: str, digest: str) -> str:
+    """生成内容寻址文件名，如 merged_characters_3f2a9c....png"""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}_{digest[:_DIGEST_PREFIX_LENGTH]}{ext}"
+
+
+class ComfyUIUploadCache:
+    """ComfyUI 上传缓存"""
+
+    def __init__(self, max_entries: int = None, ttl: float = None):
+        settings = get_settings()
+        self.max_entries = max_entries or settings.COMFYUI_UPLOAD_CACHE_SIZE
+        self.ttl = ttl if ttl is not None else settings.COMFYUI_UPLOAD_CACHE_TTL
+        # (主机, 摘要) -> 记录
+        self._entries: "OrderedDict[Tuple[str, str], UploadCacheEntry]" = OrderedDict()
+        # (路径, 修改时间, 大小) -> 摘要，避免未变化的文件重复计算
+        self._digests: "OrderedDict[Tuple[str, int, int], str]" = OrderedDict()
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        # (主机, 摘要) -> 持有或等待该锁的上传数，归零时删除锁
+        self._lock_users: Dict[Tuple[str, str], int] = {}
+        self.hits = 0
+        self.misses = 0
+
+    # ==================== 摘要 ====================
+
+    async def file_digest(self, path: str) -> str:
+        """计算文件内容摘要（按路径/修改时间/大小缓存）"""
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        digest = self._digests.get(key)
+        if digest is not None:
+            self._digests.move_to_end(key)
+            return digest
+        digest = await asyncio.to_thread(_hash_file, path)
+        self._digests[key] = digest
+        while len(self._digests) > self.max_entries:
+            self._digests.popitem(last=False)
+        return digest
+
+    # ==================== 查询与写入 ====================
+
+    @asynccontextmanager
+    async def lock(self, host: str, digest: str) -> AsyncIterator[None]:
+        """
+        同一内容的并发上传串行化，第二个等待方直接命中缓存
+
+        最后一个持有或等待该锁的上传退出时（包括提前返回、异常与取消）删除锁
+        """
+        key = (host, digest)
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._lock_users[key] = self._lock_users.get(key, 0) + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self._lock_users[key] -= 1
+            if not self._lock_users[key]:
+                del self._lock_users[key]
+                self._locks.pop(key, None)
+
+    def get(self, host: str, digest: str) -> Optional[UploadCacheEntry]:
+        """获取未过期的上传记录"""
+        key = (host, digest)
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        if self.ttl and time.monotonic() - entry.uploaded_at > self.ttl:
+            del self._entries[key]
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(
+        self,
+        host: str,
+        digest: str,
+        filename: str,
+        source_path: str,
+        kind: str,
+        mime_type: str
+    ):
+        """记录上传成功的文件"""
+        key = (host, digest)
+        self._entries[key] = UploadCacheEntry(
+            filename=filename,
+            source_path=source_path,
+            kind=kind,
+            mime_type=mime_type,
+            uploaded_at=time.monotonic(),
+        )
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def hosts_with(self, digest: str) -> List[str]:
+        """已持有该内容的主机（主机池按此选择主机，相同参考图集中到同一主机）"""
+        now = time.monotonic()
+        return [
+            key[0] for key, entry in self._entries.items()
+            if key[1] == digest and not (self.ttl and now - entry.uploaded_at > self.ttl)
+        ]
+
+    def find_referenced(self, host: str, text: str) -> List[UploadCacheEntry]:
+        """查找文本（工作流 JSON / 错误信息）中引用的已缓存文件"""
+        if not text:
+            return []
+        return [
+            entry for key, entry in self._entries.items()
+            if key[0] == host and entry.filename in text
+        ]
+
+    # ==================== 失效 ====================
+
+    def invalidate_referenced(self, host: str, error_text: str) -> List[UploadCacheEntry]:
+        """
+        失效 ComfyUI 错误信息中提到的已缓存文件
+
+        Returns:
+            被失效的记录（调用方据此重新上传）
+        """
+        if not error_text:
+            return []
+        stale = [
+            key for key, entry in self._entries.items()
+            if key[0] == host and entry.filename in error_text
+        ]
+        entries = [self._entries.pop(key) for key in stale]
+        if entries:
+            print(f"[UploadCache] ComfyUI 缺少已缓存的输入文件，失效 {len(entries)} 条: "
+                  f"{[e.filename for e in entries]}")
+        return entries
+
+    def clear(self, host: str = None):
+        """清空缓存（指定主机时只清空该主机）"""
+        if host is None:
+            self._entries.clear()
+            return
+        for key in [k for k in self._entries if k[0] == host]:
+            del self._entries[key]
+
+    def stats(self) -> Dict[str, int]:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+# 全局缓存实例
+_upload_cache: Optional[ComfyUIUploadCache] = None
+
+
+def get_upload_cache() -> ComfyUIUploadCache:
+    """获取上传缓存实例"""
+    global _upload_cache
+    if _upload_cache is None:
+        _upload_cache = ComfyUIUploadCache()
+    return _upload_cache
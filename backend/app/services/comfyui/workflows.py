@@ -3,10 +3,22 @@ ComfyUI 工作流构建器
 
 负责构建和修改 ComfyUI 工作流
 """
-import json
 import random
 import re
-from typing import Dict, Any, Optional, Tuple
+from typing import Dict, Any, Hashable, Optional, Tuple
+
+from app.utils import workflow_disconnect
+from .compiled import (
+    CHARACTERS_PLACEHOLDER,
+    PROPS_PLACEHOLDER,
+    SCENE_PLACEHOLDER,
+    SEED_INPUT_NAMES,
+    SEED_NODE_TYPES,
+    STYLE_PLACEHOLDER,
+    CompiledWorkflow,
+    find_nodes_by_type,
+    get_compiled_workflow,
+)
 
 
 class WorkflowBuilder:
@@ -37,13 +49,14 @@ class WorkflowBuilder:
         aspect_ratio: str = None,
         node_mapping: Dict[str, str] = None,
         style: str = "anime style, high quality, detailed",
+        workflow_key: Hashable = None,
         **kwargs
     ) -> Dict[str, Any]:
         """构建角色人设图工作流"""
         if workflow_json:
-            workflow = json.loads(workflow_json)
-            return self.inject_prompt(
-                workflow, prompt, novel_id, character_name,
+            compiled = get_compiled_workflow(workflow_json, workflow_key)
+            return self._inject_prompt_compiled(
+                compiled, prompt, novel_id, character_name,
                 aspect_ratio, node_mapping, style
             )
         else:
@@ -66,6 +79,7 @@ class WorkflowBuilder:
         aspect_ratio: str = None,
         node_mapping: Dict[str, str] = None,
         style: str = "anime style, high quality, detailed",
+        workflow_key: Hashable = None,
         **kwargs
     ) -> Dict[str, Any]:
         """构建场景图工作流"""
@@ -78,6 +92,7 @@ class WorkflowBuilder:
             aspect_ratio=aspect_ratio,
             node_mapping=node_mapping,
             style=style,
+            workflow_key=workflow_key,
             **kwargs
         )
     
@@ -92,7 +107,8 @@ class WorkflowBuilder:
         reference_images: Dict[str, str] = None,
         character_appearances: Optional[Dict[str, str]] = None,
         scene_setting: Optional[str] = None,
-        prop_appearances: Optional[Dict[str, str]] = None
+        prop_appearances: Optional[Dict[str, str]] = None,
+        workflow_key: Hashable = None
     ) -> Dict[str, Any]:
         """构建分镜图片工作流
 
@@ -107,17 +123,18 @@ class WorkflowBuilder:
             character_appearances: 角色外貌描述映射 {角色名: 外貌描述}
             scene_setting: 场景环境设定
             prop_appearances: 道具外观描述映射 {道具名: 外观描述}
+            workflow_key: 编译缓存键（workflow_cache_key(workflow)），未提供时按内容缓存
 
         注意：参考图节点的检测和断开逻辑已移至 shot_image_service 的 _upload_references_and_update_workflow 方法中，
         因为只有在上传参考图之后才能正确判断哪些节点没有图片。
         """
-        workflow = json.loads(workflow_json)
+        compiled = get_compiled_workflow(workflow_json, workflow_key)
+        workflow = compiled.instantiate()
 
         # 替换占位符
-        self._replace_style_placeholder(workflow, style)
-        self._replace_scene_placeholder(workflow, scene_setting)
-        self._replace_characters_placeholder(workflow, character_appearances)
-        self._replace_props_placeholder(workflow, prop_appearances)
+        self._replace_placeholders(
+            compiled, workflow, style, scene_setting, character_appearances, prop_appearances
+        )
         
         # 获取宽高
         width, height = self.get_aspect_ratio_dimensions(aspect_ratio)
@@ -150,8 +167,8 @@ class WorkflowBuilder:
         
         # 设置随机种子
         if seed is None:
-            seed = random.randint(1, 2**32)
-        self._set_random_seed(workflow, seed)
+            seed = self._task_seed()
+        compiled.set_seed(workflow, seed)
         
         return workflow
     
@@ -167,7 +184,8 @@ class WorkflowBuilder:
         style: Optional[str] = None,
         character_appearances: Optional[Dict[str, str]] = None,
         scene_setting: Optional[str] = None,
-        prop_appearances: Optional[Dict[str, str]] = None
+        prop_appearances: Optional[Dict[str, str]] = None,
+        workflow_key: Hashable = None
     ) -> Dict[str, Any]:
         """
         构建视频生成工作流
@@ -184,14 +202,15 @@ class WorkflowBuilder:
             character_appearances: 角色外貌描述映射 {角色名：外貌描述}
             scene_setting: 场景环境设定
             prop_appearances: 道具外观描述映射 {道具名：外观描述}
+            workflow_key: 编译缓存键（workflow_cache_key(workflow)），未提供时按内容缓存
         """
-        workflow = json.loads(workflow_json)
+        compiled = get_compiled_workflow(workflow_json, workflow_key)
+        workflow = compiled.instantiate()
 
         # 替换占位符
-        self._replace_style_placeholder(workflow, style)
-        self._replace_scene_placeholder(workflow, scene_setting)
-        self._replace_characters_placeholder(workflow, character_appearances)
-        self._replace_props_placeholder(workflow, prop_appearances)
+        self._replace_placeholders(
+            compiled, workflow, style, scene_setting, character_appearances, prop_appearances
+        )
 
         # 获取节点映射
         prompt_node_id = node_mapping.get("prompt_node_id")
@@ -217,8 +236,8 @@ class WorkflowBuilder:
 
         # 设置随机种子
         if seed is None:
-            seed = random.randint(1, 2**32)
-        self._set_random_seed(workflow, seed)
+            seed = self._task_seed()
+        compiled.set_seed(workflow, seed)
 
         return workflow
 
@@ -246,7 +265,7 @@ class WorkflowBuilder:
             构建好的工作流字典
         """
         if workflow_json:
-            workflow = json.loads(workflow_json)
+            workflow = get_compiled_workflow(workflow_json).instantiate()
         else:
             return self._build_default_voice_design_workflow(voice_prompt, text, novel_id, character_name)
 
@@ -276,17 +295,10 @@ class WorkflowBuilder:
 
         # 设置 SaveAudio 节点的 filename_prefix
         if save_prefix:
-            for node_id, node in workflow.items():
-                if not isinstance(node, dict):
-                    continue
-                class_type = node.get("class_type", "")
-                inputs = node.get("inputs", {})
-                node_id_str = str(node_id)
-
-                if class_type == "SaveAudio":
-                    if not save_audio_node_id or node_id_str == save_audio_node_id:
-                        inputs["filename_prefix"] = save_prefix
-                        print(f"[VoiceWorkflow] Set save prefix to node {node_id}")
+            for node_id in find_nodes_by_type(workflow, "SaveAudio"):
+                if not save_audio_node_id or node_id == save_audio_node_id:
+                    workflow[node_id].get("inputs", {})["filename_prefix"] = save_prefix
+                    print(f"[VoiceWorkflow] Set save prefix to node {node_id}")
 
         return workflow
 
@@ -316,7 +328,7 @@ class WorkflowBuilder:
             构建好的工作流字典
         """
         if workflow_json:
-            workflow = json.loads(workflow_json)
+            workflow = get_compiled_workflow(workflow_json).instantiate()
         else:
             return self._build_default_audio_workflow(text, novel_id, character_name, reference_audio_filename, emotion_prompt)
 
@@ -494,13 +506,30 @@ class WorkflowBuilder:
         style: str = "anime style, high quality, detailed"
     ) -> Dict[str, Any]:
         """将提示词注入到工作流中"""
+        return self._inject_prompt_compiled(
+            CompiledWorkflow(workflow), prompt, novel_id, character_name,
+            aspect_ratio, node_mapping, style, workflow=workflow
+        )
+
+    def _inject_prompt_compiled(
+        self,
+        compiled: CompiledWorkflow,
+        prompt: str,
+        novel_id: str = None,
+        character_name: str = None,
+        aspect_ratio: str = None,
+        node_mapping: Dict[str, str] = None,
+        style: str = "anime style, high quality, detailed",
+        workflow: Dict[str, Any] = None
+    ) -> Dict[str, Any]:
+        """按编译模板的补丁点注入提示词（workflow 为空时基于模板副本构建）"""
         # 检测工作流格式
-        if "nodes" in workflow:
+        if compiled.is_ui_format:
             print("[Workflow] Detected UI format workflow, using built-in workflow")
             return self._build_flux_workflow(prompt)
         
-        api_workflow = workflow
-        modified_count = 0
+        api_workflow = workflow if workflow is not None else compiled.instantiate()
+        injected = []
         
         # 构建保存路径
         save_prefix = None
@@ -518,74 +547,32 @@ class WorkflowBuilder:
         prompt_node_id = str(node_mapping.get("prompt_node_id", "")) if node_mapping else ""
         save_image_node_id = str(node_mapping.get("save_image_node_id", "")) if node_mapping else ""
         
-        # 遍历所有节点进行修改
-        for node_id, node in api_workflow.items():
-            if not isinstance(node, dict):
-                continue
-            
-            inputs = node.get("inputs", {})
-            class_type = node.get("class_type", "")
-            
-            # 设置 SaveImage 节点的 filename_prefix
-            if class_type == "SaveImage" and save_prefix:
-                if not save_image_node_id or str(node_id) == save_image_node_id:
-                    inputs["filename_prefix"] = save_prefix
-            
-            # 设置图片尺寸
-            if class_type in ["EmptySD3LatentImage", "EmptyFlux2LatentImage", "EmptyLatentImage"]:
-                if "width" in inputs:
-                    inputs["width"] = width
-                if "height" in inputs:
-                    inputs["height"] = height
-            
-            # 设置调度器尺寸
-            if class_type == "Flux2Scheduler":
-                if "width" in inputs:
-                    inputs["width"] = width
-                if "height" in inputs:
-                    inputs["height"] = height
-            
-            # 注入提示词
-            node_id_str = str(node_id)
-            if "text" in inputs:
-                current_text = inputs.get("text", "")
-                if isinstance(current_text, str):
-                    if prompt_node_id and node_id_str == prompt_node_id:
-                        inputs["text"] = prompt
-                        modified_count += 1
-                    elif "{CHARACTER_PROMPT}" in current_text:
-                        inputs["text"] = prompt
-                        modified_count += 1
-                    elif current_text == "" or current_text == "prompt here":
-                        inputs["text"] = prompt
-                        modified_count += 1
+        # 设置 SaveImage 节点的 filename_prefix
+        if save_prefix:
+            for node_id in compiled.nodes_by_type.get("SaveImage", []):
+                if not save_image_node_id or node_id == save_image_node_id:
+                    api_workflow[node_id].get("inputs", {})["filename_prefix"] = save_prefix
+        
+        # 设置图片/调度器尺寸
+        compiled.set_size(api_workflow, width, height)
+        
+        # 注入提示词：指定的提示词节点，或文本为 {CHARACTER_PROMPT}/空/"prompt here" 的节点
+        for node_id, is_prompt_text in compiled.text_nodes:
+            if is_prompt_text or (prompt_node_id and node_id == prompt_node_id):
+                api_workflow[node_id]["inputs"]["text"] = prompt
+                injected.append((node_id, "text"))
         
         # 回退：自动查找 CLIPTextEncode
-        if modified_count == 0 and not prompt_node_id:
-            for node_id, node in api_workflow.items():
-                if not isinstance(node, dict):
-                    continue
-                
-                class_type = node.get("class_type", "")
-                inputs = node.get("inputs", {})
-                
-                if class_type == "CLIPTextEncode":
-                    current_text = inputs.get("text", "")
-                    if isinstance(current_text, str):
-                        if any(kw in current_text.lower() for kw in ["negative", "bad", "worst"]):
-                            continue
-                        if "三视图" in current_text or "正面" in current_text:
-                            continue
-                    
-                    inputs["text"] = prompt
-                    modified_count += 1
-                    break
+        if not injected and not prompt_node_id and compiled.fallback_prompt_node:
+            node_id = compiled.fallback_prompt_node
+            api_workflow[node_id].get("inputs", {})["text"] = prompt
+            injected.append((node_id, "text"))
         
         # 设置随机种子
-        self._set_random_seed(api_workflow, random.randint(1, 2**32))
+        compiled.set_seed(api_workflow, self._task_seed())
         
-        # 替换 ##STYLE## 占位符
-        self._replace_style_placeholder(api_workflow, style)
+        # 替换 ##STYLE## 占位符（包括注入的提示词中的占位符）
+        compiled.replace_placeholders(api_workflow, {STYLE_PLACEHOLDER: style}, extra_inputs=injected)
         
         return api_workflow
     
@@ -602,13 +589,10 @@ class WorkflowBuilder:
             return True
         
         # 查找 LoadImage 节点
-        load_image_count = 0
-        for nid, node in workflow.items():
-            if node.get("class_type") == "LoadImage":
-                if load_image_count == image_index:
-                    workflow[nid]["inputs"]["image"] = filename
-                    return True
-                load_image_count += 1
+        load_image_nodes = find_nodes_by_type(workflow, "LoadImage")
+        if image_index < len(load_image_nodes):
+            workflow[load_image_nodes[image_index]]["inputs"]["image"] = filename
+            return True
 
         return False
 
@@ -622,12 +606,7 @@ class WorkflowBuilder:
         """
         从 LoadImage 节点开始，断开下游参考图链路的输入连接
 
-        当参考图节点未上传图片时，应该断开下游使用 latent、pixels、image 类型输入的连接，
-        而不是直接删除节点，这样可以避免工作流报错，兼容性更好。
-
-        匹配规则：
-        - latent、pixels：精确匹配
-        - image：支持 image 或 image 后跟数字（如 image1, image2, image_1）
+        见 app.utils.workflow_disconnect.disconnect_reference_chain。
 
         Args:
             workflow: 工作流字典
@@ -636,63 +615,7 @@ class WorkflowBuilder:
         Returns:
             修改后的工作流
         """
-        # 需要断开的输入类型
-        # latent 和 pixels 精确匹配
-        # image 支持后跟数字（如 image1, image2, image_1 等）
-        EXACT_MATCH_TYPES = {"latent", "pixels"}
-
-        # 追踪已访问的节点，避免循环
-        visited = set()
-        # 待处理的节点队列
-        queue = [str(start_node_id)]
-
-        while queue:
-            current_node_id = queue.pop(0)
-
-            if current_node_id in visited:
-                continue
-            visited.add(current_node_id)
-
-            # 查找所有引用当前节点的下游节点
-            for node_id, node in workflow.items():
-                if not isinstance(node, dict):
-                    continue
-
-                inputs = node.get("inputs", {})
-                inputs_to_disconnect = []
-
-                for input_name, input_value in inputs.items():
-                    # 检查是否是连接到当前节点的输入
-                    if isinstance(input_value, list) and len(input_value) >= 2:
-                        source_node_id = str(input_value[0])
-                        if source_node_id == current_node_id:
-                            input_name_lower = input_name.lower()
-                            should_disconnect = False
-
-                            # 精确匹配 latent 和 pixels
-                            if input_name_lower in EXACT_MATCH_TYPES:
-                                should_disconnect = True
-                            # image 类型：支持 image 或 image 后跟数字（如 image1, image2, image_1）
-                            elif input_name_lower == "image":
-                                should_disconnect = True
-                            elif input_name_lower.startswith("image"):
-                                suffix = input_name_lower[5:]  # 去掉 "image" 前缀
-                                # 允许空字符串（即 "image"）或纯数字或 _数字
-                                if suffix.isdigit() or (suffix.startswith("_") and suffix[1:].isdigit()):
-                                    should_disconnect = True
-
-                            if should_disconnect:
-                                inputs_to_disconnect.append(input_name)
-                            # 将下游节点加入队列继续追踪
-                            if node_id not in visited:
-                                queue.append(str(node_id))
-
-                # 断开匹配的输入连接
-                for input_name in inputs_to_disconnect:
-                    del inputs[input_name]
-                    print(f"[Workflow] Disconnected input '{input_name}' from node {node_id} (source: {current_node_id})")
-
-        return workflow
+        return workflow_disconnect.disconnect_reference_chain(workflow, start_node_id)
 
     # ==================== 节点映射解析 ====================
 
@@ -785,7 +708,7 @@ class WorkflowBuilder:
     ) -> Dict[str, Any]:
         """构建 Flux 角色人设生成工作流"""
         if seed is None:
-            seed = random.randint(1, 2**32 - 1)
+            seed = self._task_seed()
         
         workflow = {
             "1": {
@@ -906,8 +829,19 @@ class WorkflowBuilder:
 
         return False
 
+    @staticmethod
+    def _task_seed() -> int:
+        """当前任务固定的种子（任务重试时不变），不在任务中执行时随机生成"""
+        from app.services.scheduler.events import get_current_seed
+        seed = get_current_seed()
+        return seed if seed is not None else random.randint(1, 2**32 - 1)
+
     def _set_random_seed(self, workflow: Dict[str, Any], seed: int):
-        """设置随机种子"""
+        """设置随机种子（编译模板生成的工作流直接按补丁点写入）"""
+        template = getattr(workflow, "template", None)
+        if template is not None:
+            template.set_seed(workflow, seed)
+            return
         for node_id, node in workflow.items():
             if not isinstance(node, dict):
                 continue
@@ -915,87 +849,34 @@ class WorkflowBuilder:
             inputs = node.get("inputs", {})
             class_type = node.get("class_type", "")
             
-            if class_type in ["KSampler", "KSamplerAdvanced", "SamplerCustom", 
-                             "SamplerCustomAdvanced", "RandomNoise", "PainterSamplerLTXV"]:
-                if "seed" in inputs:
-                    inputs["seed"] = seed
-                if "noise_seed" in inputs:
-                    inputs["noise_seed"] = seed
-    
-    def _replace_style_placeholder(self, workflow: Dict[str, Any], style: str):
-        """替换 ##STYLE## 占位符"""
-        if not style:
-            return
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
-                continue
-            inputs = node.get("inputs", {})
-            for key, value in inputs.items():
-                if isinstance(value, str) and "##STYLE##" in value:
-                    inputs[key] = value.replace("##STYLE##", style)
-                    print(f"[Workflow] Replaced ##STYLE## with '{style}' in node {node_id}.{key}")
-
-    def _replace_scene_placeholder(self, workflow: Dict[str, Any], scene_setting: Optional[str]):
-        """替换 ##SCENE## 占位符
-
-        Args:
-            workflow: 工作流字典
-            scene_setting: 场景环境设定，来自 Scene.setting 字段
-        """
-        if not scene_setting:
-            return
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
-                continue
-            inputs = node.get("inputs", {})
-            for key, value in inputs.items():
-                if isinstance(value, str) and "##SCENE##" in value:
-                    inputs[key] = value.replace("##SCENE##", scene_setting)
-                    print(f"[Workflow] Replaced ##SCENE## with '{scene_setting}' in node {node_id}.{key}")
-
-    def _replace_characters_placeholder(self, workflow: Dict[str, Any], character_appearances: Optional[Dict[str, str]]):
-        """替换 ##CHARACTERS## 占位符
-
-        Args:
-            workflow: 工作流字典
-            character_appearances: 角色外貌描述映射 {角色名: 外貌描述}
-        """
-        if not character_appearances:
-            return
-        # 合并所有角色的外貌描述
-        merged = ", ".join([app for app in character_appearances.values() if app])
-        if not merged:
-            return
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
-                continue
-            inputs = node.get("inputs", {})
-            for key, value in inputs.items():
-                if isinstance(value, str) and "##CHARACTERS##" in value:
-                    inputs[key] = value.replace("##CHARACTERS##", merged)
-                    print(f"[Workflow] Replaced ##CHARACTERS## with '{merged}' in node {node_id}.{key}")
-
-    def _replace_props_placeholder(self, workflow: Dict[str, Any], prop_appearances: Optional[Dict[str, str]]):
-        """替换 ##PROPS## 占位符
+            if class_type in SEED_NODE_TYPES:
+                for name in SEED_INPUT_NAMES:
+                    if name in inputs:
+                        inputs[name] = seed
 
-        Args:
-            workflow: 工作流字典
-            prop_appearances: 道具外观描述映射 {道具名: 外观描述}
-        """
-        if not prop_appearances:
-            return
-        # 合并所有道具的外观描述
-        merged = ", ".join([app for app in prop_appearances.values() if app])
-        if not merged:
-            return
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
-                continue
-            inputs = node.get("inputs", {})
-            for key, value in inputs.items():
-                if isinstance(value, str) and "##PROPS##" in value:
-                    inputs[key] = value.replace("##PROPS##", merged)
-                    print(f"[Workflow] Replaced ##PROPS## with '{merged}' in node {node_id}.{key}")
+    def _replace_placeholders(
+        self,
+        compiled: CompiledWorkflow,
+        workflow: Dict[str, Any],
+        style: Optional[str],
+        scene_setting: Optional[str],
+        character_appearances: Optional[Dict[str, str]],
+        prop_appearances: Optional[Dict[str, str]]
+    ):
+        """按补丁点替换 ##STYLE##、##SCENE##、##CHARACTERS##、##PROPS## 占位符"""
+        compiled.replace_placeholders(workflow, {
+            STYLE_PLACEHOLDER: style,
+            SCENE_PLACEHOLDER: scene_setting,
+            CHARACTERS_PLACEHOLDER: self._merge_appearances(character_appearances),
+            PROPS_PLACEHOLDER: self._merge_appearances(prop_appearances),
+        })
+
+    @staticmethod
+    def _merge_appearances(appearances: Optional[Dict[str, str]]) -> str:
+        """合并多个角色/道具的外貌描述"""
+        if not appearances:
+            return ""
+        return ", ".join([app for app in appearances.values() if app])
     
     def convert_ui_to_api(self, workflow: Dict[str, Any]) -> Dict[str, Any]:
         """将 ComfyUI UI 格式转换为 API 格式"""
@@ -4,10 +4,11 @@ ComfyUI 实时监控服务
 """
 import asyncio
 import json
-import httpx
 from typing import Dict, Any, Optional
 from datetime import datetime
 
+from app.core.http_client import http_client
+
 # 启用 WebSocket 模式（局域网低延迟环境下更实时）
 USE_WEBSOCKET = True
 
@@ -191,7 +192,7 @@ class ComfyUIMonitor:
         """通过 HTTP 获取系统状态"""
         try:
             print(f"[ComfyUIMonitor] 正在获取系统状态: {self.base_url}/system_stats")
-            async with httpx.AsyncClient() as client:
+            async with http_client(self.base_url) as client:
                 # 获取系统状态
                 response = await client.get(
                     f"{self.base_url}/system_stats",
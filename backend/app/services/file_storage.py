@@ -1,12 +1,53 @@
 """
 文件存储服务 - 管理小说相关的所有资源文件
 """
+import asyncio
+import multiprocessing
 import os
-import httpx
 import shutil
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from datetime import datetime
+from urllib.parse import urlparse
+from urllib.request import url2pathname
+
+from app.core.config import get_settings
+from app.core.http_client import http_client
+from app.utils import video_normalizer
+
+
+# 视频片段标准化进程池
+_normalize_pool: Optional[ProcessPoolExecutor] = None
+_normalize_threads = 0
+
+
+def get_video_normalize_pool() -> Tuple[ProcessPoolExecutor, int]:
+    """
+    获取视频标准化进程池
+
+    Returns:
+        (进程池, 单个 ffmpeg 编码线程数)
+    """
+    global _normalize_pool, _normalize_threads
+    if _normalize_pool is None:
+        cpu_count = os.cpu_count() or 1
+        workers = get_settings().VIDEO_NORMALIZE_WORKERS or cpu_count
+        # 多个编码进程并行时限制各自线程数，避免 CPU 超额订阅
+        _normalize_threads = max(1, cpu_count // workers)
+        _normalize_pool = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _normalize_pool, _normalize_threads
+
+
+def shutdown_video_normalize_pool():
+    """关闭视频标准化进程池"""
+    global _normalize_pool
+    if _normalize_pool is not None:
+        _normalize_pool.shutdown(wait=False, cancel_futures=True)
+        _normalize_pool = None
 
 
 class FileStorageService:
@@ -26,6 +67,8 @@ class FileStorageService:
             self.base_dir = Path(base_dir)
         
         self.base_dir.mkdir(parents=True, exist_ok=True)
+        # 合并视频时标准化片段的缓存目录
+        self.normalized_cache_dir = self.base_dir / ".cache" / "normalized_clips"
     
     def _get_story_dir(self, novel_id: str) -> Path:
         """获取小说目录"""
@@ -42,6 +85,35 @@ class FileStorageService:
             name = name.replace(char, '_')
         return name.strip()
     
+    async def fetch_url_content(self, url: str, timeout: float = 60.0) -> bytes:
+        """
+        读取 URL 内容
+
+        支持 ComfyUI 的 view URL 和生成结果记忆返回的本地文件 URI（file://）
+        """
+        if url.startswith("file://"):
+            path = url2pathname(urlparse(url).path)
+            return await asyncio.to_thread(Path(path).read_bytes)
+        async with http_client(url) as client:
+            response = await client.get(url, timeout=timeout)
+            response.raise_for_status()
+            return response.content
+
+    def fallback_url(self, url: str) -> str:
+        """
+        下载失败时保存到任务/资源记录的 URL
+
+        生成结果记忆返回的本地文件 URI（file://）转为 /api/files/ URL，其余 URL 原样返回
+        """
+        if not url or not url.startswith("file://"):
+            return url
+        path = Path(url2pathname(urlparse(url).path)).resolve()
+        try:
+            relative_path = path.relative_to(self.base_dir.resolve())
+        except ValueError:
+            return url
+        return f"/api/files/{relative_path.as_posix()}"
+
     async def download_image(self, url: str, novel_id: str, character_name: str,
                             image_type: str = "character", chapter_id: str = None) -> Optional[str]:
         """
@@ -81,13 +153,11 @@ class FileStorageService:
             file_path = save_dir / filename
 
             # 下载图片
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=60.0)
-                response.raise_for_status()
+            content = await self.fetch_url_content(url, timeout=60.0)
 
-                # 保存文件
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+            # 保存文件
+            with open(file_path, 'wb') as f:
+                f.write(content)
 
             print(f"[FileStorage] Image saved: {file_path}")
             return str(file_path)
@@ -132,13 +202,11 @@ class FileStorageService:
             file_path = save_dir / filename
 
             # 下载音频
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=120.0)
-                response.raise_for_status()
+            content = await self.fetch_url_content(url, timeout=120.0)
 
-                # 保存文件
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+            # 保存文件
+            with open(file_path, 'wb') as f:
+                f.write(content)
 
             print(f"[FileStorage] Audio saved: {file_path}")
             return str(file_path)
@@ -177,12 +245,9 @@ class FileStorageService:
             file_path = save_dir / filename
             
             # 下载视频
-            async with httpx.AsyncClient() as client:
-                response = await client.get(url, timeout=120.0)
-                response.raise_for_status()
-                
-                with open(file_path, 'wb') as f:
-                    f.write(response.content)
+            content = await self.fetch_url_content(url, timeout=120.0)
+            with open(file_path, 'wb') as f:
+                f.write(content)
             
             print(f"[FileStorage] Video saved: {file_path}")
             return str(file_path)
@@ -611,8 +676,6 @@ class FileStorageService:
             import subprocess
             import asyncio
             import tempfile
-            import os
-            import json
             
             if not video_paths or len(video_paths) == 0:
                 return {"success": False, "message": "没有视频文件"}
@@ -633,108 +696,46 @@ class FileStorageService:
             
             print(f"[FileStorage] Merging {len(final_video_list)} videos: {final_video_list}")
 
-            async def _get_video_info(video_path: str) -> Dict[str, Any]:
-                loop = asyncio.get_event_loop()
-
-                def _run_ffprobe():
-                    return subprocess.run(
-                        [
-                            'ffprobe',
-                            '-v', 'error',
-                            '-show_entries', 'stream=codec_type,width,height',
-                            '-of', 'json',
-                            video_path,
-                        ],
-                        capture_output=True,
-                        text=True,
-                    )
-
-                result = await loop.run_in_executor(None, _run_ffprobe)
-                if result.returncode != 0:
-                    raise RuntimeError(f"ffprobe failed for {video_path}: {result.stderr}")
-
-                data = json.loads(result.stdout or '{}')
-                streams = data.get('streams', [])
-                if not streams:
-                    raise RuntimeError(f"No video stream found in {video_path}")
-
-                video_stream = next((stream for stream in streams if stream.get('codec_type') == 'video'), None)
-                if not video_stream:
-                    raise RuntimeError(f"No video stream found in {video_path}")
-
-                return {
-                    'width': int(video_stream.get('width') or 0),
-                    'height': int(video_stream.get('height') or 0),
-                    'has_audio': any(stream.get('codec_type') == 'audio' for stream in streams),
-                }
-
-            target_info = await _get_video_info(final_video_list[0])
+            loop = asyncio.get_event_loop()
+            target_info = await loop.run_in_executor(None, video_normalizer.probe_video, final_video_list[0])
             target_width = target_info['width']
             target_height = target_info['height']
 
             if target_width <= 0 or target_height <= 0:
                 return {"success": False, "message": "无法读取目标视频分辨率"}
 
-            temp_normalized_dir = tempfile.mkdtemp(prefix='novelflow_merge_')
-            normalized_paths = []
+            # 并行标准化各片段：已符合目标格式的直接使用，未变化的片段命中缓存
+            pool, threads = get_video_normalize_pool()
+            cache_dir = str(self.normalized_cache_dir)
+            results = await asyncio.gather(*[
+                loop.run_in_executor(
+                    pool, video_normalizer.normalize_clip,
+                    video_path, cache_dir, target_width, target_height, threads
+                )
+                for video_path in final_video_list
+            ])
+
+            for result in results:
+                if not result["success"]:
+                    print(f"[FileStorage] Normalize error: {result['message']}")
+                    return {
+                        "success": False,
+                        "message": f"视频标准化失败: {result['message'][:200]}"
+                    }
+            normalized_paths = [result["path"] for result in results]
+            status_counts = {}
+            for result in results:
+                status_counts[result["status"]] = status_counts.get(result["status"], 0) + 1
+            print(f"[FileStorage] Normalized clips: {status_counts}")
+
             concat_file = None
 
             # 创建临时文件列表
             try:
-                loop = asyncio.get_event_loop()
-
-                for index, video_path in enumerate(final_video_list):
-                    normalized_path = os.path.join(temp_normalized_dir, f'normalized_{index:03d}.mp4')
-                    video_info = await _get_video_info(video_path)
-                    normalize_cmd = [
-                        'ffmpeg',
-                        '-i', video_path,
-                    ]
-
-                    if not video_info['has_audio']:
-                        normalize_cmd.extend([
-                            '-f', 'lavfi',
-                            '-i', 'anullsrc=channel_layout=stereo:sample_rate=48000',
-                        ])
-
-                    normalize_cmd.extend([
-                        '-vf', f'scale={target_width}:{target_height}:force_original_aspect_ratio=decrease,pad={target_width}:{target_height}:(ow-iw)/2:(oh-ih)/2:black,fps=24,format=yuv420p',
-                        '-c:v', 'libx264',
-                        '-preset', 'medium',
-                        '-crf', '18',
-                        '-c:a', 'aac',
-                        '-ar', '48000',
-                        '-ac', '2',
-                    ])
-
-                    if not video_info['has_audio']:
-                        normalize_cmd.append('-shortest')
-
-                    normalize_cmd.extend([
-                        '-movflags', '+faststart',
-                        '-y',
-                        normalized_path,
-                    ])
-
-                    print(f"[FileStorage] Normalizing video: {' '.join(normalize_cmd)}")
-
-                    def _run_normalize(cmd=normalize_cmd):
-                        return subprocess.run(cmd, capture_output=True, text=True)
-
-                    normalize_result = await loop.run_in_executor(None, _run_normalize)
-                    if normalize_result.returncode != 0:
-                        print(f"[FileStorage] Normalize error: {normalize_result.stderr}")
-                        return {
-                            "success": False,
-                            "message": f"视频标准化失败: {normalize_result.stderr[:200]}"
-                        }
-
-                    normalized_paths.append(normalized_path)
-
                 with tempfile.NamedTemporaryFile(mode='w', suffix='.txt', delete=False) as f:
                     concat_file = f.name
                     for video_path in normalized_paths:
-                        escaped_path = video_path.replace("'", "'\\''")
+                        escaped_path = os.path.abspath(video_path).replace("'", "'\\''")
                         f.write(f"file '{escaped_path}'\n")
             
                 # 使用 ffmpeg 合并视频
@@ -754,9 +755,6 @@ class FileStorageService:
                 
                 print(f"[FileStorage] Running ffmpeg: {' '.join(cmd)}")
                 
-                # 在线程池中执行
-                loop = asyncio.get_event_loop()
-                
                 def _run_ffmpeg():
                     result = subprocess.run(
                         cmd,
@@ -793,7 +791,8 @@ class FileStorageService:
             finally:
                 if concat_file and os.path.exists(concat_file):
                     os.unlink(concat_file)
-                shutil.rmtree(temp_normalized_dir, ignore_errors=True)
+                max_bytes = get_settings().VIDEO_NORMALIZE_CACHE_MAX_MB * 1024 * 1024
+                await loop.run_in_executor(None, video_normalizer.prune_cache, cache_dir, max_bytes)
             
         except Exception as e:
             import traceback
@@ -4,12 +4,26 @@ LLM 统一客户端模块
 提供 LLMClient 客户端和配置类，用于底层 LLM API 调用。
 对外暴露的服务层请使用 app.services.llm_service.LLMService。
 """
-from .base import LLMConfig, LLMResponse
+from .base import LLMConfig, LLMResponse, LLMStreamError
 from .client import LLMClient
+from .cache import LLMResponseCache, get_llm_cache
+from .log_sink import LLMLogSink, get_llm_log_sink
+from .limiter import LLMLimiterRegistry, get_llm_limiter
+from .router import LLMRouter, build_llm_router, get_llm_route_stats
 
 
 __all__ = [
     "LLMConfig",
     "LLMResponse",
+    "LLMStreamError",
     "LLMClient",
+    "LLMResponseCache",
+    "get_llm_cache",
+    "LLMLogSink",
+    "get_llm_log_sink",
+    "LLMLimiterRegistry",
+    "get_llm_limiter",
+    "LLMRouter",
+    "build_llm_router",
+    "get_llm_route_stats",
 ]
\ No newline at end of file
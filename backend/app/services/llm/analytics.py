@@ -0,0 +1,236 @@
+"""
+LLM 调用统计
+
+日志写入时按（小时、厂商、模型、任务类型）汇总到 llm_log_rollups 表：
+- 调用次数、失败次数、缓存命中次数
+- 耗时与响应长度的固定分桶直方图，查询时按直方图线性插值估算分位数
+
+统计查询只读取汇总表，日志量达到百万级时仍能快速返回，用于比较各厂商/模型的延迟与稳定性。
+"""
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+# 耗时分桶上界（秒），最后一个桶为无上界
+DURATION_BUCKETS: Tuple[float, ...] = (
+    0.25, 0.5, 1, 2, 3, 5, 8, 12, 20, 30, 45, 60, 90, 120, 180, 300, 600
+)
+# 响应长度分桶上界（字符数）
+RESPONSE_BUCKETS: Tuple[float, ...] = (
+    100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000, 64000, 128000
+)
+
+# 统计接口支持的时间粒度与分组维度
+INTERVALS = {"hour": timedelta(hours=1), "day": timedelta(days=1)}
+GROUP_FIELDS = ("provider", "model", "task_type")
+
+# 按天汇总时使用上海时间划分日期
+SHANGHAI_TZ = timezone(timedelta(hours=8))
+
+RollupKey = Tuple[datetime, str, str, str]
+
+
+def bucket_index(bounds: Sequence[float], value: float) -> int:
+    for i, bound in enumerate(bounds):
+        if value <= bound:
+            return i
+    return len(bounds)
+
+
+def histogram_percentile(
+    bounds: Sequence[float], counts: Sequence[int], q: float, max_value: Optional[float] = None
+) -> Optional[float]:
+    """
+    根据分桶计数估算分位数（桶内线性插值）
+
+    Args:
+        bounds: 分桶上界
+        counts: 各桶计数（长度为 len(bounds) + 1）
+        q: 分位数（0~1）
+        max_value: 观测最大值，用作无上界桶与结果的上限
+    """
+    total = sum(counts)
+    if total <= 0:
+        return None
+    target = q * total
+    seen = 0
+    for i, count in enumerate(counts):
+        if count <= 0:
+            continue
+        if seen + count >= target:
+            lower = bounds[i - 1] if i > 0 else 0.0
+            upper = bounds[i] if i < len(bounds) else (max_value if max_value is not None else lower)
+            if max_value is not None:
+                upper = min(upper, max_value)
+                lower = min(lower, upper)
+            value = lower + (upper - lower) * (target - seen) / count
+            return round(value, 3)
+        seen += count
+    return max_value
+
+
+def _hour_start(dt: datetime) -> datetime:
+    if dt.tzinfo is not None:
+        dt = dt.astimezone(timezone.utc).replace(tzinfo=None)
+    return dt.replace(minute=0, second=0, microsecond=0)
+
+
+@dataclass
+class RollupDelta:
+    """一个汇总行的增量"""
+    requests: int = 0
+    errors: int = 0
+    cached: int = 0
+    duration_count: int = 0
+    duration_sum: float = 0.0
+    duration_max: float = 0.0
+    duration_histogram: List[int] = field(default_factory=lambda: [0] * (len(DURATION_BUCKETS) + 1))
+    response_chars_sum: int = 0
+    response_chars_max: int = 0
+    response_histogram: List[int] = field(default_factory=lambda: [0] * (len(RESPONSE_BUCKETS) + 1))
+
+    def add_record(self, record: Dict[str, Any]):
+        self.requests += 1
+        if record.get("status") == "error":
+            self.errors += 1
+        if record.get("cached"):
+            self.cached += 1
+        elif record.get("duration") is not None:
+            duration = float(record["duration"])
+            self.duration_count += 1
+            self.duration_sum += duration
+            self.duration_max = max(self.duration_max, duration)
+            self.duration_histogram[bucket_index(DURATION_BUCKETS, duration)] += 1
+        if record.get("status") != "error":
+            chars = len(record.get("response") or "")
+            self.response_chars_sum += chars
+            self.response_chars_max = max(self.response_chars_max, chars)
+            self.response_histogram[bucket_index(RESPONSE_BUCKETS, chars)] += 1
+
+    def merge(self, other: "RollupDelta"):
+        self.requests += other.requests
+        self.errors += other.errors
+        self.cached += other.cached
+        self.duration_count += other.duration_count
+        self.duration_sum += other.duration_sum
+        self.duration_max = max(self.duration_max, other.duration_max)
+        self.duration_histogram = _add_counts(self.duration_histogram, other.duration_histogram)
+        self.response_chars_sum += other.response_chars_sum
+        self.response_chars_max = max(self.response_chars_max, other.response_chars_max)
+        self.response_histogram = _add_counts(self.response_histogram, other.response_histogram)
+
+    @classmethod
+    def from_row(cls, row) -> "RollupDelta":
+        return cls(
+            requests=row.requests or 0,
+            errors=row.errors or 0,
+            cached=row.cached or 0,
+            duration_count=row.duration_count or 0,
+            duration_sum=row.duration_sum or 0.0,
+            duration_max=row.duration_max or 0.0,
+            duration_histogram=_load_counts(row.duration_histogram, len(DURATION_BUCKETS) + 1),
+            response_chars_sum=row.response_chars_sum or 0,
+            response_chars_max=row.response_chars_max or 0,
+            response_histogram=_load_counts(row.response_histogram, len(RESPONSE_BUCKETS) + 1),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """汇总指标（请求量、错误率、耗时与响应长度分位数）"""
+        successes = self.requests - self.errors
+        return {
+            "requests": self.requests,
+            "errors": self.errors,
+            "error_rate": round(self.errors / self.requests, 4) if self.requests else 0.0,
+            "cached": self.cached,
+            "latency": {
+                "count": self.duration_count,
+                "avg": round(self.duration_sum / self.duration_count, 3) if self.duration_count else None,
+                "p50": histogram_percentile(DURATION_BUCKETS, self.duration_histogram, 0.5, self.duration_max),
+                "p95": histogram_percentile(DURATION_BUCKETS, self.duration_histogram, 0.95, self.duration_max),
+                "p99": histogram_percentile(DURATION_BUCKETS, self.duration_histogram, 0.99, self.duration_max),
+                "max": round(self.duration_max, 3) if self.duration_count else None,
+            },
+            "response_chars": {
+                "avg": round(self.response_chars_sum / successes) if successes > 0 else None,
+                "p50": histogram_percentile(RESPONSE_BUCKETS, self.response_histogram, 0.5, self.response_chars_max),
+                "p95": histogram_percentile(RESPONSE_BUCKETS, self.response_histogram, 0.95, self.response_chars_max),
+                "max": self.response_chars_max if successes > 0 else None,
+                "histogram": [
+                    {"le": bound, "count": count}
+                    for bound, count in zip(list(RESPONSE_BUCKETS) + [None], self.response_histogram)
+                ],
+            },
+        }
+
+
+def _add_counts(a: List[int], b: List[int]) -> List[int]:
+    return [x + y for x, y in zip(a, b)]
+
+
+def _load_counts(value: Optional[str], size: int) -> List[int]:
+    try:
+        counts = [int(c) for c in json.loads(value or "[]")]
+    except (TypeError, ValueError):
+        counts = []
+    return (counts + [0] * size)[:size]
+
+
+def aggregate_records(
+    records: Iterable[Dict[str, Any]], now: Optional[datetime] = None
+) -> Dict[RollupKey, RollupDelta]:
+    """将日志记录按（小时、厂商、模型、任务类型）聚合为汇总增量"""
+    now = now or datetime.utcnow()
+    deltas: Dict[RollupKey, RollupDelta] = {}
+    for record in records:
+        key = (
+            _hour_start(record.get("created_at") or now),
+            record.get("provider") or "",
+            record.get("model") or "",
+            record.get("task_type") or "",
+        )
+        deltas.setdefault(key, RollupDelta()).add_record(record)
+    return deltas
+
+
+def _interval_start(bucket_start: datetime, interval: str) -> datetime:
+    if interval == "day":
+        local = bucket_start.replace(tzinfo=timezone.utc).astimezone(SHANGHAI_TZ)
+        return local.replace(hour=0, minute=0, second=0, microsecond=0)
+    return bucket_start.replace(tzinfo=timezone.utc).astimezone(SHANGHAI_TZ)
+
+
+def summarize_rollups(
+    rows: Iterable[Any], interval: str = "hour", group_by: Sequence[str] = GROUP_FIELDS
+) -> Dict[str, Any]:
+    """
+    将小时汇总行合并为按时间粒度与分组维度的统计
+
+    Returns:
+        {
+            "groups": [{provider/model/task_type..., "summary": 指标, "series": [{"time", 指标}]}],
+            "total": 全部指标
+        }
+    """
+    total = RollupDelta()
+    groups: Dict[Tuple, Dict[str, Any]] = {}
+    for row in rows:
+        delta = RollupDelta.from_row(row)
+        total.merge(delta)
+        dims = tuple(getattr(row, name) for name in group_by)
+        group = groups.setdefault(dims, {"summary": RollupDelta(), "series": {}})
+        group["summary"].merge(delta)
+        point = _interval_start(row.bucket_start, interval)
+        group["series"].setdefault(point, RollupDelta()).merge(delta)
+
+    result = []
+    for dims, group in groups.items():
+        item = dict(zip(group_by, dims))
+        item["summary"] = group["summary"].to_dict()
+        item["series"] = [
+            {"time": point.isoformat(), **delta.to_dict()}
+            for point, delta in sorted(group["series"].items())
+        ]
+        result.append(item)
+    result.sort(key=lambda g: g["summary"]["requests"], reverse=True)
+    return {"groups": result, "total": total.to_dict()}
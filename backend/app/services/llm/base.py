@@ -3,10 +3,16 @@ LLM 服务基类定义
 
 定义所有 LLM 提供商必须实现的接口
 """
+import json
+import time
+import httpx
 from abc import ABC, abstractmethod
-from typing import Dict, Any, Optional
+from typing import Dict, Any, Optional, AsyncIterator
 from dataclasses import dataclass
 
+from app.core.http_client import http_client
+from .limiter import RETRYABLE_STATUS_CODES, get_api_key_override, parse_retry_after
+
 
 def save_llm_log(
     provider: str,
@@ -21,40 +27,41 @@ def save_llm_log(
     chapter_id: str = None,
     character_id: str = None,
     used_proxy: bool = False,
-    duration: float = None
+    duration: float = None,
+    cached: bool = False,
+    route: str = None
 ):
-    """保存 LLM 调用日志到数据库（异步执行，不阻塞主流程）"""
+    """保存 LLM 调用日志（加入批量写入队列，不阻塞主流程）
+
+    route 未指定时使用多厂商路由器为当前请求设置的路由决策。
+    """
     try:
-        from app.core.database import SessionLocal
-        from app.models.llm_log import LLMLog
         from app.constants import (
             LOG_SYSTEM_PROMPT_MAX_LENGTH,
             LOG_USER_PROMPT_MAX_LENGTH,
             LOG_RESPONSE_MAX_LENGTH,
             LOG_ERROR_MESSAGE_MAX_LENGTH,
         )
+        from .log_sink import get_llm_log_sink
+        from .router import get_route_note
 
-        db = SessionLocal()
-        try:
-            log = LLMLog(
-                provider=provider,
-                model=model,
-                system_prompt=system_prompt[:LOG_SYSTEM_PROMPT_MAX_LENGTH] if system_prompt else None,
-                user_prompt=user_prompt[:LOG_USER_PROMPT_MAX_LENGTH] if user_prompt else None,
-                response=response[:LOG_RESPONSE_MAX_LENGTH] if response else None,
-                status=status,
-                error_message=error_message[:LOG_ERROR_MESSAGE_MAX_LENGTH] if error_message else None,
-                task_type=task_type,
-                novel_id=novel_id,
-                chapter_id=chapter_id,
-                character_id=character_id,
-                used_proxy=used_proxy,
-                duration=duration
-            )
-            db.add(log)
-            db.commit()
-        finally:
-            db.close()
+        get_llm_log_sink().submit({
+            "provider": provider,
+            "model": model,
+            "system_prompt": system_prompt[:LOG_SYSTEM_PROMPT_MAX_LENGTH] if system_prompt else None,
+            "user_prompt": user_prompt[:LOG_USER_PROMPT_MAX_LENGTH] if user_prompt else "",
+            "response": response[:LOG_RESPONSE_MAX_LENGTH] if response else None,
+            "status": status,
+            "error_message": error_message[:LOG_ERROR_MESSAGE_MAX_LENGTH] if error_message else None,
+            "task_type": task_type,
+            "novel_id": novel_id,
+            "chapter_id": chapter_id,
+            "character_id": character_id,
+            "used_proxy": used_proxy,
+            "duration": duration,
+            "cached": cached,
+            "route": route if route is not None else get_route_note(),
+        })
     except Exception as e:
         print(f"[LLM Log] 保存日志失败：{e}")
 
@@ -75,6 +82,22 @@ class LLMConfig:
     https_proxy: Optional[str] = None
 
 
+class LLMStreamError(Exception):
+    """流式请求失败（HTTP 错误或连接中断）"""
+
+    def __init__(
+        self,
+        message: str,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        retryable: bool = False
+    ):
+        super().__init__(message)
+        self.status_code = status_code
+        self.retry_after = retry_after
+        self.retryable = retryable
+
+
 @dataclass
 class LLMResponse:
     """LLM 响应数据类"""
@@ -83,6 +106,10 @@ class LLMResponse:
     error: str = ""
     raw_response: Optional[Dict[str, Any]] = None
     duration: float = 0.0
+    # 失败时的 HTTP 状态码、Retry-After 秒数，以及是否可以重试（限流、服务端错误、连接错误）
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+    retryable: bool = False
 
 
 class BaseLLMProvider(ABC):
@@ -107,7 +134,10 @@ class BaseLLMProvider(ABC):
         return self.config.provider
 
     def _get_current_api_key(self) -> str:
-        """获取当前 API Key，支持轮询"""
+        """获取当前 API Key，优先使用限流器为本次请求选定的 Key，否则轮询"""
+        override = get_api_key_override()
+        if override and override in self._api_keys:
+            return override
         if not self._api_keys:
             return self.config.api_key or ""
 
@@ -126,6 +156,145 @@ class BaseLLMProvider(ABC):
 
         return self.config.https_proxy or self.config.http_proxy or None
 
+    def _http_client(self):
+        """借用当前 API 地址对应的共享连接池客户端
+
+        本地服务（ollama/custom）不读取环境变量中的代理。
+        """
+        is_local = self.config.provider in ("ollama", "custom")
+        return http_client(
+            self.config.api_url,
+            proxy=self._get_proxy_config(),
+            trust_env=not is_local
+        )
+
+    # ==================== 流式输出 ====================
+
+    # 子类实现 _parse_stream_chunk 后设为 True；不支持时流式调用退化为一次性返回完整内容
+    SUPPORTS_STREAMING = False
+
+    def _get_stream_endpoint(self) -> str:
+        """获取流式 API 端点 URL"""
+        return self._get_endpoint()
+
+    def _build_stream_body(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[str]
+    ) -> Dict[str, Any]:
+        """构建流式请求体"""
+        body = self._build_request_body(
+            system_prompt, user_content, temperature, max_tokens, response_format
+        )
+        body["stream"] = True
+        return body
+
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> str:
+        """从一条流式事件中提取文本增量"""
+        raise NotImplementedError
+
+    async def stream_chat_completion(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        response_format: Optional[str] = None,
+        task_type: str = None,
+        novel_id: str = None,
+        chapter_id: str = None,
+        character_id: str = None
+    ) -> AsyncIterator[str]:
+        """
+        流式对话请求，逐段产出文本增量
+
+        流结束后写入调用日志（内容为完整响应）。
+
+        Raises:
+            LLMStreamError: HTTP 错误或连接中断
+        """
+        if not self.SUPPORTS_STREAMING:
+            result = await self.chat_completion(
+                system_prompt=system_prompt,
+                user_content=user_content,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format=response_format,
+                task_type=task_type,
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                character_id=character_id
+            )
+            if not result.success:
+                raise LLMStreamError(
+                    result.error, result.status_code, result.retry_after, result.retryable
+                )
+            if result.content:
+                yield result.content
+            return
+
+        start_time = time.time()
+        endpoint = self._get_stream_endpoint()
+        headers = self._get_headers()
+        body = self._build_stream_body(
+            system_prompt, user_content, temperature, max_tokens, response_format
+        )
+        used_proxy = self._get_proxy_config() is not None
+        chunks = []
+        error_msg = None
+
+        try:
+            async with self._http_client() as client:
+                async with client.stream(
+                    "POST", endpoint, headers=headers, json=body, timeout=600
+                ) as response:
+                    if response.status_code != 200:
+                        text = (await response.aread()).decode("utf-8", errors="replace")
+                        raise LLMStreamError(
+                            f"API 错误 ({response.status_code}): {text}",
+                            status_code=response.status_code,
+                            retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                            retryable=response.status_code in RETRYABLE_STATUS_CODES
+                        )
+
+                    async for line in response.aiter_lines():
+                        data = _parse_stream_line(line)
+                        if data is None:
+                            continue
+                        delta = self._parse_stream_chunk(data)
+                        if delta:
+                            chunks.append(delta)
+                            yield delta
+        except LLMStreamError as e:
+            error_msg = str(e)
+            raise
+        except Exception as e:
+            error_detail = str(e) if str(e) else "(无详细错误信息)"
+            error_msg = f"请求异常：[{type(e).__name__}] {error_detail}"
+            print(f"[{type(self).__name__}] 流式请求失败：{error_msg}")
+            raise LLMStreamError(
+                error_msg, retryable=isinstance(e, httpx.TransportError)
+            ) from e
+        finally:
+            save_llm_log(
+                provider=self.config.provider,
+                model=self.config.model,
+                system_prompt=system_prompt,
+                user_prompt=user_content,
+                response="".join(chunks),
+                status="error" if error_msg else "success",
+                error_message=error_msg,
+                task_type=task_type,
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                character_id=character_id,
+                used_proxy=used_proxy,
+                duration=time.time() - start_time
+            )
+
     @abstractmethod
     async def chat_completion(
         self,
@@ -177,3 +346,24 @@ class BaseLLMProvider(ABC):
     def _get_headers(self) -> Dict[str, str]:
         """获取请求头"""
         pass
+
+
+def _parse_stream_line(line: str) -> Optional[Dict[str, Any]]:
+    """
+    解析流式响应的一行
+
+    支持 SSE（"data: {...}"）与逐行 JSON（NDJSON）两种格式，
+    空行、事件名、注释与结束标记返回 None。
+    """
+    line = line.strip()
+    if not line or line.startswith(":") or line.startswith("event:"):
+        return None
+    if line.startswith("data:"):
+        line = line[5:].strip()
+    if not line or line == "[DONE]":
+        return None
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
@@ -0,0 +1,152 @@
+"""
+LLM 响应缓存
+
+相同输入的 LLM 请求（重跑章节拆分、角色解析、测试用例回放等）直接返回上次的响应：
+- 键为厂商、接口地址、模型、系统提示词、用户内容、温度、最大 token 数、响应格式的规范化哈希
+- 存储在数据库 llm_response_cache 表中，进程重启后仍然有效
+- 按有效期与条目数上限（最久未使用）淘汰
+- 只缓存成功且通过调用方校验（如 JSON 解析）的响应，命中未通过校验的条目时删除并重新调用
+- 调用方要求重新生成（use_cache=False）时跳过读取；LLM_CACHE_ENABLED 为 False 时不读写
+"""
+import hashlib
+import json
+from typing import Any, Callable, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.db_executor import run_db
+from app.repositories.llm_cache import LLMCacheRepository
+
+# 每写入多少条执行一次淘汰
+_EVICT_EVERY = 20
+
+
+def make_cache_key(
+    provider: str,
+    model: str,
+    system_prompt: str,
+    user_content: str,
+    temperature: float,
+    response_format: Optional[str],
+    api_url: Optional[str] = None,
+    max_tokens: Optional[int] = None
+) -> str:
+    """计算请求的缓存键"""
+    canonical = json.dumps(
+        {
+            "provider": provider,
+            "api_url": (api_url or "").rstrip("/"),
+            "model": model,
+            "system_prompt": system_prompt or "",
+            "user_content": user_content or "",
+            "temperature": round(float(temperature), 4) if temperature is not None else None,
+            "max_tokens": max_tokens,
+            "response_format": response_format,
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """LLM 响应缓存"""
+
+    def __init__(self, session_factory: Callable = None):
+        if session_factory is None:
+            from app.core.database import SessionLocal
+            session_factory = SessionLocal
+        self._session_factory = session_factory
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return get_settings().LLM_CACHE_ENABLED
+
+    def _run(self, fn_name: str, *args):
+        db = self._session_factory()
+        try:
+            return getattr(LLMCacheRepository(db), fn_name)(*args)
+        finally:
+            db.close()
+
+    def _get(self, key: str) -> Optional[str]:
+        db = self._session_factory()
+        try:
+            entry = LLMCacheRepository(db).get(key, get_settings().LLM_CACHE_TTL)
+            return entry.response if entry is not None else None
+        finally:
+            db.close()
+
+    async def get(self, key: str, validate: Callable[[str], bool] = None) -> Optional[str]:
+        """
+        读取缓存的响应内容，未命中返回 None
+
+        Args:
+            validate: 调用方的响应校验，未通过校验的条目视为未命中并删除
+        """
+        try:
+            response = await run_db(self._get, key)
+        except Exception as e:
+            print(f"[LLMCache] 读取缓存失败：{e}")
+            response = None
+        if response is not None and validate is not None and not validate(response):
+            print(f"[LLMCache] 缓存的响应未通过校验，删除 {key[:12]}")
+            await self.delete(key)
+            response = None
+        if response is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return response
+
+    async def put(self, key: str, provider: str, model: str, response: str, task_type: str = None):
+        """写入缓存，并定期淘汰过期与超出上限的条目"""
+        settings = get_settings()
+        self._writes += 1
+        evict = self._writes % _EVICT_EVERY == 1
+        try:
+            await run_db(self._run, "put", key, provider, model, response, task_type)
+            if evict:
+                removed = await run_db(
+                    self._run, "evict", settings.LLM_CACHE_MAX_ENTRIES, settings.LLM_CACHE_TTL
+                )
+                if removed:
+                    print(f"[LLMCache] 淘汰 {removed} 条缓存")
+        except Exception as e:
+            print(f"[LLMCache] 写入缓存失败：{e}")
+
+    async def delete(self, key: str):
+        """删除缓存条目（调用方判定缓存的响应不可用时）"""
+        try:
+            await run_db(self._run, "delete", key)
+        except Exception as e:
+            print(f"[LLMCache] 删除缓存失败：{e}")
+
+    async def clear(self) -> int:
+        """清空缓存"""
+        return await run_db(self._run, "clear")
+
+    async def stats(self) -> Dict[str, Any]:
+        total = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": await run_db(self._run, "count"),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / total, 4) if total else 0.0,
+        }
+
+
+# 全局缓存实例
+_llm_cache: Optional[LLMResponseCache] = None
+
+
+def get_llm_cache() -> LLMResponseCache:
+    """获取 LLM 响应缓存实例"""
+    global _llm_cache
+    if _llm_cache is None:
+        _llm_cache = LLMResponseCache()
+    return _llm_cache
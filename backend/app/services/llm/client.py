@@ -3,10 +3,14 @@ LLM 统一客户端
 
 提供统一的 LLM 调用接口，支持多厂商切换和 API Key 轮询。
 """
+import asyncio
 import httpx
 import os
-from typing import Optional, Dict, Any, Type
-from .base import BaseLLMProvider, LLMConfig, LLMResponse
+from typing import Optional, Dict, Any, Type, AsyncIterator, Callable, Tuple
+from app.core.config import get_settings
+from .base import BaseLLMProvider, LLMConfig, LLMResponse, LLMStreamError, save_llm_log
+from .cache import get_llm_cache, make_cache_key
+from .limiter import estimate_tokens, get_llm_limiter, retry_delay, usage_tokens
 from .providers.openai import OpenAICompatibleProvider
 from .providers.anthropic import AnthropicProvider
 from .providers.gemini import GeminiProvider
@@ -68,7 +72,9 @@ class LLMClient:
         task_type: str = None,
         novel_id: str = None,
         chapter_id: str = None,
-        character_id: str = None
+        character_id: str = None,
+        use_cache: bool = True,
+        validate: Callable[[str], bool] = None
     ) -> Dict[str, Any]:
         """
         发送对话请求
@@ -83,29 +89,66 @@ class LLMClient:
             novel_id: 小说 ID
             chapter_id: 章节 ID
             character_id: 角色 ID
+            use_cache: 为 False 时跳过缓存读取，强制调用 LLM（结果仍写入缓存）
+            validate: 响应校验（如 JSON 解析），未通过校验的响应不写入缓存，缓存中的此类条目被删除
 
         Returns:
             兼容旧 LLMService 的格式：
             {
                 "success": bool,
                 "content": str,
-                "error": str (optional)
+                "error": str (optional),
+                "cached": bool (命中响应缓存时为 True)
             }
         """
-        result = await self._provider.chat_completion(
-            system_prompt=system_prompt,
-            user_content=user_content,
-            temperature=temperature,
-            max_tokens=max_tokens,
-            response_format=response_format,
-            task_type=task_type,
-            novel_id=novel_id,
-            chapter_id=chapter_id,
-            character_id=character_id
+        cache = get_llm_cache()
+        cache_key, cached = await self._cached_response(
+            system_prompt, user_content, temperature, max_tokens, response_format,
+            task_type, novel_id, chapter_id, character_id, use_cache, validate
         )
+        if cached is not None:
+            return {
+                "success": True,
+                "content": cached,
+                "raw_response": None,
+                "cached": True
+            }
+
+        limiter = get_llm_limiter().for_config(self.config)
+        tokens = estimate_tokens(system_prompt, user_content)
+        max_retries = max(0, get_settings().LLM_MAX_RETRIES)
+        attempt = 0
+        while True:
+            if limiter is None:
+                result = await self._call_provider(
+                    system_prompt, user_content, temperature, max_tokens, response_format,
+                    task_type, novel_id, chapter_id, character_id
+                )
+            else:
+                async with limiter.lease(tokens) as lease:
+                    result = await self._call_provider(
+                        system_prompt, user_content, temperature, max_tokens, response_format,
+                        task_type, novel_id, chapter_id, character_id
+                    )
+                    lease.release(
+                        result.success, result.status_code, result.retry_after,
+                        usage_tokens(result.raw_response)
+                    )
+
+            if result.success or not result.retryable or attempt >= max_retries:
+                break
+            # 启用限流时 Retry-After 已作为该 Key 的冷却时间，重试可立即换用其他 Key
+            delay = retry_delay(attempt, None if limiter else result.retry_after)
+            attempt += 1
+            print(f"[LLMClient] 请求失败（{result.error[:100]}），{delay:.1f}s 后第 {attempt} 次重试")
+            await asyncio.sleep(delay)
 
         # 转换为兼容旧 LLMService 的格式
         if result.success:
+            if cache_key and result.content and (validate is None or validate(result.content)):
+                await cache.put(
+                    cache_key, self.config.provider, self.config.model, result.content, task_type
+                )
             return {
                 "success": True,
                 "content": result.content,
@@ -117,3 +160,156 @@ class LLMClient:
                 "error": result.error,
                 "content": ""
             }
+
+    async def _cached_response(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[str],
+        task_type: str,
+        novel_id: str,
+        chapter_id: str,
+        character_id: str,
+        use_cache: bool,
+        validate: Optional[Callable[[str], bool]]
+    ) -> Tuple[Optional[str], Optional[str]]:
+        """
+        计算缓存键并读取响应缓存，命中时记录一条缓存命中的 LLM 日志
+
+        Returns:
+            (缓存键，未启用缓存时为 None；命中的响应内容，未命中或跳过读取时为 None)
+        """
+        cache = get_llm_cache()
+        if not cache.enabled:
+            return None, None
+        cache_key = make_cache_key(
+            self.config.provider, self.config.model, system_prompt,
+            user_content, temperature, response_format,
+            api_url=self.config.api_url, max_tokens=max_tokens
+        )
+        if not use_cache:
+            return cache_key, None
+        content = await cache.get(cache_key, validate)
+        if content is not None:
+            print(f"[LLMCache] 命中缓存：task_type={task_type}, model={self.config.model}")
+            save_llm_log(
+                provider=self.config.provider,
+                model=self.config.model,
+                system_prompt=system_prompt,
+                user_prompt=user_content,
+                response=content,
+                status="success",
+                task_type=task_type,
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                character_id=character_id,
+                duration=0.0,
+                cached=True
+            )
+        return cache_key, content
+
+    async def _call_provider(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[str],
+        task_type: str,
+        novel_id: str,
+        chapter_id: str,
+        character_id: str
+    ) -> LLMResponse:
+        return await self._provider.chat_completion(
+            system_prompt=system_prompt,
+            user_content=user_content,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            response_format=response_format,
+            task_type=task_type,
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            character_id=character_id
+        )
+
+    async def stream_chat_completion(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float = 0.7,
+        max_tokens: int = 4000,
+        response_format: Optional[str] = None,
+        task_type: str = None,
+        novel_id: str = None,
+        chapter_id: str = None,
+        character_id: str = None,
+        use_cache: bool = True,
+        validate: Callable[[str], bool] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式对话请求，逐段产出文本增量
+
+        命中响应缓存时一次性产出缓存内容；完整响应成功结束且通过 validate 校验后写入缓存。
+
+        Raises:
+            LLMStreamError: 请求失败或连接中断
+        """
+        cache = get_llm_cache()
+        cache_key, cached = await self._cached_response(
+            system_prompt, user_content, temperature, max_tokens, response_format,
+            task_type, novel_id, chapter_id, character_id, use_cache, validate
+        )
+        if cached is not None:
+            yield cached
+            return
+
+        limiter = get_llm_limiter().for_config(self.config)
+        tokens = estimate_tokens(system_prompt, user_content)
+        max_retries = max(0, get_settings().LLM_MAX_RETRIES)
+        chunks = []
+        attempt = 0
+        while True:
+            stream = self._provider.stream_chat_completion(
+                system_prompt=system_prompt,
+                user_content=user_content,
+                temperature=temperature,
+                max_tokens=max_tokens,
+                response_format=response_format,
+                task_type=task_type,
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                character_id=character_id
+            )
+            try:
+                if limiter is None:
+                    async for delta in stream:
+                        chunks.append(delta)
+                        yield delta
+                else:
+                    async with limiter.lease(tokens) as lease:
+                        try:
+                            async for delta in stream:
+                                lease.mark_first_chunk()
+                                chunks.append(delta)
+                                yield delta
+                        except LLMStreamError as e:
+                            lease.release(False, e.status_code, e.retry_after)
+                            raise
+                        lease.release(True)
+                break
+            except LLMStreamError as e:
+                # 已经产出内容后无法透明重试
+                if chunks or not e.retryable or attempt >= max_retries:
+                    raise
+                delay = retry_delay(attempt, None if limiter else e.retry_after)
+                attempt += 1
+                print(f"[LLMClient] 流式请求失败（{str(e)[:100]}），{delay:.1f}s 后第 {attempt} 次重试")
+                await asyncio.sleep(delay)
+
+        content = "".join(chunks)
+        if cache_key and content and (validate is None or validate(content)):
+            await cache.put(
+                cache_key, self.config.provider, self.config.model, content, task_type
+            )
@@ -0,0 +1,338 @@
+"""
+LLM 调用限流与并发控制
+
+每个 API Key 独立限流：
+- 令牌桶：按 LLM_KEY_RPM / LLM_KEY_TPM 限制每分钟请求数与 token 数（0 表示不限）
+- 自适应并发（AIMD）：请求成功且耗时正常时并发上限缓慢增加，
+  收到 429 时减半并按 Retry-After 冷却，耗时超过 LLM_LATENCY_TARGET 时小幅下调
+  （流式请求以首个片段的到达时间作为耗时，调用方提前结束读取或取消请求不计为失败）
+- 多个 Key 时选择当前最空闲（并发占用比例最低、额度最充足）的 Key
+
+可重试的失败（429、5xx、连接错误）由 LLMClient 按指数退避加随机抖动自动重试。
+"""
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+
+# 可重试的 HTTP 状态码
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# 当前请求使用的 API Key（由限流器选定，供提供商生成请求头）
+_api_key_override: ContextVar[Optional[str]] = ContextVar("llm_api_key_override", default=None)
+
+
+def get_api_key_override() -> Optional[str]:
+    return _api_key_override.get()
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头（秒数形式）"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        return None
+
+
+def estimate_tokens(*texts: str) -> int:
+    """粗略估算 token 数（中英文混合文本约 2 个字符一个 token）"""
+    return max(1, sum(len(t or "") for t in texts) // 2)
+
+
+def usage_tokens(raw_response: Optional[Dict[str, Any]]) -> Optional[int]:
+    """从响应中读取实际 token 用量（OpenAI / Anthropic / Gemini 格式）"""
+    if not isinstance(raw_response, dict):
+        return None
+    usage = raw_response.get("usage")
+    if isinstance(usage, dict):
+        if usage.get("total_tokens") is not None:
+            return int(usage["total_tokens"])
+        if usage.get("input_tokens") is not None:
+            return int(usage["input_tokens"]) + int(usage.get("output_tokens") or 0)
+    metadata = raw_response.get("usageMetadata")
+    if isinstance(metadata, dict) and metadata.get("totalTokenCount") is not None:
+        return int(metadata["totalTokenCount"])
+    return None
+
+
+def retry_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次重试前的等待时间（指数退避 + 随机抖动，不少于 Retry-After）"""
+    base = get_settings().LLM_RETRY_BASE_DELAY * (2 ** attempt)
+    return max(retry_after or 0.0, base * random.uniform(0.5, 1.5))
+
+
+class TokenBucket:
+    """按分钟补充的令牌桶"""
+
+    def __init__(self, per_minute: int):
+        self.per_minute = per_minute
+        self.tokens = float(per_minute)
+        self._updated = time.monotonic()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.per_minute <= 0
+
+    def _refill(self, now: float):
+        if self.unlimited:
+            return
+        elapsed = max(0.0, now - self._updated)
+        self._updated = now
+        self.tokens = min(float(self.per_minute), self.tokens + elapsed * self.per_minute / 60.0)
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """获得 amount 个令牌需要等待的秒数"""
+        if self.unlimited:
+            return 0.0
+        self._refill(now)
+        # 单次请求超过桶容量时按桶满放行，避免永远等待
+        amount = min(amount, self.per_minute)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) * 60.0 / self.per_minute
+
+    def consume(self, amount: float):
+        if not self.unlimited:
+            self._refill(time.monotonic())
+            self.tokens -= amount
+
+
+class KeyLimiter:
+    """单个 API Key 的限流状态"""
+
+    def __init__(self, key: str):
+        settings = get_settings()
+        self.key = key
+        self.rpm = TokenBucket(settings.LLM_KEY_RPM)
+        self.tpm = TokenBucket(settings.LLM_KEY_TPM)
+        self.concurrency = float(settings.LLM_KEY_INITIAL_CONCURRENCY)
+        self.in_flight = 0
+        self.cooldown_until = 0.0
+        self.requests = 0
+        self.throttled = 0
+        self.errors = 0
+        self.avg_latency: Optional[float] = None
+
+    @property
+    def limit(self) -> int:
+        return max(1, int(self.concurrency))
+
+    def wait_time(self, tokens: int, now: float) -> Optional[float]:
+        """可以发起请求前需要等待的秒数（并发已满时返回 None）"""
+        if self.in_flight >= self.limit:
+            return None
+        return max(
+            self.cooldown_until - now,
+            self.rpm.wait_time(1, now),
+            self.tpm.wait_time(tokens, now),
+            0.0,
+        )
+
+    def score(self) -> Tuple[float, float]:
+        """选择 Key 的排序依据：并发占用比例低、近期无限流者优先"""
+        return (self.in_flight / self.limit, self.throttled_recently)
+
+    @property
+    def throttled_recently(self) -> float:
+        return max(0.0, self.cooldown_until - time.monotonic())
+
+    def on_result(self, success: bool, status_code: Optional[int], retry_after: Optional[float], latency: float):
+        """根据请求结果调整并发上限（AIMD）"""
+        settings = get_settings()
+        self.requests += 1
+        if status_code == 429:
+            self.throttled += 1
+            self.concurrency = max(1.0, self.concurrency / 2)
+            cooldown = retry_after if retry_after is not None else settings.LLM_RETRY_BASE_DELAY
+            self.cooldown_until = max(self.cooldown_until, time.monotonic() + cooldown)
+            print(f"[LLMLimiter] Key {mask_key(self.key)} 被限流，并发上限降为 {self.limit}，冷却 {cooldown:.1f}s")
+            return
+        if not success:
+            self.errors += 1
+            if status_code is not None and status_code >= 500:
+                self.concurrency = max(1.0, self.concurrency * 0.75)
+            return
+
+        self.avg_latency = latency if self.avg_latency is None else self.avg_latency * 0.8 + latency * 0.2
+        if latency > settings.LLM_LATENCY_TARGET:
+            self.concurrency = max(1.0, self.concurrency * 0.9)
+        else:
+            self.concurrency = min(
+                float(settings.LLM_KEY_MAX_CONCURRENCY), self.concurrency + 1.0 / self.concurrency
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        return {
+            "key": mask_key(self.key),
+            "in_flight": self.in_flight,
+            "concurrency_limit": self.limit,
+            "saturated": self.in_flight >= self.limit or self.cooldown_until > now,
+            "cooldown_remaining": round(max(0.0, self.cooldown_until - now), 1),
+            "rpm_available": None if self.rpm.unlimited else round(self.rpm.tokens, 1),
+            "tpm_available": None if self.tpm.unlimited else round(self.tpm.tokens),
+            "requests": self.requests,
+            "throttled": self.throttled,
+            "errors": self.errors,
+            "avg_latency": round(self.avg_latency, 2) if self.avg_latency is not None else None,
+        }
+
+
+def mask_key(key: str) -> str:
+    if not key:
+        return "(none)"
+    if len(key) <= 8:
+        return key[:2] + "***"
+    return f"{key[:4]}***{key[-4:]}"
+
+
+@dataclass
+class KeyLease:
+    """一次请求占用的 Key"""
+    limiter: KeyLimiter
+    tokens: int
+    started: float
+    released: bool = False
+    # 流式请求首个片段的到达耗时（秒）
+    first_chunk_latency: Optional[float] = None
+
+    @property
+    def key(self) -> str:
+        return self.limiter.key
+
+    def mark_first_chunk(self):
+        """记录流式请求首个片段的到达时间，作为自适应并发的耗时依据"""
+        if self.first_chunk_latency is None:
+            self.first_chunk_latency = time.monotonic() - self.started
+
+    def abandon(self):
+        """调用方提前结束（停止读取流式响应、请求被取消）：已收到内容按成功记录，否则只归还并发名额"""
+        if self.first_chunk_latency is not None:
+            self.release(True)
+        elif not self.released:
+            self.released = True
+            self.limiter.in_flight -= 1
+
+    def release(
+        self,
+        success: bool,
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None,
+        used_tokens: Optional[int] = None
+    ):
+        if self.released:
+            return
+        self.released = True
+        self.limiter.in_flight -= 1
+        if used_tokens is not None and used_tokens > self.tokens:
+            # 按实际用量补扣 token 额度
+            self.limiter.tpm.consume(used_tokens - self.tokens)
+        latency = self.first_chunk_latency
+        if latency is None:
+            latency = time.monotonic() - self.started
+        self.limiter.on_result(success, status_code, retry_after, latency)
+
+
+class ProviderLimiter:
+    """同一提供商（API 地址）下所有 Key 的限流器"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self._keys: Dict[str, KeyLimiter] = {}
+
+    def sync_keys(self, keys: List[str]):
+        """同步配置中的 Key 列表（保留已有 Key 的状态）"""
+        keys = keys or [""]
+        for key in keys:
+            if key not in self._keys:
+                self._keys[key] = KeyLimiter(key)
+        for key in list(self._keys):
+            if key not in keys:
+                del self._keys[key]
+
+    async def acquire(self, tokens: int) -> KeyLease:
+        """等待并占用一个可用的 Key"""
+        while True:
+            now = time.monotonic()
+            ready = []
+            wait = None
+            for limiter in self._keys.values():
+                key_wait = limiter.wait_time(tokens, now)
+                if key_wait is None:
+                    continue
+                if key_wait <= 0:
+                    ready.append(limiter)
+                elif wait is None or key_wait < wait:
+                    wait = key_wait
+
+            if ready:
+                limiter = min(ready, key=lambda l: l.score())
+                limiter.in_flight += 1
+                limiter.rpm.consume(1)
+                limiter.tpm.consume(tokens)
+                return KeyLease(limiter=limiter, tokens=tokens, started=time.monotonic())
+
+            # 并发全部占满时短暂轮询等待释放
+            await asyncio.sleep(min(wait, 1.0) if wait is not None else 0.1)
+
+    @asynccontextmanager
+    async def lease(self, tokens: int) -> AsyncIterator[KeyLease]:
+        """占用 Key 并在上下文中将其设为当前请求使用的 Key"""
+        lease = await self.acquire(tokens)
+        token = _api_key_override.set(lease.key or None)
+        try:
+            yield lease
+        except (asyncio.CancelledError, GeneratorExit):
+            lease.abandon()
+            raise
+        finally:
+            try:
+                _api_key_override.reset(token)
+            except ValueError:
+                _api_key_override.set(None)
+            # 调用方未记录结果（如异常退出）时按失败释放
+            lease.release(False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"provider": self.name, "keys": [k.to_dict() for k in self._keys.values()]}
+
+
+class LLMLimiterRegistry:
+    """按提供商与 API 地址划分的限流器"""
+
+    def __init__(self):
+        self._limiters: Dict[Tuple[str, str], ProviderLimiter] = {}
+
+    def for_config(self, config) -> Optional[ProviderLimiter]:
+        """获取 LLMConfig 对应的限流器，未启用限流时返回 None"""
+        if not get_settings().LLM_RATE_LIMIT_ENABLED:
+            return None
+        name = (config.provider, (config.api_url or "").rstrip("/"))
+        limiter = self._limiters.get(name)
+        if limiter is None:
+            limiter = self._limiters[name] = ProviderLimiter(f"{name[0]} {name[1]}")
+        keys = [k.strip() for k in (config.api_key or "").split(",") if k.strip()]
+        limiter.sync_keys(keys)
+        return limiter
+
+    def stats(self) -> List[Dict[str, Any]]:
+        return [limiter.stats() for limiter in self._limiters.values()]
+
+
+# 全局限流器实例
+_llm_limiter: Optional[LLMLimiterRegistry] = None
+
+
+def get_llm_limiter() -> LLMLimiterRegistry:
+    """获取 LLM 限流器实例"""
+    global _llm_limiter
+    if _llm_limiter is None:
+        _llm_limiter = LLMLimiterRegistry()
+    return _llm_limiter
@@ -0,0 +1,147 @@
+"""
+LLM 调用日志批量写入
+
+save_llm_log 在每次 LLM 调用后执行，逐条打开会话并提交会在并行解析时产生大量阻塞事件循环的 SQLite 提交。
+日志先放入内存队列，由后台写入协程在数据库执行线程中批量插入：
+- 队列达到 LLM_LOG_BATCH_SIZE 条或距上次写入超过 LLM_LOG_FLUSH_INTERVAL 秒时写入
+- 队列超过 LLM_LOG_QUEUE_SIZE 条（数据库写入跟不上）时丢弃最早的日志并计数
+- 较长的提示词与响应由 CompressedText 列类型压缩存储
+- 每批日志写入后同步累加到 llm_log_rollups 小时汇总，供调用统计接口使用
+- 应用关闭时通知写入协程退出并等待其写完当前批次，再写入剩余日志
+
+不在事件循环中调用时（脚本、Celery worker 线程）同步等待数据库执行线程写入，与其他写入排队执行。
+"""
+import asyncio
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from app.core.config import get_settings
+from app.core.db_executor import run_db, run_db_sync
+
+
+class LLMLogSink:
+    """LLM 调用日志批量写入器"""
+
+    def __init__(self):
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._stopping = False
+        self.written = 0
+        self.dropped = 0
+
+    def submit(self, record: Dict[str, Any]):
+        """
+        提交一条日志（LLMLog 字段字典）
+
+        在事件循环中调用时加入队列等待批量写入，否则在数据库执行线程中立即写入。
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            run_db_sync(self._write, [record])
+            return
+
+        settings = get_settings()
+        self._queue.append(record)
+        while len(self._queue) > settings.LLM_LOG_QUEUE_SIZE:
+            self._queue.popleft()
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                print(f"[LLMLogSink] 日志写入跟不上，已丢弃 {self.dropped} 条最早的日志")
+        self._ensure_started()
+        if len(self._queue) >= settings.LLM_LOG_BATCH_SIZE:
+            self._wakeup.set()
+
+    def _ensure_started(self):
+        # 写入协程所在的事件循环已结束（如测试或脚本多次 asyncio.run）时重新启动
+        if (
+            self._task is not None
+            and not self._task.done()
+            and self._task.get_loop() is asyncio.get_running_loop()
+        ):
+            return
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def _run_loop(self):
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(
+                    self._wakeup.wait(), timeout=get_settings().LLM_LOG_FLUSH_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[LLMLogSink] 日志写入失败: {e}")
+
+    async def flush(self):
+        """写入队列中的所有日志（每批不超过 LLM_LOG_BATCH_SIZE 条）"""
+        batch_size = max(1, get_settings().LLM_LOG_BATCH_SIZE)
+        while self._queue:
+            batch = [self._queue.popleft() for _ in range(min(batch_size, len(self._queue)))]
+            # 已出队的批次在取消时也要写完，避免丢失
+            await asyncio.shield(run_db(self._write, batch))
+
+    def _write(self, records: List[Dict[str, Any]]):
+        from app.core.database import SessionLocal
+        from app.models.llm_log import LLMLog
+
+        db = SessionLocal()
+        try:
+            db.execute(insert(LLMLog), records)
+            db.commit()
+            self.written += len(records)
+        except Exception as e:
+            db.rollback()
+            print(f"[LLM Log] 保存日志失败：{e}")
+            db.close()
+            return
+
+        # 日志写入成功后累加到小时汇总（统计失败不影响日志本身）
+        try:
+            from app.repositories.llm_log import LLMLogRollupRepository
+            from .analytics import aggregate_records
+
+            LLMLogRollupRepository(db).merge(aggregate_records(records))
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[LLM Log] 更新调用统计失败：{e}")
+        finally:
+            db.close()
+
+    async def stop(self):
+        """停止后台写入并写入剩余日志"""
+        task, self._task = self._task, None
+        if task is not None and not task.done() and task.get_loop() is asyncio.get_running_loop():
+            # 通知写入协程在当前批次写完后退出，而不是在写入中途取消
+            self._stopping = True
+            self._wakeup.set()
+            await task
+        await self.flush()
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": len(self._queue),
+            "written": self.written,
+            "dropped": self.dropped,
+        }
+
+
+# 全局写入器实例
+_log_sink: Optional[LLMLogSink] = None
+
+
+def get_llm_log_sink() -> LLMLogSink:
+    """获取 LLM 日志写入器实例"""
+    global _log_sink
+    if _log_sink is None:
+        _log_sink = LLMLogSink()
+    return _log_sink
@@ -3,10 +3,11 @@ Anthropic Claude 提供商
 
 支持 Anthropic Claude API 格式。
 """
-import httpx
 import time
+import httpx
 from typing import Dict, Any, Optional
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, save_llm_log
+from ..limiter import RETRYABLE_STATUS_CODES, parse_retry_after
 
 
 class AnthropicProvider(BaseLLMProvider):
@@ -17,6 +18,7 @@ class AnthropicProvider(BaseLLMProvider):
     """
 
     PROVIDER_NAME = "anthropic"
+    SUPPORTS_STREAMING = True
 
     def _get_endpoint(self) -> str:
         """获取 API 端点 URL"""
@@ -56,6 +58,12 @@ class AnthropicProvider(BaseLLMProvider):
             return response_data["content"][0]["text"]
         return ""
 
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> str:
+        """解析流式增量（content_block_delta 事件中的文本）"""
+        if data.get("type") == "content_block_delta":
+            return (data.get("delta") or {}).get("text") or ""
+        return ""
+
     async def chat_completion(
         self,
         system_prompt: str,
@@ -96,10 +104,8 @@ class AnthropicProvider(BaseLLMProvider):
         proxy = self._get_proxy_config()
         used_proxy = proxy is not None
 
-        client = httpx.AsyncClient(proxy=proxy, timeout=600.0)
-
         try:
-            async with client:
+            async with self._http_client() as client:
                 response = await client.post(
                     endpoint,
                     headers=headers,
@@ -154,7 +160,10 @@ class AnthropicProvider(BaseLLMProvider):
                 return LLMResponse(
                     success=False,
                     error=error_msg,
-                    duration=duration
+                    duration=duration,
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES
                 )
         except Exception as e:
             import traceback
@@ -183,5 +192,6 @@ class AnthropicProvider(BaseLLMProvider):
             return LLMResponse(
                 success=False,
                 error=error_msg,
-                duration=duration
+                duration=duration,
+                retryable=isinstance(e, httpx.TransportError)
             )
@@ -3,10 +3,11 @@ Google Gemini 提供商
 
 支持 Google Gemini API 格式。
 """
-import httpx
 import time
+import httpx
 from typing import Dict, Any, Optional
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, save_llm_log
+from ..limiter import RETRYABLE_STATUS_CODES, parse_retry_after
 
 
 class GeminiProvider(BaseLLMProvider):
@@ -17,12 +18,31 @@ class GeminiProvider(BaseLLMProvider):
     """
 
     PROVIDER_NAME = "gemini"
+    SUPPORTS_STREAMING = True
 
     def _get_endpoint(self) -> str:
         """获取 API 端点 URL"""
         base = self.config.api_url.rstrip("/")
         return f"{base}/models/{self.config.model}:generateContent?key={self._get_current_api_key()}"
 
+    def _get_stream_endpoint(self) -> str:
+        """获取流式 API 端点 URL（SSE 格式）"""
+        base = self.config.api_url.rstrip("/")
+        return f"{base}/models/{self.config.model}:streamGenerateContent?alt=sse&key={self._get_current_api_key()}"
+
+    def _build_stream_body(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float,
+        max_tokens: int,
+        response_format: Optional[str]
+    ) -> Dict[str, Any]:
+        """构建流式请求体（Gemini 通过端点区分流式，请求体不变）"""
+        return self._build_request_body(
+            system_prompt, user_content, temperature, max_tokens, response_format
+        )
+
     def _get_headers(self) -> Dict[str, str]:
         """获取请求头"""
         return {
@@ -60,6 +80,10 @@ class GeminiProvider(BaseLLMProvider):
             pass
         return ""
 
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> str:
+        """解析流式增量（每个事件与非流式响应结构相同）"""
+        return self._parse_response(data)
+
     async def chat_completion(
         self,
         system_prompt: str,
@@ -100,10 +124,8 @@ class GeminiProvider(BaseLLMProvider):
         proxy = self._get_proxy_config()
         used_proxy = proxy is not None
 
-        client = httpx.AsyncClient(proxy=proxy, timeout=600.0)
-
         try:
-            async with client:
+            async with self._http_client() as client:
                 response = await client.post(
                     endpoint,
                     headers=headers,
@@ -158,7 +180,10 @@ class GeminiProvider(BaseLLMProvider):
                 return LLMResponse(
                     success=False,
                     error=error_msg,
-                    duration=duration
+                    duration=duration,
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES
                 )
         except Exception as e:
             import traceback
@@ -187,5 +212,6 @@ class GeminiProvider(BaseLLMProvider):
             return LLMResponse(
                 success=False,
                 error=error_msg,
-                duration=duration
+                duration=duration,
+                retryable=isinstance(e, httpx.TransportError)
             )
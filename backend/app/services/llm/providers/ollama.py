@@ -3,12 +3,12 @@ Ollama 提供商
 
 支持 Ollama 本地模型服务。
 """
-import httpx
-import os
 import re
 import time
+import httpx
 from typing import Dict, Any, Optional, List
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, save_llm_log
+from ..limiter import RETRYABLE_STATUS_CODES, parse_retry_after
 
 
 class OllamaProvider(BaseLLMProvider):
@@ -19,6 +19,7 @@ class OllamaProvider(BaseLLMProvider):
     """
 
     PROVIDER_NAME = "ollama"
+    SUPPORTS_STREAMING = True
 
     def _get_endpoint(self) -> str:
         """获取 API 端点 URL"""
@@ -72,6 +73,13 @@ class OllamaProvider(BaseLLMProvider):
             return content
         return response_data.get("content", "")
 
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> str:
+        """解析流式增量（OpenAI 兼容格式）"""
+        choices = data.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+
     async def chat_completion(
         self,
         system_prompt: str,
@@ -108,18 +116,11 @@ class OllamaProvider(BaseLLMProvider):
             system_prompt, user_content, temperature, max_tokens, response_format
         )
 
-        # Ollama 不需要代理
-        old_http_proxy = os.environ.pop('HTTP_PROXY', None)
-        old_https_proxy = os.environ.pop('HTTPS_PROXY', None)
-        old_http_proxy_lower = os.environ.pop('http_proxy', None)
-        old_https_proxy_lower = os.environ.pop('https_proxy', None)
-
-        transport = httpx.AsyncHTTPTransport(proxy=None)
-        client = httpx.AsyncClient(transport=transport, timeout=300.0)
+        # Ollama 不需要代理（由 _http_client 处理）
         used_proxy = False
 
         try:
-            async with client:
+            async with self._http_client() as client:
                 response = await client.post(
                     endpoint,
                     headers=headers,
@@ -127,16 +128,6 @@ class OllamaProvider(BaseLLMProvider):
                     timeout=300.0
                 )
 
-            # 恢复环境变量
-            if old_http_proxy:
-                os.environ['HTTP_PROXY'] = old_http_proxy
-            if old_https_proxy:
-                os.environ['HTTPS_PROXY'] = old_https_proxy
-            if old_http_proxy_lower:
-                os.environ['http_proxy'] = old_http_proxy_lower
-            if old_https_proxy_lower:
-                os.environ['https_proxy'] = old_https_proxy_lower
-
             duration = time.time() - start_time
 
             if response.status_code == 200:
@@ -184,7 +175,10 @@ class OllamaProvider(BaseLLMProvider):
                 return LLMResponse(
                     success=False,
                     error=error_msg,
-                    duration=duration
+                    duration=duration,
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES
                 )
         except Exception as e:
             import traceback
@@ -194,16 +188,6 @@ class OllamaProvider(BaseLLMProvider):
             print(f"[OllamaProvider] {error_msg}")
             traceback.print_exc()
 
-            # 恢复环境变量
-            if old_http_proxy:
-                os.environ['HTTP_PROXY'] = old_http_proxy
-            if old_https_proxy:
-                os.environ['HTTPS_PROXY'] = old_https_proxy
-            if old_http_proxy_lower:
-                os.environ['http_proxy'] = old_http_proxy_lower
-            if old_https_proxy_lower:
-                os.environ['https_proxy'] = old_https_proxy_lower
-
             duration = time.time() - start_time
             save_llm_log(
                 provider=self.config.provider,
@@ -223,7 +207,8 @@ class OllamaProvider(BaseLLMProvider):
             return LLMResponse(
                 success=False,
                 error=error_msg,
-                duration=duration
+                duration=duration,
+                retryable=isinstance(e, httpx.TransportError)
             )
 
     async def get_models(self) -> List[str]:
@@ -239,10 +224,11 @@ class OllamaProvider(BaseLLMProvider):
         try:
             # 尝试 Ollama API
             ollama_url = re.sub(r'/v1/?$', '', self.config.api_url) + "/api/tags"
-            async with httpx.AsyncClient(timeout=10.0) as client:
+            async with self._http_client() as client:
                 response = await client.get(
                     ollama_url,
-                    headers=self._get_headers()
+                    headers=self._get_headers(),
+                    timeout=10.0
                 )
 
                 if response.status_code == 200:
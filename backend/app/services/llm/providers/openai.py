@@ -3,11 +3,11 @@ OpenAI 兼容的 LLM 提供商
 
 支持 OpenAI、DeepSeek、Azure 等使用 OpenAI 兼容格式的 LLM 服务。
 """
-import httpx
-import os
 import time
+import httpx
 from typing import Dict, Any, Optional
 from ..base import BaseLLMProvider, LLMConfig, LLMResponse, save_llm_log
+from ..limiter import RETRYABLE_STATUS_CODES, parse_retry_after
 
 
 class OpenAICompatibleProvider(BaseLLMProvider):
@@ -18,6 +18,7 @@ class OpenAICompatibleProvider(BaseLLMProvider):
     """
 
     PROVIDER_NAME = "openai_compatible"
+    SUPPORTS_STREAMING = True
 
     def _get_endpoint(self) -> str:
         """获取 API 端点 URL"""
@@ -67,6 +68,13 @@ class OpenAICompatibleProvider(BaseLLMProvider):
             return content
         return response_data.get("content", "")
 
+    def _parse_stream_chunk(self, data: Dict[str, Any]) -> str:
+        """解析流式增量（choices[0].delta.content，忽略推理内容）"""
+        choices = data.get("choices") or []
+        if not choices:
+            return ""
+        return (choices[0].get("delta") or {}).get("content") or ""
+
     async def chat_completion(
         self,
         system_prompt: str,
@@ -108,21 +116,10 @@ class OpenAICompatibleProvider(BaseLLMProvider):
         used_proxy = proxy is not None
 
         timeout = 600
-        # Ollama 和 custom 不需要代理
-        if self.config.provider in ("ollama", "custom"):
-            old_http_proxy = os.environ.pop('HTTP_PROXY', None)
-            old_https_proxy = os.environ.pop('HTTPS_PROXY', None)
-            old_http_proxy_lower = os.environ.pop('http_proxy', None)
-            old_https_proxy_lower = os.environ.pop('https_proxy', None)
-
-            transport = httpx.AsyncHTTPTransport(proxy=None)
-            client = httpx.AsyncClient(transport=transport, timeout=timeout)
-        else:
-            client = httpx.AsyncClient(proxy=proxy, timeout=timeout)
-            old_http_proxy = old_https_proxy = old_http_proxy_lower = old_https_proxy_lower = None
 
         try:
-            async with client:
+            # Ollama 和 custom 不走代理（由 _http_client 处理）
+            async with self._http_client() as client:
                 print(f"[openai chat_completion] endpoint:{endpoint}, headers:{headers}, timeout:{timeout}")
                 response = await client.post(
                     endpoint,
@@ -130,17 +127,6 @@ class OpenAICompatibleProvider(BaseLLMProvider):
                     json=body,
                     timeout=timeout
                 )
-            # 恢复环境变量
-            if self.config.provider in ("ollama", "custom"):
-                if old_http_proxy:
-                    os.environ['HTTP_PROXY'] = old_http_proxy
-                if old_https_proxy:
-                    os.environ['HTTPS_PROXY'] = old_https_proxy
-                if old_http_proxy_lower:
-                    os.environ['http_proxy'] = old_http_proxy_lower
-                if old_https_proxy_lower:
-                    os.environ['https_proxy'] = old_https_proxy_lower
-
             duration = time.time() - start_time
 
             if response.status_code == 200:
@@ -188,7 +174,10 @@ class OpenAICompatibleProvider(BaseLLMProvider):
                 return LLMResponse(
                     success=False,
                     error=error_msg,
-                    duration=duration
+                    duration=duration,
+                    status_code=response.status_code,
+                    retry_after=parse_retry_after(response.headers.get("Retry-After")),
+                    retryable=response.status_code in RETRYABLE_STATUS_CODES
                 )
         except Exception as e:
             import traceback
@@ -217,5 +206,6 @@ class OpenAICompatibleProvider(BaseLLMProvider):
             return LLMResponse(
                 success=False,
                 error=error_msg,
-                duration=duration
+                duration=duration,
+                retryable=isinstance(e, httpx.TransportError)
             )
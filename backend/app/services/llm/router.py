@@ -0,0 +1,455 @@
+"""
+LLM 多厂商路由：对冲请求与故障切换
+
+配置 LLM_FALLBACK_PROVIDERS 后，LLMService 使用 LLMRouter 代替单一厂商的 LLMClient：
+- 按顺序使用主厂商与备用厂商（熔断中的厂商跳过，全部熔断时仍按顺序尝试）
+- 对冲：主请求超过该厂商/模型同类任务近期 p95 耗时仍未返回时，向下一个厂商发起对冲请求，
+  采用最先返回的有效响应（json_object 格式要求可解析为 JSON），取消其余请求
+- 故障切换：请求失败或响应无效且没有其他请求在进行时，立即改用下一个厂商
+- 熔断：厂商/模型连续失败 LLM_CIRCUIT_FAILURE_THRESHOLD 次后暂停使用 LLM_CIRCUIT_OPEN_SECONDS 秒，
+  之后放行一次试探请求，成功则恢复
+
+流式请求以首个文本片段的到达时间作为对冲依据，开始产出内容后不再切换。
+每次请求的路由决策写入 llm_logs.route，被取消的请求以 cancelled 状态单独记录。
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from contextvars import ContextVar
+from dataclasses import replace
+from typing import Any, AsyncIterator, Deque, Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.utils.json_parser import parse_llm_json
+from .base import LLMConfig, LLMStreamError, save_llm_log
+from .client import LLMClient
+
+# 当前请求的路由决策（由路由器设置，写入该请求的调用日志）
+_route_note: ContextVar[Optional[str]] = ContextVar("llm_route_note", default=None)
+
+# 每个厂商/模型/任务类型保留的耗时样本数
+LATENCY_SAMPLE_SIZE = 100
+
+
+def get_route_note() -> Optional[str]:
+    return _route_note.get()
+
+
+def route_label(config: LLMConfig) -> str:
+    return f"{config.provider}/{config.model}"
+
+
+class CircuitBreaker:
+    """单个厂商/模型的熔断器"""
+
+    def __init__(self, label: str):
+        self.label = label
+        self.failures = 0
+        self.opened_until = 0.0
+
+    @property
+    def state(self) -> str:
+        threshold = get_settings().LLM_CIRCUIT_FAILURE_THRESHOLD
+        if self.failures < threshold:
+            return "closed"
+        return "open" if time.monotonic() < self.opened_until else "half_open"
+
+    def allow(self) -> bool:
+        return self.state != "open"
+
+    def record_success(self):
+        if self.failures >= get_settings().LLM_CIRCUIT_FAILURE_THRESHOLD:
+            print(f"[LLMRouter] {self.label} 恢复，关闭熔断")
+        self.failures = 0
+        self.opened_until = 0.0
+
+    def record_failure(self):
+        settings = get_settings()
+        self.failures += 1
+        if self.failures >= settings.LLM_CIRCUIT_FAILURE_THRESHOLD:
+            # 熔断中（含试探请求失败）重新计时
+            self.opened_until = time.monotonic() + settings.LLM_CIRCUIT_OPEN_SECONDS
+            print(
+                f"[LLMRouter] {self.label} 连续失败 {self.failures} 次，"
+                f"熔断 {settings.LLM_CIRCUIT_OPEN_SECONDS:.0f}s"
+            )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "open_remaining": round(max(0.0, self.opened_until - time.monotonic()), 1),
+        }
+
+
+class LLMRouteStats:
+    """各厂商/模型的熔断状态与耗时样本（进程内共享）"""
+
+    def __init__(self):
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._latencies: Dict[Tuple[str, str, str], Deque[float]] = {}
+
+    def breaker(self, config: LLMConfig) -> CircuitBreaker:
+        label = route_label(config)
+        if label not in self._breakers:
+            self._breakers[label] = CircuitBreaker(label)
+        return self._breakers[label]
+
+    def record_latency(self, config: LLMConfig, task_type: Optional[str], kind: str, seconds: float):
+        key = (route_label(config), task_type or "", kind)
+        self._latencies.setdefault(key, deque(maxlen=LATENCY_SAMPLE_SIZE)).append(seconds)
+
+    def p95(self, config: LLMConfig, task_type: Optional[str], kind: str) -> Optional[float]:
+        """近期耗时 p95，样本数不足 LLM_HEDGE_MIN_SAMPLES 时返回 None"""
+        samples = self._latencies.get((route_label(config), task_type or "", kind))
+        if not samples or len(samples) < max(1, get_settings().LLM_HEDGE_MIN_SAMPLES):
+            return None
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))]
+
+    def hedge_delay(self, config: LLMConfig, task_type: Optional[str], kind: str) -> float:
+        """发起对冲请求前的等待时间"""
+        settings = get_settings()
+        p95 = self.p95(config, task_type, kind)
+        if p95 is None:
+            return settings.LLM_HEDGE_DEFAULT_DELAY
+        return max(settings.LLM_HEDGE_MIN_DELAY, p95)
+
+    def stats(self) -> Dict[str, Any]:
+        latencies = {}
+        for (label, task_type, kind), samples in self._latencies.items():
+            ordered = sorted(samples)
+            latencies.setdefault(label, []).append({
+                "task_type": task_type or None,
+                "kind": kind,
+                "samples": len(ordered),
+                "p50": round(ordered[len(ordered) // 2], 2),
+                "p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+            })
+        return {
+            "breakers": {label: b.to_dict() for label, b in self._breakers.items()},
+            "latencies": latencies,
+        }
+
+
+# 全局路由统计实例
+_route_stats: Optional[LLMRouteStats] = None
+
+
+def get_llm_route_stats() -> LLMRouteStats:
+    """获取 LLM 路由统计实例"""
+    global _route_stats
+    if _route_stats is None:
+        _route_stats = LLMRouteStats()
+    return _route_stats
+
+
+def is_valid_response(content: str, response_format: Optional[str]) -> bool:
+    """响应内容是否可用（要求 JSON 时必须能解析为 JSON）"""
+    if not content or not content.strip():
+        return False
+    if response_format == "json_object":
+        try:
+            parse_llm_json(content)
+        except (json.JSONDecodeError, ValueError, TypeError):
+            return False
+    return True
+
+
+class _Attempt:
+    """一次发往某个厂商的请求"""
+
+    def __init__(self, config: LLMConfig, note: str, task: asyncio.Task):
+        self.config = config
+        self.note = note
+        self.task = task
+        self.started = time.monotonic()
+
+
+class LLMRouter:
+    """
+    按顺序排列的多个厂商/模型配置之间的路由
+
+    接口与 LLMClient 相同（chat_completion / stream_chat_completion），返回结果额外包含
+    provider、model 与 route（路由决策说明）。
+    """
+
+    def __init__(self, configs: List[LLMConfig]):
+        if not configs:
+            raise ValueError("LLMRouter 至少需要一个厂商配置")
+        self.configs = configs
+        self.stats = get_llm_route_stats()
+
+    def _candidates(self) -> List[LLMConfig]:
+        allowed = [c for c in self.configs if self.stats.breaker(c).allow()]
+        # 全部熔断时仍按顺序尝试，避免请求直接失败
+        return allowed or list(self.configs)
+
+    @staticmethod
+    def _request_kwargs(config: LLMConfig, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        # 备用厂商配置了最大 token 数时以其为上限
+        if config.max_tokens and kwargs.get("max_tokens"):
+            return {**kwargs, "max_tokens": min(kwargs["max_tokens"], config.max_tokens)}
+        return kwargs
+
+    def _log_cancelled(self, attempt: _Attempt, winner: _Attempt, kwargs: Dict[str, Any]):
+        save_llm_log(
+            provider=attempt.config.provider,
+            model=attempt.config.model,
+            system_prompt=kwargs.get("system_prompt"),
+            user_prompt=kwargs.get("user_content"),
+            status="cancelled",
+            error_message=f"{route_label(winner.config)} 已先返回，取消本请求",
+            task_type=kwargs.get("task_type"),
+            novel_id=kwargs.get("novel_id"),
+            chapter_id=kwargs.get("chapter_id"),
+            character_id=kwargs.get("character_id"),
+            route=f"{attempt.note}；已取消，采用 {route_label(winner.config)}",
+        )
+
+    async def _cancel_others(self, attempts: List[_Attempt], winner: _Attempt, kwargs: Dict[str, Any]):
+        # 已经结束的请求由提供商自行记录日志，只记录被取消的请求
+        pending = [a for a in attempts if not a.task.done()]
+        for attempt in pending:
+            attempt.task.cancel()
+        for attempt in pending:
+            try:
+                await attempt.task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._log_cancelled(attempt, winner, kwargs)
+
+    async def chat_completion(self, **kwargs) -> Dict[str, Any]:
+        """
+        发送对话请求（参数同 LLMClient.chat_completion）
+
+        Returns:
+            LLMClient.chat_completion 的结果，另含 provider / model / route
+        """
+        settings = get_settings()
+        task_type = kwargs.get("task_type")
+        response_format = kwargs.get("response_format")
+        candidates = self._candidates()
+        running: List[_Attempt] = []
+        next_index = 0
+        last_result: Optional[Dict[str, Any]] = None
+
+        async def call(config: LLMConfig, note: str) -> Dict[str, Any]:
+            _route_note.set(note)
+            try:
+                return await LLMClient(config).chat_completion(**self._request_kwargs(config, kwargs))
+            except Exception as e:
+                return {"success": False, "error": str(e), "content": ""}
+
+        def launch(role: str, reason: str = "") -> _Attempt:
+            nonlocal next_index
+            config = candidates[next_index]
+            next_index += 1
+            note = f"{role}: {route_label(config)}" + (f"（{reason}）" if reason else "")
+            attempt = _Attempt(config, note, asyncio.create_task(call(config, note)))
+            running.append(attempt)
+            if role != "primary":
+                print(f"[LLMRouter] {note}")
+            return attempt
+
+        newest = launch("primary")
+        try:
+            while running:
+                timeout = None
+                delay = None
+                if settings.LLM_HEDGE_ENABLED and next_index < len(candidates):
+                    delay = self.stats.hedge_delay(newest.config, task_type, "complete")
+                    timeout = max(0.0, newest.started + delay - time.monotonic())
+
+                done, _ = await asyncio.wait(
+                    [a.task for a in running], timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    newest = launch("hedge", f"{route_label(newest.config)} 超过 {delay:.1f}s 未返回")
+                    continue
+
+                for attempt in [a for a in running if a.task in done]:
+                    running.remove(attempt)
+                    result = attempt.task.result()
+                    breaker = self.stats.breaker(attempt.config)
+                    if result.get("success") and is_valid_response(result.get("content", ""), response_format):
+                        breaker.record_success()
+                        if not result.get("cached"):
+                            self.stats.record_latency(
+                                attempt.config, task_type, "complete", time.monotonic() - attempt.started
+                            )
+                        await self._cancel_others(running, attempt, kwargs)
+                        running.clear()
+                        return {
+                            **result,
+                            "provider": attempt.config.provider,
+                            "model": attempt.config.model,
+                            "route": attempt.note,
+                        }
+
+                    breaker.record_failure()
+                    last_result = result
+                    if result.get("success"):
+                        print(f"[LLMRouter] {route_label(attempt.config)} 响应无法解析为 JSON")
+                    if not running and next_index < len(candidates):
+                        reason = "响应无效" if result.get("success") else "请求失败"
+                        newest = launch("failover", f"{route_label(attempt.config)} {reason}")
+        finally:
+            # 调用方取消时一并取消进行中的请求
+            for attempt in running:
+                attempt.task.cancel()
+
+        result = {**(last_result or {"content": ""}), "success": False, "route": newest.note}
+        if last_result and last_result.get("success"):
+            result["error"] = "响应无法解析为 JSON"
+        return result
+
+    async def stream_chat_completion(self, **kwargs) -> AsyncIterator[str]:
+        """
+        流式对话请求（参数同 LLMClient.stream_chat_completion）
+
+        首个文本片段超过 p95 未到达时发起对冲，采用最先产出内容的请求并取消其余请求。
+
+        Raises:
+            LLMStreamError: 所有厂商均失败，或产出内容后连接中断
+        """
+        settings = get_settings()
+        task_type = kwargs.get("task_type")
+        candidates = self._candidates()
+        running: Dict[asyncio.Task, Tuple[_Attempt, asyncio.Queue]] = {}
+        getters: Dict[asyncio.Task, asyncio.Task] = {}
+        next_index = 0
+        last_error: Optional[Exception] = None
+
+        async def pump(config: LLMConfig, note: str, queue: asyncio.Queue):
+            # 在独立任务中消费流，使提供商写日志时能读取到本请求的路由决策
+            _route_note.set(note)
+            try:
+                async for delta in LLMClient(config).stream_chat_completion(**self._request_kwargs(config, kwargs)):
+                    await queue.put(("chunk", delta))
+                await queue.put(("done", None))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                await queue.put(("error", e))
+
+        def launch(role: str, reason: str = "") -> _Attempt:
+            nonlocal next_index
+            config = candidates[next_index]
+            next_index += 1
+            note = f"{role}: {route_label(config)}" + (f"（{reason}）" if reason else "")
+            queue: asyncio.Queue = asyncio.Queue()
+            attempt = _Attempt(config, note, asyncio.create_task(pump(config, note, queue)))
+            running[attempt.task] = (attempt, queue)
+            getters[asyncio.create_task(queue.get())] = attempt.task
+            if role != "primary":
+                print(f"[LLMRouter] {note}")
+            return attempt
+
+        winner: Optional[_Attempt] = None
+        winner_queue: Optional[asyncio.Queue] = None
+        first_item = None
+        newest = launch("primary")
+        try:
+            while getters and winner is None:
+                timeout = None
+                delay = None
+                if settings.LLM_HEDGE_ENABLED and next_index < len(candidates):
+                    delay = self.stats.hedge_delay(newest.config, task_type, "first_chunk")
+                    timeout = max(0.0, newest.started + delay - time.monotonic())
+
+                done, _ = await asyncio.wait(list(getters), timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    newest = launch("hedge", f"{route_label(newest.config)} 超过 {delay:.1f}s 未开始返回")
+                    continue
+
+                for getter in done:
+                    attempt, queue = running[getters.pop(getter)]
+                    kind, value = getter.result()
+                    if kind == "error":
+                        del running[attempt.task]
+                        self.stats.breaker(attempt.config).record_failure()
+                        last_error = value
+                        if winner is None and not getters and next_index < len(candidates):
+                            newest = launch("failover", f"{route_label(attempt.config)} 请求失败")
+                        continue
+                    if winner is None:
+                        winner, winner_queue, first_item = attempt, queue, (kind, value)
+                        self.stats.record_latency(
+                            attempt.config, task_type, "first_chunk", time.monotonic() - attempt.started
+                        )
+
+            if winner is None:
+                if isinstance(last_error, LLMStreamError):
+                    raise last_error
+                raise LLMStreamError(str(last_error) if last_error else "所有 LLM 厂商均请求失败")
+
+            # 取消其余请求
+            for getter in getters:
+                getter.cancel()
+            getters.clear()
+            del running[winner.task]
+            await self._cancel_others([a for a, _ in running.values()], winner, kwargs)
+            running.clear()
+            running[winner.task] = (winner, winner_queue)
+
+            kind, value = first_item
+            while True:
+                if kind == "done":
+                    self.stats.breaker(winner.config).record_success()
+                    return
+                if kind == "error":
+                    self.stats.breaker(winner.config).record_failure()
+                    raise value if isinstance(value, LLMStreamError) else LLMStreamError(str(value))
+                yield value
+                kind, value = await winner_queue.get()
+        finally:
+            for getter in getters:
+                getter.cancel()
+            for attempt, _ in running.values():
+                attempt.task.cancel()
+
+
+def _fallback_credentials(primary: LLMConfig, item: Dict[str, Any]) -> Optional[Tuple[str, str]]:
+    """
+    解析备用厂商的 API 地址与 Key
+
+    与主厂商相同的厂商沿用主厂商的地址与 Key；不同厂商必须在备用项中填写自己的地址与 Key
+    （ollama / custom 可以不填 Key），缺少时返回 None。
+    """
+    api_url = item.get("api_url")
+    api_key = item.get("api_key")
+    if item["provider"] == primary.provider:
+        return api_url or primary.api_url, api_key if api_key is not None else primary.api_key
+    if not api_url or (not api_key and item["provider"] not in ("ollama", "custom")):
+        return None
+    return api_url, api_key or ""
+
+
+def build_llm_router(primary: LLMConfig, fallbacks: List[Dict[str, Any]]) -> LLMRouter:
+    """
+    根据主厂商配置与 LLM_FALLBACK_PROVIDERS 构建路由器
+
+    与主厂商相同的备用项未填写 API 地址、Key 时沿用主厂商配置；其他厂商需填写自己的地址与 Key，
+    缺少时跳过该备用项。代理配置沿用主厂商配置。
+    max_tokens 为该模型的输出 token 上限，请求的 max_tokens 超出时按其截断。
+    """
+    configs = [primary]
+    for item in fallbacks:
+        if not item.get("provider") or not item.get("model"):
+            continue
+        credentials = _fallback_credentials(primary, item)
+        if credentials is None:
+            print(f"[LLMRouter] 备用厂商 {item['provider']}/{item['model']} 缺少 API 地址或 Key，已跳过")
+            continue
+        api_url, api_key = credentials
+        configs.append(replace(
+            primary,
+            provider=item["provider"],
+            model=item["model"],
+            api_url=api_url,
+            api_key=api_key,
+            max_tokens=item.get("max_tokens"),
+        ))
+    return LLMRouter(configs)
@@ -3,16 +3,23 @@ LLM 服务封装 - 支持多厂商调用 (DeepSeek, OpenAI, Gemini, Anthropic, A
 
 对外暴露的服务层，内部使用 LLMClient 实现底层调用。
 """
-from typing import Dict, Any, List, Optional
+import asyncio
+import json
+import re
+from difflib import SequenceMatcher
+from typing import Dict, Any, List, Optional, Tuple, Union, AsyncIterator, Callable, Awaitable
 from app.core.config import get_settings
-from app.services.llm import LLMClient, LLMConfig
-from app.utils.json_parser import safe_parse_llm_json, clean_llm_response
+from app.services.llm import LLMClient, LLMConfig, LLMRouter, LLMStreamError, build_llm_router
+from app.utils.json_parser import safe_parse_llm_json, clean_llm_response, JsonArrayStreamParser
+from app.utils.text_chunker import TextWindow, split_text_windows
 from app.constants import (
     DEFAULT_TEMPERATURE,
     DEFAULT_MAX_TOKENS,
     DEFAULT_VIDEO_DURATION,
     NOVEL_TEXT_MAX_LENGTH,
     CHAPTER_CONTENT_MAX_LENGTH,
+    SPLIT_WINDOW_CONTEXT_LENGTH,
+    SPLIT_WINDOW_OVERLAP_SHOTS,
     DEFAULT_PARSE_CHARACTERS_PROMPT,
     CHAPTER_RANGE_PLACEHOLDER,
     DEFAULT_CHAPTER_RANGE_DESCRIPTION,
@@ -21,12 +28,19 @@ from app.constants import (
     DEFAULT_CHARACTER_APPEARANCE_FALLBACK,
     DEFAULT_SCENE_SETTING_FALLBACK,
     DEFAULT_PROP_APPEARANCE_FALLBACK,
+    APPEARANCE_BATCH_ITEM_TOKENS,
+    BATCH_APPEARANCE_OUTPUT_INSTRUCTION,
     get_character_appearance_prompt,
     get_scene_setting_prompt,
     get_prop_appearance_prompt,
 )
 
 
+def _parses_as_json(content: str) -> bool:
+    """响应能否解析为 JSON 对象（json_object 格式的响应只在可解析时缓存）"""
+    return bool(safe_parse_llm_json(content, default=None))
+
+
 class LLMService:
     """多厂商 LLM API 服务封装
 
@@ -68,8 +82,8 @@ class LLMService:
         # 当前使用的 API Key 索引
         self.current_key_index = 0
 
-    def _get_client(self) -> LLMClient:
-        """获取 LLMClient 实例"""
+    def _get_client(self) -> Union[LLMClient, LLMRouter]:
+        """获取 LLMClient 实例（配置了备用厂商时返回多厂商路由器，接口相同）"""
         config = LLMConfig(
             provider=self.provider,
             model=self.model,
@@ -81,6 +95,9 @@ class LLMService:
             http_proxy=self.http_proxy,
             https_proxy=self.https_proxy,
         )
+        fallbacks = get_settings().LLM_FALLBACK_PROVIDERS
+        if fallbacks:
+            return build_llm_router(config, fallbacks)
         return LLMClient(config)
 
     def _normalize_max_tokens(self, max_tokens: int) -> int:
@@ -103,12 +120,16 @@ class LLMService:
         task_type: str = None,
         novel_id: str = None,
         chapter_id: str = None,
-        character_id: str = None
+        character_id: str = None,
+        use_cache: bool = True,
+        validate: Callable[[str], bool] = None
     ) -> Dict[str, Any]:
         """
         发送对话请求
 
         内部使用 LLMClient 实现底层调用。
+        开启 LLM_CACHE_ENABLED 时相同请求返回缓存的响应，use_cache=False 可强制重新调用。
+        validate 未通过的响应不缓存；json_object 格式默认校验能否解析为 JSON。
 
         Returns:
             {
@@ -118,11 +139,7 @@ class LLMService:
             }
         """
         # 使用配置的参数，如果提供了则覆盖默认值
-        final_temperature = float(self.temperature) if self.temperature else temperature
-        final_max_tokens = max_tokens if max_tokens is not None else self.max_tokens
-        if final_max_tokens is None:
-            final_max_tokens = DEFAULT_MAX_TOKENS
-        final_max_tokens = self._normalize_max_tokens(final_max_tokens)
+        final_temperature, final_max_tokens = self._resolve_generation_params(temperature, max_tokens)
         print(f"[chat_completion] url: {self.api_url}, model: {self.model}, temperature: {final_temperature}, max_tokens: {final_max_tokens} \n system_prompt: {system_prompt}\n user_content: {user_content}")
 
         client = self._get_client()
@@ -135,7 +152,9 @@ class LLMService:
             task_type=task_type,
             novel_id=novel_id,
             chapter_id=chapter_id,
-            character_id=character_id
+            character_id=character_id,
+            use_cache=use_cache,
+            validate=validate or (_parses_as_json if response_format == "json_object" else None)
         )
 
     async def check_health(self) -> bool:
@@ -209,9 +228,10 @@ class LLMService:
         description: str,
         style: str = "anime",
         novel_id: str = None,
-        character_id: str = None
+        character_id: str = None,
+        use_cache: bool = True
     ) -> str:
-        """生成角色外貌描述"""
+        """生成角色外貌描述（重新生成时传 use_cache=False）"""
         system_prompt = get_character_appearance_prompt(style)
 
         result = await self.chat_completion(
@@ -221,7 +241,8 @@ class LLMService:
             max_tokens=1000,
             task_type="generate_character_appearance",
             novel_id=novel_id,
-            character_id=character_id
+            character_id=character_id,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -253,7 +274,8 @@ class LLMService:
         scene_name: str,
         description: str,
         style: str = "anime",
-        novel_id: str = None
+        novel_id: str = None,
+        use_cache: bool = True
     ) -> str:
         """生成场景设定（环境设置）
 
@@ -262,6 +284,7 @@ class LLMService:
             description: 场景描述
             style: 画风风格
             novel_id: 小说 ID
+            use_cache: 为 False 时不复用缓存的响应（重新生成）
 
         Returns:
             场景设定字符串（用于 AI 绘图的环境描述）
@@ -274,7 +297,8 @@ class LLMService:
             temperature=0.8,
             max_tokens=1000,
             task_type="generate_scene_setting",
-            novel_id=novel_id
+            novel_id=novel_id,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -287,7 +311,8 @@ class LLMService:
         prop_name: str,
         description: str,
         style: str = "anime",
-        novel_id: str = None
+        novel_id: str = None,
+        use_cache: bool = True
     ) -> str:
         """生成道具外观描述
 
@@ -296,6 +321,7 @@ class LLMService:
             description: 道具描述
             style: 画风风格
             novel_id: 小说 ID
+            use_cache: 为 False 时不复用缓存的响应（重新生成）
 
         Returns:
             道具外观描述字符串（用于 AI 绘图）
@@ -308,7 +334,8 @@ class LLMService:
             temperature=0.8,
             max_tokens=1000,
             task_type="generate_prop_appearance",
-            novel_id=novel_id
+            novel_id=novel_id,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -316,6 +343,76 @@ class LLMService:
         else:
             return DEFAULT_PROP_APPEARANCE_FALLBACK.format(prop_name=prop_name)
 
+    # 批量生成时各实体类型的系统提示词、输入标签与日志任务类型
+    _APPEARANCE_KINDS = {
+        "character": (get_character_appearance_prompt, "角色", "generate_character_appearance"),
+        "scene": (get_scene_setting_prompt, "场景", "generate_scene_setting"),
+        "prop": (get_prop_appearance_prompt, "道具", "generate_prop_appearance"),
+    }
+
+    async def generate_appearances_batch(
+        self,
+        entity_type: str,
+        entities: List[Dict[str, str]],
+        style: str = "anime",
+        novel_id: str = None
+    ) -> Dict[str, str]:
+        """一次请求为多个角色/场景/道具生成外貌（环境设定）描述
+
+        系统提示词与单个生成相同，只发送一次；条目以短编号标识，结果按编号映射回实体 ID。
+
+        Args:
+            entity_type: character / scene / prop
+            entities: [{"id": 实体ID, "name": 名称, "description": 描述}]
+            style: 画风风格
+            novel_id: 小说 ID
+
+        Returns:
+            {实体ID: 描述}，响应中缺失或为空的实体不包含在结果中（由调用方重试）
+        """
+        prompt_fn, label, task_type = self._APPEARANCE_KINDS[entity_type]
+        system_prompt = prompt_fn(style) + BATCH_APPEARANCE_OUTPUT_INSTRUCTION
+
+        id_map = {str(i + 1): entity["id"] for i, entity in enumerate(entities)}
+        items = [
+            {"id": short_id, f"{label}名称": entity["name"], f"{label}描述": entity.get("description") or ""}
+            for short_id, entity in zip(id_map, entities)
+        ]
+        user_content = f"""共 {len(items)} 个{label}：
+{json.dumps(items, ensure_ascii=False, indent=2)}
+
+请为每个{label}生成描述："""
+
+        result = await self.chat_completion(
+            system_prompt=system_prompt,
+            user_content=user_content,
+            temperature=0.8,
+            max_tokens=APPEARANCE_BATCH_ITEM_TOKENS * len(items),
+            response_format="json_object",
+            task_type=f"{task_type}_batch",
+            novel_id=novel_id
+        )
+        if not result["success"]:
+            print(f"[generate_appearances_batch] {label} 批量生成失败: {result.get('error')}")
+            return {}
+
+        data = safe_parse_llm_json(result["content"], default=None)
+        if isinstance(data, list):
+            data = {"items": data}
+        if not isinstance(data, dict):
+            print(f"[generate_appearances_batch] JSON 解析失败，原始内容：{result['content'][:500]}")
+            return {}
+
+        generated = {}
+        for item in data.get("items") or []:
+            if not isinstance(item, dict):
+                continue
+            entity_id = id_map.get(str(item.get("id", "")).strip())
+            text = clean_llm_response(str(item.get("text") or "")).strip()
+            if entity_id and text:
+                generated[entity_id] = text
+        return generated
+
 
     async def parse_scenes(
         self,
@@ -371,7 +468,8 @@ class LLMService:
     async def parse_props(
         self,
         text: str,
-        prompt_template: str = None
+        prompt_template: str = None,
+        novel_id: str = None
     ) -> Dict[str, Any]:
         """
         解析小说文本中的道具信息
@@ -379,6 +477,7 @@ class LLMService:
         Args:
             text: 小说文本
             prompt_template: 提示词模板（可选）
+            novel_id: 小说 ID（用于日志记录）
 
         Returns:
             道具解析结果
@@ -397,7 +496,8 @@ class LLMService:
             temperature=0.3,
             max_tokens=4000,
             response_format="json_object",
-            task_type="parse_props"
+            task_type="parse_props",
+            novel_id=novel_id
         )
 
         if result["success"]:
@@ -432,21 +532,67 @@ class LLMService:
         )
         return result.get("content", "")
 
-    async def split_chapter_with_prompt(
+    def _resolve_generation_params(self, temperature: float, max_tokens: Optional[int]) -> Tuple[float, int]:
+        """合并配置中的温度与最大 token 数"""
+        final_temperature = float(self.temperature) if self.temperature else temperature
+        final_max_tokens = max_tokens if max_tokens is not None else self.max_tokens
+        if final_max_tokens is None:
+            final_max_tokens = DEFAULT_MAX_TOKENS
+        return final_temperature, self._normalize_max_tokens(final_max_tokens)
+
+    async def stream_chat_completion(
+        self,
+        system_prompt: str,
+        user_content: str,
+        temperature: float = DEFAULT_TEMPERATURE,
+        max_tokens: Optional[int] = None,
+        response_format: Optional[str] = None,
+        task_type: str = None,
+        novel_id: str = None,
+        chapter_id: str = None,
+        character_id: str = None,
+        use_cache: bool = True,
+        validate: Callable[[str], bool] = None
+    ) -> AsyncIterator[str]:
+        """
+        流式对话请求，逐段产出文本增量（缓存规则同 chat_completion）
+
+        Raises:
+            LLMStreamError: 请求失败或连接中断
+        """
+        final_temperature, final_max_tokens = self._resolve_generation_params(temperature, max_tokens)
+        print(f"[stream_chat_completion] url: {self.api_url}, model: {self.model}, temperature: {final_temperature}, max_tokens: {final_max_tokens}")
+
+        client = self._get_client()
+        async for delta in client.stream_chat_completion(
+            system_prompt=system_prompt,
+            user_content=user_content,
+            temperature=final_temperature,
+            max_tokens=final_max_tokens,
+            response_format=response_format,
+            task_type=task_type,
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            character_id=character_id,
+            use_cache=use_cache,
+            validate=validate or (_parses_as_json if response_format == "json_object" else None)
+        ):
+            yield delta
+
+    def _build_split_chapter_prompts(
         self,
         chapter_title: str,
         chapter_content: str,
         prompt_template: str,
-        word_count: int = 100,
-        character_names: List[str] = None,
-        scene_names: List[str] = None,
-        prop_names: List[str] = None,
-        style: str = "anime style, high quality, detailed",
-        novel_id: str = None,
-        chapter_id: str = None
-    ) -> Dict[str, Any]:
-        """使用自定义提示词将章节拆分为分镜数据结构"""
-
+        word_count: int,
+        character_names: List[str],
+        scene_names: List[str],
+        prop_names: List[str],
+        style: str,
+        window: Optional[TextWindow] = None,
+        window_count: int = 1
+    ) -> Tuple[str, str]:
+        """构建章节拆分的系统提示词与用户内容（window 为超长章节的拆分窗口）"""
         # 替换提示词模板中的占位符
         system_prompt = prompt_template.replace(
             "{每个分镜对应拆分故事字数}", str(word_count)
@@ -476,12 +622,88 @@ class LLMService:
         if allowed_characters_line or allowed_scenes_line or allowed_props_line:
             whitelist_lines = allowed_characters_line + allowed_scenes_line + allowed_props_line + "\n"
 
-        user_content = f"""{whitelist_lines}章节标题：{chapter_title}
+        if window is None or window_count <= 1:
+            user_content = f"""{whitelist_lines}章节标题：{chapter_title}
 
 章节内容：
 {chapter_content[:CHAPTER_CONTENT_MAX_LENGTH]}
 
 请将以上章节内容拆分为分镜数据结构。"""
+            return system_prompt, user_content
+
+        context_block = ""
+        if window.context:
+            context_block = f"""前文衔接（上一段结尾，仅用于理解剧情衔接，不要为这部分内容生成分镜）：
+{window.context}
+
+"""
+        user_content = f"""{whitelist_lines}章节标题：{chapter_title}
+
+{context_block}章节内容（第 {window.index + 1}/{window_count} 段）：
+{window.text[:CHAPTER_CONTENT_MAX_LENGTH]}
+
+请将以上章节内容拆分为分镜数据结构。"""
+        return system_prompt, user_content
+
+    @staticmethod
+    def _split_chapter_error(chapter_title: str, error: str) -> Dict[str, Any]:
+        return {
+            "error": error,
+            "chapter": chapter_title,
+            "characters": [],
+            "scenes": [],
+            "shots": []
+        }
+
+    async def split_chapter_with_prompt(
+        self,
+        chapter_title: str,
+        chapter_content: str,
+        prompt_template: str,
+        word_count: int = 100,
+        character_names: List[str] = None,
+        scene_names: List[str] = None,
+        prop_names: List[str] = None,
+        style: str = "anime style, high quality, detailed",
+        novel_id: str = None,
+        chapter_id: str = None,
+        window: Optional[TextWindow] = None,
+        window_count: int = 1,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        使用自定义提示词将章节拆分为分镜数据结构
+
+        超过 CHAPTER_CONTENT_MAX_LENGTH 的章节按段落切分为窗口并发拆分，再拼接为连续的分镜列表。
+        """
+        if window is None:
+            windows = split_text_windows(
+                chapter_content, CHAPTER_CONTENT_MAX_LENGTH, SPLIT_WINDOW_CONTEXT_LENGTH
+            )
+            if len(windows) > 1:
+                print(f"[split_chapter] 章节 {chapter_title} 共 {len(chapter_content)} 字，分 {len(windows)} 个窗口并发拆分")
+                # 窗口全部并发发出，并发上限由 LLM 限流器按 API Key 控制
+
+                async def split_window(item: TextWindow) -> Dict[str, Any]:
+                    return await self.split_chapter_with_prompt(
+                        chapter_title, item.text, prompt_template, word_count,
+                        character_names, scene_names, prop_names, style,
+                        novel_id=novel_id, chapter_id=chapter_id,
+                        window=item, window_count=len(windows), use_cache=use_cache
+                    )
+
+                results = await asyncio.gather(*(split_window(item) for item in windows))
+                for result in results:
+                    if result.get("error"):
+                        return self._split_chapter_error(chapter_title, result["error"])
+                merged = merge_window_results(chapter_title, results)
+                merged["shots"] = stitch_window_shots([r.get("shots", []) for r in results])
+                return merged
+
+        system_prompt, user_content = self._build_split_chapter_prompts(
+            chapter_title, chapter_content, prompt_template, word_count,
+            character_names, scene_names, prop_names, style, window, window_count
+        )
 
         result = await self.chat_completion(
             system_prompt=system_prompt,
@@ -491,7 +713,8 @@ class LLMService:
             response_format="json_object",
             task_type="split_chapter",
             novel_id=novel_id,
-            chapter_id=chapter_id
+            chapter_id=chapter_id,
+            use_cache=use_cache
         )
 
         if result["success"]:
@@ -501,13 +724,7 @@ class LLMService:
             if not data:
                 print(f"[split_chapter] JSON 解析失败")
                 print(f"[split_chapter] 原始内容: {result['content'][:500]}")
-                return {
-                    "error": "JSON 解析失败",
-                    "chapter": chapter_title,
-                    "characters": [],
-                    "scenes": [],
-                    "shots": []
-                }
+                return self._split_chapter_error(chapter_title, "JSON 解析失败")
 
             # 确保返回格式正确
             return {
@@ -518,13 +735,225 @@ class LLMService:
                 "shots": data.get("shots", [])
             }
         else:
-            return {
-                "error": result.get("error", "未知错误"),
-                "chapter": chapter_title,
-                "characters": [],
-                "scenes": [],
-                "shots": []
-            }
+            return self._split_chapter_error(chapter_title, result.get("error", "未知错误"))
+
+    async def split_chapter_with_prompt_stream(
+        self,
+        chapter_title: str,
+        chapter_content: str,
+        prompt_template: str,
+        on_shot: Callable[[Dict[str, Any]], Awaitable[None]],
+        word_count: int = 100,
+        character_names: List[str] = None,
+        scene_names: List[str] = None,
+        prop_names: List[str] = None,
+        style: str = "anime style, high quality, detailed",
+        novel_id: str = None,
+        chapter_id: str = None,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """
+        流式拆分章节，shots 数组中每个分镜闭合后立即回调 on_shot（重新拆分时传 use_cache=False）
+
+        返回值与 split_chapter_with_prompt 相同；shots 为完整响应解析出的全部分镜，
+        另含 streamed_count（已回调的分镜数）。
+
+        超过 CHAPTER_CONTENT_MAX_LENGTH 的章节按段落切分为窗口并发拆分，
+        分镜按窗口顺序回调，相邻窗口衔接处的重复分镜被去除。
+        """
+        windows = split_text_windows(
+            chapter_content, CHAPTER_CONTENT_MAX_LENGTH, SPLIT_WINDOW_CONTEXT_LENGTH
+        )
+        if len(windows) <= 1:
+            return await self._split_window_stream(
+                chapter_title, chapter_content, prompt_template, on_shot, word_count,
+                character_names, scene_names, prop_names, style, novel_id, chapter_id,
+                use_cache=use_cache
+            )
+
+        print(f"[split_chapter] 章节 {chapter_title} 共 {len(chapter_content)} 字，分 {len(windows)} 个窗口并发拆分")
+        queues = [asyncio.Queue() for _ in windows]
+        results: List[Optional[Dict[str, Any]]] = [None] * len(windows)
+
+        # 窗口全部并发发出，并发上限由 LLM 限流器按 API Key 控制
+        async def run_window(item: TextWindow):
+            queue = queues[item.index]
+            try:
+                result = await self._split_window_stream(
+                    chapter_title, item.text, prompt_template, queue.put, word_count,
+                    character_names, scene_names, prop_names, style, novel_id, chapter_id,
+                    window=item, window_count=len(windows), use_cache=use_cache
+                )
+                # 增量解析遗漏的分镜按完整响应补齐
+                for shot in result.get("shots", [])[result.get("streamed_count", 0):]:
+                    await queue.put(shot)
+                results[item.index] = result
+            except Exception as e:
+                results[item.index] = self._split_chapter_error(chapter_title, str(e))
+            finally:
+                await queue.put(None)
+
+        tasks = [asyncio.create_task(run_window(item)) for item in windows]
+        emitted: List[Dict[str, Any]] = []
+        try:
+            # 按窗口顺序回调，后续窗口先完成时在队列中等待
+            for item in windows:
+                previous = emitted[-SPLIT_WINDOW_OVERLAP_SHOTS:] if item.index > 0 else []
+                checked = 0
+                while True:
+                    shot = await queues[item.index].get()
+                    if shot is None:
+                        break
+                    if checked < SPLIT_WINDOW_OVERLAP_SHOTS and previous:
+                        checked += 1
+                        if is_duplicate_shot(shot, previous):
+                            print(f"[split_chapter] 去除窗口 {item.index + 1} 衔接处的重复分镜")
+                            continue
+                    emitted.append(shot)
+                    await on_shot(shot)
+
+                error = results[item.index].get("error")
+                if error:
+                    result = self._split_chapter_error(
+                        chapter_title, f"第 {item.index + 1}/{len(windows)} 段拆分失败：{error}"
+                    )
+                    result["streamed_count"] = len(emitted)
+                    return result
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        merged = merge_window_results(chapter_title, results)
+        merged["shots"] = emitted
+        merged["streamed_count"] = len(emitted)
+        return merged
+
+    async def _split_window_stream(
+        self,
+        chapter_title: str,
+        chapter_content: str,
+        prompt_template: str,
+        on_shot: Callable[[Dict[str, Any]], Awaitable[None]],
+        word_count: int,
+        character_names: List[str],
+        scene_names: List[str],
+        prop_names: List[str],
+        style: str,
+        novel_id: str,
+        chapter_id: str,
+        window: Optional[TextWindow] = None,
+        window_count: int = 1,
+        use_cache: bool = True
+    ) -> Dict[str, Any]:
+        """流式拆分单个章节（或超长章节的一个窗口）"""
+        system_prompt, user_content = self._build_split_chapter_prompts(
+            chapter_title, chapter_content, prompt_template, word_count,
+            character_names, scene_names, prop_names, style, window, window_count
+        )
+
+        parser = JsonArrayStreamParser("shots")
+        streamed_shots = []
+        chunks = []
+        try:
+            async for delta in self.stream_chat_completion(
+                system_prompt=system_prompt,
+                user_content=user_content,
+                temperature=DEFAULT_TEMPERATURE,
+                max_tokens=CHAPTER_CONTENT_MAX_LENGTH,
+                response_format="json_object",
+                task_type="split_chapter",
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                use_cache=use_cache
+            ):
+                chunks.append(delta)
+                for shot in parser.feed(delta):
+                    streamed_shots.append(shot)
+                    await on_shot(shot)
+        except LLMStreamError as e:
+            result = self._split_chapter_error(chapter_title, str(e))
+            result["streamed_count"] = len(streamed_shots)
+            return result
+
+        content = "".join(chunks)
+        data = safe_parse_llm_json(content)
+        if not data:
+            if not streamed_shots:
+                print(f"[split_chapter] JSON 解析失败")
+                print(f"[split_chapter] 原始内容: {content[:500]}")
+                result = self._split_chapter_error(chapter_title, "JSON 解析失败")
+                result["streamed_count"] = 0
+                return result
+            # 整体解析失败（如输出被截断）时保留已闭合的分镜
+            print(f"[split_chapter] 完整响应解析失败，保留已解析的 {len(streamed_shots)} 个分镜")
+            data = {"shots": streamed_shots}
+
+        return {
+            "chapter": data.get("chapter", chapter_title),
+            "characters": data.get("characters", []),
+            "scenes": data.get("scenes", []),
+            "props": data.get("props", []),
+            "shots": data.get("shots", []),
+            "streamed_count": len(streamed_shots)
+        }
+
+
+# ==================== 分窗口拆分结果拼接 ====================
+
+_SHOT_TEXT_RE = re.compile(r"[\s，。！？、；：,.!?;:\"'“”‘’（）()《》【】…—-]+")
+
+
+def _shot_text(shot: Any) -> str:
+    if not isinstance(shot, dict):
+        return str(shot)
+    return _SHOT_TEXT_RE.sub("", str(shot.get("description", "")))
+
+
+def is_duplicate_shot(shot: Any, previous: List[Any], threshold: float = 0.8) -> bool:
+    """判断分镜是否与前一窗口末尾的某个分镜重复（描述文本相似度不低于 threshold）"""
+    text = _shot_text(shot)
+    if not text:
+        return False
+    for other in previous:
+        other_text = _shot_text(other)
+        if other_text and SequenceMatcher(None, text, other_text).ratio() >= threshold:
+            return True
+    return False
+
+
+def stitch_window_shots(shot_lists: List[List[Any]]) -> List[Any]:
+    """
+    按窗口顺序拼接分镜列表
+
+    每个窗口开头的 SPLIT_WINDOW_OVERLAP_SHOTS 个分镜与前一窗口末尾重复时去除，
+    分镜自带的 index 重新编号为连续序号。
+    """
+    stitched: List[Any] = []
+    for position, shots in enumerate(shot_lists):
+        previous = stitched[-SPLIT_WINDOW_OVERLAP_SHOTS:] if position > 0 else []
+        for offset, shot in enumerate(shots):
+            if previous and offset < SPLIT_WINDOW_OVERLAP_SHOTS and is_duplicate_shot(shot, previous):
+                continue
+            stitched.append(shot)
+    for number, shot in enumerate(stitched, start=1):
+        if isinstance(shot, dict) and "index" in shot:
+            shot["index"] = number
+    return stitched
+
+
+def merge_window_results(chapter_title: str, results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """合并各窗口的角色/场景/道具列表（去重，保持首次出现顺序）"""
+    merged = {"chapter": chapter_title, "characters": [], "scenes": [], "props": []}
+    seen = {key: set() for key in ("characters", "scenes", "props")}
+    for result in results:
+        for key in seen:
+            for item in result.get(key) or []:
+                marker = json.dumps(item, ensure_ascii=False, sort_keys=True)
+                if marker not in seen[key]:
+                    seen[key].add(marker)
+                    merged[key].append(item)
+    return merged
 
 
 def get_llm_service() -> LLMService:
@@ -6,7 +6,7 @@
 import json
 import os
 from datetime import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable, Awaitable
 
 from sqlalchemy.orm import Session
 
@@ -14,12 +14,22 @@ from app.models.novel import Novel, Chapter, Character, Scene
 from app.models.prompt_template import PromptTemplate
 from app.core.database import SessionLocal
 from app.utils.time_utils import format_datetime
+from app.utils.text_utils import content_hash
 from app.services.llm_service import LLMService
+from app.services.chunked_extraction import ChunkedExtractor
 from app.services.comfyui import ComfyUIService
 from app.services.file_storage import file_storage
 from app.services.prompt_builder import get_style
 from app.utils.path_utils import url_to_local_path
 from app.utils.image_utils import load_chinese_font, merge_character_images
+from app.constants import (
+    NOVEL_TEXT_MAX_LENGTH,
+    CHAPTER_CONTENT_MAX_LENGTH,
+    DEFAULT_PARSE_CHARACTERS_PROMPT,
+    DEFAULT_PARSE_SCENES_PROMPT,
+)
+from app.core.config import get_settings
+from app.repositories.chapter_extraction import ChapterExtractionRepository
 from app.repositories.shot_repository import ShotRepository
 
 
@@ -34,6 +44,76 @@ class NovelService:
         """获取 LLMService 实例（每次调用创建新实例以获取最新配置）"""
         return LLMService()
     
+    @staticmethod
+    def _chunk_failure_note(extracted: Dict[str, Any]) -> Optional[str]:
+        """构造部分文本块解析失败的提示信息"""
+        failed = extracted.get("failed_chunks") or []
+        if not failed:
+            return None
+        ranges = "、".join(f["sourceRange"] for f in failed)
+        return f"{len(failed)}/{extracted['chunk_count']} 个文本块解析失败（{ranges}）"
+    
+    # ==================== 增量解析记录 ====================
+
+    def _changed_chapters(
+        self,
+        novel_id: str,
+        chapters: List[Chapter],
+        extraction_type: str,
+        template_version: str
+    ) -> List[Chapter]:
+        """筛选自上次解析后内容或解析提示词模板发生变化（或从未成功解析）的章节"""
+        records = ChapterExtractionRepository(self.db).get_map_by_novel(novel_id, extraction_type)
+        changed = []
+        for chapter in chapters:
+            record = records.get(chapter.id)
+            if (
+                record is None
+                or record.template_version != template_version
+                or record.content_hash != content_hash(chapter.content)
+            ):
+                changed.append(chapter)
+        return changed
+
+    def _record_extractions(
+        self,
+        novel_id: str,
+        chapters: List[Chapter],
+        extraction_type: str,
+        template_version: str,
+        extracted: Dict[str, Any]
+    ) -> None:
+        """记录解析成功章节的内容指纹与实体名称（所在文本块解析失败的章节不记录，下次增量解析时重试）"""
+        repo = ChapterExtractionRepository(self.db)
+        chapter_entities = extracted.get("chapter_entities") or {}
+        for chapter in chapters:
+            if chapter.number in chapter_entities:
+                repo.upsert(
+                    novel_id=novel_id,
+                    chapter_id=chapter.id,
+                    extraction_type=extraction_type,
+                    template_version=template_version,
+                    content_hash=content_hash(chapter.content),
+                    entity_names=chapter_entities[chapter.number]
+                )
+        self.db.commit()
+
+    @staticmethod
+    def _unchanged_result(skipped: int) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "data": [],
+            "message": f"所选 {skipped} 个章节自上次解析后内容未变化，无需重新解析",
+            "statistics": {"created": 0, "updated": 0, "total": 0, "skippedChapters": skipped}
+        }
+
+    @staticmethod
+    def _chapters_range(chapters: List[Chapter]) -> str:
+        """章节列表的范围描述"""
+        if chapters[0].number == chapters[-1].number:
+            return f"第{chapters[0].number}章"
+        return f"第{chapters[0].number}章至第{chapters[-1].number}章"
+
     # ==================== 角色解析 ====================
     
     async def parse_characters(
@@ -66,20 +146,43 @@ class NovelService:
             end_desc = f"第{end_chapter}章" if end_chapter is not None else f"第{chapters[-1].number}章"
             source_range = f"{start_desc}至{end_desc}"
         
-        full_text = "\n\n".join([c.content for c in chapters if c.content])
-        if not full_text.strip():
+        # 增量模式只解析自上次解析后新增或修改的章节
+        template_version = content_hash(get_settings().PARSE_CHARACTERS_PROMPT or DEFAULT_PARSE_CHARACTERS_PROMPT)
+        skipped = 0
+        if is_incremental:
+            changed = self._changed_chapters(novel_id, chapters, "characters", template_version)
+            skipped = len(chapters) - len(changed)
+            if not changed:
+                return self._unchanged_result(skipped)
+            if skipped:
+                print(f"[ParseCharacters] 增量解析：{len(changed)} 个章节有变化，跳过 {skipped} 个")
+                chapters = changed
+                source_range = self._chapters_range(changed)
+        
+        extractor = ChunkedExtractor()
+        chunks = extractor.build_chunks(chapters, max_chars=NOVEL_TEXT_MAX_LENGTH)
+        if not chunks:
             return {"success": False, "message": "章节内容为空"}
         
         try:
-            # 调用 LLM 解析文本提取角色
-            result = await self.get_llm_service().parse_novel_text(full_text, novel_id=novel_id, source_range=source_range)
+            # 分块并行调用 LLM 解析文本提取角色
+            llm_service = self.get_llm_service()
+            result = await extractor.extract(
+                chunks,
+                lambda chunk: llm_service.parse_novel_text(
+                    chunk.text, novel_id=novel_id, source_range=chunk.source_range
+                ),
+                list_key="characters"
+            )
             
             if "error" in result:
                 return {"success": False, "message": f"解析失败: {result['error']}"}
             
+            self._record_extractions(novel_id, chapters, "characters", template_version, result)
+            failure_note = self._chunk_failure_note(result)
             characters_data = result.get("characters", [])
             if not characters_data:
-                return {"success": True, "data": [], "message": "未识别到角色"}
+                return {"success": True, "data": [], "message": failure_note or "未识别到角色"}
             
             # 创建角色记录
             created_characters = []
@@ -154,6 +257,10 @@ class NovelService:
             if not narrator:
                 character_repo_for_narrator.create_narrator(novel_id)
                 message_parts.append("自动创建旁白角色")
+            if skipped:
+                message_parts.append(f"跳过 {skipped} 个未变化章节")
+            if failure_note:
+                message_parts.append(failure_note)
 
             return {
                 "success": True,
@@ -176,7 +283,8 @@ class NovelService:
                 "statistics": {
                     "created": len(created_characters),
                     "updated": len(updated_characters),
-                    "total": len(created_characters) + len(updated_characters)
+                    "total": len(created_characters) + len(updated_characters),
+                    "skippedChapters": skipped
                 }
             }
             
@@ -219,10 +327,6 @@ class NovelService:
             end_desc = f"第{end_chapter}章" if end_chapter is not None else f"第{chapters[-1].number}章"
             source_range = f"{start_desc}至{end_desc}"
 
-        full_text = "\n\n".join([c.content for c in chapters if c.content])
-        if not full_text.strip():
-            return {"success": False, "message": "章节内容为空"}
-
         try:
             # 获取道具解析提示词模板
             prompt_template = None
@@ -241,18 +345,44 @@ class NovelService:
                     with open(template_path, "r", encoding="utf-8") as f:
                         prompt_template = f.read()
 
-            # 调用 LLM 解析文本提取道具
-            result = await self.get_llm_service().parse_props(
-                text=full_text[:150000],  # 限制长度
-                prompt_template=prompt_template
+            # 增量模式只解析自上次解析后新增或修改的章节
+            template_version = content_hash(prompt_template)
+            skipped = 0
+            if is_incremental:
+                changed = self._changed_chapters(novel_id, chapters, "props", template_version)
+                skipped = len(chapters) - len(changed)
+                if not changed:
+                    return self._unchanged_result(skipped)
+                if skipped:
+                    print(f"[ParseProps] 增量解析：{len(changed)} 个章节有变化，跳过 {skipped} 个")
+                    chapters = changed
+                    source_range = self._chapters_range(changed)
+
+            extractor = ChunkedExtractor()
+            chunks = extractor.build_chunks(chapters, max_chars=NOVEL_TEXT_MAX_LENGTH)
+            if not chunks:
+                return {"success": False, "message": "章节内容为空"}
+
+            # 分块并行调用 LLM 解析文本提取道具
+            llm_service = self.get_llm_service()
+            result = await extractor.extract(
+                chunks,
+                lambda chunk: llm_service.parse_props(
+                    text=chunk.text,
+                    prompt_template=prompt_template,
+                    novel_id=novel_id
+                ),
+                list_key="props"
             )
 
             if result.get("error"):
                 return {"success": False, "message": result["error"]}
 
+            self._record_extractions(novel_id, chapters, "props", template_version, result)
+            failure_note = self._chunk_failure_note(result)
             props_data = result.get("props", [])
             if not props_data:
-                return {"success": True, "data": [], "message": "未识别到道具"}
+                return {"success": True, "data": [], "message": failure_note or "未识别到道具"}
 
             # 创建道具记录
             created_props = []
@@ -315,6 +445,10 @@ class NovelService:
                 message_parts.append(f"新增 {len(created_props)} 个道具")
             if updated_props:
                 message_parts.append(f"更新 {len(updated_props)} 个道具")
+            if skipped:
+                message_parts.append(f"跳过 {skipped} 个未变化章节")
+            if failure_note:
+                message_parts.append(failure_note)
 
             return {
                 "success": True,
@@ -336,7 +470,8 @@ class NovelService:
                 "statistics": {
                     "created": len(created_props),
                     "updated": len(updated_props),
-                    "total": len(created_props) + len(updated_props)
+                    "total": len(created_props) + len(updated_props),
+                    "skippedChapters": skipped
                 }
             }
 
@@ -377,29 +512,53 @@ class NovelService:
         else:
             source_range = f"第{chapters[0].number}章 ~ 第{chapters[-1].number}章"
         
-        # 合并章节内容
-        combined_content = ""
-        for chapter in chapters:
-            combined_content += f"\n\n【第{chapter.number}章 {chapter.title}】\n{chapter.content or ''}"
-        
         # 获取场景解析提示词模板
         prompt_template = None
         if prompt_template_repo:
             templates = prompt_template_repo.list_by_type('scene_parse')
             prompt_template = templates[0].template if templates else None
         
+        # 增量模式只解析自上次解析后新增或修改的章节
+        template_version = content_hash(prompt_template or DEFAULT_PARSE_SCENES_PROMPT)
+        skipped = 0
+        if mode == "incremental":
+            changed = self._changed_chapters(novel_id, chapters, "scenes", template_version)
+            skipped = len(chapters) - len(changed)
+            if not changed:
+                return self._unchanged_result(skipped)
+            if skipped:
+                print(f"[ParseScenes] 增量解析：{len(changed)} 个章节有变化，跳过 {skipped} 个")
+                chapters = changed
+                source_range = (
+                    f"第{changed[0].number}章" if len(changed) == 1
+                    else f"第{changed[0].number}章 ~ 第{changed[-1].number}章"
+                )
+        
+        # 按章节边界分块（块内保留【第N章 标题】标记）
+        extractor = ChunkedExtractor()
+        chunks = extractor.build_chunks(chapters, max_chars=CHAPTER_CONTENT_MAX_LENGTH)
+        if not chunks:
+            return {"success": False, "message": "章节内容为空"}
+        
         try:
-            # 调用 LLM 解析场景
-            result = await self.get_llm_service().parse_scenes(
-                novel_id=novel_id,
-                chapter_content=combined_content[:150000],  # 限制长度
-                chapter_title=source_range,
-                prompt_template=prompt_template
+            # 分块并行调用 LLM 解析场景
+            llm_service = self.get_llm_service()
+            result = await extractor.extract(
+                chunks,
+                lambda chunk: llm_service.parse_scenes(
+                    novel_id=novel_id,
+                    chapter_content=chunk.text,
+                    chapter_title=chunk.source_range,
+                    prompt_template=prompt_template
+                ),
+                list_key="scenes"
             )
             
             if result.get("error"):
                 return {"success": False, "message": result["error"]}
             
+            self._record_extractions(novel_id, chapters, "scenes", template_version, result)
+            failure_note = self._chunk_failure_note(result)
             scenes_data = result.get("scenes", [])
             
             # 获取现有场景
@@ -451,6 +610,10 @@ class NovelService:
                 message_parts.append(f"新增 {len(created_scenes)} 个场景")
             if updated_scenes:
                 message_parts.append(f"更新 {len(updated_scenes)} 个场景")
+            if skipped:
+                message_parts.append(f"跳过 {skipped} 个未变化章节")
+            if failure_note:
+                message_parts.append(failure_note)
             
             return {
                 "success": True,
@@ -472,7 +635,8 @@ class NovelService:
                 "statistics": {
                     "created": len(created_scenes),
                     "updated": len(updated_scenes),
-                    "total": len(created_scenes) + len(updated_scenes)
+                    "total": len(created_scenes) + len(updated_scenes),
+                    "skippedChapters": skipped
                 }
             }
             
@@ -626,17 +790,23 @@ class NovelService:
         chapter: Chapter,
         character_names: List[str],
         scene_names: List[str],
-        prop_names: List[str] = None
+        prop_names: List[str] = None,
+        on_shot_created: Callable[[Dict[str, Any]], Awaitable[None]] = None,
+        use_cache: bool = True
     ) -> Dict[str, Any]:
         """
         使用小说配置的拆分提示词将章节拆分为分镜
         
+        LLM 以流式输出，每个分镜闭合后立即写入 Shot 表，无需等待完整响应。
+        
         Args:
             novel: 小说对象
             chapter: 章节对象
             character_names: 角色名称列表
             scene_names: 场景名称列表
             prop_names: 道具名称列表
+            on_shot_created: 分镜写入后的回调（参数为分镜响应数据），用于推送给客户端
+            use_cache: 为 False 时不复用缓存的 LLM 响应（重新拆分）
             
         Returns:
             拆分结果
@@ -688,49 +858,62 @@ class NovelService:
         style, style_template = get_style(self.db, novel, "character")
         print(f"[SplitChapter] Using style: {style}")
         
-        # 调用 LLM 进行拆分
-        result = await llm_service.split_chapter_with_prompt(
+        # 使用 ShotRepository 管理分镜数据
+        shot_repo = ShotRepository(self.db)
+        created_shots = []
+
+        async def create_shot(shot_data: Dict[str, Any]):
+            # 收到第一个分镜时才删除章节的现有分镜记录（重新拆分时）
+            if not created_shots:
+                shot_repo.delete_by_chapter(chapter.id)
+            shot = shot_repo.create(
+                chapter_id=chapter.id,
+                index=len(created_shots) + 1,
+                description=shot_data.get("description", ""),
+                video_description=shot_data.get("video_description", ""),
+                characters=shot_data.get("characters", []),
+                scene=shot_data.get("scene", ""),
+                props=shot_data.get("props", []),
+                duration=shot_data.get("duration", 4),
+                dialogues=shot_data.get("dialogues", []),
+            )
+            created_shots.append(shot)
+            if on_shot_created:
+                await on_shot_created(shot_repo.to_response(shot))
+
+        # 调用 LLM 进行拆分（流式，分镜逐个写入）
+        result = await llm_service.split_chapter_with_prompt_stream(
             chapter_title=chapter.title,
             chapter_content=chapter.content or "",
             prompt_template=prompt_template.template,
+            on_shot=create_shot,
             word_count=100,
             character_names=character_names,
             scene_names=scene_names,
             prop_names=prop_names,
-            style=style
+            style=style,
+            use_cache=use_cache
         )
 
         # 检查是否有错误
         if result.get("error"):
+            message = f"LLM 拆分失败: {result.get('error')}"
+            if created_shots:
+                message += f"（已生成 {len(created_shots)} 个分镜）"
             return {
                 "success": False,
-                "message": f"LLM 拆分失败: {result.get('error')}",
+                "message": message,
                 "data": result
             }
 
+        # 按位置用完整解析结果补齐流式阶段未产出的末尾分镜（如响应在最后一个分镜处截断、需修复后才能解析）。
+        # 假设已创建的分镜是完整结果的前缀：流式解析失败的中间元素在完整解析中同样失败（两者跳过相同的元素），
+        # 否则按位置补齐会错位
         shots_data = result.get("shots", [])
-
-        # 使用 ShotRepository 管理分镜数据
-        shot_repo = ShotRepository(self.db)
-
-        # 删除章节的现有分镜记录（重新拆分时）
-        shot_repo.delete_by_chapter(chapter.id)
-
-        # 创建 Shot 记录
-        created_shots = []
-        for idx, shot_data in enumerate(shots_data, 1):
-            shot = shot_repo.create(
-                chapter_id=chapter.id,
-                index=idx,
-                description=shot_data.get("description", ""),
-                video_description=shot_data.get("video_description", ""),
-                characters=shot_data.get("characters", []),
-                scene=shot_data.get("scene", ""),
-                props=shot_data.get("props", []),
-                duration=shot_data.get("duration", 4),
-                dialogues=shot_data.get("dialogues", []),
-            )
-            created_shots.append(shot)
+        for shot_data in shots_data[len(created_shots):]:
+            await create_shot(shot_data)
+        if not created_shots:
+            shot_repo.delete_by_chapter(chapter.id)
 
         # 更新 parsed_data，移除 shots 数组（已迁移到 Shot 表）
         parsed_data_for_storage = {
@@ -738,6 +921,8 @@ class NovelService:
             "characters": result.get("characters", []),
             "scenes": result.get("scenes", []),
             "props": result.get("props", []),
+            # 拆分时的章节内容指纹，批量拆分据此跳过内容未变化的章节
+            "content_hash": content_hash(chapter.content),
         }
         # 保留 transition_videos（如果存在）
         existing_parsed = {}
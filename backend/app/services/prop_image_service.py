@@ -4,7 +4,6 @@
 封装道具图片生成的业务逻辑
 """
 import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -14,8 +13,10 @@ from app.models.novel import Prop, Novel
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.repositories import TaskRepository, WorkflowRepository, PropRepository
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task, report_progress
 from app.services.prompt_builder import build_prop_prompt, get_style
 
 
@@ -29,7 +30,8 @@ class PropService:
     def create_prop_image_task(
         self,
         prop_id: str,
-        db: Session = None
+        db: Session = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         创建道具图生成任务
@@ -37,6 +39,7 @@ class PropService:
         Args:
             prop_id: 道具ID
             db: 数据库会话
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
 
         Returns:
             创建结果
@@ -97,15 +100,14 @@ class PropService:
         prop.prop_task_id = task.id
         db.commit()
 
-        # 启动后台任务
-        asyncio.create_task(
-            self._generate_prop_image_task(
-                task.id,
-                prop_id,
-                prop.name,
-                prop.appearance,
-                prop.description
-            )
+        # 加入任务队列
+        enqueue_task(
+            task,
+            prop_id=prop_id,
+            name=prop.name,
+            appearance=prop.appearance,
+            description=prop.description,
+            use_memo=use_memo
         )
 
         return {
@@ -123,7 +125,8 @@ class PropService:
         prop_id: str,
         name: str,
         appearance: str,
-        description: str
+        description: str,
+        use_memo: bool = True
     ):
         """
         后台任务：生成道具图
@@ -134,6 +137,7 @@ class PropService:
             name: 道具名称
             appearance: 道具外观
             description: 道具描述
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
         """
         from app.core.database import SessionLocal
         db = SessionLocal()
@@ -161,7 +165,7 @@ class PropService:
             # 更新任务状态为运行中
             task.status = "running"
             task.started_at = datetime.utcnow()
-            db.commit()
+            await async_commit(db)
 
             # 获取道具所属小说
             prop = prop_repo.get_by_id(prop_id)
@@ -188,7 +192,7 @@ class PropService:
                 task.error_message = "道具缺少外观描述，无法生成图片"
                 task.current_step = "生成失败"
                 self._update_prop_status(prop_repo, prop_id, "failed")
-                db.commit()
+                await async_commit(db)
                 return
 
             prompt = build_prop_prompt(name, raw_appearance, "", template.template if template else None, style)
@@ -198,7 +202,7 @@ class PropService:
 
             # 保存提示词
             task.prompt_text = prompt
-            db.commit()
+            await async_commit(db)
 
             # 获取工作流JSON字符串
             workflow_json_str = workflow.workflow_json if workflow else None
@@ -225,18 +229,17 @@ class PropService:
                 scene_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                style=style
+                style=style,
+                workflow_key=workflow_cache_key(workflow)
             )
 
             # 保存构建后的完整工作流到任务
             task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
-            db.commit()
+            await async_commit(db)
             print(f"[PropTask] Saved submitted workflow to task")
 
             # 调用 ComfyUI 生成图片
-            task.current_step = "正在调用 ComfyUI 生成图片..."
-            task.progress = 30
-            db.commit()
+            report_progress(task.id, current_step="正在调用 ComfyUI 生成图片...", progress=30)
 
             result = await self.comfyui_service.generate_scene_image(
                 prompt,
@@ -245,7 +248,8 @@ class PropService:
                 scene_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                workflow=submitted_workflow
+                workflow=submitted_workflow,
+                use_memo=use_memo
             )
 
             print(f"[PropTask] Generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -257,8 +261,7 @@ class PropService:
                 image_url = result.get("image_url")
 
                 # 下载图片到本地存储
-                task.current_step = "下载图片到服务器..."
-                db.commit()
+                report_progress(task.id, current_step="下载图片到服务器...")
 
                 try:
                     local_path = await file_storage.download_image(
@@ -276,11 +279,11 @@ class PropService:
                         task.current_step = "生成完成，图片已保存"
                     else:
                         # 下载失败，使用原始URL
-                        task.result_url = image_url
+                        task.result_url = file_storage.fallback_url(image_url)
                         task.current_step = "生成完成，使用远程图片"
                 except Exception as e:
                     print(f"[PropTask] Failed to download prop image: {e}")
-                    task.result_url = image_url
+                    task.result_url = file_storage.fallback_url(image_url)
                     task.current_step = "生成完成，使用远程图片"
 
                 task.status = "completed"
@@ -302,7 +305,7 @@ class PropService:
                 if prop:
                     prop.generating_status = "failed"
 
-            db.commit()
+            await async_commit(db)
 
         except Exception as e:
             task.status = "failed"
@@ -317,7 +320,7 @@ class PropService:
             except:
                 pass
 
-            db.commit()
+            await async_commit(db)
         finally:
             db.close()
 
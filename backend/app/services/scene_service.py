@@ -4,7 +4,6 @@
 封装场景相关的业务逻辑
 """
 import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, Optional
 
@@ -14,8 +13,10 @@ from app.models.novel import Scene
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.repositories import TaskRepository, WorkflowRepository, SceneRepository
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task, report_progress
 from app.services.prompt_builder import build_scene_prompt, get_style
 
 
@@ -29,7 +30,8 @@ class SceneService:
     def create_scene_image_task(
         self,
         scene_id: str,
-        db: Session = None
+        db: Session = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         创建场景图生成任务
@@ -37,6 +39,7 @@ class SceneService:
         Args:
             scene_id: 场景ID
             db: 数据库会话
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
             
         Returns:
             创建结果
@@ -92,15 +95,14 @@ class SceneService:
         scene.scene_task_id = task.id
         db.commit()
         
-        # 启动后台任务
-        asyncio.create_task(
-            self._generate_scene_image_task(
-                task.id,
-                scene_id,
-                scene.name,
-                scene.setting,
-                scene.description
-            )
+        # 加入任务队列
+        enqueue_task(
+            task,
+            scene_id=scene_id,
+            name=scene.name,
+            setting=scene.setting,
+            description=scene.description,
+            use_memo=use_memo
         )
         
         return {
@@ -118,7 +120,8 @@ class SceneService:
         scene_id: str,
         name: str,
         setting: str,
-        description: str
+        description: str,
+        use_memo: bool = True
     ):
         """
         后台任务：生成场景图
@@ -129,6 +132,7 @@ class SceneService:
             name: 场景名称
             setting: 环境设置
             description: 场景描述
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
         """
         from app.core.database import SessionLocal
         db = SessionLocal()
@@ -156,7 +160,7 @@ class SceneService:
             # 更新任务状态为运行中
             task.status = "running"
             task.started_at = datetime.utcnow()
-            db.commit()
+            await async_commit(db)
 
             # 获取场景所属小说
             scene = scene_repo.get_by_id(scene_id)
@@ -185,7 +189,7 @@ class SceneService:
 
             # 保存提示词
             task.prompt_text = prompt
-            db.commit()
+            await async_commit(db)
 
             # 获取工作流JSON字符串
             workflow_json_str = workflow.workflow_json if workflow else None
@@ -212,12 +216,13 @@ class SceneService:
                 scene_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                style=style
+                style=style,
+                workflow_key=workflow_cache_key(workflow)
             )
 
             # 保存构建后的完整工作流到任务
             task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
-            db.commit()
+            await async_commit(db)
             print(f"[Task] Saved submitted scene workflow to task")
 
             # 调用 ComfyUI 生成图片
@@ -228,7 +233,8 @@ class SceneService:
                 scene_name=name,
                 aspect_ratio=novel.aspect_ratio if novel else None,
                 node_mapping=node_mapping,
-                workflow=submitted_workflow
+                workflow=submitted_workflow,
+                use_memo=use_memo
             )
 
             print(f"[Task] Scene generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -237,8 +243,7 @@ class SceneService:
                 image_url = result.get("image_url")
 
                 # 下载图片到本地存储
-                task.current_step = "下载图片到服务器..."
-                db.commit()
+                report_progress(task.id, current_step="下载图片到服务器...")
 
                 try:
                     local_path = await file_storage.download_image(
@@ -256,11 +261,11 @@ class SceneService:
                         task.current_step = "生成完成，图片已保存"
                     else:
                         # 下载失败，使用原始URL
-                        task.result_url = image_url
+                        task.result_url = file_storage.fallback_url(image_url)
                         task.current_step = "生成完成，使用远程图片"
                 except Exception as e:
                     print(f"[Task] Failed to download scene image: {e}")
-                    task.result_url = image_url
+                    task.result_url = file_storage.fallback_url(image_url)
                     task.current_step = "生成完成，使用远程图片"
 
                 task.status = "completed"
@@ -282,7 +287,7 @@ class SceneService:
                 if scene:
                     scene.generating_status = "failed"
 
-            db.commit()
+            await async_commit(db)
 
         except Exception as e:
             task.status = "failed"
@@ -297,7 +302,7 @@ class SceneService:
             except:
                 pass
 
-            db.commit()
+            await async_commit(db)
         finally:
             db.close()
     
@@ -0,0 +1,42 @@
+"""
+任务调度模块
+
+基于 tasks 表的持久化任务队列，替代直接 asyncio.create_task 启动后台任务：
+- 有界并发（全局 / ComfyUI / 单任务类型）
+- 优先级与原子领取、租约续约
+- ComfyUI 任务按所需模型分组领取
+- 交互/批量调度通道（批量任务不占用为交互任务预留的 ComfyUI 名额）
+- 启动时恢复中断的任务
+- 进程内执行（SQLite 单机）或 Celery 分发执行
+- 任务进度合并写入
+- 任务事件实时推送
+- 汇总任务终态写入与终止检查
+"""
+
+from .scheduler import TaskScheduler, get_task_scheduler, init_task_scheduler, enqueue_task
+from .affinity import ModelAffinityPlanner
+from .lanes import LaneMetrics
+from .registry import register_task_handler, get_task_handler, registered_task_types
+from .progress import TaskProgressWriter, get_progress_writer, report_progress
+from .events import TaskEventBus, get_task_event_bus, task_event_payload
+from .aggregate import finish_task, load_task_status
+
+__all__ = [
+    "TaskScheduler",
+    "get_task_scheduler",
+    "init_task_scheduler",
+    "enqueue_task",
+    "ModelAffinityPlanner",
+    "LaneMetrics",
+    "register_task_handler",
+    "get_task_handler",
+    "registered_task_types",
+    "TaskProgressWriter",
+    "get_progress_writer",
+    "report_progress",
+    "TaskEventBus",
+    "get_task_event_bus",
+    "task_event_payload",
+    "finish_task",
+    "load_task_status",
+]
@@ -0,0 +1,178 @@
+"""
+ComfyUI 任务按模型分组调度
+
+角色图（z-image）、分镜图（flux2）、视频（ltx-2）与配音（TTS）任务交替提交时，ComfyUI 每个任务都可能
+卸载并重新加载数 GB 的模型，加载耗时往往超过采样本身。领取 ComfyUI 任务时：
+- 按任务工作流模板中模型加载节点使用的模型文件分组（未关联工作流的任务按任务类型分组）
+- 同一优先级内优先领取与上一个任务同组的任务，把一组任务执行完再切换模型
+- 当前组连续插队超过 TASK_MODEL_AFFINITY_MAX_SKIPS 次后切换到等待最久的其他组（防止饿死）
+- 等待超过目标时间（TASK_WAIT_SLO）的任务在同一优先级内最先领取，不受分组影响，但不越过更高优先级的任务
+"""
+from datetime import datetime
+from typing import Dict, Hashable, List, Optional, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.constants import COMFYUI_TASK_TYPES, DEFAULT_COMFYUI_WAIT_SLO
+from app.core.config import get_settings
+from app.models.task import Task
+from app.models.workflow import Workflow
+from app.services.comfyui.compiled import get_compiled_workflow, workflow_cache_key
+
+# 领取原因
+PICK_FIFO = "fifo"  # 按优先级与创建时间的原顺序
+PICK_AFFINITY = "affinity"  # 同组任务插到其他组任务之前
+PICK_STARVATION = "starvation"  # 插队次数达到上限后切换分组
+PICK_SLO = "slo"  # 等待超过目标时间
+
+
+def wait_slo(task_type: str) -> Optional[int]:
+    """任务类型的等待时间目标（秒），未配置返回 None"""
+    settings = get_settings()
+    if task_type in settings.TASK_WAIT_SLO:
+        return settings.TASK_WAIT_SLO[task_type]
+    return DEFAULT_COMFYUI_WAIT_SLO.get(task_type)
+
+
+def task_model_groups(db: Session, tasks: List[Task]) -> Dict[str, Hashable]:
+    """
+    计算任务的模型分组
+
+    Returns:
+        {任务ID: 所需模型文件集合（或任务类型）}
+    """
+    workflow_ids = {t.workflow_id for t in tasks if t.workflow_id}
+    models = {}
+    if workflow_ids:
+        for workflow in db.query(Workflow).filter(Workflow.id.in_(workflow_ids)).all():
+            try:
+                models[workflow.id] = get_compiled_workflow(
+                    workflow.workflow_json, workflow_cache_key(workflow)
+                ).model_files
+            except (TypeError, ValueError):
+                continue
+    return {
+        t.id: models.get(t.workflow_id) or ("type", t.type)
+        for t in tasks
+    }
+
+
+def task_wait_seconds(task: Task, now: datetime) -> float:
+    """任务从创建到 now 的等待时间（秒）"""
+    if task.created_at is None:
+        return 0.0
+    return (now - task.created_at.replace(tzinfo=None)).total_seconds()
+
+
+class ModelAffinityPlanner:
+    """ComfyUI 任务模型分组领取顺序与统计"""
+
+    def __init__(self):
+        # 上一个领取的 ComfyUI 任务所属分组（视为 ComfyUI 当前已加载的模型）
+        self.current: Optional[Hashable] = None
+        # 当前分组已插队的次数
+        self.skips = 0
+        self.claims = 0
+        self.swaps = 0
+        self.swaps_avoided = 0
+        self.starvation_switches = 0
+        self.slo_overrides = 0
+        self.slo_misses = 0
+
+    def _pick(
+        self,
+        remaining: List[Task],
+        groups: Dict[str, Hashable],
+        current: Optional[Hashable],
+        skips: int,
+        now: datetime
+    ) -> Tuple[Task, str]:
+        head = remaining[0]
+        # 等待时间目标与分组只在同一优先级内生效，批量积压不会越过交互任务
+        level = [t for t in remaining if (t.priority or 0) == (head.priority or 0)]
+        for task in level:
+            slo = wait_slo(task.type)
+            if slo is not None and task_wait_seconds(task, now) >= slo:
+                return task, (PICK_SLO if task is not head else PICK_FIFO)
+
+        if current is None or groups[head.id] == current:
+            return head, PICK_FIFO
+        same = next((t for t in level if groups[t.id] == current), None)
+        if same is None:
+            return head, PICK_FIFO
+        if skips < get_settings().TASK_MODEL_AFFINITY_MAX_SKIPS:
+            return same, PICK_AFFINITY
+        return head, PICK_STARVATION
+
+    def order(
+        self,
+        tasks: List[Task],
+        groups: Dict[str, Hashable],
+        now: datetime = None
+    ) -> List[Tuple[Task, Optional[str]]]:
+        """
+        调整 ComfyUI 任务的领取顺序（非 ComfyUI 任务保持原位置）
+
+        Args:
+            tasks: 按优先级、创建时间排序的待领取任务
+            groups: 任务模型分组
+
+        Returns:
+            [(任务, 领取原因)]，非 ComfyUI 任务的领取原因为 None
+        """
+        now = now or datetime.utcnow()
+        remaining = [t for t in tasks if t.type in COMFYUI_TASK_TYPES]
+        current, skips = self.current, self.skips
+        picks = []
+        while remaining:
+            task, reason = self._pick(remaining, groups, current, skips, now)
+            remaining.remove(task)
+            picks.append((task, reason))
+            if groups[task.id] != current:
+                skips = 0
+            if reason == PICK_AFFINITY:
+                skips += 1
+            current = groups[task.id]
+
+        picks.reverse()
+        return [
+            picks.pop() if t.type in COMFYUI_TASK_TYPES else (t, None)
+            for t in tasks
+        ]
+
+    def record(self, task: Task, group: Hashable, reason: str, now: datetime = None):
+        """记录实际领取的 ComfyUI 任务"""
+        now = now or datetime.utcnow()
+        self.claims += 1
+        if group != self.current:
+            if self.current is not None:
+                self.swaps += 1
+            self.skips = 0
+        if reason == PICK_AFFINITY:
+            self.swaps_avoided += 1
+            self.skips += 1
+        elif reason == PICK_STARVATION:
+            self.starvation_switches += 1
+        elif reason == PICK_SLO:
+            self.slo_overrides += 1
+        slo = wait_slo(task.type)
+        if slo is not None and task_wait_seconds(task, now) >= slo:
+            self.slo_misses += 1
+        self.current = group
+
+    def stats(self) -> Dict[str, object]:
+        current = self.current
+        if isinstance(current, frozenset):
+            current = sorted(current)
+        elif isinstance(current, tuple):
+            current = f"{current[0]}:{current[1]}"
+        return {
+            "enabled": get_settings().TASK_MODEL_AFFINITY_ENABLED,
+            "current_models": current,
+            "claims": self.claims,
+            "model_swaps": self.swaps,
+            "swaps_avoided": self.swaps_avoided,
+            "starvation_switches": self.starvation_switches,
+            "slo_overrides": self.slo_overrides,
+            "slo_misses": self.slo_misses,
+        }
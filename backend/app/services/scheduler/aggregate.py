@@ -0,0 +1,41 @@
+"""
+汇总任务公共操作
+
+批量拆分章节、批量生成外貌描述、批量生成分镜图等汇总任务共用：
+写入终态，以及在执行期间检查任务是否已被用户终止。
+"""
+from datetime import datetime
+from typing import Optional
+
+from app.core.database import SessionLocal
+from app.core.db_executor import async_commit
+from app.models.task import Task
+
+
+async def finish_task(db, task: Task, status: str, step: str, error_message: str = None):
+    """
+    写入汇总任务的终态（提交在数据库执行线程中完成）
+
+    Args:
+        db: 任务所在的数据库会话
+        task: 任务
+        status: 终态（completed / failed）
+        step: 当前步骤描述
+        error_message: 错误信息
+    """
+    task.status = status
+    task.current_step = step
+    task.progress = 100 if status == "completed" else task.progress
+    task.error_message = error_message
+    task.completed_at = datetime.utcnow()
+    await async_commit(db)
+
+
+def load_task_status(task_id: str) -> Optional[str]:
+    """读取任务当前状态（使用独立会话，供 run_db 调用），任务不存在时返回 None"""
+    db = SessionLocal()
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        return task.status if task else None
+    finally:
+        db.close()
@@ -0,0 +1,70 @@
+"""
+任务执行后端
+
+- InProcessBackend: 在当前事件循环中执行（单机 SQLite 部署）
+- CeleryBackend: 通过 Redis 分发给 Celery worker 执行（多机部署）
+
+两种后端共用 tasks 表上的领取/租约逻辑，并发上限由调度器统一控制。
+"""
+import asyncio
+from typing import Dict
+
+
+class InProcessBackend:
+    """进程内执行后端"""
+
+    # 领取者即执行者，同机同进程存活即可判断任务是否仍在执行
+    is_local = True
+
+    def __init__(self):
+        self._tasks: Dict[str, asyncio.Task] = {}
+
+    def submit(self, task_id: str, owner: str, priority: int = 0) -> None:
+        from app.services.scheduler.runner import run_claimed_task
+
+        task = asyncio.create_task(run_claimed_task(task_id, owner))
+        self._tasks[task_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(task_id, None))
+
+    def running_task_ids(self):
+        return list(self._tasks.keys())
+
+    async def shutdown(self) -> list:
+        """取消所有执行中的任务，返回被中断的任务 ID"""
+        interrupted = list(self._tasks.keys())
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return interrupted
+
+
+class CeleryBackend:
+    """Celery 执行后端"""
+
+    # 任务在其他进程/机器上执行，只能依据租约过期判断是否中断
+    is_local = False
+
+    def submit(self, task_id: str, owner: str, priority: int = 0) -> None:
+        from app.services.scheduler.celery_app import run_task
+
+        # Celery/Redis 优先级 0 最高、9 最低
+        celery_priority = max(0, min(9, 5 - priority // 5))
+        run_task.apply_async(args=[task_id, owner], priority=celery_priority)
+
+    def running_task_ids(self):
+        return []
+
+    async def shutdown(self) -> list:
+        return []
+
+
+def create_backend(name: str):
+    """根据配置创建执行后端"""
+    if name == "celery":
+        from app.services.scheduler.celery_app import CELERY_AVAILABLE
+        if CELERY_AVAILABLE:
+            return CeleryBackend()
+        print("[TaskScheduler] celery 未安装，回退到进程内执行")
+    return InProcessBackend()
@@ -0,0 +1,33 @@
+"""
+Celery 应用（TASK_BACKEND=celery 时使用）
+
+启动 worker: cd backend && celery -A app.services.scheduler.celery_app worker --concurrency=4
+任务的领取与并发控制仍由 API 进程中的调度器负责，worker 只执行已领取的任务。
+"""
+import asyncio
+
+from app.core.config import get_settings
+
+try:
+    from celery import Celery
+    CELERY_AVAILABLE = True
+except ImportError:
+    CELERY_AVAILABLE = False
+
+
+if CELERY_AVAILABLE:
+    _settings = get_settings()
+
+    celery_app = Celery("novelflow", broker=_settings.REDIS_URL)
+    celery_app.conf.update(
+        task_acks_late=True,  # 执行完成才确认，worker 崩溃时消息重新投递
+        task_reject_on_worker_lost=True,
+        worker_prefetch_multiplier=1,
+        broker_transport_options={"priority_steps": list(range(10)), "queue_order_strategy": "priority"},
+    )
+
+    @celery_app.task(name="novelflow.run_task")
+    def run_task(task_id: str, owner: str):
+        """执行已领取的任务"""
+        from app.services.scheduler.runner import run_claimed_task
+        asyncio.run(run_claimed_task(task_id, owner))
@@ -0,0 +1,326 @@
+"""
+任务事件推送
+
+将任务状态变化实时推送给 WebSocket / SSE 订阅者，替代客户端轮询 /api/tasks：
+- 任务记录提交（状态、进度、错误等字段变化）时由 Session 事件采集；
+  仓库中的批量 UPDATE（领取、释放租约、移除子任务）不经过 flush，提交前按记录的任务ID读取最新状态
+- report_progress 的进度更新在写库前直接推送
+- ComfyUI 的 progress / executing 事件按 prompt_id 关联到任务，推送采样步数与当前节点
+- 订阅可按小说/章节过滤；同一任务在合并窗口内的多次变化合并为一条
+
+只在当前进程内推送（Celery worker 中执行的任务只推送数据库提交产生的事件）。
+"""
+import asyncio
+from collections import OrderedDict
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Set
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from app.constants import task_lane
+from app.core.config import get_settings
+from app.models.task import Task
+from app.repositories.task import BULK_UPDATED_TASKS_KEY
+
+# 变化时需要推送的任务字段 -> 事件字段
+_TRACKED_FIELDS = {
+    "status": "status",
+    "progress": "progress",
+    "current_step": "currentStep",
+    "error_message": "errorMessage",
+    "result_url": "resultUrl",
+}
+
+# 任务事件数据所需的列（批量 UPDATE 后按列读取，不影响会话中已加载的对象）
+_EVENT_COLUMNS = (
+    Task.id, Task.type, Task.name, Task.status, Task.progress, Task.current_step,
+    Task.error_message, Task.result_url, Task.novel_id, Task.chapter_id,
+    Task.shot_id, Task.character_id, Task.scene_id, Task.prop_id,
+)
+
+# 任务 -> 小说/章节 归属缓存上限
+_TASK_INFO_LIMIT = 4096
+
+# 当前执行的任务（由任务执行器设置，ComfyUI 提交时据此关联 prompt_id）
+_current_task: ContextVar[Optional[Dict[str, Any]]] = ContextVar("current_task", default=None)
+# 当前执行任务的调度通道（ComfyUI 提交时交互通道插到队列最前）
+_current_lane: ContextVar[Optional[str]] = ContextVar("current_lane", default=None)
+# 当前执行任务固定的生成种子（保存在任务参数中，重试时不变）
+_current_seed: ContextVar[Optional[int]] = ContextVar("current_seed", default=None)
+
+
+def task_event_payload(task: Task) -> Dict[str, Any]:
+    """任务事件数据（字段与任务列表接口一致）"""
+    return {
+        "id": task.id,
+        "type": task.type,
+        "name": task.name,
+        "status": task.status,
+        "progress": task.progress,
+        "currentStep": task.current_step,
+        "errorMessage": task.error_message,
+        "resultUrl": task.result_url,
+        "novelId": task.novel_id,
+        "chapterId": task.chapter_id,
+        "shotId": task.shot_id,
+        "characterId": task.character_id,
+        "sceneId": task.scene_id,
+        "propId": task.prop_id,
+    }
+
+
+def set_current_task(task: Task, seed: Optional[int] = None):
+    """标记当前协程正在执行的任务，返回用于恢复的 token（seed 为任务固定的生成种子）"""
+    task_token = _current_task.set({
+        "id": task.id,
+        "type": task.type,
+        "novelId": task.novel_id,
+        "chapterId": task.chapter_id,
+    })
+    return task_token, _current_lane.set(task_lane(task.priority)), _current_seed.set(seed)
+
+
+def reset_current_task(token):
+    task_token, lane_token, seed_token = token
+    _current_task.reset(task_token)
+    _current_lane.reset(lane_token)
+    _current_seed.reset(seed_token)
+
+
+def get_current_task() -> Optional[Dict[str, Any]]:
+    """当前协程正在执行的任务（id / type / novelId / chapterId），不在任务中时为 None"""
+    return _current_task.get()
+
+
+def get_current_lane() -> Optional[str]:
+    """当前协程正在执行的任务所属调度通道，不在任务中时为 None"""
+    return _current_lane.get()
+
+
+def get_current_seed() -> Optional[int]:
+    """当前协程正在执行的任务固定的生成种子，不在任务中时为 None"""
+    return _current_seed.get()
+
+
+class TaskEventSubscription:
+    """单个订阅者，按任务合并待发送事件"""
+
+    def __init__(self, novel_id: str = None, chapter_id: str = None):
+        self.novel_id = novel_id
+        self.chapter_id = chapter_id
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._ready = asyncio.Event()
+
+    def matches(self, event_data: Dict[str, Any]) -> bool:
+        if self.novel_id and event_data.get("novelId") != self.novel_id:
+            return False
+        if self.chapter_id and event_data.get("chapterId") != self.chapter_id:
+            return False
+        return True
+
+    def push(self, event_data: Dict[str, Any]):
+        merged = self._pending.get(event_data["id"])
+        if merged is None:
+            self._pending[event_data["id"]] = dict(event_data)
+        else:
+            merged.update(event_data)
+        self._ready.set()
+
+    async def next_batch(self, timeout: float = None) -> List[Dict[str, Any]]:
+        """
+        等待下一批事件
+
+        有事件到达后再等待一个合并窗口，期间同一任务的变化合并为一条；超时返回空列表。
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            return []
+        await asyncio.sleep(get_settings().TASK_EVENT_COALESCE_INTERVAL)
+        self._ready.clear()
+        batch = list(self._pending.values())
+        self._pending.clear()
+        return batch
+
+
+class TaskEventBus:
+    """任务事件总线"""
+
+    def __init__(self):
+        self._subscribers: Set[TaskEventSubscription] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        # 任务ID -> 归属信息（进度事件只携带任务ID，过滤时需要小说/章节）
+        self._task_info: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        # ComfyUI prompt_id -> 任务归属信息
+        self._prompts: Dict[str, Dict[str, Any]] = {}
+
+    @property
+    def has_subscribers(self) -> bool:
+        return bool(self._subscribers)
+
+    # ==================== 订阅 ====================
+
+    def subscribe(self, novel_id: str = None, chapter_id: str = None) -> TaskEventSubscription:
+        """创建订阅（需在事件循环中调用）"""
+        self._loop = asyncio.get_running_loop()
+        subscription = TaskEventSubscription(novel_id, chapter_id)
+        self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskEventSubscription):
+        self._subscribers.discard(subscription)
+
+    # ==================== 发布 ====================
+
+    def publish(self, event_data: Dict[str, Any]):
+        """
+        发布任务事件（线程安全）
+
+        Args:
+            event_data: 至少包含 id；缺少 novelId/chapterId 时从归属缓存补全
+        """
+        if not self._subscribers or self._loop is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop:
+            self._dispatch(event_data)
+        elif not self._loop.is_closed():
+            # 数据库执行线程中提交的事件切回事件循环分发
+            self._loop.call_soon_threadsafe(self._dispatch, event_data)
+
+    def _dispatch(self, event_data: Dict[str, Any]):
+        task_id = event_data["id"]
+        info = self._task_info.get(task_id)
+        if "novelId" in event_data:
+            self._remember(task_id, event_data)
+        elif info:
+            event_data = {**info, **event_data}
+        for subscription in list(self._subscribers):
+            if subscription.matches(event_data):
+                subscription.push(event_data)
+
+    def _remember(self, task_id: str, event_data: Dict[str, Any]):
+        self._task_info[task_id] = {
+            "type": event_data.get("type"),
+            "novelId": event_data.get("novelId"),
+            "chapterId": event_data.get("chapterId"),
+        }
+        self._task_info.move_to_end(task_id)
+        while len(self._task_info) > _TASK_INFO_LIMIT:
+            self._task_info.popitem(last=False)
+
+    def publish_progress(self, task_id: str, current_step: str = None, progress: int = None):
+        """发布 report_progress 产生的进度"""
+        if not self._subscribers:
+            return
+        event_data: Dict[str, Any] = {"id": task_id}
+        current = _current_task.get()
+        if current and current["id"] == task_id:
+            event_data.update(current)
+        if current_step is not None:
+            event_data["currentStep"] = current_step
+        if progress is not None:
+            event_data["progress"] = progress
+        self.publish(event_data)
+
+    # ==================== ComfyUI 执行进度 ====================
+
+    def bind_prompt(self, prompt_id: str):
+        """将 ComfyUI prompt 关联到当前执行的任务"""
+        current = _current_task.get()
+        if prompt_id and current:
+            self._prompts[prompt_id] = current
+            # 未收到结束事件的 prompt（如 WebSocket 断开期间完成）按提交顺序淘汰
+            while len(self._prompts) > _TASK_INFO_LIMIT:
+                self._prompts.pop(next(iter(self._prompts)))
+
+    def handle_comfyui_message(self, msg_type: str, payload: Dict[str, Any]):
+        """处理 ComfyUI 的 progress / executing 事件，推送节点与采样步数"""
+        prompt_id = payload.get("prompt_id")
+        info = self._prompts.get(prompt_id) if prompt_id else None
+        if info is None:
+            return
+
+        if msg_type == "progress":
+            self.publish({
+                **info,
+                "node": payload.get("node"),
+                "step": payload.get("value"),
+                "maxSteps": payload.get("max"),
+            })
+        elif msg_type == "executing":
+            node = payload.get("node")
+            if node is None:
+                # 整个 prompt 执行结束
+                self._prompts.pop(prompt_id, None)
+                return
+            self.publish({**info, "node": node, "step": None, "maxSteps": None})
+        elif msg_type in ("execution_error", "execution_interrupted"):
+            self._prompts.pop(prompt_id, None)
+
+
+# 全局事件总线实例
+_task_event_bus: Optional[TaskEventBus] = None
+
+
+def get_task_event_bus() -> TaskEventBus:
+    """获取任务事件总线实例"""
+    global _task_event_bus
+    if _task_event_bus is None:
+        _task_event_bus = TaskEventBus()
+    return _task_event_bus
+
+
+# ==================== 数据库提交事件采集 ====================
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_task_changes(session: Session, flush_context):
+    """flush 时记录任务字段变化（提交后属性会过期，此处先取快照）"""
+    if not get_task_event_bus().has_subscribers:
+        return
+    changed = session.info.setdefault("task_events", {})
+    for obj in session.deleted:
+        if isinstance(obj, Task):
+            changed[obj.id] = {
+                "id": obj.id, "novelId": obj.novel_id, "chapterId": obj.chapter_id, "deleted": True
+            }
+    for obj in list(session.new) + list(session.dirty):
+        if not isinstance(obj, Task):
+            continue
+        state = inspect(obj)
+        if obj not in session.new and not any(
+            state.attrs[field].history.has_changes() for field in _TRACKED_FIELDS
+        ):
+            continue
+        changed[obj.id] = task_event_payload(obj)
+
+
+@event.listens_for(Session, "before_commit")
+def _collect_bulk_task_updates(session: Session):
+    """批量 UPDATE 涉及的任务在提交前读取最新状态（随后 flush 的对象变化会覆盖）"""
+    task_ids = session.info.pop(BULK_UPDATED_TASKS_KEY, None)
+    if not task_ids or not get_task_event_bus().has_subscribers:
+        return
+    changed = session.info.setdefault("task_events", {})
+    for row in session.execute(select(*_EVENT_COLUMNS).where(Task.id.in_(task_ids))):
+        changed[row.id] = task_event_payload(row)
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_task_changes(session: Session):
+    changed = session.info.pop("task_events", None)
+    if changed:
+        bus = get_task_event_bus()
+        for event_data in changed.values():
+            bus.publish(event_data)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_task_changes(session: Session):
+    session.info.pop("task_events", None)
+    session.info.pop(BULK_UPDATED_TASKS_KEY, None)
@@ -0,0 +1,67 @@
+"""
+ComfyUI 任务调度通道
+
+用户单次触发的生成（交互通道）与批量生成（批量通道，低于默认优先级）共用 ComfyUI：
+- 批量任务最多占用 TASK_COMFYUI_CONCURRENCY - TASK_COMFYUI_INTERACTIVE_RESERVED 个并发名额，
+  ComfyUI 中同时存在的批量 prompt 不超过该数量，交互任务无需排在整个批量积压之后
+- 交互任务以 front 方式提交到 ComfyUI（COMFYUI_INTERACTIVE_FRONT），排在已提交的批量 prompt 之前
+- 按通道统计排队/执行中任务数与近期等待时间（创建到领取）
+"""
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict
+
+from app.constants import TASK_LANES
+from app.core.config import get_settings
+from app.models.task import Task
+from app.services.scheduler.affinity import task_wait_seconds
+
+# 每个通道保留的等待时间样本数
+_WAIT_SAMPLES = 200
+
+
+def bulk_comfyui_limit() -> int:
+    """批量通道可同时占用的 ComfyUI 并发名额"""
+    settings = get_settings()
+    return max(1, settings.TASK_COMFYUI_CONCURRENCY - settings.TASK_COMFYUI_INTERACTIVE_RESERVED)
+
+
+class LaneMetrics:
+    """各通道 ComfyUI 任务的领取数与等待时间"""
+
+    def __init__(self):
+        self._waits = {lane: deque(maxlen=_WAIT_SAMPLES) for lane in TASK_LANES}
+        self.claimed = {lane: 0 for lane in TASK_LANES}
+
+    def record_claim(self, lane: str, task: Task, now: datetime = None):
+        """记录领取的任务及其等待时间"""
+        self.claimed[lane] += 1
+        self._waits[lane].append(task_wait_seconds(task, now or datetime.utcnow()))
+
+    def stats(self, pending: Dict[str, int], running: Dict[str, int]) -> Dict[str, Any]:
+        """
+        Args:
+            pending: 各通道排队中的任务数
+            running: 各通道执行中的任务数
+        """
+        lanes = {}
+        for lane in TASK_LANES:
+            ordered = sorted(self._waits[lane])
+            waits = {}
+            if ordered:
+                waits = {
+                    "wait_p50": round(ordered[len(ordered) // 2], 2),
+                    "wait_p95": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))], 2),
+                    "wait_max": round(ordered[-1], 2),
+                }
+            lanes[lane] = {
+                "pending": pending.get(lane, 0),
+                "running": running.get(lane, 0),
+                "claimed": self.claimed[lane],
+                **waits,
+            }
+        return {
+            "bulk_comfyui_limit": bulk_comfyui_limit(),
+            "interactive_front": get_settings().COMFYUI_INTERACTIVE_FRONT,
+            "lanes": lanes,
+        }
@@ -0,0 +1,115 @@
+"""
+任务进度合并写入
+
+后台任务执行过程中频繁更新 current_step / progress，逐条提交会让 SQLite 写锁被反复争用。
+进度更新先写入内存，按 TASK_PROGRESS_FLUSH_INTERVAL 在数据库执行线程中以单个事务批量落库；
+同一任务在一个周期内的多次更新只保留最新值。
+
+只更新仍为 running 的任务，任务进入终态（由处理函数直接提交）后残留的进度不会覆盖结果。
+"""
+import asyncio
+from typing import Any, Dict, Optional
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import run_db
+from app.models.task import Task
+from app.services.scheduler.events import get_task_event_bus
+
+
+class TaskProgressWriter:
+    """任务进度合并写入器"""
+
+    def __init__(self):
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+
+    def update(self, task_id: str, current_step: str = None, progress: int = None):
+        """
+        记录任务进度（不立即写库）
+
+        Args:
+            task_id: 任务ID
+            current_step: 当前步骤描述
+            progress: 进度（0-100）
+        """
+        get_task_event_bus().publish_progress(task_id, current_step=current_step, progress=progress)
+        fields = self._pending.setdefault(task_id, {})
+        if current_step is not None:
+            fields["current_step"] = current_step
+        if progress is not None:
+            fields["progress"] = progress
+        self._ensure_started()
+
+    def _ensure_started(self):
+        if self._task is not None and not self._task.done():
+            self._wakeup.set()
+            return
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        self._wakeup = asyncio.Event()
+        self._wakeup.set()
+        self._task = asyncio.create_task(self._run_loop())
+
+    async def _run_loop(self):
+        interval = get_settings().TASK_PROGRESS_FLUSH_INTERVAL
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            # 等待一个周期，合并这段时间内的所有更新
+            await asyncio.sleep(interval)
+            try:
+                await self.flush()
+            except Exception as e:
+                print(f"[TaskProgress] 进度写入失败: {e}")
+
+    async def flush(self):
+        """立即写入所有待写进度"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        await run_db(self._write, pending)
+
+    @staticmethod
+    def _write(pending: Dict[str, Dict[str, Any]]):
+        db = SessionLocal()
+        try:
+            for task_id, fields in pending.items():
+                db.query(Task).filter(
+                    Task.id == task_id,
+                    Task.status == "running"
+                ).update(fields, synchronize_session=False)
+            db.commit()
+        finally:
+            db.close()
+
+    async def stop(self):
+        """停止后台写入并写入剩余进度"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+
+# 全局写入器实例
+_progress_writer: Optional[TaskProgressWriter] = None
+
+
+def get_progress_writer() -> TaskProgressWriter:
+    """获取进度写入器实例"""
+    global _progress_writer
+    if _progress_writer is None:
+        _progress_writer = TaskProgressWriter()
+    return _progress_writer
+
+
+def report_progress(task_id: str, current_step: str = None, progress: int = None):
+    """记录任务进度，由写入器合并后批量落库"""
+    get_progress_writer().update(task_id, current_step=current_step, progress=progress)
@@ -0,0 +1,58 @@
+"""
+任务处理函数注册表
+
+任务类型 -> 处理函数。处理函数签名为 `async def handler(task_id: str, **payload)`，
+payload 为入队时保存在 Task.payload 中的参数。
+默认处理函数以 "模块:函数" 或 "模块:类.方法" 字符串登记，首次使用时才导入，避免循环依赖。
+"""
+import importlib
+from typing import Awaitable, Callable, Dict, List, Union
+
+TaskHandler = Callable[..., Awaitable[None]]
+
+# 已有后台任务的默认处理函数
+DEFAULT_TASK_HANDLERS: Dict[str, str] = {
+    "shot_image": "app.services.shot_image_service:generate_shot_image_task",
+    "shot_video": "app.services.shot_video_service:generate_shot_video_task",
+    "transition_video": "app.services.transition_service:generate_transition_video_task",
+    "keyframe_image": "app.services.shot_keyframe_service:run_keyframe_image_task",
+    "character_portrait": "app.services.character_service:CharacterService._generate_portrait_task",
+    "character_voice": "app.services.character_service:CharacterService._generate_voice_task",
+    "character_audio": "app.services.shot_audio_service:ShotAudioService._generate_audio_task",
+    "narrator_audio": "app.services.shot_audio_service:ShotAudioService._generate_audio_task",
+    "scene_image": "app.services.scene_service:SceneService._generate_scene_image_task",
+    "prop_image": "app.services.prop_image_service:PropService._generate_prop_image_task",
+    "chapter_shot_images": "app.services.shot_batch_service:generate_chapter_shot_images_task",
+    "novel_split_chapters": "app.services.chapter_split_batch_service:split_novel_chapters_task",
+    "novel_fill_appearances": "app.services.appearance_batch_service:fill_novel_appearances_task",
+}
+
+_handlers: Dict[str, Union[str, TaskHandler]] = dict(DEFAULT_TASK_HANDLERS)
+
+
+def _resolve(path: str) -> TaskHandler:
+    """解析 "模块:函数" / "模块:类.方法"，类方法使用无参实例（后台任务自行创建数据库会话）"""
+    module_name, attr = path.split(":", 1)
+    module = importlib.import_module(module_name)
+    if "." in attr:
+        class_name, method_name = attr.split(".", 1)
+        return getattr(getattr(module, class_name)(), method_name)
+    return getattr(module, attr)
+
+
+def register_task_handler(task_type: str, handler: Union[str, TaskHandler]) -> None:
+    """注册（或覆盖）任务类型的处理函数"""
+    _handlers[task_type] = handler
+
+
+def get_task_handler(task_type: str) -> TaskHandler:
+    """获取任务类型的处理函数，未注册时抛出 KeyError"""
+    handler = _handlers[task_type]
+    if isinstance(handler, str):
+        return _resolve(handler)
+    return handler
+
+
+def registered_task_types() -> List[str]:
+    """获取所有已注册的任务类型"""
+    return list(_handlers.keys())
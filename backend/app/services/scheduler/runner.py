@@ -0,0 +1,116 @@
+"""
+任务执行
+
+进程内后台执行与 Celery worker 共用：读取任务参数、调用处理函数、执行期间定期续约，
+结束后释放租约。处理函数自行维护任务的 status/progress 等字段。
+"""
+import asyncio
+import json
+import random
+from datetime import datetime
+
+from app.constants import COMFYUI_TASK_TYPES
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import run_db
+from app.repositories import TaskRepository
+from app.services.scheduler.events import set_current_task, reset_current_task
+from app.services.scheduler.registry import get_task_handler
+
+
+def _renew_lease(task_id: str, owner: str, lease_seconds: int) -> bool:
+    db = SessionLocal()
+    try:
+        return TaskRepository(db).renew_lease(task_id, owner, lease_seconds)
+    finally:
+        db.close()
+
+
+def _release_lease(task_id: str, owner: str):
+    db = SessionLocal()
+    try:
+        TaskRepository(db).release_lease(task_id, owner)
+    finally:
+        db.close()
+
+
+async def _heartbeat(task_id: str, owner: str, lease_seconds: int):
+    """定期续约，租约被接管时停止"""
+    interval = max(1.0, lease_seconds / 3)
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            if not await run_db(_renew_lease, task_id, owner, lease_seconds):
+                print(f"[TaskRunner] 任务 {task_id} 租约已被接管，停止续约")
+                return
+        except Exception as e:
+            print(f"[TaskRunner] 任务 {task_id} 续约失败: {e}")
+
+
+def _mark_failed(task_id: str, error_message: str):
+    """处理函数异常退出且未写入终态时标记失败"""
+    db = SessionLocal()
+    try:
+        task = TaskRepository(db).get_by_id(task_id)
+        if task and task.status in ("pending", "running"):
+            task.status = "failed"
+            task.error_message = error_message
+            task.completed_at = datetime.utcnow()
+            db.commit()
+    finally:
+        db.close()
+
+
+async def run_claimed_task(task_id: str, owner: str) -> None:
+    """
+    执行已领取的任务
+
+    Args:
+        task_id: 任务ID
+        owner: 领取任务时使用的租约持有者标识
+    """
+    lease_seconds = get_settings().TASK_LEASE_SECONDS
+
+    db = SessionLocal()
+    try:
+        task = TaskRepository(db).get_by_id(task_id)
+        if not task:
+            print(f"[TaskRunner] 任务不存在: {task_id}")
+            return
+        task_type = task.type
+        payload = json.loads(task.payload or "{}")
+        # 生成任务的种子保存在任务参数中，重试时重建出相同的工作流以命中生成结果记忆
+        seed = None
+        if task_type in COMFYUI_TASK_TYPES:
+            seed = payload.pop("seed", None)
+            if seed is None:
+                seed = random.randint(1, 2**32 - 1)
+                task.payload = json.dumps({**payload, "seed": seed}, ensure_ascii=False)
+                db.commit()
+        # 处理函数内的进度与 ComfyUI 执行事件据此关联到任务
+        context_token = set_current_task(task, seed)
+    finally:
+        db.close()
+
+    heartbeat = asyncio.create_task(_heartbeat(task_id, owner, lease_seconds))
+    try:
+        handler = get_task_handler(task_type)
+        await handler(task_id, **payload)
+    except asyncio.CancelledError:
+        # 服务关闭时由调度器负责重新排队
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        await run_db(_mark_failed, task_id, f"任务执行异常: {e}")
+    finally:
+        heartbeat.cancel()
+        reset_current_task(context_token)
+        # 任务被取消时同样需要释放租约，屏蔽取消使写入在数据库执行线程中完成
+        try:
+            await asyncio.shield(run_db(_release_lease, task_id, owner))
+        except Exception as e:
+            print(f"[TaskRunner] 任务 {task_id} 释放租约失败: {e}")
+        # 立即提交下一个任务，避免 ComfyUI 在调度轮询间隔内空闲
+        from app.services.scheduler.scheduler import get_task_scheduler
+        get_task_scheduler().notify()
@@ -0,0 +1,362 @@
+"""
+任务调度器
+
+基于 tasks 表的持久化任务队列：
+- 入队：保存处理函数参数（payload）与优先级，任务保持 pending
+- 领取：按优先级/创建时间原子领取，受全局、ComfyUI 及单类型并发上限约束（批量汇总任务不计入全局上限）
+- 通道：批量任务（低优先级）占用的 ComfyUI 并发名额有上限，为交互任务预留名额（见 lanes.py）
+- 模型分组：ComfyUI 任务在同一优先级内优先领取与上一个任务使用相同模型的任务（见 affinity.py）
+- 租约：执行期间定期续约，租约过期的任务视为中断
+- 恢复：启动时及运行期间将中断的任务重新排队（超过最大执行次数则标记失败）
+"""
+import asyncio
+import json
+import os
+import socket
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy.orm import object_session
+
+from app.constants import (
+    AGGREGATE_TASK_TYPES, COMFYUI_TASK_TYPES, DEFAULT_TASK_TYPE_CONCURRENCY, TASK_LANE_BULK,
+    TASK_PRIORITY_NORMAL, task_lane,
+)
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import run_db
+from app.models.task import Task
+from app.repositories import TaskRepository
+from app.services.scheduler.affinity import ModelAffinityPlanner, task_model_groups
+from app.services.scheduler.backends import create_backend
+from app.services.scheduler.lanes import LaneMetrics, bulk_comfyui_limit
+from app.services.scheduler.registry import registered_task_types
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TaskScheduler:
+    """任务调度器"""
+
+    def __init__(self, backend_name: str = None):
+        settings = get_settings()
+        self.hostname = socket.gethostname()
+        self.owner_id = f"{self.hostname}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.backend = create_backend(backend_name or settings.TASK_BACKEND)
+        self._running = False
+        self._loop_task: Optional[asyncio.Task] = None
+        self._wakeup: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.model_affinity = ModelAffinityPlanner()
+        self.lane_metrics = LaneMetrics()
+
+    # ==================== 并发上限 ====================
+
+    @staticmethod
+    def type_limit(task_type: str) -> int:
+        """获取任务类型的并发上限"""
+        settings = get_settings()
+        if task_type in settings.TASK_TYPE_CONCURRENCY:
+            return settings.TASK_TYPE_CONCURRENCY[task_type]
+        return DEFAULT_TASK_TYPE_CONCURRENCY.get(task_type, settings.TASK_DEFAULT_CONCURRENCY)
+
+    # ==================== 生命周期 ====================
+
+    async def start(self):
+        """恢复中断的任务并启动调度循环"""
+        if self._running:
+            return
+        self.recover_interrupted_tasks(startup=True)
+        self._running = True
+        self._wakeup = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self._loop_task = asyncio.create_task(self._run_loop())
+        print(f"[TaskScheduler] 调度器已启动: owner={self.owner_id}, backend={type(self.backend).__name__}")
+
+    async def stop(self):
+        """停止调度，进程内执行中的任务重新排队，由下次启动继续执行"""
+        self._running = False
+        if self._loop_task:
+            self._loop_task.cancel()
+            try:
+                await self._loop_task
+            except asyncio.CancelledError:
+                pass
+            self._loop_task = None
+
+        interrupted = await self.backend.shutdown()
+        if interrupted:
+            db = SessionLocal()
+            try:
+                for task in db.query(Task).filter(Task.id.in_(interrupted), Task.status == "running").all():
+                    # 正常停机不计入执行次数
+                    task.attempts = max(0, (task.attempts or 1) - 1)
+                    self._requeue(task, "服务重启，任务已重新排队")
+                db.commit()
+            finally:
+                db.close()
+            print(f"[TaskScheduler] 已重新排队 {len(interrupted)} 个执行中的任务")
+        print("[TaskScheduler] 调度器已停止")
+
+    def notify(self):
+        """有新任务入队时唤醒调度循环（可在数据库执行线程中调用）"""
+        if self._wakeup is None:
+            return
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+        if running is self._loop or self._loop is None:
+            self._wakeup.set()
+        elif not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._wakeup.set)
+
+    # ==================== 入队 ====================
+
+    def enqueue(
+        self,
+        task: Task,
+        priority: int = TASK_PRIORITY_NORMAL,
+        **payload: Any
+    ) -> Task:
+        """
+        将已创建的任务加入队列
+
+        Args:
+            task: 已持久化的任务记录（type 需已注册处理函数）
+            priority: 优先级，数值越大越先执行
+            **payload: 处理函数参数（需可 JSON 序列化，不含 task_id）
+        """
+        db = object_session(task)
+        if db is None:
+            raise ValueError(f"任务 {task.id} 未关联数据库会话，无法入队")
+        task.payload = json.dumps(payload, ensure_ascii=False)
+        task.priority = priority
+        task.attempts = 0
+        task.max_attempts = get_settings().TASK_MAX_ATTEMPTS
+        task.lease_owner = None
+        task.lease_expires_at = None
+        if task.status != "pending":
+            task.status = "pending"
+        db.commit()
+        self.notify()
+        return task
+
+    # ==================== 调度 ====================
+
+    async def _run_loop(self):
+        settings = get_settings()
+        last_reap = 0.0
+        loop = asyncio.get_event_loop()
+        while self._running:
+            try:
+                # 领取涉及数据库读写，在数据库执行器中完成；提交执行需在事件循环上进行
+                claimed = await run_db(self.claim_pending)
+                self._submit(claimed)
+                # 定期回收租约过期的任务
+                now = loop.time()
+                if now - last_reap >= settings.TASK_LEASE_SECONDS / 2:
+                    await run_db(self.recover_interrupted_tasks)
+                    last_reap = now
+            except Exception as e:
+                print(f"[TaskScheduler] 调度错误: {e}")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=settings.TASK_POLL_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+    def dispatch_pending(self) -> int:
+        """按并发上限领取并提交待执行任务，返回本轮提交数"""
+        claimed = self.claim_pending()
+        self._submit(claimed)
+        return len(claimed)
+
+    def _submit(self, claimed: List[Tuple[str, int]]) -> None:
+        for task_id, priority in claimed:
+            self.backend.submit(task_id, self.owner_id, priority)
+
+    def claim_pending(self) -> List[Tuple[str, int]]:
+        """
+        按并发上限领取待执行任务（仅数据库操作，不提交执行）
+
+        Returns:
+            已领取任务的 (task_id, priority) 列表
+        """
+        settings = get_settings()
+        db = SessionLocal()
+        try:
+            repo = TaskRepository(db)
+            leased = repo.count_leased_by_type()
+            # 汇总任务不占用全局名额
+            total_free = settings.TASK_MAX_WORKERS - sum(
+                count for task_type, count in leased.items() if task_type not in AGGREGATE_TASK_TYPES
+            )
+            comfyui_free = settings.TASK_COMFYUI_CONCURRENCY - sum(
+                count for task_type, count in leased.items() if task_type in COMFYUI_TASK_TYPES
+            )
+            bulk_free = bulk_comfyui_limit() - repo.count_by_lane(
+                COMFYUI_TASK_TYPES, "running", leased_only=True
+            )[TASK_LANE_BULK]
+
+            task_types = [
+                t for t in registered_task_types()
+                if self.type_limit(t) > leased.get(t, 0)
+                and (t in AGGREGATE_TASK_TYPES or total_free > 0)
+                and (t not in COMFYUI_TASK_TYPES or comfyui_free > 0)
+            ]
+            if not task_types:
+                return []
+
+            candidates = [(task, None) for task in repo.list_claimable(
+                task_types, limit=(max(total_free, 0) + len(AGGREGATE_TASK_TYPES)) * 4
+            )]
+            groups = {}
+            if settings.TASK_MODEL_AFFINITY_ENABLED and comfyui_free > 0:
+                comfyui_tasks = [task for task, _ in candidates if task.type in COMFYUI_TASK_TYPES]
+                if comfyui_tasks:
+                    groups = task_model_groups(db, comfyui_tasks)
+                    candidates = self.model_affinity.order([task for task, _ in candidates], groups)
+
+            claimed = []
+            for task, reason in candidates:
+                task_type = task.type
+                if leased.get(task_type, 0) >= self.type_limit(task_type):
+                    continue
+                is_aggregate = task_type in AGGREGATE_TASK_TYPES
+                if not is_aggregate and total_free <= 0:
+                    continue
+                is_comfyui = task_type in COMFYUI_TASK_TYPES
+                if is_comfyui and comfyui_free <= 0:
+                    continue
+                lane = task_lane(task.priority)
+                # 批量任务不占用为交互任务预留的名额
+                if is_comfyui and lane == TASK_LANE_BULK and bulk_free <= 0:
+                    continue
+                task_id, priority = task.id, task.priority or 0
+                if not repo.claim(task_id, self.owner_id, settings.TASK_LEASE_SECONDS):
+                    continue
+
+                leased[task_type] = leased.get(task_type, 0) + 1
+                if not is_aggregate:
+                    total_free -= 1
+                if is_comfyui:
+                    comfyui_free -= 1
+                    if lane == TASK_LANE_BULK:
+                        bulk_free -= 1
+                    self.lane_metrics.record_claim(lane, task)
+                    if task_id in groups:
+                        self.model_affinity.record(task, groups[task_id], reason)
+                claimed.append((task_id, priority))
+                print(f"[TaskScheduler] 领取任务 {task_id} ({task_type}, priority={priority})")
+            return claimed
+        finally:
+            db.close()
+
+    def lane_stats(self) -> Dict[str, Any]:
+        """各通道 ComfyUI 任务的排队/执行中数量与近期等待时间"""
+        db = SessionLocal()
+        try:
+            repo = TaskRepository(db)
+            return self.lane_metrics.stats(
+                pending=repo.count_by_lane(COMFYUI_TASK_TYPES, "pending"),
+                running=repo.count_by_lane(COMFYUI_TASK_TYPES, "running"),
+            )
+        finally:
+            db.close()
+
+    # ==================== 恢复 ====================
+
+    def _lease_lost(self, task: Task, now: datetime, startup: bool) -> bool:
+        """判断 running 任务是否已中断"""
+        if not task.lease_owner:
+            # 未经调度器执行的旧式后台任务，进程重启后必然已中断
+            return startup
+        if task.lease_owner == self.owner_id:
+            return False
+        if task.lease_expires_at and task.lease_expires_at.replace(tzinfo=None) < now:
+            return True
+        # 同机进程已退出的租约无需等待过期（仅进程内执行后端）
+        if self.backend.is_local:
+            host, _, rest = task.lease_owner.partition(":")
+            pid = rest.partition(":")[0]
+            if host == self.hostname and pid.isdigit() and not _pid_alive(int(pid)):
+                return True
+        return False
+
+    @staticmethod
+    def _requeue(task: Task, step: str):
+        task.status = "pending"
+        task.progress = 0
+        task.current_step = step
+        task.lease_owner = None
+        task.lease_expires_at = None
+        task.comfyui_prompt_id = None
+
+    def recover_interrupted_tasks(self, startup: bool = False) -> Dict[str, int]:
+        """
+        恢复中断的任务：可重试的重新排队，其余标记失败
+
+        Args:
+            startup: 是否为启动时调用（此时无租约的 running 任务也视为中断）
+        """
+        now = datetime.utcnow()
+        requeued = failed = 0
+        db = SessionLocal()
+        try:
+            for task in TaskRepository(db).list_running():
+                if not self._lease_lost(task, now, startup):
+                    continue
+                if task.payload and (task.attempts or 0) < (task.max_attempts or 1):
+                    self._requeue(task, "任务中断，已重新排队")
+                    requeued += 1
+                else:
+                    task.status = "failed"
+                    task.error_message = "任务执行中断（服务重启或 worker 失联）"
+                    task.lease_owner = None
+                    task.lease_expires_at = None
+                    task.completed_at = now
+                    failed += 1
+            db.commit()
+        finally:
+            db.close()
+        if requeued or failed:
+            print(f"[TaskScheduler] 恢复中断任务: 重新排队 {requeued} 个, 标记失败 {failed} 个")
+        return {"requeued": requeued, "failed": failed}
+
+
+# 全局调度器实例
+_task_scheduler: Optional[TaskScheduler] = None
+
+
+def get_task_scheduler() -> TaskScheduler:
+    """获取调度器实例"""
+    global _task_scheduler
+    if _task_scheduler is None:
+        _task_scheduler = TaskScheduler()
+    return _task_scheduler
+
+
+def init_task_scheduler() -> TaskScheduler:
+    """初始化调度器（应用启动时调用）"""
+    global _task_scheduler
+    _task_scheduler = TaskScheduler()
+    return _task_scheduler
+
+
+def enqueue_task(
+    task: Task,
+    priority: int = TASK_PRIORITY_NORMAL,
+    **payload: Any
+) -> Task:
+    """将已创建的任务加入调度队列"""
+    return get_task_scheduler().enqueue(task, priority=priority, **payload)
@@ -4,7 +4,6 @@
 封装分镜台词音频生成相关的业务逻辑
 """
 import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, List, Optional
 
@@ -15,8 +14,11 @@ from app.models.workflow import Workflow
 from app.repositories import TaskRepository
 from app.repositories.character_repository import CharacterRepository
 from app.repositories.shot_repository import ShotRepository
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, upload_digests
+from app.constants import TASK_PRIORITY_LOW
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task, report_progress
 
 
 class ShotAudioService:
@@ -36,7 +38,8 @@ class ShotAudioService:
         workflow: Workflow,
         character_repo: CharacterRepository,
         task_repo: TaskRepository,
-        shot_id: str = None
+        shot_id: str = None,
+        use_memo: bool = True
     ) -> Dict[str, Any]:
         """
         为单个分镜创建音频生成任务
@@ -50,6 +53,7 @@ class ShotAudioService:
             workflow: 音频工作流
             character_repo: 角色仓库
             task_repo: 任务仓库
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
 
         Returns:
             创建结果
@@ -157,20 +161,19 @@ class ShotAudioService:
                 "type": dialogue_type
             })
 
-            # 启动后台任务
-            asyncio.create_task(
-                self._generate_audio_task(
-                    task_id=task.id,
-                    novel_id=novel_id,
-                    chapter_id=chapter_id,
-                    shot_index=shot_index,
-                    character_name=character_name,
-                    text=text,
-                    emotion_prompt=emotion_prompt,
-                    reference_audio_url=character.reference_audio_url,
-                    workflow_id=workflow.id,
-                    dialogue_type=dialogue_type
-                )
+            # 加入任务队列
+            enqueue_task(
+                task,
+                novel_id=novel_id,
+                chapter_id=chapter_id,
+                shot_index=shot_index,
+                character_name=character_name,
+                text=text,
+                emotion_prompt=emotion_prompt,
+                reference_audio_url=character.reference_audio_url,
+                workflow_id=workflow.id,
+                dialogue_type=dialogue_type,
+                use_memo=use_memo
             )
 
         return {
@@ -332,20 +335,19 @@ class ShotAudioService:
                     "type": dialogue_type
                 })
 
-                # 启动后台任务
-                asyncio.create_task(
-                    self._generate_audio_task(
-                        task_id=task.id,
-                        novel_id=novel_id,
-                        chapter_id=chapter_id,
-                        shot_index=shot_index,
-                        character_name=character_name,
-                        text=text,
-                        emotion_prompt=emotion_prompt,
-                        reference_audio_url=character.reference_audio_url,
-                        workflow_id=workflow.id,
-                        dialogue_type=dialogue_type
-                    )
+                # 加入任务队列（批量任务低优先级）
+                enqueue_task(
+                    task,
+                    priority=TASK_PRIORITY_LOW,
+                    novel_id=novel_id,
+                    chapter_id=chapter_id,
+                    shot_index=shot_index,
+                    character_name=character_name,
+                    text=text,
+                    emotion_prompt=emotion_prompt,
+                    reference_audio_url=character.reference_audio_url,
+                    workflow_id=workflow.id,
+                    dialogue_type=dialogue_type
                 )
 
         return {
@@ -370,7 +372,8 @@ class ShotAudioService:
         emotion_prompt: str,
         reference_audio_url: str,
         workflow_id: str,
-        dialogue_type: str = "character"
+        dialogue_type: str = "character",
+        use_memo: bool = True
     ):
         """
         后台任务：生成角色/旁白台词音频
@@ -386,6 +389,7 @@ class ShotAudioService:
             reference_audio_url: 参考音频URL
             workflow_id: 工作流ID
             dialogue_type: 台词类型（character 或 narration）
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
         """
         from app.core.database import SessionLocal
         from app.repositories import WorkflowRepository, ChapterRepository
@@ -415,7 +419,7 @@ class ShotAudioService:
             # 更新任务状态为运行中
             task.status = "running"
             task.started_at = datetime.utcnow()
-            db.commit()
+            await async_commit(db)
 
             # 获取工作流JSON和节点映射
             workflow_json_str = workflow.workflow_json if workflow else None
@@ -436,7 +440,7 @@ class ShotAudioService:
                 task.status = "failed"
                 task.error_message = "无法下载参考音频"
                 task.current_step = "下载参考音频失败"
-                db.commit()
+                await async_commit(db)
                 return
 
             # 上传参考音频到 ComfyUI
@@ -445,7 +449,7 @@ class ShotAudioService:
                 task.status = "failed"
                 task.error_message = f"上传参考音频失败: {upload_result.get('message', '')}"
                 task.current_step = "上传参考音频失败"
-                db.commit()
+                await async_commit(db)
                 return
 
             reference_audio_filename = upload_result.get("filename")
@@ -468,27 +472,25 @@ class ShotAudioService:
                 task.prompt_text = f"类型: 旁白\n台词: {text}\n情感: {emotion_prompt}"
             else:
                 task.prompt_text = f"角色: {character_name}\n台词: {text}\n情感: {emotion_prompt}"
-            task.current_step = "正在生成音频..."
-            db.commit()
+            report_progress(task.id, current_step="正在生成音频...")
 
-            # 提交到 ComfyUI 队列
-            queue_result = await self.comfyui_service.client.queue_prompt(submitted_workflow)
-            if not queue_result.get("success"):
-                task.status = "failed"
-                task.error_message = queue_result.get("error", "提交任务失败")
-                task.current_step = "提交任务失败"
-                db.commit()
-                return
+            async def save_prompt_id(prompt_id: str):
+                task.comfyui_prompt_id = prompt_id
+                await async_commit(db)
 
-            prompt_id = queue_result.get("prompt_id")
-            task.comfyui_prompt_id = prompt_id
-            db.commit()
-
-            # 等待结果
+            # 提交到 ComfyUI 队列并等待结果（相同台词与音色直接复用记忆的音频）
             save_audio_node_id = node_mapping.get("save_audio_node_id") if node_mapping else None
-            result = await self.comfyui_service.client.wait_for_audio_result(
-                prompt_id, submitted_workflow, save_audio_node_id, timeout=600
+            result = await self.comfyui_service.run_workflow(
+                submitted_workflow, save_audio_node_id, timeout=600, audio=True,
+                use_memo=use_memo, on_queued=save_prompt_id,
+                input_digests=upload_digests(upload_result)
             )
+            if not result.get("success") and not result.get("prompt_id"):
+                task.status = "failed"
+                task.error_message = result.get("message", "提交任务失败")
+                task.current_step = "提交任务失败"
+                await async_commit(db)
+                return
 
             print(f"[AudioTask] Generation result: {json.dumps(result, ensure_ascii=True)}")
 
@@ -496,8 +498,7 @@ class ShotAudioService:
                 audio_url = result.get("audio_url")
 
                 # 下载音频到本地存储
-                task.current_step = "下载音频到服务器..."
-                db.commit()
+                report_progress(task.id, current_step="下载音频到服务器...")
 
                 try:
                     local_path = await file_storage.download_audio(
@@ -513,11 +514,11 @@ class ShotAudioService:
                         task.result_url = local_url
                         task.current_step = "生成完成，音频已保存"
                     else:
-                        task.result_url = audio_url
+                        task.result_url = file_storage.fallback_url(audio_url)
                         task.current_step = "生成完成，使用远程音频"
                 except Exception as e:
                     print(f"[AudioTask] Failed to download audio: {e}")
-                    task.result_url = audio_url
+                    task.result_url = file_storage.fallback_url(audio_url)
                     task.current_step = "生成完成，使用远程音频"
 
                 task.status = "completed"
@@ -535,7 +536,7 @@ class ShotAudioService:
                 task.error_message = result.get("message", "生成失败")
                 task.current_step = "生成失败"
 
-            db.commit()
+            await async_commit(db)
 
         except Exception as e:
             print(f"[AudioTask] Error: {e}")
@@ -546,7 +547,7 @@ class ShotAudioService:
                 task.status = "failed"
                 task.error_message = str(e)
                 task.current_step = "任务异常"
-                db.commit()
+                await async_commit(db)
         finally:
             db.close()
 
@@ -568,7 +569,7 @@ class ShotAudioService:
             本地文件路径，失败返回 None
         """
         import os
-        import httpx
+        from app.core.http_client import http_client
 
         try:
             # 如果已经是本地文件路径
@@ -587,7 +588,7 @@ class ShotAudioService:
                 safe_name = "".join(c if c.isalnum() or c in "-_" else "_" for c in character_name)
                 temp_path = temp_dir / f"{safe_name}_reference.flac"
 
-                async with httpx.AsyncClient() as client:
+                async with http_client(reference_audio_url) as client:
                     response = await client.get(reference_audio_url)
                     if response.status_code == 200:
                         with open(temp_path, "wb") as f:
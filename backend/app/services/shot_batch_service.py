@@ -0,0 +1,381 @@
+"""
+章节批量分镜图生成服务
+
+章节级汇总任务（chapter_shot_images）负责：
+1. 汇总所选分镜依赖的角色/场景/道具，缺少图片的先生成（每个只生成一次）
+2. 相同角色组合的分镜共用一张合并角色图，只合并一次
+3. 为每个分镜创建 shot_image 任务交给调度器，ComfyUI 并发上限由调度器统一控制，
+   子任务结束后调度器立即提交下一个，保持 ComfyUI 队列不空闲也不过载
+4. 汇总子任务状态，作为一个任务对外报告进度
+"""
+import asyncio
+import json
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from app.core.config import get_settings
+from app.core.database import SessionLocal
+from app.core.db_executor import async_commit, run_db
+from app.constants import TASK_PRIORITY_LOW
+from app.models.novel import Chapter, Character, Scene, Prop
+from app.models.shot import Shot
+from app.models.task import Task
+from app.repositories import TaskRepository
+from app.repositories.shot_repository import ShotRepository
+from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task, finish_task, report_progress
+from app.utils.image_utils import merge_character_images, copy_merged_character_image
+from app.utils.path_utils import url_to_local_path
+
+# 依赖资源阶段在汇总进度中的占比
+PREREQUISITE_PROGRESS = 10
+
+
+# ==================== 依赖分析 ====================
+
+
+def collect_shot_references(shots: List[Shot]) -> Dict[str, List[str]]:
+    """
+    汇总分镜引用的角色/场景/道具名称（去重，保持首次出现顺序）
+
+    Returns:
+        {"characters": [...], "scenes": [...], "props": [...]}
+    """
+    refs = {"characters": {}, "scenes": {}, "props": {}}
+    for shot in shots:
+        for name in json.loads(shot.characters) if shot.characters else []:
+            refs["characters"][name] = None
+        if shot.scene:
+            refs["scenes"][shot.scene] = None
+        for name in json.loads(shot.props) if shot.props else []:
+            refs["props"][name] = None
+    return {key: list(names) for key, names in refs.items()}
+
+
+def group_shots_by_characters(shots: List[Shot]) -> Dict[Tuple[str, ...], List[Shot]]:
+    """按角色组合分组（组合相同即共用合并角色图，不含角色的分镜不分组）"""
+    groups: Dict[Tuple[str, ...], List[Shot]] = {}
+    for shot in shots:
+        names = json.loads(shot.characters) if shot.characters else []
+        if names:
+            groups.setdefault(tuple(sorted(names)), []).append(shot)
+    return groups
+
+
+def summarize_child_status(counts: Dict[str, int], total: int) -> Tuple[int, int, int]:
+    """
+    汇总子任务状态
+
+    Returns:
+        (已完成数, 失败数, 汇总进度 0-100)
+    """
+    completed = counts.get("completed", 0)
+    failed = counts.get("failed", 0)
+    if total <= 0:
+        return completed, failed, 100
+    done = completed + failed
+    progress = PREREQUISITE_PROGRESS + (100 - PREREQUISITE_PROGRESS) * done // total
+    return completed, failed, min(progress, 100)
+
+
+# ==================== 后台任务 ====================
+
+
+async def generate_chapter_shot_images_task(
+    task_id: str,
+    novel_id: str,
+    chapter_id: str,
+    shot_ids: List[str],
+    workflow_id: str,
+    use_memo: bool = True,
+):
+    """
+    后台任务：章节批量生成分镜图
+
+    Args:
+        task_id: 汇总任务ID
+        novel_id: 小说ID
+        chapter_id: 章节ID
+        shot_ids: 需要生成图片的分镜ID列表
+        workflow_id: 分镜生图工作流ID
+        use_memo: 分镜任务是否使用生成结果记忆（重新生成时为 False）
+    """
+    db = SessionLocal()
+    task = None
+    try:
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if not task:
+            return
+
+        task.status = "running"
+        task.started_at = datetime.utcnow()
+        task.current_step = "分析分镜依赖..."
+        await async_commit(db)
+
+        chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
+        chapter_title = chapter.title if chapter else ""
+
+        shot_repo = ShotRepository(db)
+        selected = set(shot_ids)
+        shots = [s for s in shot_repo.get_by_chapter(chapter_id) if s.id in selected]
+        if not shots:
+            await finish_task(db, task, "failed", "没有需要生成的分镜", error_message="分镜不存在")
+            return
+
+        print(f"[ChapterShotImages {task_id}] Chapter: {chapter_id}, shots: {len(shots)}")
+
+        # 1. 生成缺少图片的角色/场景/道具（每个只生成一次）
+        # 创建任务涉及多次提交与文件删除，在数据库执行线程中完成，避免阻塞事件循环
+        prerequisite_ids, created_prerequisite_ids = await run_db(
+            _create_prerequisite_tasks, db, novel_id, shots, task_id
+        )
+        if prerequisite_ids:
+            report_progress(
+                task_id, current_step=f"等待 {len(prerequisite_ids)} 个角色/场景/道具图生成...", progress=2
+            )
+            if await _wait_for_tasks(task_id, prerequisite_ids, created_prerequisite_ids) is None:
+                return
+            db.expire_all()
+
+        # 2. 相同角色组合共用一张合并角色图
+        report_progress(task_id, current_step="合并角色图片...", progress=PREREQUISITE_PROGRESS // 2)
+        reference_paths = await _prepare_character_references(db, novel_id, chapter_id, shots, task_id)
+
+        # 3. 提交分镜任务，由调度器按 ComfyUI 并发上限执行
+        child_ids, created_child_ids = await run_db(
+            _submit_shot_tasks, db, task, novel_id, chapter_id, chapter_title, shots, workflow_id,
+            reference_paths, use_memo=use_memo
+        )
+        total = len(child_ids)
+        report_progress(
+            task_id, current_step=f"已提交 {total} 个分镜生图任务", progress=PREREQUISITE_PROGRESS
+        )
+
+        # 4. 汇总子任务进度
+        def on_progress(counts: Dict[str, int]):
+            completed, failed, progress = summarize_child_status(counts, total)
+            step = f"分镜图生成中 {completed + failed}/{total}"
+            if failed:
+                step += f"（失败 {failed}）"
+            report_progress(task_id, current_step=step, progress=progress)
+
+        counts = await _wait_for_tasks(task_id, child_ids, created_child_ids, on_progress)
+        if counts is None:
+            return
+
+        completed, failed, _ = summarize_child_status(counts, total)
+        if total and failed == total:
+            await finish_task(db, task, "failed", "全部分镜生成失败", error_message=f"{failed} 个分镜生成失败")
+        else:
+            summary = f"完成 {completed}/{total}" + (f"，失败 {failed}" if failed else "")
+            await finish_task(db, task, "completed", summary)
+        print(f"[ChapterShotImages {task_id}] Done: completed={completed}, failed={failed}, total={total}")
+
+    except Exception as e:
+        print(f"[ChapterShotImages {task_id}] Error: {e}")
+        import traceback
+
+        traceback.print_exc()
+
+        try:
+            if task is not None:
+                await finish_task(db, task, "failed", "任务异常", error_message=str(e))
+        except Exception:
+            pass
+    finally:
+        db.close()
+
+
+# ==================== 辅助函数 ====================
+
+
+def _create_prerequisite_tasks(
+    db, novel_id: str, shots: List[Shot], task_id: str
+) -> Tuple[List[str], List[str]]:
+    """
+    为缺少图片的角色/场景/道具创建生成任务（已有进行中的任务直接复用）
+
+    Returns:
+        (需要等待的任务ID列表, 其中本次新建的任务ID列表)
+    """
+    from app.services.character_service import CharacterService
+    from app.services.scene_service import SceneService
+    from app.services.prop_image_service import PropService
+
+    refs = collect_shot_references(shots)
+    task_repo = TaskRepository(db)
+    targets = [
+        (Character, refs["characters"], task_repo.get_active_by_character,
+         lambda item: CharacterService(db).create_character_portrait_task(item.id, db)),
+        (Scene, refs["scenes"], task_repo.get_active_by_scene,
+         lambda item: SceneService(db).create_scene_image_task(item.id, db)),
+        (Prop, refs["props"], task_repo.get_active_by_prop,
+         lambda item: PropService(db).create_prop_image_task(item.id, db)),
+    ]
+
+    task_ids, created_ids = [], []
+    for model, names, get_active, create in targets:
+        if not names:
+            continue
+        items = db.query(model).filter(model.novel_id == novel_id, model.name.in_(names)).all()
+        for item in items:
+            if item.image_url:
+                continue
+            # 用户自行发起的进行中任务只等待、不归本批量任务管理（终止批量任务时不移除）
+            existing = get_active(item.id)
+            result = create(item)
+            new_task_id = result.get("data", {}).get("taskId") if result.get("success") else None
+            if new_task_id:
+                task_ids.append(new_task_id)
+                if existing is None or existing.id != new_task_id:
+                    created_ids.append(new_task_id)
+            else:
+                # 依赖图生成失败不阻塞分镜生成，分镜缺少该参考图继续
+                print(f"[ChapterShotImages {task_id}] Skip prerequisite {item.name}: {result.get('message')}")
+    return task_ids, created_ids
+
+
+async def _prepare_character_references(
+    db, novel_id: str, chapter_id: str, shots: List[Shot], task_id: str
+) -> Dict[str, str]:
+    """按角色组合合并角色图，返回 {分镜ID: 合并角色图路径}"""
+    reference_paths: Dict[str, str] = {}
+    for names, group in group_shots_by_characters(shots).items():
+        characters = {
+            c.name: c
+            for c in db.query(Character).filter(
+                Character.novel_id == novel_id, Character.name.in_(names)
+            ).all()
+        }
+        # 保持分镜中角色的原始顺序
+        ordered_names = json.loads(group[0].characters)
+        character_images = []
+        for name in ordered_names:
+            character = characters.get(name)
+            path = url_to_local_path(character.image_url) if character and character.image_url else None
+            if path:
+                character_images.append((name, path))
+        if not character_images:
+            continue
+
+        merged_path = await asyncio.to_thread(
+            merge_character_images, novel_id, chapter_id, group[0].index, character_images, file_storage
+        )
+        if not merged_path:
+            print(f"[ChapterShotImages {task_id}] Failed to merge characters {list(names)}")
+            continue
+        reference_paths[group[0].id] = merged_path
+
+        merged_names = [name for name, _ in character_images]
+        for shot in group[1:]:
+            path = await asyncio.to_thread(
+                copy_merged_character_image,
+                novel_id, chapter_id, shot.index, merged_names, merged_path, file_storage
+            )
+            if path:
+                reference_paths[shot.id] = path
+    return reference_paths
+
+
+def _submit_shot_tasks(
+    db,
+    task: Task,
+    novel_id: str,
+    chapter_id: str,
+    chapter_title: str,
+    shots: List[Shot],
+    workflow_id: str,
+    reference_paths: Dict[str, str],
+    use_memo: bool = True,
+) -> Tuple[List[str], List[str]]:
+    """
+    创建并入队分镜生图任务（已有进行中的任务直接纳入汇总）
+
+    Returns:
+        (子任务ID列表, 其中本次新建的任务ID列表)
+    """
+    task_repo = TaskRepository(db)
+    shot_repo = ShotRepository(db)
+    child_ids, created_ids = [], []
+    for shot in shots:
+        existing_task = task_repo.get_active_shot_task(novel_id, chapter_id, shot.index, "shot_image")
+        if existing_task:
+            child_ids.append(existing_task.id)
+            continue
+
+        file_storage.delete_shot_image(novel_id, chapter_id, shot.index, shot_id=shot.id)
+        # 与任务记录一同提交
+        shot_repo.update_image_status(shot, "generating")
+
+        child = task_repo.create_shot_image_task(
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            shot_index=shot.index,
+            chapter_title=chapter_title,
+            workflow_id=workflow_id,
+            workflow_name=task.workflow_name,
+            shot_id=shot.id,
+        )
+        enqueue_task(
+            child,
+            priority=TASK_PRIORITY_LOW,
+            novel_id=novel_id,
+            chapter_id=chapter_id,
+            shot_index=shot.index,
+            shot_description=shot.description,
+            workflow_id=workflow_id,
+            character_reference_path=reference_paths.get(shot.id),
+            use_memo=use_memo,
+        )
+        child_ids.append(child.id)
+        created_ids.append(child.id)
+    return child_ids, created_ids
+
+
+def _load_status(task_id: str, child_ids: List[str]) -> Tuple[Optional[str], Dict[str, int]]:
+    db = SessionLocal()
+    try:
+        repo = TaskRepository(db)
+        task = repo.get_by_id(task_id)
+        return (task.status if task else None), repo.count_by_status(child_ids)
+    finally:
+        db.close()
+
+
+def _dequeue_pending(child_ids: List[str]) -> int:
+    """汇总任务被终止时，移除本批量任务创建且尚未开始执行的子任务"""
+    db = SessionLocal()
+    try:
+        return TaskRepository(db).dequeue_pending(child_ids, "批量任务已终止", "已终止")
+    finally:
+        db.close()
+
+
+async def _wait_for_tasks(
+    task_id: str, child_ids: List[str], owned_ids: List[str], on_progress=None
+) -> Optional[Dict[str, int]]:
+    """
+    等待子任务全部结束
+
+    Args:
+        child_ids: 需要等待的子任务ID（含复用的进行中任务）
+        owned_ids: 其中本批量任务创建的子任务ID，汇总任务被终止时只移除这些任务
+
+    Returns:
+        子任务各状态数量；汇总任务被终止时返回 None
+    """
+    interval = get_settings().TASK_POLL_INTERVAL
+    last_counts = None
+    while True:
+        status, counts = await run_db(_load_status, task_id, child_ids)
+        if status != "running":
+            removed = await run_db(_dequeue_pending, owned_ids) if owned_ids else 0
+            print(f"[ChapterShotImages {task_id}] Batch task stopped, dequeued {removed} pending tasks")
+            return None
+        if counts != last_counts:
+            last_counts = counts
+            if on_progress:
+                on_progress(counts)
+        if counts.get("pending", 0) + counts.get("running", 0) == 0:
+            return counts
+        await asyncio.sleep(interval)
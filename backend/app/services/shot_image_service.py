@@ -5,6 +5,7 @@
 """
 
 import json
+import os
 from datetime import datetime
 from typing import Optional, Dict, Any
 
@@ -14,17 +15,20 @@ from app.models.prompt_template import PromptTemplate
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.core.database import SessionLocal
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, upload_digests, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import report_progress
 from app.services.prompt_builder import get_style
 from app.utils.path_utils import url_to_local_path
 from app.utils.image_utils import merge_character_images
 from app.repositories.shot_repository import ShotRepository
 from app.utils.workflow_disconnect import (
-    disconnect_reference_chain,
+    WorkflowGraph,
     disconnect_unuploaded_reference_nodes,
     disconnect_all_reference_nodes,
     clear_unset_reference_nodes,
+    prune_unreachable_nodes,
 )
 
 
@@ -35,6 +39,8 @@ async def generate_shot_image_task(
     shot_index: int,
     shot_description: str,
     workflow_id: str,
+    character_reference_path: Optional[str] = None,
+    use_memo: bool = True,
 ):
     """
     后台任务：生成分镜图片
@@ -46,6 +52,8 @@ async def generate_shot_image_task(
         shot_index: 分镜索引
         shot_description: 分镜描述
         workflow_id: 工作流ID
+        character_reference_path: 已合并的角色参考图（章节批量生成时预先合并）
+        use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
     """
     db = SessionLocal()
     try:
@@ -58,7 +66,7 @@ async def generate_shot_image_task(
         task.status = "running"
         task.started_at = datetime.utcnow()
         task.current_step = "准备生成环境..."
-        db.commit()
+        await async_commit(db)
 
         # 获取章节和小说
         chapter = (
@@ -70,14 +78,14 @@ async def generate_shot_image_task(
         if not chapter:
             task.status = "failed"
             task.error_message = "章节不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         novel = db.query(Novel).filter(Novel.id == novel_id).first()
         if not novel:
             task.status = "failed"
             task.error_message = "小说不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         # 使用 ShotRepository 获取分镜数据
@@ -87,7 +95,7 @@ async def generate_shot_image_task(
         if not shot:
             task.status = "failed"
             task.error_message = "分镜不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         # 从 Shot 模型获取分镜数据
@@ -107,7 +115,7 @@ async def generate_shot_image_task(
         if not workflow:
             task.status = "failed"
             task.error_message = "工作流不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         # 获取节点映射
@@ -118,7 +126,7 @@ async def generate_shot_image_task(
 
         # 先保存提示词
         task.prompt_text = shot_description
-        db.commit()
+        await async_commit(db)
 
         # 获取风格提示词
         style, _ = get_style(db, novel, "character")
@@ -126,10 +134,15 @@ async def generate_shot_image_task(
 
         comfyui_service = ComfyUIService()
 
-        # 合并角色图片
-        character_reference_path = await _process_character_references(
-            db, task, novel_id, chapter_id, shot_index, shot_characters, task_id, shot_repo
-        )
+        # 合并角色图片（章节批量生成时已预先合并，直接使用）
+        if character_reference_path and os.path.exists(character_reference_path):
+            _update_shot_merged_character_url(
+                db, chapter_id, shot_index, character_reference_path, shot_repo
+            )
+        else:
+            character_reference_path = await _process_character_references(
+                db, task, novel_id, chapter_id, shot_index, shot_characters, task_id, shot_repo
+            )
 
         # 处理场景图
         scene_reference_path = await _process_scene_reference(
@@ -179,8 +192,7 @@ async def generate_shot_image_task(
         print(f"[ShotTask {task_id}] Prop appearances: {prop_appearances}")
 
         # 构建工作流
-        task.current_step = "构建工作流..."
-        db.commit()
+        report_progress(task.id, current_step="构建工作流...")
 
         submitted_workflow = comfyui_service.builder.build_shot_workflow(
             prompt=shot_description,
@@ -191,10 +203,11 @@ async def generate_shot_image_task(
             character_appearances=character_appearances,
             scene_setting=scene_setting,
             prop_appearances=prop_appearances,
+            workflow_key=workflow_cache_key(workflow),
         )
 
         # 上传参考图并更新工作流
-        await _upload_references_and_update_workflow(
+        input_digests = await _upload_references_and_update_workflow(
             comfyui_service,
             submitted_workflow,
             node_mapping,
@@ -207,9 +220,7 @@ async def generate_shot_image_task(
         )
 
         # 调用 ComfyUI 生成图片
-        task.current_step = "正在调用 ComfyUI 生成图片..."
-        task.progress = 30
-        db.commit()
+        report_progress(task.id, current_step="正在调用 ComfyUI 生成图片...", progress=30)
 
         result = await comfyui_service.generate_shot_image_with_workflow(
             prompt=shot_description,
@@ -220,6 +231,8 @@ async def generate_shot_image_task(
             scene_reference_path=None,
             workflow=submitted_workflow,
             style=style,
+            use_memo=use_memo,
+            input_digests=input_digests,
         )
 
         print(f"[ShotTask {task_id}] Generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -231,13 +244,13 @@ async def generate_shot_image_task(
             task.workflow_json = json.dumps(
                 result["submitted_workflow"], ensure_ascii=False, indent=2
             )
-            db.commit()
+            await async_commit(db)
 
         if not result.get("success"):
             task.status = "failed"
             task.error_message = result.get("message", "生成失败")
             task.current_step = "生成失败"
-            db.commit()
+            await async_commit(db)
             return
 
         # 下载并保存生成的图片
@@ -255,7 +268,7 @@ async def generate_shot_image_task(
             task.status = "failed"
             task.error_message = str(e)
             task.current_step = "任务异常"
-            db.commit()
+            await async_commit(db)
         except Exception:
             pass
     finally:
@@ -281,8 +294,7 @@ async def _process_character_references(
     if not shot_characters:
         return None
 
-    task.current_step = f"合并角色图片: {', '.join(shot_characters)}"
-    db.commit()
+    report_progress(task.id, current_step=f"合并角色图片: {', '.join(shot_characters)}")
 
     character_images = []
     print(
@@ -322,12 +334,10 @@ async def _process_character_references(
             )
 
             print(f"[ShotTask {task_id}] Merged character image saved: {merged_path}")
-            task.current_step = f"已合并 {len(character_images)} 个角色图片"
-            db.commit()
+            report_progress(task.id, current_step=f"已合并 {len(character_images)} 个角色图片")
         else:
             print(f"[ShotTask {task_id}] Failed to merge character images")
-            task.current_step = "角色图片合并失败，继续生成..."
-            db.commit()
+            report_progress(task.id, current_step="角色图片合并失败，继续生成...")
 
     return character_reference_path
 
@@ -358,8 +368,7 @@ async def _process_scene_reference(
     if not shot_scene:
         return None
 
-    task.current_step = f"查找场景图: {shot_scene}"
-    db.commit()
+    report_progress(task.id, current_step=f"查找场景图: {shot_scene}")
 
     scene = (
         db.query(Scene)
@@ -401,8 +410,7 @@ async def _process_prop_references(
     if not shot_props:
         return None
 
-    task.current_step = f"查找道具图: {', '.join(shot_props)}"
-    db.commit()
+    report_progress(task.id, current_step=f"查找道具图: {', '.join(shot_props)}")
 
     prop_reference_paths = {}
     print(f"[ShotTask {task_id}] Looking for {len(shot_props)} props: {shot_props}")
@@ -429,8 +437,7 @@ async def _process_prop_references(
     print(f"[ShotTask {task_id}] Total prop images found: {len(prop_reference_paths)}")
 
     if prop_reference_paths:
-        task.current_step = f"已找到 {len(prop_reference_paths)} 个道具图片"
-        db.commit()
+        report_progress(task.id, current_step=f"已找到 {len(prop_reference_paths)} 个道具图片")
 
     return prop_reference_paths if prop_reference_paths else None
 
@@ -459,23 +466,29 @@ async def _upload_references_and_update_workflow(
         db: 数据库会话
         task_id: 任务 ID
         prop_reference_paths: 道具参考图路径字典 {道具名称: 图片路径}
+
+    Returns:
+        上传参考图的 {ComfyUI 文件名: 内容摘要}，供生成结果记忆使用
     """
     # 收集所有需要上传的参考图
     has_any_reference = (
         character_reference_path or scene_reference_path or prop_reference_paths
     )
+    # 连接索引在断开任何链路之前构建，供所有参考图节点的断开和剪枝共用
+    graph = WorkflowGraph(submitted_workflow)
 
     if not has_any_reference:
         # 没有任何参考图，断开所有参考图节点的下游连接
-        disconnect_all_reference_nodes(submitted_workflow, node_mapping)
+        disconnect_all_reference_nodes(submitted_workflow, node_mapping, graph=graph)
+        prune_unreachable_nodes(submitted_workflow, graph, node_mapping)
         task.workflow_json = json.dumps(
             submitted_workflow, ensure_ascii=False, indent=2
         )
-        db.commit()
-        return
+        await async_commit(db)
+        return {}
 
-    task.current_step = "上传参考图..."
-    db.commit()
+    report_progress(task.id, current_step="上传参考图...")
+    uploads = []
     print(f"[ShotTask {task_id}] Uploading reference images before submission")
 
     # 上传角色参考图
@@ -485,6 +498,7 @@ async def _upload_references_and_update_workflow(
             character_reference_path
         )
         if upload_result.get("success"):
+            uploads.append(upload_result)
             character_uploaded_filename = upload_result.get("filename")
             print(
                 f"[ShotTask {task_id}] Character image uploaded successfully: {character_uploaded_filename}"
@@ -499,6 +513,7 @@ async def _upload_references_and_update_workflow(
     if scene_reference_path:
         upload_result = await comfyui_service.client.upload_image(scene_reference_path)
         if upload_result.get("success"):
+            uploads.append(upload_result)
             scene_uploaded_filename = upload_result.get("filename")
             print(
                 f"[ShotTask {task_id}] Scene image uploaded successfully: {scene_uploaded_filename}"
@@ -515,6 +530,7 @@ async def _upload_references_and_update_workflow(
             if prop_path:
                 upload_result = await comfyui_service.client.upload_image(prop_path)
                 if upload_result.get("success"):
+                    uploads.append(upload_result)
                     prop_uploaded_filenames[prop_name] = upload_result.get("filename")
                     print(
                         f"[ShotTask {task_id}] Prop '{prop_name}' image uploaded successfully: {upload_result.get('filename')}"
@@ -591,11 +607,13 @@ async def _upload_references_and_update_workflow(
     )
 
     # 检测并断开未上传图片的参考图节点的下游连接
-    disconnect_unuploaded_reference_nodes(submitted_workflow, node_mapping)
+    disconnect_unuploaded_reference_nodes(submitted_workflow, node_mapping, graph=graph)
+    prune_unreachable_nodes(submitted_workflow, graph, node_mapping)
 
     task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
-    db.commit()
+    await async_commit(db)
     print(f"[ShotTask {task_id}] Saved workflow with reference images to task")
+    return upload_digests(*uploads)
 
 
 async def _save_generated_image(
@@ -611,16 +629,14 @@ async def _save_generated_image(
     shot_repo: ShotRepository = None,
 ):
     """下载并保存生成的图片"""
-    task.current_step = "正在下载生成的图片..."
-    task.progress = 80
-    db.commit()
+    report_progress(task.id, current_step="正在下载生成的图片...", progress=80)
 
     image_url = result.get("image_url")
     if not image_url:
         task.status = "failed"
         task.error_message = "未获取到图片URL"
         task.current_step = "生成失败"
-        db.commit()
+        await async_commit(db)
         return
 
     # 使用 shot_id 作为文件名的一部分（如果提供）
@@ -644,19 +660,20 @@ async def _save_generated_image(
         task.result_url = local_url
         task.current_step = "生成完成"
         task.completed_at = datetime.utcnow()
-        db.commit()
+        await async_commit(db)
 
         # 更新 Shot 记录
         _update_shot_image(db, chapter_id, shot_index, local_path, local_url, shot_repo)
 
         print(f"[ShotTask {task_id}] Completed, image saved: {local_path}")
     else:
+        image_url = file_storage.fallback_url(image_url)
         task.status = "completed"
         task.progress = 100
         task.result_url = image_url
         task.current_step = "生成完成（使用远程图片）"
         task.completed_at = datetime.utcnow()
-        db.commit()
+        await async_commit(db)
 
         # 更新 Shot 记录（使用远程URL）
         _update_shot_image(db, chapter_id, shot_index, None, image_url, shot_repo)
@@ -17,15 +17,18 @@ from app.models.task import Task
 from app.models.workflow import Workflow
 from app.models.novel import Novel, Chapter
 from app.models.prompt_template import PromptTemplate
+from app.core.db_executor import async_commit
 from app.repositories.shot_repository import ShotRepository
-from app.services.comfyui import ComfyUIService
+from app.services.comfyui import ComfyUIService, upload_digests, workflow_cache_key
 from app.services.llm_service import LLMService
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task
 from app.utils.path_utils import url_to_local_path
 from app.utils.workflow_disconnect import (
-    disconnect_reference_chain,
+    WorkflowGraph,
     disconnect_unuploaded_reference_nodes,
     clear_unset_keyframe_reference_nodes,
+    prune_unreachable_nodes,
 )
 
 
@@ -199,7 +202,8 @@ class ShotKeyframeService:
         db: Session,
         shot_id: str,
         frame_index: int,
-        workflow_id: Optional[str] = None
+        workflow_id: Optional[str] = None,
+        use_memo: bool = True
     ) -> Tuple[bool, Optional[str], str]:
         """生成关键帧图片
 
@@ -210,6 +214,7 @@ class ShotKeyframeService:
             shot_id: 分镜 ID
             frame_index: 关键帧序号
             workflow_id: 指定的工作流 ID
+            use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
 
         Returns:
             (success, task_id, message) 元组
@@ -243,29 +248,17 @@ class ShotKeyframeService:
             workflow_id=workflow_id
         )
         db.add(task)
-        db.commit()
+        await async_commit(db)
 
-        # 启动后台任务
-        from app.core.database import SessionLocal
-        import asyncio
-
-        async def run_background_task():
-            db_bg = SessionLocal()
-            try:
-                await self._generate_keyframe_image_task(
-                    db_bg, task.id, shot_id, frame_index, keyframe, workflow_id
-                )
-            except Exception as e:
-                # 更新任务状态为失败
-                task_bg = db_bg.query(Task).filter(Task.id == task.id).first()
-                if task_bg:
-                    task_bg.status = "failed"
-                    task_bg.error_message = str(e)
-                    db_bg.commit()
-            finally:
-                db_bg.close()
-
-        asyncio.create_task(run_background_task())
+        # 加入任务队列
+        enqueue_task(
+            task,
+            shot_id=shot_id,
+            frame_index=frame_index,
+            keyframe=keyframe,
+            workflow_id=workflow_id,
+            use_memo=use_memo
+        )
 
         return True, task.id, f"关键帧图片生成任务已创建"
 
@@ -276,7 +269,8 @@ class ShotKeyframeService:
         shot_id: str,
         frame_index: int,
         keyframe: dict,
-        workflow_id: Optional[str] = None
+        workflow_id: Optional[str] = None,
+        use_memo: bool = True
     ):
         """关键帧图片生成后台任务"""
         task = db.query(Task).filter(Task.id == task_id).first()
@@ -285,7 +279,7 @@ class ShotKeyframeService:
 
         # 更新任务状态
         task.status = "running"
-        db.commit()
+        await async_commit(db)
 
         try:
             shot_repo = ShotRepository(db)
@@ -338,25 +332,25 @@ class ShotKeyframeService:
             # 获取关键帧描述作为提示词
             prompt = keyframe.get("description", shot.description)
 
-            # 解析工作流 JSON
-            workflow_data = json.loads(workflow.workflow_json) if isinstance(workflow.workflow_json, str) else workflow.workflow_json
-
             # 构建工作流
             submitted_workflow = comfyui_service.builder.build_shot_workflow(
                 prompt=prompt,
                 workflow_json=workflow.workflow_json,
                 node_mapping=node_mapping,
                 aspect_ratio=novel.aspect_ratio or "16:9",
-                style=""
+                style="",
+                workflow_key=workflow_cache_key(workflow)
             )
 
             # 处理参考图节点
             reference_image_node_id = node_mapping.get("reference_image_node_id")
+            input_digests = {}
 
             if reference_path:
                 # 上传参考图
                 upload_result = await comfyui_service.client.upload_image(reference_path)
                 if upload_result.get("success"):
+                    input_digests = upload_digests(upload_result)
                     uploaded_filename = upload_result.get("filename")
                     if reference_image_node_id and str(reference_image_node_id) in submitted_workflow:
                         submitted_workflow[str(reference_image_node_id)]["inputs"]["image"] = uploaded_filename
@@ -373,28 +367,28 @@ class ShotKeyframeService:
                 reference_path=reference_path
             )
 
-            # 检测并断开未上传图片的参考图节点的下游连接
-            disconnect_unuploaded_reference_nodes(submitted_workflow, node_mapping)
-
-            # 提交任务
-            queue_result = await comfyui_service.client.queue_prompt(submitted_workflow)
-
-            if not queue_result.get("success"):
-                raise ValueError(f"提交任务失败: {queue_result.get('error')}")
-
-            prompt_id = queue_result.get("prompt_id")
-            save_image_node_id = node_mapping.get("save_image_node_id")
+            # 检测并断开未上传图片的参考图节点的下游连接，并删除遗留的无用子图
+            graph = WorkflowGraph(submitted_workflow)
+            disconnect_unuploaded_reference_nodes(submitted_workflow, node_mapping, graph=graph)
+            prune_unreachable_nodes(submitted_workflow, graph, node_mapping)
 
             # 保存工作流 JSON 和提示词到任务记录
-            task.comfyui_prompt_id = prompt_id
             task.workflow_json = json.dumps(submitted_workflow, ensure_ascii=False, indent=2)
             task.prompt_text = prompt
-            db.commit()
+            await async_commit(db)
 
-            # 等待结果
-            result = await comfyui_service.client.wait_for_result(
-                prompt_id, submitted_workflow, save_image_node_id, timeout=7200
+            async def save_prompt_id(prompt_id: str):
+                task.comfyui_prompt_id = prompt_id
+                await async_commit(db)
+
+            # 提交任务并等待结果（相同工作流直接复用记忆的结果）
+            save_image_node_id = node_mapping.get("save_image_node_id")
+            result = await comfyui_service.run_workflow(
+                submitted_workflow, save_image_node_id, use_memo=use_memo,
+                on_queued=save_prompt_id, input_digests=input_digests
             )
+            if not result.get("success") and not result.get("prompt_id"):
+                raise ValueError(f"提交任务失败: {result.get('message')}")
 
             if result.get("success") and result.get("image_url"):
                 image_url = result["image_url"]
@@ -423,7 +417,7 @@ class ShotKeyframeService:
                     # 更新任务状态
                     task.status = "completed"
                     task.result_url = local_url
-                    db.commit()
+                    await async_commit(db)
                 else:
                     raise ValueError("下载图片失败")
             else:
@@ -432,7 +426,7 @@ class ShotKeyframeService:
         except Exception as e:
             task.status = "failed"
             task.error_message = str(e)
-            db.commit()
+            await async_commit(db)
             raise
 
     async def upload_keyframe_image(
@@ -771,4 +765,32 @@ class ShotKeyframeService:
 
         shot_repo.update(shot, keyframes=keyframes)
 
-        return True, None, "关键帧删除成功"
\ No newline at end of file
+        return True, None, "关键帧删除成功"
+
+
+async def run_keyframe_image_task(
+    task_id: str,
+    shot_id: str,
+    frame_index: int,
+    keyframe: dict,
+    workflow_id: Optional[str] = None,
+    use_memo: bool = True
+):
+    """关键帧图片生成任务入口（供任务调度器调用）"""
+    from app.core.database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        await ShotKeyframeService()._generate_keyframe_image_task(
+            db, task_id, shot_id, frame_index, keyframe, workflow_id, use_memo
+        )
+    except Exception as e:
+        # 更新任务状态为失败
+        db.rollback()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        if task:
+            task.status = "failed"
+            task.error_message = str(e)
+            await async_commit(db)
+    finally:
+        db.close()
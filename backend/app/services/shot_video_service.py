@@ -10,8 +10,10 @@ from app.models.novel import Novel, Chapter
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.core.database import SessionLocal
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import report_progress
 from app.utils.path_utils import url_to_local_path
 from app.repositories.shot_repository import ShotRepository
 
@@ -24,7 +26,8 @@ async def generate_shot_video_task(
     workflow_id: str,
     shot_image_url: str,
     use_keyframes: bool = True,
-    use_reference_audio: bool = True
+    use_reference_audio: bool = True,
+    use_memo: bool = True
 ):
     """
     后台任务：生成分镜视频
@@ -38,6 +41,7 @@ async def generate_shot_video_task(
         shot_image_url: 分镜图片URL
         use_keyframes: 是否使用关键帧（如果存在），默认 True
         use_reference_audio: 是否使用参考音频（如果存在），默认 True
+        use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
     """
     db = SessionLocal()
     try:
@@ -48,7 +52,7 @@ async def generate_shot_video_task(
         task.status = "running"
         task.started_at = datetime.utcnow()
         task.current_step = "准备生成视频..."
-        db.commit()
+        await async_commit(db)
 
         chapter = db.query(Chapter).filter(
             Chapter.id == chapter_id,
@@ -58,21 +62,21 @@ async def generate_shot_video_task(
         if not chapter:
             task.status = "failed"
             task.error_message = "章节不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         novel = db.query(Novel).filter(Novel.id == novel_id).first()
         if not novel:
             task.status = "failed"
             task.error_message = "小说不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
         if not workflow:
             task.status = "failed"
             task.error_message = "工作流不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         node_mapping = json.loads(workflow.node_mapping) if workflow.node_mapping else {}
@@ -85,14 +89,14 @@ async def generate_shot_video_task(
         if not shot:
             task.status = "failed"
             task.error_message = "分镜不存在"
-            db.commit()
+            await async_commit(db)
             return
 
         # 视频生成优先使用专用视频描述，未填写时回退到分镜描述
         shot_prompt = (shot.video_description or "").strip() or (shot.description or "")
 
         task.prompt_text = shot_prompt
-        db.commit()
+        await async_commit(db)
 
         duration = shot.duration or 4
         fps = 25
@@ -196,9 +200,7 @@ async def generate_shot_video_task(
         elif not use_keyframes:
             print(f"[VideoTask {task_id}] Skipping keyframes (use_keyframes=False)")
 
-        task.current_step = "正在调用 ComfyUI 生成视频..."
-        task.progress = 30
-        db.commit()
+        report_progress(task.id, current_step="正在调用 ComfyUI 生成视频...", progress=30)
 
         comfyui_service = ComfyUIService()
         result = await comfyui_service.generate_shot_video_with_workflow(
@@ -214,7 +216,9 @@ async def generate_shot_video_task(
             scene_setting=scene_setting,
             prop_appearances=prop_appearances,
             reference_audio_path=reference_audio_path,
-            keyframe_paths=keyframe_paths
+            keyframe_paths=keyframe_paths,
+            workflow_key=workflow_cache_key(workflow),
+            use_memo=use_memo
         )
 
         print(f"[VideoTask {task_id}] Generation result: {json.dumps(result, ensure_ascii=True)}")
@@ -225,14 +229,14 @@ async def generate_shot_video_task(
 
         if result.get("submitted_workflow"):
             task.workflow_json = json.dumps(result["submitted_workflow"], ensure_ascii=False, indent=2)
-            db.commit()
+            await async_commit(db)
             print(f"[VideoTask {task_id}] Saved submitted workflow to task")
 
         if not result.get("success"):
             task.status = "failed"
             task.error_message = result.get("message", "生成失败")
             task.current_step = "生成失败"
-            db.commit()
+            await async_commit(db)
             return
 
         # 下载并保存视频
@@ -247,7 +251,7 @@ async def generate_shot_video_task(
             task.status = "failed"
             task.error_message = str(e)
             task.current_step = "任务异常"
-            db.commit()
+            await async_commit(db)
         except Exception:
             pass
     finally:
@@ -259,16 +263,14 @@ async def _save_generated_video(
     shot_index: int, db, task_id: str, shot_repo: ShotRepository
 ):
     """下载并保存生成的视频"""
-    task.current_step = "正在下载生成的视频..."
-    task.progress = 80
-    db.commit()
+    report_progress(task.id, current_step="正在下载生成的视频...", progress=80)
 
     video_url = result.get("video_url")
     if not video_url:
         task.status = "failed"
         task.error_message = "未获取到视频URL"
         task.current_step = "生成失败"
-        db.commit()
+        await async_commit(db)
         return
 
     local_path = await file_storage.download_video(
@@ -293,11 +295,11 @@ async def _save_generated_video(
         task.result_url = local_url
         task.current_step = "生成完成"
         task.completed_at = datetime.utcnow()
-        db.commit()
+        await async_commit(db)
 
         print(f"[VideoTask {task_id}] Video saved: {local_url}")
     else:
         task.status = "failed"
         task.error_message = "下载视频失败"
         task.current_step = "下载失败"
-        db.commit()
+        await async_commit(db)
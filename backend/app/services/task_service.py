@@ -4,12 +4,12 @@
 封装任务相关的业务逻辑和后台任务
 """
 import json
-import asyncio
 from datetime import datetime
 from typing import Dict, Any, Tuple
 
 from sqlalchemy.orm import Session
 
+from app.constants import COMFYUI_TASK_TYPES, TASK_PRIORITY_NORMAL
 from app.core.database import SessionLocal
 from app.utils.time_utils import format_datetime
 from app.models.task import Task
@@ -19,8 +19,9 @@ from app.repositories import TaskRepository, WorkflowRepository
 from app.repositories.character_repository import CharacterRepository
 from app.repositories.scene_repository import SceneRepository
 from app.repositories.prompt_template import PromptTemplateRepository
-from app.services.comfyui import ComfyUIService
+from app.services.comfyui import ComfyUIService, get_backend_pool
 from app.services.file_storage import file_storage
+from app.services.scheduler import enqueue_task
 from app.services.prompt_builder import (
     build_character_prompt,
     build_scene_prompt,
@@ -119,6 +120,32 @@ class TaskService:
                 "details": {"skipped": True},
             }
 
+        if task.status == "pending" and not task.comfyui_prompt_id and not task.lease_owner:
+            # 仍在调度队列中等待、尚未提交到 ComfyUI 的任务直接终止
+            task.status = "failed"
+            task.error_message = "任务被用户删除并终止"
+            task.current_step = "已终止"
+            db.commit()
+            return {
+                "success": True,
+                "message": "已从任务队列中移除",
+                "task": task,
+                "details": {"dequeued": True},
+            }
+
+        if task.type in ("chapter_shot_images", "novel_split_chapters", "novel_fill_appearances"):
+            # 批量任务本身不提交 ComfyUI，标记终止后由其移除尚未执行的子任务、停止处理剩余章节或实体
+            task.status = "failed"
+            task.error_message = "任务被用户删除并终止"
+            task.current_step = "已终止"
+            db.commit()
+            return {
+                "success": True,
+                "message": "批量任务已终止",
+                "task": task,
+                "details": {"batch": True},
+            }
+
         if not task.comfyui_prompt_id:
             return {
                 "success": False,
@@ -126,7 +153,9 @@ class TaskService:
                 "status_code": 409,
             }
 
-        cancel_result = await self.comfyui_service.cancel_all_matching_tasks([task.comfyui_prompt_id])
+        # 多主机时到任务所在的主机终止
+        comfyui_service = ComfyUIService(task.comfyui_host) if task.comfyui_host else self.comfyui_service
+        cancel_result = await comfyui_service.cancel_all_matching_tasks([task.comfyui_prompt_id])
         deleted_from_queue = cancel_result.get("deleted_from_queue", [])
         interrupted = cancel_result.get("interrupted", False)
         not_found = cancel_result.get("not_found", [])
@@ -196,24 +225,29 @@ class TaskService:
             "interrupted": False
         }
 
+        # 配置了多台 ComfyUI 主机时逐台处理
+        comfyui_services = [ComfyUIService(host) for host in get_backend_pool().hosts]
+
         # 1. 【第一步】清空 ComfyUI 队列（先清除等待中的任务）
-        try:
-            print(f"[CancelAll] Step 1: Clearing ComfyUI queue")
-            clear_result = await self.comfyui_service.clear_queue()
-            cancel_result["queue_cleared"] = clear_result.get("success", False)
-            print(f"[CancelAll] Clear queue result: {clear_result}")
-        except Exception as e:
-            print(f"[CancelAll] Clear queue error: {e}")
+        for comfyui_service in comfyui_services:
+            try:
+                print(f"[CancelAll] Step 1: Clearing ComfyUI queue ({comfyui_service.base_url})")
+                clear_result = await comfyui_service.clear_queue()
+                cancel_result["queue_cleared"] |= clear_result.get("success", False)
+                print(f"[CancelAll] Clear queue result: {clear_result}")
+            except Exception as e:
+                print(f"[CancelAll] Clear queue error: {e}")
 
         # 2. 【第二步】中断当前正在执行的任务
         if has_running_task:
-            try:
-                print(f"[CancelAll] Step 2: Interrupting running task")
-                interrupt_result = await self.comfyui_service.interrupt_execution()
-                cancel_result["interrupted"] = interrupt_result.get("success", False)
-                print(f"[CancelAll] Interrupt result: {interrupt_result}")
-            except Exception as e:
-                print(f"[CancelAll] Interrupt error: {e}")
+            for comfyui_service in comfyui_services:
+                try:
+                    print(f"[CancelAll] Step 2: Interrupting running task ({comfyui_service.base_url})")
+                    interrupt_result = await comfyui_service.interrupt_execution()
+                    cancel_result["interrupted"] |= interrupt_result.get("success", False)
+                    print(f"[CancelAll] Interrupt result: {interrupt_result}")
+                except Exception as e:
+                    print(f"[CancelAll] Interrupt error: {e}")
 
         # 更新所有任务状态为 failed
         cancelled_count = 0
@@ -272,6 +306,9 @@ class TaskService:
         if task.status not in ["failed", "completed"]:
             return {"success": False, "message": "只能重试失败或已完成的任务", "status_code": 400}
 
+        # 重试已完成的生成任务表示要新的结果，跳过生成结果记忆
+        regenerate = task.status == "completed" and task.type in COMFYUI_TASK_TYPES
+
         # 重置任务状态
         task.status = "pending"
         task.progress = 0
@@ -281,37 +318,39 @@ class TaskService:
         task.completed_at = None
         db.commit()
 
-        # 根据任务类型重新执行
+        # 根据任务类型重新入队（角色/场景使用最新的设定，其余沿用入队时的参数）
+        payload = None
         if task.type == "character_portrait" and task.character_id:
-            # 从CharacterService重新执行任务
-            from app.services.character_service import CharacterService
-            character_service = CharacterService(db)
             character = character_repo.get_by_id(task.character_id)
             if character:
-                asyncio.create_task(
-                    character_service._generate_portrait_task(
-                        task.id,
-                        character.id,
-                        character.name,
-                        character.appearance,
-                        character.description
-                    )
-                )
+                payload = {
+                    "character_id": character.id,
+                    "name": character.name,
+                    "appearance": character.appearance,
+                    "description": character.description,
+                }
         elif task.type == "scene_image" and task.scene_id:
-            # 从SceneService重新执行任务
-            from app.services.scene_service import SceneService
-            scene_service = SceneService(db)
             scene = scene_repo.get_by_id(task.scene_id)
             if scene:
-                asyncio.create_task(
-                    scene_service._generate_scene_image_task(
-                        task.id,
-                        scene.id,
-                        scene.name,
-                        scene.setting,
-                        scene.description
-                    )
-                )
+                payload = {
+                    "scene_id": scene.id,
+                    "name": scene.name,
+                    "setting": scene.setting,
+                    "description": scene.description,
+                }
+        elif task.payload:
+            payload = json.loads(task.payload)
+
+        if payload is not None:
+            if regenerate:
+                payload["use_memo"] = False
+                payload.pop("seed", None)
+            elif task.payload:
+                # 沿用上次的种子，重建出相同的工作流以命中生成结果记忆
+                seed = json.loads(task.payload).get("seed")
+                if seed is not None:
+                    payload["seed"] = seed
+            enqueue_task(task, priority=task.priority or TASK_PRIORITY_NORMAL, **payload)
 
         return {
             "success": True,
@@ -400,6 +439,7 @@ class TaskService:
             "sceneId": task.scene_id,
             "shotId": task.shot_id,
             "comfyuiPromptId": task.comfyui_prompt_id,
+            "comfyuiHost": task.comfyui_host,
             "createdAt": format_datetime(task.created_at),
             "startedAt": format_datetime(task.started_at),
             "completedAt": format_datetime(task.completed_at),
@@ -5,15 +5,16 @@
 """
 import json
 import os
-import httpx
 from datetime import datetime
 
 from app.models.novel import Chapter
 from app.models.task import Task
 from app.models.workflow import Workflow
 from app.core.database import SessionLocal
-from app.services.comfyui import ComfyUIService
+from app.core.db_executor import async_commit
+from app.services.comfyui import ComfyUIService, workflow_cache_key
 from app.services.file_storage import file_storage
+from app.services.scheduler import report_progress
 from app.utils.path_utils import url_to_local_path
 from app.repositories.shot_repository import ShotRepository
 
@@ -25,7 +26,8 @@ async def generate_transition_video_task(
     from_index: int,
     to_index: int,
     workflow_id: str,
-    frame_count: int = 49
+    frame_count: int = 49,
+    use_memo: bool = True
 ):
     """
     后台任务：生成转场视频（从视频提取首帧/尾帧）
@@ -38,6 +40,7 @@ async def generate_transition_video_task(
         to_index: 结束分镜索引
         workflow_id: 工作流ID
         frame_count: 帧数
+        use_memo: 是否使用生成结果记忆（强制重新生成时为 False）
     """
     db = SessionLocal()
 
@@ -50,7 +53,7 @@ async def generate_transition_video_task(
         task.status = "running"
         task.current_step = "准备生成转场视频..."
         task.progress = 10
-        db.commit()
+        await async_commit(db)
 
         chapter = db.query(Chapter).filter(Chapter.id == chapter_id).first()
         if not chapter:
@@ -87,9 +90,7 @@ async def generate_transition_video_task(
         first_video_name = Path(first_video_path).stem
         second_video_name = Path(second_video_path).stem
 
-        task.current_step = "正在提取视频帧..."
-        task.progress = 20
-        db.commit()
+        report_progress(task.id, current_step="正在提取视频帧...", progress=20)
 
         # 提取前一个视频的尾帧
         first_frames = await file_storage.extract_video_frames(first_video_path)
@@ -104,9 +105,7 @@ async def generate_transition_video_task(
         last_frame_path = first_frames["last"]
         first_frame_path = second_frames["first"]
 
-        task.current_step = "正在调用 ComfyUI 生成转场视频..."
-        task.progress = 40
-        db.commit()
+        report_progress(task.id, current_step="正在调用 ComfyUI 生成转场视频...", progress=40)
 
         workflow = db.query(Workflow).filter(Workflow.id == workflow_id).first()
         if not workflow:
@@ -125,7 +124,9 @@ async def generate_transition_video_task(
             node_mapping=node_mapping,
             first_image_path=last_frame_path,
             last_image_path=first_frame_path,
-            frame_count=frame_count
+            frame_count=frame_count,
+            workflow_key=workflow_cache_key(workflow),
+            use_memo=use_memo
         )
 
         if result.get("prompt_id"):
@@ -134,26 +135,21 @@ async def generate_transition_video_task(
 
         if result.get("submitted_workflow"):
             task.workflow_json = json.dumps(result["submitted_workflow"], ensure_ascii=False, indent=2)
-            db.commit()
+            await async_commit(db)
             print(f"[TransitionTask] Saved submitted workflow to task")
 
         if result.get("success"):
             video_url = result.get("video_url")
 
-            task.current_step = "正在保存视频..."
-            task.progress = 80
-            db.commit()
+            report_progress(task.id, current_step="正在保存视频...", progress=80)
 
             transition_path = file_storage.get_transition_video_path(
                 novel_id, chapter_id, first_video_name, second_video_name
             )
 
-            async with httpx.AsyncClient() as client:
-                response = await client.get(video_url, timeout=120.0)
-                response.raise_for_status()
-
-                with open(transition_path, 'wb') as f:
-                    f.write(response.content)
+            content = await file_storage.fetch_url_content(video_url, timeout=120.0)
+            with open(transition_path, 'wb') as f:
+                f.write(content)
 
             relative_path = str(transition_path).replace(str(file_storage.base_dir), "").replace("\\", "/")
             local_url = f"/api/files/{relative_path.lstrip('/')}"
@@ -173,7 +169,7 @@ async def generate_transition_video_task(
             task.progress = 100
             task.result_url = local_url
             task.current_step = "转场视频生成完成"
-            db.commit()
+            await async_commit(db)
 
             print(f"[TransitionTask] Completed: {from_index}->{to_index}, video: {local_url}")
         else:
@@ -188,7 +184,7 @@ async def generate_transition_video_task(
             task.status = "failed"
             task.error_message = str(e)
             task.current_step = "任务异常"
-            db.commit()
+            await async_commit(db)
         except Exception:
             pass
     finally:
@@ -41,6 +41,60 @@ def load_chinese_font(size: int) -> ImageFont:
     return ImageFont.load_default()
 
 
+def _remove_old_merged_images(novel_id: str, chapter_id: str, shot_index: int, file_storage):
+    """删除分镜旧的合并角色图"""
+    import os
+    import glob
+
+    story_dir = file_storage._get_story_dir(novel_id)
+    chapter_short = chapter_id[:8] if chapter_id else "unknown"
+    merged_dir = story_dir / f"chapter_{chapter_short}" / "merged_characters"
+    if merged_dir.exists():
+        old_files = glob.glob(str(merged_dir / f"shot_{shot_index:03d}_*_characters.png"))
+        for old_file in old_files:
+            try:
+                os.remove(old_file)
+                print(f"[MergeCharacters] Removed old merged character image: {old_file}")
+            except Exception as e:
+                print(f"[MergeCharacters] Failed to remove old file {old_file}: {e}")
+
+
+def copy_merged_character_image(
+    novel_id: str,
+    chapter_id: str,
+    shot_index: int,
+    character_names: List[str],
+    source_path: str,
+    file_storage
+) -> Optional[str]:
+    """
+    复用已合并的角色图（相同角色组合的分镜共用同一张合并图）
+
+    Args:
+        novel_id: 小说ID
+        chapter_id: 章节ID
+        shot_index: 分镜索引
+        character_names: 角色名列表
+        source_path: 已合并的角色图路径
+        file_storage: 文件存储服务实例
+
+    Returns:
+        该分镜的合并角色图路径，失败返回 None
+    """
+    import shutil
+
+    try:
+        merged_path = file_storage.get_merged_characters_path(novel_id, chapter_id, shot_index, character_names)
+        if str(merged_path) == str(source_path):
+            return str(merged_path)
+        _remove_old_merged_images(novel_id, chapter_id, shot_index, file_storage)
+        shutil.copyfile(source_path, merged_path)
+        return str(merged_path)
+    except Exception as e:
+        print(f"[MergeCharacters] Failed to copy merged character image: {e}")
+        return None
+
+
 def merge_character_images(
     novel_id: str,
     chapter_id: str,
@@ -61,25 +115,12 @@ def merge_character_images(
     Returns:
         合并后的图片路径，失败返回 None
     """
-    import os
-    import glob
-    
     if not character_images:
         return None
     
     try:
         # 删除旧的合并角色图
-        story_dir = file_storage._get_story_dir(novel_id)
-        chapter_short = chapter_id[:8] if chapter_id else "unknown"
-        merged_dir = story_dir / f"chapter_{chapter_short}" / "merged_characters"
-        if merged_dir.exists():
-            old_files = glob.glob(str(merged_dir / f"shot_{shot_index:03d}_*_characters.png"))
-            for old_file in old_files:
-                try:
-                    os.remove(old_file)
-                    print(f"[MergeCharacters] Removed old merged character image: {old_file}")
-                except Exception as e:
-                    print(f"[MergeCharacters] Failed to remove old file {old_file}: {e}")
+        _remove_old_merged_images(novel_id, chapter_id, shot_index, file_storage)
         
         # 获取角色名列表
         character_names = [name for name, _ in character_images]
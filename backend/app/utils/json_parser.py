@@ -151,3 +151,113 @@ def clean_llm_response(content: str) -> str:
     text = re.sub(r'<\|.*?\|>', '', text)
 
     return text.strip()
+
+
+class JsonArrayStreamParser:
+    """
+    增量解析流式 LLM 输出中的 JSON 数组元素
+
+    逐段输入文本，顶层对象中指定键（如 "shots"）的数组每有一个元素（对象）闭合即返回，
+    无需等待完整响应。会跳过开头的 <think> 推理内容与 Markdown 代码块标记。
+
+    示例：
+        parser = JsonArrayStreamParser("shots")
+        for delta in stream:
+            for shot in parser.feed(delta):
+                ...
+    """
+
+    def __init__(self, key: str):
+        self.key = key
+        self.count = 0  # 已产出的元素数
+        self.failed = 0  # 闭合但无法解析的元素数
+        self._text = ""
+        self._pos = 0
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._string_start = 0
+        self._pending_key = None  # 顶层对象中刚读完的字符串（后跟冒号时为键）
+        self._current_key = None
+        self._array_depth = None  # 目标数组内部的深度
+        self._element_start = None
+        self._done = False
+
+    def feed(self, chunk: str) -> list:
+        """输入一段文本，返回本次新闭合的数组元素"""
+        self._text += chunk
+        if not self._started and not self._skip_preamble():
+            return []
+
+        items = []
+        text = self._text
+        i = self._pos
+        while i < len(text) and not self._done:
+            c = text[i]
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif c == "\\":
+                    self._escape = True
+                elif c == '"':
+                    self._in_string = False
+                    if self._depth == 1:
+                        self._pending_key = text[self._string_start:i]
+            elif c == '"':
+                self._in_string = True
+                self._string_start = i + 1
+            elif c == ":" and self._depth == 1:
+                self._current_key = self._pending_key
+            elif c == "," and self._depth == 1:
+                self._current_key = None
+            elif c in "{[":
+                self._depth += 1
+                if c == "[" and self._depth == 2 and self._current_key == self.key and self._array_depth is None:
+                    self._array_depth = self._depth
+                elif c == "{" and self._array_depth is not None and self._depth == self._array_depth + 1:
+                    self._element_start = i
+            elif c in "}]":
+                if (
+                    c == "}"
+                    and self._element_start is not None
+                    and self._depth == self._array_depth + 1
+                ):
+                    item = self._parse_element(text[self._element_start:i + 1])
+                    if item is not None:
+                        items.append(item)
+                    self._element_start = None
+                self._depth -= 1
+                if c == "]" and self._array_depth is not None and self._depth == self._array_depth - 1:
+                    # 目标数组结束，之后的内容无需再扫描
+                    self._done = True
+            i += 1
+        self._pos = i
+        return items
+
+    def _skip_preamble(self) -> bool:
+        """跳过 JSON 之前的推理内容与代码块标记，找到顶层对象后返回 True"""
+        text = self._text
+        offset = 0
+        stripped = text.lstrip()
+        if stripped.lower().startswith("<think"):
+            match = re.search(r'</think\s*>', text, flags=re.IGNORECASE)
+            if not match:
+                return False
+            offset = match.end()
+        start = text.find("{", offset)
+        if start < 0:
+            return False
+        self._started = True
+        self._pos = start
+        return True
+
+    def _parse_element(self, element: str):
+        try:
+            item = json.loads(element)
+        except json.JSONDecodeError:
+            self.failed += 1
+            print(f"[JSON Parser] 流式元素解析失败: {element[:200]}")
+            return None
+        self.count += 1
+        return item
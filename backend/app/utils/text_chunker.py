@@ -0,0 +1,251 @@
+"""
+文本分块工具
+
+按章节/段落边界将长文本切分为受 token 预算约束的文本块，供分块并行解析使用；
+按段落边界将超长章节切分为带衔接上下文的窗口，供分窗口拆分分镜使用。
+"""
+import re
+from dataclasses import dataclass, field
+from typing import List, Optional, Sequence, Tuple
+
+# CJK 字符（中日韩统一表意文字、假名、谚文、全角标点）
+_CJK_RE = re.compile(r'[\u3000-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]')
+
+# 段落分隔：一个或多个空行，或单个换行
+_PARAGRAPH_RE = re.compile(r'\n\s*\n|\n')
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本 token 数。
+
+    CJK 字符按 1 token/字计，其余字符按约 4 字符/token 计。
+    只用于分块预算，偏保守即可，不追求与具体分词器一致。
+    """
+    if not text:
+        return 0
+    cjk_count = len(_CJK_RE.findall(text))
+    other_count = len(text) - cjk_count
+    return cjk_count + (other_count + 3) // 4
+
+
+@dataclass
+class TextChunk:
+    """一个待解析的文本块"""
+    index: int
+    text: str
+    chapter_numbers: List[int] = field(default_factory=list)
+    tokens: int = 0
+
+    @property
+    def start_chapter(self) -> Optional[int]:
+        return self.chapter_numbers[0] if self.chapter_numbers else None
+
+    @property
+    def end_chapter(self) -> Optional[int]:
+        return self.chapter_numbers[-1] if self.chapter_numbers else None
+
+    @property
+    def source_range(self) -> str:
+        """文本块覆盖的章节范围描述，如 "第3章至第7章" """
+        if not self.chapter_numbers:
+            return ""
+        if self.start_chapter == self.end_chapter:
+            return f"第{self.start_chapter}章"
+        return f"第{self.start_chapter}章至第{self.end_chapter}章"
+
+
+def _split_paragraphs(content: str) -> List[str]:
+    """按段落拆分，去掉空段"""
+    return [p.strip() for p in _PARAGRAPH_RE.split(content) if p and p.strip()]
+
+
+def _hard_split(text: str, max_tokens: int, max_chars: int) -> List[str]:
+    """对超出预算的单个段落按句末标点切分，仍超出则按长度硬切"""
+    sentences = re.split(r'(?<=[。！？!?；;…])', text)
+    pieces: List[str] = []
+    current = ""
+    for sentence in sentences:
+        if not sentence:
+            continue
+        candidate = current + sentence
+        if current and (estimate_tokens(candidate) > max_tokens or len(candidate) > max_chars):
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+
+    # 单句仍然超长时按字符硬切
+    result: List[str] = []
+    for piece in pieces:
+        while estimate_tokens(piece) > max_tokens or len(piece) > max_chars:
+            # 以 CJK 最坏情况（1 字 1 token）估算切点
+            cut = max(1, min(max_tokens, max_chars))
+            result.append(piece[:cut])
+            piece = piece[cut:]
+        if piece:
+            result.append(piece)
+    return result
+
+
+def chunk_chapters(
+    chapters: Sequence[Tuple[int, str, str]],
+    max_tokens: int,
+    max_chars: Optional[int] = None,
+    include_headers: bool = True,
+) -> List[TextChunk]:
+    """
+    将章节切分为受 token 预算约束的文本块。
+
+    优先在章节边界切分，多个短章节合并进同一块；单章超出预算时在段落边界切分，
+    单段仍超出时按句子/长度切分。
+
+    Args:
+        chapters: [(章节号, 章节标题, 章节内容), ...]，需已按章节号排序
+        max_tokens: 单块 token 预算
+        max_chars: 单块字符上限（可选，兼容按字符截断的下游）
+        include_headers: 是否在块内保留【第N章 标题】标记
+
+    Returns:
+        文本块列表
+    """
+    max_chars = max_chars or max_tokens * 4
+    chunks: List[TextChunk] = []
+    parts: List[str] = []
+    numbers: List[int] = []
+
+    def flush():
+        if parts:
+            text = "\n\n".join(parts)
+            chunks.append(TextChunk(
+                index=len(chunks),
+                text=text,
+                chapter_numbers=list(numbers),
+                tokens=estimate_tokens(text),
+            ))
+            parts.clear()
+            numbers.clear()
+
+    def fits(extra: str) -> bool:
+        candidate = "\n\n".join(parts + [extra])
+        return estimate_tokens(candidate) <= max_tokens and len(candidate) <= max_chars
+
+    for number, title, content in chapters:
+        content = (content or "").strip()
+        if not content:
+            continue
+        header = f"【第{number}章 {title}】" if include_headers else ""
+        block = f"{header}\n{content}" if header else content
+
+        if fits(block):
+            parts.append(block)
+            numbers.append(number)
+            continue
+
+        if estimate_tokens(block) <= max_tokens and len(block) <= max_chars:
+            # 整章放得下一个新块
+            flush()
+            parts.append(block)
+            numbers.append(number)
+            continue
+
+        # 单章超出预算：按段落切分，每个续块重复章节标记
+        flush()
+        # 为续块的章节标记预留预算
+        body_tokens = max(1, max_tokens - estimate_tokens(header) - 1)
+        body_chars = max(1, max_chars - len(header) - 1)
+        paragraphs: List[str] = []
+        for paragraph in _split_paragraphs(content):
+            if estimate_tokens(paragraph) > body_tokens or len(paragraph) > body_chars:
+                paragraphs.extend(_hard_split(paragraph, body_tokens, body_chars))
+            else:
+                paragraphs.append(paragraph)
+
+        body: List[str] = []
+        for paragraph in paragraphs:
+            candidate = "\n".join(([header] if header else []) + body + [paragraph])
+            if body and (estimate_tokens(candidate) > max_tokens or len(candidate) > max_chars):
+                parts.append("\n".join(([header] if header else []) + body))
+                numbers.append(number)
+                flush()
+                body = []
+            body.append(paragraph)
+        if body:
+            parts.append("\n".join(([header] if header else []) + body))
+            numbers.append(number)
+
+    flush()
+    return chunks
+
+
+@dataclass
+class TextWindow:
+    """超长章节的一个拆分窗口"""
+    index: int
+    text: str
+    context: str = ""  # 上一窗口结尾文本，仅供衔接参考
+
+
+def split_text_windows(content: str, max_chars: int, context_chars: int = 0) -> List[TextWindow]:
+    """
+    将超长文本按段落边界切分为窗口。
+
+    每个窗口正文与上一窗口结尾的衔接上下文合计不超过 max_chars；
+    上下文取上一窗口末尾的完整段落，单段超长时取其末尾 context_chars 个字符。
+
+    Args:
+        content: 章节内容
+        max_chars: 单个窗口（含上下文）字符上限
+        context_chars: 衔接上下文字符上限
+
+    Returns:
+        窗口列表；内容不超过 max_chars 时只有一个窗口且无上下文
+    """
+    content = (content or "").strip()
+    if len(content) <= max_chars:
+        return [TextWindow(index=0, text=content)] if content else []
+
+    context_chars = max(0, min(context_chars, max_chars // 4))
+    body_chars = max(1, max_chars - context_chars - 1)
+    paragraphs: List[str] = []
+    for paragraph in _split_paragraphs(content):
+        if len(paragraph) > body_chars:
+            paragraphs.extend(_hard_split(paragraph, body_chars, body_chars))
+        else:
+            paragraphs.append(paragraph)
+
+    bodies: List[List[str]] = []
+    body: List[str] = []
+    size = 0
+    for paragraph in paragraphs:
+        if body and size + 1 + len(paragraph) > body_chars:
+            bodies.append(body)
+            body, size = [], 0
+        size += len(paragraph) + (1 if body else 0)
+        body.append(paragraph)
+    if body:
+        bodies.append(body)
+
+    windows: List[TextWindow] = []
+    for index, body in enumerate(bodies):
+        context = _tail_context(bodies[index - 1], context_chars) if index > 0 else ""
+        windows.append(TextWindow(index=index, text="\n".join(body), context=context))
+    return windows
+
+
+def _tail_context(paragraphs: List[str], max_chars: int) -> str:
+    """取段落列表末尾不超过 max_chars 的完整段落作为衔接上下文"""
+    if max_chars <= 0:
+        return ""
+    tail: List[str] = []
+    size = 0
+    for paragraph in reversed(paragraphs):
+        if size + len(paragraph) > max_chars:
+            break
+        tail.insert(0, paragraph)
+        size += len(paragraph) + 1
+    if not tail:
+        return paragraphs[-1][-max_chars:]
+    return "\n".join(tail)
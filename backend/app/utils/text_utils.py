@@ -3,6 +3,7 @@
 
 提供编码检测、章节解析、中文数字转换功能，用于批量导入章节。
 """
+import hashlib
 import re
 from typing import Tuple, List, Dict, Optional
 
@@ -23,6 +24,16 @@ def detect_encoding(raw_bytes: bytes) -> str:
         return 'gbk'
 
 
+def content_hash(text: Optional[str]) -> str:
+    """
+    计算文本内容指纹（SHA-256）。
+
+    忽略换行符差异与首尾空白，仅因编辑器换行格式不同不会视为内容变化。
+    """
+    normalized = (text or "").replace('\r\n', '\n').replace('\r', '\n').strip()
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
 def chinese_to_int(text: str) -> Optional[int]:
     """
     中文数字转阿拉伯数字。
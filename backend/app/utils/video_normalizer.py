@@ -0,0 +1,204 @@
+"""
+视频片段标准化
+
+合并视频前将每个片段统一为相同的分辨率/帧率/编码参数，以便最终使用 concat 流拷贝拼接。
+- 标准化结果按「源文件内容摘要 + 目标参数」缓存，重新合并时只处理变化的片段
+- 已符合目标格式的片段直接使用原文件，不重新编码
+- 函数在独立进程中执行（ProcessPoolExecutor），本模块只依赖标准库，保证子进程导入开销小
+"""
+import hashlib
+import json
+import os
+import subprocess
+from typing import Any, Dict, Optional
+
+# 标准化目标参数（宽高取第一个片段的分辨率）
+TARGET_FPS = 24
+TARGET_PIX_FMT = "yuv420p"
+TARGET_VIDEO_CODEC = "h264"
+TARGET_AUDIO_CODEC = "aac"
+TARGET_SAMPLE_RATE = 48000
+TARGET_CHANNELS = 2
+ENCODE_PARAMS = ["-c:v", "libx264", "-preset", "medium", "-crf", "18"]
+
+# 参数变化时缓存键随之变化
+_CACHE_VERSION = "v1"
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def probe_video(path: str) -> Dict[str, Any]:
+    """读取视频/音频流信息"""
+    result = subprocess.run(
+        [
+            "ffprobe",
+            "-v", "error",
+            "-show_entries",
+            "stream=codec_type,codec_name,width,height,pix_fmt,avg_frame_rate,sample_rate,channels",
+            "-of", "json",
+            path,
+        ],
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"ffprobe failed for {path}: {result.stderr}")
+
+    streams = json.loads(result.stdout or "{}").get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), None)
+    if not video:
+        raise RuntimeError(f"No video stream found in {path}")
+    audio = next((s for s in streams if s.get("codec_type") == "audio"), None)
+
+    return {
+        "width": int(video.get("width") or 0),
+        "height": int(video.get("height") or 0),
+        "codec": video.get("codec_name"),
+        "pix_fmt": video.get("pix_fmt"),
+        "fps": _parse_rate(video.get("avg_frame_rate")),
+        "has_audio": audio is not None,
+        "audio_codec": audio.get("codec_name") if audio else None,
+        "sample_rate": int(audio.get("sample_rate") or 0) if audio else 0,
+        "channels": int(audio.get("channels") or 0) if audio else 0,
+    }
+
+
+def _parse_rate(rate: Optional[str]) -> float:
+    try:
+        num, _, den = (rate or "0/1").partition("/")
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return 0.0
+
+
+def matches_target(info: Dict[str, Any], width: int, height: int) -> bool:
+    """片段是否已符合目标格式（可直接参与流拷贝拼接）"""
+    return (
+        info["width"] == width
+        and info["height"] == height
+        and info["codec"] == TARGET_VIDEO_CODEC
+        and info["pix_fmt"] == TARGET_PIX_FMT
+        and abs(info["fps"] - TARGET_FPS) < 0.01
+        and info["audio_codec"] == TARGET_AUDIO_CODEC
+        and info["sample_rate"] == TARGET_SAMPLE_RATE
+        and info["channels"] == TARGET_CHANNELS
+    )
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cache_key(source_digest: str, width: int, height: int) -> str:
+    """标准化结果缓存键：源内容 + 目标参数"""
+    params = [
+        _CACHE_VERSION, str(width), str(height), str(TARGET_FPS), TARGET_PIX_FMT,
+        *ENCODE_PARAMS, TARGET_AUDIO_CODEC, str(TARGET_SAMPLE_RATE), str(TARGET_CHANNELS),
+    ]
+    return hashlib.blake2b(
+        "|".join([source_digest, *params]).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+def build_normalize_cmd(
+    source: str,
+    output: str,
+    width: int,
+    height: int,
+    has_audio: bool,
+    threads: int = 0
+) -> list:
+    """构建标准化 ffmpeg 命令"""
+    cmd = ["ffmpeg", "-i", source]
+    if not has_audio:
+        cmd.extend(["-f", "lavfi", "-i", f"anullsrc=channel_layout=stereo:sample_rate={TARGET_SAMPLE_RATE}"])
+    cmd.extend([
+        "-vf",
+        f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+        f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2:black,fps={TARGET_FPS},format={TARGET_PIX_FMT}",
+        *ENCODE_PARAMS,
+        "-c:a", TARGET_AUDIO_CODEC,
+        "-ar", str(TARGET_SAMPLE_RATE),
+        "-ac", str(TARGET_CHANNELS),
+    ])
+    if threads:
+        cmd.extend(["-threads", str(threads)])
+    if not has_audio:
+        cmd.append("-shortest")
+    cmd.extend(["-movflags", "+faststart", "-y", output])
+    return cmd
+
+
+def normalize_clip(
+    source: str,
+    cache_dir: str,
+    width: int,
+    height: int,
+    threads: int = 0
+) -> Dict[str, Any]:
+    """
+    标准化单个片段（在进程池中执行）
+
+    Returns:
+        {
+            "success": bool,
+            "path": str,  # 用于拼接的文件路径
+            "status": str,  # reused（原文件已符合）/ cached（命中缓存）/ encoded
+            "message": str
+        }
+    """
+    try:
+        info = probe_video(source)
+        if matches_target(info, width, height):
+            return {"success": True, "path": source, "status": "reused", "message": ""}
+
+        key = cache_key(file_digest(source), width, height)
+        cached_path = os.path.join(cache_dir, f"{key}.mp4")
+        if os.path.exists(cached_path):
+            # 更新访问时间，供缓存淘汰使用
+            os.utime(cached_path)
+            return {"success": True, "path": cached_path, "status": "cached", "message": ""}
+
+        os.makedirs(cache_dir, exist_ok=True)
+        temp_path = os.path.join(cache_dir, f"{key}.{os.getpid()}.tmp.mp4")
+        cmd = build_normalize_cmd(source, temp_path, width, height, info["has_audio"], threads)
+        print(f"[VideoNormalizer] Normalizing video: {' '.join(cmd)}")
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode != 0:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+            return {"success": False, "path": source, "status": "failed", "message": result.stderr}
+        os.replace(temp_path, cached_path)
+        return {"success": True, "path": cached_path, "status": "encoded", "message": ""}
+    except Exception as e:
+        return {"success": False, "path": source, "status": "failed", "message": str(e)}
+
+
+def prune_cache(cache_dir: str, max_bytes: int) -> int:
+    """按最近使用时间淘汰缓存，直到总大小不超过上限，返回删除的文件数"""
+    if not os.path.isdir(cache_dir):
+        return 0
+    files = []
+    total = 0
+    for name in os.listdir(cache_dir):
+        if not name.endswith(".mp4") or ".tmp." in name:
+            continue
+        path = os.path.join(cache_dir, name)
+        stat = os.stat(path)
+        files.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= max_bytes:
+            break
+        try:
+            os.unlink(path)
+            total -= size
+            removed += 1
+        except OSError:
+            pass
+    return removed
@@ -5,13 +5,162 @@
 - 分镜图生成时未使用参考图
 - 关键帧图片生成时未使用参考图
 - 视频生成时未上传关键帧参考图
+
+所有操作基于 WorkflowGraph 连接索引（正向/反向邻接表），每次提交构建一次，
+断开链路与剪枝均为线性复杂度。
 """
 
-from typing import Dict, Any, Optional, List
+from collections import deque
+from typing import Dict, Any, Iterable, Optional, List, Set, Tuple
+
+# 参考图链路上需要断开的输入类型
+REFERENCE_INPUT_KINDS = {"latent", "pixels", "image"}
+
+# 节点输入引用 (节点ID, 输入名)
+InputRef = Tuple[str, str]
+
+
+def classify_input(input_name: str) -> Optional[str]:
+    """
+    按输入名判断输入类型
+
+    - latent、pixels：精确匹配
+    - image：支持 image 或 image 后跟数字（如 image1, image2, image_1）
+
+    Returns:
+        "latent" / "pixels" / "image"，其他输入返回 None
+    """
+    name = input_name.lower()
+    if name in ("latent", "pixels", "image"):
+        return name
+    if name.startswith("image"):
+        suffix = name[5:]  # 去掉 "image" 前缀
+        if suffix.isdigit() or (suffix.startswith("_") and suffix[1:].isdigit()):
+            return "image"
+    return None
+
+
+class WorkflowGraph:
+    """
+    工作流连接索引（每次提交构建一次，断开/剪枝操作同步更新）
+
+    - upstream: {节点ID: {输入名: (来源节点ID, 输出槽位)}}
+    - consumers: {来源节点ID: {输出槽位: {(下游节点ID, 输入名)}}}
+    - reference_inputs: 类型为 latent/pixels/image 的连接输入
+    - outputs: 构建时没有下游的节点，视为输出节点（剪枝时保留）
+    """
+
+    def __init__(self, workflow: Dict[str, Any]):
+        self.workflow = workflow
+        self.upstream: Dict[str, Dict[str, Tuple[str, Any]]] = {}
+        self.consumers: Dict[str, Dict[Any, Set[InputRef]]] = {}
+        self.reference_inputs: Set[InputRef] = set()
+
+        for node_id, node in workflow.items():
+            if not isinstance(node, dict):
+                continue
+            node_id = str(node_id)
+            links = self.upstream.setdefault(node_id, {})
+            for input_name, input_value in node.get("inputs", {}).items():
+                if isinstance(input_value, list) and len(input_value) >= 2:
+                    source = (str(input_value[0]), input_value[1])
+                    links[input_name] = source
+                    self.consumers.setdefault(source[0], {}).setdefault(_slot_key(source[1]), set()).add(
+                        (node_id, input_name)
+                    )
+                    if classify_input(input_name) in REFERENCE_INPUT_KINDS:
+                        self.reference_inputs.add((node_id, input_name))
+
+        self.outputs: Set[str] = {node_id for node_id in self.upstream if not self.consumers.get(node_id)}
+
+    def consumers_of(self, node_id: str) -> List[InputRef]:
+        """节点所有输出槽位的下游输入"""
+        return [ref for refs in self.consumers.get(node_id, {}).values() for ref in refs]
+
+    def downstream(self, start_node_id: str) -> List[str]:
+        """从起始节点沿连接可达的所有下游节点（含起始节点，按广度优先顺序）"""
+        start_node_id = str(start_node_id)
+        visited = {start_node_id}
+        order = [start_node_id]
+        queue = deque(order)
+        while queue:
+            for consumer, _ in self.consumers_of(queue.popleft()):
+                if consumer not in visited:
+                    visited.add(consumer)
+                    order.append(consumer)
+                    queue.append(consumer)
+        return order
+
+    def remove_link(self, node_id: str, input_name: str):
+        """删除节点的连接输入"""
+        source = self.upstream.get(node_id, {}).pop(input_name, None)
+        if source is None:
+            return
+        self.workflow[node_id].get("inputs", {}).pop(input_name, None)
+        self.reference_inputs.discard((node_id, input_name))
+        slots = self.consumers.get(source[0], {})
+        refs = slots.get(_slot_key(source[1]))
+        if refs is not None:
+            refs.discard((node_id, input_name))
+            if not refs:
+                del slots[_slot_key(source[1])]
+
+    def disconnect_reference_chain(self, start_node_id: str) -> List[InputRef]:
+        """
+        断开起始节点下游链路中来源于链路内节点的 latent、pixels、image 输入
+
+        Returns:
+            被断开的输入列表
+        """
+        removed = []
+        for source in self.downstream(start_node_id):
+            for node_id, input_name in sorted(self.consumers_of(source)):
+                if (node_id, input_name) in self.reference_inputs:
+                    self.remove_link(node_id, input_name)
+                    removed.append((node_id, input_name))
+                    print(
+                        f"[Workflow] Disconnected input '{input_name}' from node {node_id} (source: {source})"
+                    )
+        return removed
+
+    def prune_dead_nodes(self, keep: Iterable[str] = ()) -> List[str]:
+        """
+        删除无法到达任何输出节点的节点（断开参考图链路后遗留的子图）
+
+        Args:
+            keep: 额外保留的节点ID（如节点映射中的保存节点）
+
+        Returns:
+            被删除的节点ID列表
+        """
+        live: Set[str] = set()
+        queue = deque(n for n in self.outputs.union(str(k) for k in keep) if n in self.upstream)
+        while queue:
+            node_id = queue.popleft()
+            if node_id in live:
+                continue
+            live.add(node_id)
+            queue.extend(source for source, _ in self.upstream[node_id].values() if source not in live)
+
+        dead = [node_id for node_id in self.upstream if node_id not in live]
+        for node_id in dead:
+            for input_name in list(self.upstream[node_id]):
+                self.remove_link(node_id, input_name)
+            del self.upstream[node_id]
+            self.consumers.pop(node_id, None)
+            self.workflow.pop(node_id, None)
+        if dead:
+            print(f"[Workflow] Pruned {len(dead)} unreachable nodes: {', '.join(dead)}")
+        return dead
+
+
+def _slot_key(slot: Any) -> Any:
+    # 输出槽位通常为整数，异常格式（如列表）转为可哈希的字符串
+    return slot if isinstance(slot, (int, str)) else str(slot)
 
 
 def disconnect_reference_chain(
-    workflow: Dict[str, Any], start_node_id: str
+    workflow: Dict[str, Any], start_node_id: str, graph: Optional[WorkflowGraph] = None
 ) -> Dict[str, Any]:
     """
     从 LoadImage 节点开始，断开下游参考图链路的输入连接
@@ -19,86 +168,55 @@ def disconnect_reference_chain(
     当参考图节点未上传图片时，应该断开下游使用 latent、pixels、image 类型输入的连接，
     而不是直接删除节点，这样可以避免工作流报错，兼容性更好。
 
-    匹配规则：
-    - latent、pixels：精确匹配
-    - image：支持 image 或 image 后跟数字（如 image1, image2, image_1）
+    匹配规则见 classify_input。
 
     Args:
         workflow: 工作流字典
         start_node_id: 起始节点 ID（通常是 LoadImage 节点）
+        graph: 该工作流的连接索引（同一次提交中多次断开时复用）
 
     Returns:
         修改后的工作流
     """
-    # 需要断开的输入类型
-    EXACT_MATCH_TYPES = {"latent", "pixels"}
-
-    # 追踪已访问的节点，避免循环
-    visited = set()
-    # 待处理的节点队列
-    queue = [str(start_node_id)]
-
-    while queue:
-        current_node_id = queue.pop(0)
-
-        if current_node_id in visited:
-            continue
-        visited.add(current_node_id)
+    (graph or WorkflowGraph(workflow)).disconnect_reference_chain(str(start_node_id))
+    return workflow
 
-        # 查找所有引用当前节点的下游节点
-        for node_id, node in workflow.items():
-            if not isinstance(node, dict):
-                continue
 
-            inputs = node.get("inputs", {})
-            inputs_to_disconnect = []
+def prune_unreachable_nodes(
+    workflow: Dict[str, Any],
+    graph: Optional[WorkflowGraph] = None,
+    node_mapping: Optional[dict] = None,
+) -> List[str]:
+    """
+    删除无法到达输出节点的节点，减少 ComfyUI 需要校验和执行的节点
 
-            for input_name, input_value in inputs.items():
-                # 检查是否是连接到当前节点的输入
-                if isinstance(input_value, list) and len(input_value) >= 2:
-                    source_node_id = str(input_value[0])
-                    if source_node_id == current_node_id:
-                        input_name_lower = input_name.lower()
-                        should_disconnect = False
-
-                        # 精确匹配 latent 和 pixels
-                        if input_name_lower in EXACT_MATCH_TYPES:
-                            should_disconnect = True
-                        # image 类型：支持 image 或 image 后跟数字（如 image1, image2, image_1）
-                        elif input_name_lower == "image":
-                            should_disconnect = True
-                        elif input_name_lower.startswith("image"):
-                            suffix = input_name_lower[5:]  # 去掉 "image" 前缀
-                            # 允许空字符串（即 "image"）或纯数字或 _数字
-                            if suffix.isdigit() or (
-                                suffix.startswith("_") and suffix[1:].isdigit()
-                            ):
-                                should_disconnect = True
-
-                        if should_disconnect:
-                            inputs_to_disconnect.append(input_name)
-                        # 将下游节点加入队列继续追踪
-                        if node_id not in visited:
-                            queue.append(str(node_id))
-
-            # 断开匹配的输入连接
-            for input_name in inputs_to_disconnect:
-                del inputs[input_name]
-                print(
-                    f"[Workflow] Disconnected input '{input_name}' from node {node_id} (source: {current_node_id})"
-                )
+    Args:
+        workflow: 工作流字典
+        graph: 该工作流的连接索引（应在断开参考图链路之前构建，以正确识别输出节点）
+        node_mapping: 节点映射，其中的保存节点（*save*_node_id）始终保留
 
-    return workflow
+    Returns:
+        被删除的节点ID列表
+    """
+    keep = [
+        str(value) for key, value in (node_mapping or {}).items()
+        if value and "save" in key.lower() and key.endswith("_node_id")
+    ]
+    return (graph or WorkflowGraph(workflow)).prune_dead_nodes(keep)
 
 
-def disconnect_all_reference_nodes(workflow: dict, node_mapping: dict):
+def disconnect_all_reference_nodes(
+    workflow: dict, node_mapping: dict, graph: Optional[WorkflowGraph] = None
+):
     """
     断开所有参考图节点的下游连接
 
     Args:
         workflow: 工作流字典
         node_mapping: 节点映射
+        graph: 该工作流的连接索引，未提供时构建一次供所有参考图节点共用
     """
+    graph = graph or WorkflowGraph(workflow)
     reference_node_keys = [
         key
         for key in node_mapping
@@ -107,7 +225,7 @@ def disconnect_all_reference_nodes(workflow: dict, node_mapping: dict):
     for ref_key in reference_node_keys:
         node_id = node_mapping.get(ref_key)
         if node_id and str(node_id) in workflow:
-            disconnect_reference_chain(workflow, str(node_id))
+            graph.disconnect_reference_chain(str(node_id))
             print(
                 f"[Workflow] Disconnected reference node {node_id} (key: {ref_key}) - no reference image provided"
             )
@@ -116,7 +234,8 @@ def disconnect_all_reference_nodes(workflow: dict, node_mapping: dict):
 def disconnect_unuploaded_reference_nodes(
     workflow: dict,
     node_mapping: dict,
-    reference_node_keys: Optional[List[str]] = None
+    reference_node_keys: Optional[List[str]] = None,
+    graph: Optional[WorkflowGraph] = None
 ):
     """
     检测并断开未上传图片的参考图节点的下游连接
@@ -125,6 +244,7 @@ def disconnect_unuploaded_reference_nodes(
         workflow: 工作流字典
         node_mapping: 节点映射
         reference_node_keys: 要检查的参考图节点键名列表，如果为 None 则自动检测所有参考图节点
+        graph: 该工作流的连接索引，未提供时在需要断开时构建一次
     """
     if reference_node_keys is None:
         # 自动检测所有参考图节点键名
@@ -143,7 +263,8 @@ def disconnect_unuploaded_reference_nodes(
             image_value = workflow[node_id_str].get("inputs", {}).get("image", "")
             # 如果没有有效图片，断开下游参考链路
             if not image_value or image_value in ["", ""]:
-                disconnect_reference_chain(workflow, node_id_str)
+                graph = graph or WorkflowGraph(workflow)
+                graph.disconnect_reference_chain(node_id_str)
                 print(
                     f"[Workflow] Disconnected reference node {node_id_str} (key: {ref_key}) - no image uploaded"
                 )
@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+迁移脚本：为 llm_logs 表添加查询索引，创建 llm_log_rollups 小时汇总表并根据历史日志回填
+运行: cd backend && python migrations/add_llm_logs_analytics.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+DATABASE_URL = "sqlite:///./novelflow.db"
+
+INDEXES = [
+    ("ix_llm_logs_created", "created_at"),
+    ("ix_llm_logs_provider_model_created", "provider, model, created_at"),
+    ("ix_llm_logs_task_type_created", "task_type, created_at"),
+    ("ix_llm_logs_status_created", "status, created_at"),
+    ("ix_llm_logs_novel_created", "novel_id, created_at"),
+]
+
+# 回填时每批读取的日志条数
+BATCH_SIZE = 2000
+
+
+def migrate():
+    """添加索引、创建汇总表并回填"""
+    from app.models.llm_log import LLMLog, LLMLogRollup
+    from app.repositories.llm_log import LLMLogRollupRepository
+    from app.services.llm.analytics import aggregate_records
+
+    engine = create_engine(DATABASE_URL)
+
+    with engine.connect() as conn:
+        try:
+            for name, columns in INDEXES:
+                # 检查索引是否存在
+                result = conn.execute(text(
+                    f"SELECT name FROM sqlite_master WHERE type='index' AND name='{name}'"
+                ))
+                if result.fetchone() is None:
+                    conn.execute(text(f"CREATE INDEX {name} ON llm_logs({columns})"))
+                    print(f"✓ Created index {name}")
+                else:
+                    print(f"✓ Index {name} already exists")
+            conn.commit()
+        except Exception as e:
+            print(f"✗ Error: {e}")
+            conn.rollback()
+            return
+
+    LLMLogRollup.__table__.create(bind=engine, checkfirst=True)
+    print("✓ llm_log_rollups table ready")
+
+    db = sessionmaker(bind=engine)()
+    try:
+        if db.query(LLMLogRollup).first() is not None:
+            print("✓ llm_log_rollups already populated, skip backfill")
+        else:
+            repo = LLMLogRollupRepository(db)
+            total = 0
+            last_created, last_id = None, None
+            while True:
+                # 按（创建时间, ID）游标分批读取，避免 OFFSET 越翻越慢
+                query = db.query(LLMLog)
+                if last_created is not None:
+                    query = query.filter(
+                        (LLMLog.created_at > last_created)
+                        | ((LLMLog.created_at == last_created) & (LLMLog.id > last_id))
+                    )
+                logs = query.order_by(LLMLog.created_at, LLMLog.id).limit(BATCH_SIZE).all()
+                if not logs:
+                    break
+                records = [
+                    {
+                        "created_at": log.created_at,
+                        "provider": log.provider,
+                        "model": log.model,
+                        "task_type": log.task_type,
+                        "status": log.status,
+                        "duration": log.duration,
+                        "cached": log.cached,
+                        "response": log.response,
+                    }
+                    for log in logs
+                ]
+                repo.merge(aggregate_records(records))
+                db.commit()
+                db.expunge_all()
+                total += len(logs)
+                last_created, last_id = logs[-1].created_at, logs[-1].id
+                print(f"  backfilled {total} logs")
+            print(f"✓ Backfilled llm_log_rollups from {total} logs")
+    except Exception as e:
+        print(f"✗ Error: {e}")
+        db.rollback()
+    finally:
+        db.close()
+
+    print("\n✅ Migration completed!")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,37 @@
+"""
+迁移脚本：为 tasks 表添加 comfyui_host 字段（记录执行任务的 ComfyUI 主机）
+运行: cd backend && python migrations/add_task_comfyui_host.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+DATABASE_URL = "sqlite:///./novelflow.db"
+
+def migrate():
+    """添加 comfyui_host 列到 tasks 表"""
+    engine = create_engine(DATABASE_URL)
+
+    with engine.connect() as conn:
+        try:
+            # 检查字段是否已存在
+            result = conn.execute(text("PRAGMA table_info(tasks)"))
+            columns = [row[1] for row in result.fetchall()]
+
+            if 'comfyui_host' not in columns:
+                conn.execute(text("ALTER TABLE tasks ADD COLUMN comfyui_host VARCHAR"))
+                print("[OK] Added comfyui_host column to tasks table")
+            else:
+                print("[OK] comfyui_host column already exists")
+
+            conn.commit()
+        except Exception as e:
+            print(f"[ERROR] {e}")
+            conn.rollback()
+
+    print("\n[DONE] Migration completed!")
+
+if __name__ == "__main__":
+    migrate()
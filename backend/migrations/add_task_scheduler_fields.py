@@ -0,0 +1,62 @@
+#!/usr/bin/env python3
+"""
+迁移脚本：为 tasks 表添加任务调度字段（优先级、参数、执行次数、租约）
+运行: cd backend && python migrations/add_task_scheduler_fields.py
+"""
+import sys
+import os
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import create_engine, text
+
+DATABASE_URL = "sqlite:///./novelflow.db"
+
+NEW_COLUMNS = [
+    ("priority", "INTEGER DEFAULT 0"),
+    ("payload", "TEXT"),
+    ("attempts", "INTEGER DEFAULT 0"),
+    ("max_attempts", "INTEGER DEFAULT 1"),
+    ("lease_owner", "VARCHAR"),
+    ("lease_expires_at", "DATETIME"),
+]
+
+
+def migrate():
+    """添加调度字段到 tasks 表"""
+    engine = create_engine(DATABASE_URL)
+
+    with engine.connect() as conn:
+        try:
+            # 检查字段是否已存在
+            result = conn.execute(text("PRAGMA table_info(tasks)"))
+            columns = [row[1] for row in result.fetchall()]
+
+            for name, column_type in NEW_COLUMNS:
+                if name not in columns:
+                    conn.execute(text(f"ALTER TABLE tasks ADD COLUMN {name} {column_type}"))
+                    print(f"✓ Added {name} column to tasks table")
+                else:
+                    print(f"✓ {name} column already exists")
+
+            # 检查索引是否存在
+            result = conn.execute(text(
+                "SELECT name FROM sqlite_master WHERE type='index' AND name='ix_tasks_status_priority_created'"
+            ))
+            if result.fetchone() is None:
+                conn.execute(text(
+                    "CREATE INDEX ix_tasks_status_priority_created ON tasks(status, priority, created_at)"
+                ))
+                print("✓ Created index ix_tasks_status_priority_created")
+            else:
+                print("✓ Index ix_tasks_status_priority_created already exists")
+
+            conn.commit()
+        except Exception as e:
+            print(f"✗ Error: {e}")
+            conn.rollback()
+
+    print("\n✅ Migration completed!")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,66 @@
+"""
+工作流构建微基准：对比每次解析模板与使用编译缓存时，内置工作流的单次构建耗时
+
+运行方式（backend 目录下）：
+    python -m tests.bench_workflow_build [迭代次数]
+"""
+import contextlib
+import glob
+import io
+import os
+import sys
+import time
+
+from app.services.comfyui import compiled as compiled_module
+from app.services.comfyui.workflows import WorkflowBuilder
+
+WORKFLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workflows")
+
+
+def _build(builder: WorkflowBuilder, name: str, workflow_json: str):
+    if name.startswith(("character", "scene", "prop")):
+        return builder.build_character_workflow(
+            "少年剑客，白衣长剑", workflow_json=workflow_json,
+            novel_id="bench", character_name="林风", aspect_ratio="16:9",
+        )
+    if name.startswith(("video", "transition")):
+        return builder.build_video_workflow(
+            "镜头缓慢推进", workflow_json, {}, style="anime", scene_setting="竹林",
+        )
+    if name.startswith("Qwen3-TTS"):
+        return builder.build_audio_workflow("大家好", workflow_json=workflow_json)
+    return builder.build_shot_workflow(
+        "两人在竹林中对峙", workflow_json, {}, style="anime",
+        character_appearances={"林风": "白衣"}, scene_setting="竹林",
+    )
+
+
+def _per_build_ms(builder, name, workflow_json, iterations, cached: bool) -> float:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        if not cached:
+            compiled_module.clear_compiled_workflows()
+        _build(builder, name, workflow_json)
+    return (time.perf_counter() - start) * 1000 / iterations
+
+
+def main(iterations: int = 200):
+    builder = WorkflowBuilder()
+    rows = []
+    for path in sorted(glob.glob(os.path.join(WORKFLOWS_DIR, "*.json"))):
+        name = os.path.basename(path)
+        with open(path, encoding="utf-8") as f:
+            workflow_json = f.read()
+        # 构建过程中的节点日志不计入输出
+        with contextlib.redirect_stdout(io.StringIO()):
+            uncached = _per_build_ms(builder, name, workflow_json, iterations, cached=False)
+            cached = _per_build_ms(builder, name, workflow_json, iterations, cached=True)
+        rows.append((name, len(workflow_json), uncached, cached))
+
+    print(f"{'workflow':<42}{'bytes':>8}{'parse+build ms':>16}{'cached ms':>12}{'speedup':>9}")
+    for name, size, uncached, cached in rows:
+        print(f"{name:<42}{size:>8}{uncached:>16.3f}{cached:>12.3f}{uncached / cached:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,67 @@
+"""
+批量生成外貌/场景设定单元测试
+"""
+import json
+
+import pytest
+
+from app.services import appearance_batch_service as batch_module
+from app.services.llm_service import LLMService
+
+
+def _entities(count: int, description: str = "描述"):
+    return [{"id": f"id-{i}", "name": f"角色{i}", "description": description} for i in range(count)]
+
+
+class TestAppearanceBatch:
+    def test_pack_respects_item_and_char_limits(self):
+        batches = batch_module.pack_appearance_batches(_entities(7), max_items=3, max_chars=1000)
+        assert [len(b) for b in batches] == [3, 3, 1]
+
+        # 单个超长实体单独成批
+        long_entities = _entities(3, description="长" * 50)
+        batches = batch_module.pack_appearance_batches(long_entities, max_items=10, max_chars=60)
+        assert [len(b) for b in batches] == [1, 1, 1]
+
+    @pytest.mark.asyncio
+    async def test_only_missing_entities_retried(self):
+        calls = []
+
+        async def generate_batch(batch):
+            calls.append([e["id"] for e in batch])
+            # 首轮漏掉 id-1，并返回批次外的 ID
+            if len(calls) == 1:
+                return {"id-0": "a", "id-2": "c", "other": "x"}
+            return {e["id"]: "retried" for e in batch}
+
+        saved = {}
+
+        async def on_batch(generated):
+            saved.update(generated)
+
+        results = await batch_module.generate_in_batches(_entities(3), generate_batch, on_batch=on_batch)
+
+        assert calls == [["id-0", "id-1", "id-2"], ["id-1"]]
+        assert results == {"id-0": "a", "id-1": "retried", "id-2": "c"}
+        assert saved == results
+
+    @pytest.mark.asyncio
+    async def test_llm_batch_maps_short_ids_back(self, monkeypatch):
+        captured = {}
+
+        async def fake_chat(self, **kwargs):
+            captured.update(kwargs)
+            items = [{"id": "2", "text": "silver hair"}, {"id": "9", "text": "ignored"}, {"id": "1", "text": ""}]
+            return {"success": True, "content": json.dumps({"items": items})}
+
+        monkeypatch.setattr(LLMService, "chat_completion", fake_chat)
+        entities = [
+            {"id": "uuid-a", "name": "林风", "description": "少年剑客"},
+            {"id": "uuid-b", "name": "苏晴", "description": "医女"},
+        ]
+
+        result = await LLMService().generate_appearances_batch("character", entities, novel_id="n1")
+
+        assert result == {"uuid-b": "silver hair"}
+        assert "林风" in captured["user_content"] and "uuid-a" not in captured["user_content"]
+        assert captured["task_type"] == "generate_character_appearance_batch"
@@ -0,0 +1,96 @@
+"""
+小说批量拆分章节单元测试
+"""
+import json
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models.novel import Chapter, Novel
+from app.models.task import Task
+from app.repositories.shot_repository import ShotRepository
+from app.services import chapter_split_batch_service as batch_module
+from app.services.scheduler import aggregate as aggregate_module
+from app.services.novel_service import NovelService
+from app.utils.text_utils import content_hash
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    # 各章节使用独立会话，使用文件数据库使各会话看到同一份数据
+    engine = create_engine(f"sqlite:///{tmp_path / 'split.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(batch_module, "SessionLocal", factory)
+    monkeypatch.setattr(aggregate_module, "SessionLocal", factory)
+    monkeypatch.setattr(batch_module, "report_progress", lambda task_id, **kwargs: None)
+    monkeypatch.setattr(get_settings(), "CHAPTER_SPLIT_CONCURRENCY", 2)
+    yield factory
+    engine.dispose()
+
+
+def _seed(factory, contents):
+    db = factory()
+    novel = Novel(title="测试小说")
+    db.add(novel)
+    db.flush()
+    chapters = [
+        Chapter(novel_id=novel.id, number=i + 1, title=title, content=content)
+        for i, (title, content) in enumerate(contents)
+    ]
+    db.add_all(chapters)
+    task = Task(type="novel_split_chapters", name="批量拆分", novel_id=novel.id, status="pending")
+    db.add(task)
+    db.commit()
+    ids = novel.id, [c.id for c in chapters], task.id
+    db.close()
+    return ids
+
+
+class TestChapterSplitBatch:
+    def test_split_is_current_requires_matching_hash_and_shots(self):
+        chapter = Chapter(content="林风走出山门。\r\n", parsed_data=json.dumps({"content_hash": content_hash("林风走出山门。")}))
+
+        assert batch_module.chapter_split_is_current(chapter, 3)
+        assert not batch_module.chapter_split_is_current(chapter, 0)
+        chapter.content = "林风走出山门，回头望去。"
+        assert not batch_module.chapter_split_is_current(chapter, 3)
+
+    @pytest.mark.asyncio
+    async def test_unchanged_skipped_and_failures_reported(self, session_factory, monkeypatch):
+        novel_id, chapter_ids, task_id = _seed(
+            session_factory, [("第一章", "山门"), ("第二章", "下山"), ("第三章", "客栈")]
+        )
+        calls = []
+
+        async def fake_split(self, novel, chapter, character_names, scene_names, prop_names=None, **kwargs):
+            calls.append((chapter.title, character_names))
+            if chapter.title == "第三章":
+                return {"success": False, "message": "LLM 拆分失败: timeout"}
+            ShotRepository(self.db).create(chapter_id=chapter.id, index=1, description="镜头")
+            chapter.parsed_data = json.dumps({"content_hash": content_hash(chapter.content)})
+            self.db.commit()
+            return {"success": True, "data": {}}
+
+        monkeypatch.setattr(NovelService, "split_chapter", fake_split)
+
+        await batch_module.split_novel_chapters_task(task_id, novel_id, chapter_ids)
+
+        db = session_factory()
+        task = db.query(Task).filter(Task.id == task_id).first()
+        assert task.status == "completed"
+        assert "第三章: LLM 拆分失败: timeout" in task.error_message
+        assert {title for title, _ in calls} == {"第一章", "第二章", "第三章"}
+
+        # 第二次运行跳过内容未变化的章节，只重试失败的章节
+        calls.clear()
+        task.status = "pending"
+        db.commit()
+        await batch_module.split_novel_chapters_task(task_id, novel_id, chapter_ids)
+        db.expire_all()
+        assert [title for title, _ in calls] == ["第三章"]
+        assert "跳过 2" in task.current_step
+        db.close()
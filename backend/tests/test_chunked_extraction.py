@@ -0,0 +1,136 @@
+"""
+分块并行解析单元测试
+"""
+import asyncio
+
+import pytest
+from app.utils.text_chunker import chunk_chapters, estimate_tokens, split_text_windows
+from app.services.chunked_extraction import ChunkedExtractor, merge_entities
+
+
+class TestChunkChapters:
+    def test_short_chapters_packed_together(self):
+        chunks = chunk_chapters([(1, "开端", "甲" * 100), (2, "发展", "乙" * 100)], max_tokens=1000)
+        assert len(chunks) == 1
+        assert chunks[0].chapter_numbers == [1, 2]
+        assert chunks[0].source_range == "第1章至第2章"
+        assert "【第1章 开端】" in chunks[0].text
+
+    def test_chapters_split_at_boundary(self):
+        chunks = chunk_chapters([(1, "", "甲" * 600), (2, "", "乙" * 600)], max_tokens=1000)
+        assert [c.chapter_numbers for c in chunks] == [[1], [2]]
+
+    def test_oversized_chapter_split_by_paragraph(self):
+        content = "\n".join(["段落内容。" * 40] * 20)
+        chunks = chunk_chapters([(3, "长章", content)], max_tokens=500)
+        assert len(chunks) > 1
+        for chunk in chunks:
+            assert chunk.tokens <= 500
+            assert chunk.text.startswith("【第3章 长章】")
+            assert chunk.source_range == "第3章"
+
+    def test_max_chars_respected(self):
+        chunks = chunk_chapters([(1, "", "a" * 5000)], max_tokens=10000, max_chars=1000)
+        assert all(len(c.text) <= 1000 for c in chunks)
+
+    def test_empty_chapters_skipped(self):
+        assert chunk_chapters([(1, "", ""), (2, "", "   ")], max_tokens=100) == []
+
+    def test_estimate_tokens(self):
+        assert estimate_tokens("你好") == 2
+        assert estimate_tokens("abcd") == 1
+        assert estimate_tokens("") == 0
+
+
+class TestSplitTextWindows:
+    def test_short_text_single_window(self):
+        windows = split_text_windows("第一段\n第二段", max_chars=100, context_chars=20)
+
+        assert len(windows) == 1
+        assert windows[0].context == ""
+
+    def test_windows_cut_at_paragraphs_with_context(self):
+        paragraphs = [f"第{i}段" + "字" * 95 for i in range(30)]
+        windows = split_text_windows("\n".join(paragraphs), max_chars=1000, context_chars=250)
+
+        assert len(windows) > 1
+        # 正文按顺序覆盖全部段落，不重复不丢失
+        assert "\n".join(w.text for w in windows).split("\n") == paragraphs
+        for previous, window in zip(windows, windows[1:]):
+            assert len(window.text) + len(window.context) <= 1000
+            assert previous.text.endswith(window.context)
+            assert window.context.startswith("第")
+
+
+class TestMergeEntities:
+    def test_dedup_by_normalized_name(self):
+        merged = merge_entities([
+            [{"name": "萧炎", "description": "少年"}],
+            [{"name": " 萧 炎 ", "description": "萧家少年，天才"}],
+        ])
+        assert len(merged) == 1
+        assert merged[0]["name"] == "萧炎"
+        assert merged[0]["description"] == "萧家少年，天才"
+
+    def test_fill_missing_fields(self):
+        merged = merge_entities([
+            [{"name": "Alice", "appearance": ""}],
+            [{"name": "alice", "appearance": "red hood", "voice_prompt": "soft"}],
+        ])
+        assert merged[0]["appearance"] == "red hood"
+        assert merged[0]["voice_prompt"] == "soft"
+
+    def test_keep_order_and_skip_nameless(self):
+        merged = merge_entities([
+            [{"name": "B"}, {"name": ""}, {"description": "no name"}],
+            [{"name": "A"}, {"name": "b"}],
+        ])
+        assert [e["name"] for e in merged] == ["B", "A"]
+
+
+class TestChunkedExtractor:
+    @pytest.mark.asyncio
+    async def test_concurrency_limit_and_merge(self):
+        chunks = chunk_chapters([(i, "", "甲" * 600) for i in range(1, 7)], max_tokens=1000)
+        running = 0
+        peak = 0
+
+        async def fake_extract(chunk):
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return {"characters": [{"name": "主角"}, {"name": f"配角{chunk.index}"}]}
+
+        result = await ChunkedExtractor(max_tokens=1000, concurrency=2).extract(
+            chunks, fake_extract, list_key="characters"
+        )
+        assert peak == 2
+        assert result["chunk_count"] == 6
+        assert len(result["characters"]) == 7
+        assert result["failed_chunks"] == []
+
+    @pytest.mark.asyncio
+    async def test_partial_failure_reported(self):
+        chunks = chunk_chapters([(1, "", "甲" * 600), (2, "", "乙" * 600)], max_tokens=1000)
+
+        async def fake_extract(chunk):
+            if chunk.index == 1:
+                raise RuntimeError("timeout")
+            return {"scenes": [{"name": "大厅"}]}
+
+        result = await ChunkedExtractor(max_tokens=1000).extract(chunks, fake_extract, list_key="scenes")
+        assert "error" not in result
+        assert [s["name"] for s in result["scenes"]] == ["大厅"]
+        assert result["failed_chunks"][0]["sourceRange"] == "第2章"
+
+    @pytest.mark.asyncio
+    async def test_all_failed_returns_error(self):
+        chunks = chunk_chapters([(1, "", "甲" * 10)], max_tokens=1000)
+
+        async def fake_extract(chunk):
+            return {"error": "boom", "props": []}
+
+        result = await ChunkedExtractor(max_tokens=1000).extract(chunks, fake_extract, list_key="props")
+        assert result["error"] == "boom"
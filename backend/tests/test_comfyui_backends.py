@@ -0,0 +1,182 @@
+"""
+ComfyUI 主机池单元测试
+"""
+import asyncio
+import json
+
+import pytest
+import pytest_asyncio
+
+from app.core.config import get_settings
+from app.services.comfyui import client as client_module
+from app.services.comfyui.backends import ComfyUIBackendPool
+from app.services.comfyui.client import ComfyUIClient
+from app.services.comfyui.events import ComfyUIEventHub
+from app.services.comfyui.upload_cache import ComfyUIUploadCache
+
+
+class StubComfyUI:
+    """最小化的 ComfyUI HTTP 服务，记录收到的请求"""
+
+    def __init__(self, pending: int = 0):
+        self.pending = pending
+        self.requests = []
+        self.server = None
+        self.url = None
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        host, port = self.server.sockets[0].getsockname()[:2]
+        self.url = f"http://{host}:{port}"
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        head = await reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        method, path = lines[0].split(" ")[:2]
+        length = 0
+        for line in lines[1:]:
+            if line.lower().startswith("content-length:"):
+                length = int(line.split(":", 1)[1])
+        if length:
+            await reader.readexactly(length)
+        self.requests.append((method, path))
+
+        if path == "/queue":
+            body = {"queue_running": [], "queue_pending": [["p"]] * self.pending}
+        elif path == "/prompt":
+            body = {"prompt_id": "prompt-1"}
+        else:
+            body = {"name": "uploaded.png"}
+        data = json.dumps(body).encode()
+        writer.write(
+            b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+            + f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode()
+            + data
+        )
+        await writer.drain()
+        writer.close()
+
+
+@pytest_asyncio.fixture
+async def stubs():
+    servers = [StubComfyUI(), StubComfyUI()]
+    for server in servers:
+        await server.start()
+    yield servers
+    for server in servers:
+        if server.server.is_serving():
+            await server.stop()
+
+
+@pytest.fixture
+def use_pool(monkeypatch):
+    """让客户端使用指定主机列表的主机池与独立的上传缓存"""
+    cache = ComfyUIUploadCache(max_entries=8, ttl=3600)
+    hub = ComfyUIEventHub()
+    monkeypatch.setattr(client_module, "get_upload_cache", lambda: cache)
+    monkeypatch.setattr(client_module, "get_event_hub", lambda host=None: hub)
+
+    def install(hosts):
+        pool = ComfyUIBackendPool(hosts)
+        monkeypatch.setattr(client_module, "get_backend_pool", lambda: pool)
+        return pool
+
+    return install
+
+
+def _write(path, content: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+class TestBackendPool:
+    def test_select_least_loaded_and_counts_assignments(self):
+        pool = ComfyUIBackendPool(["http://a", "http://b"])
+        pool.backends()
+        pool.get("http://a").queue_pending = 2
+
+        assert pool.select() == "http://b"
+        assert pool.select() == "http://b"
+        # b 已分配 2 个任务，与 a 负载相同时按配置顺序选择
+        assert pool.select() == "http://a"
+
+    def test_affinity_within_slack(self, monkeypatch):
+        monkeypatch.setattr(get_settings(), "COMFYUI_AFFINITY_SLACK", 2)
+        pool = ComfyUIBackendPool(["http://a", "http://b"])
+        pool.backends()
+        pool.get("http://a").queue_pending = 2
+
+        assert pool.select(preferred=["http://a"]) == "http://a"
+
+        pool.get("http://a").queue_pending = 5
+        assert pool.select(preferred=["http://a"]) == "http://b"
+
+    def test_unhealthy_host_skipped(self):
+        pool = ComfyUIBackendPool(["http://a", "http://b"])
+        pool.backends()
+        pool.mark_unhealthy("http://a")
+
+        assert pool.select() == "http://b"
+        assert pool.select(exclude=["http://b"]) == "http://a"
+
+    @pytest.mark.asyncio
+    async def test_refresh_reads_queue_depth(self, stubs):
+        busy, idle = stubs
+        busy.pending = 3
+        pool = ComfyUIBackendPool([busy.url, idle.url])
+
+        await pool.refresh()
+
+        assert pool.get(busy.url).load == 3
+        assert pool.get(idle.url).load == 0
+        assert pool.select() == idle.url
+
+        await idle.stop()
+        await pool.refresh()
+        assert pool.get(idle.url).healthy is False
+        assert pool.select() == busy.url
+
+
+class TestClientFailover:
+    @pytest.mark.asyncio
+    async def test_queue_prompt_fails_over_and_migrates_inputs(self, tmp_path, stubs, use_pool):
+        first, second = stubs
+        use_pool([first.url, second.url])
+
+        async def run():
+            client = ComfyUIClient()
+            path = _write(tmp_path / "ref.png", b"reference")
+            filename = (await client.upload_image(path))["filename"]
+            assert client.base_url == first.url
+
+            await first.stop()
+            result = await client.queue_prompt({"1": {"inputs": {"image": filename}}})
+            return client.base_url, result
+
+        # 每个任务在独立协程中执行，选定的主机不影响其他任务
+        host, result = await asyncio.create_task(run())
+
+        assert result["success"] is True
+        assert host == second.url
+        assert [p for _, p in second.requests] == ["/upload/image", "/prompt"]
+
+    @pytest.mark.asyncio
+    async def test_upload_fails_over_to_next_host(self, tmp_path, stubs, use_pool):
+        first, second = stubs
+        pool = use_pool([first.url, second.url])
+        await first.stop()
+
+        async def run():
+            client = ComfyUIClient()
+            return await client.upload_image(_write(tmp_path / "ref.png", b"reference"))
+
+        result = await asyncio.create_task(run())
+
+        assert result["success"] is True
+        assert pool.get(first.url).healthy is False
+        assert second.requests == [("POST", "/upload/image")]
@@ -0,0 +1,133 @@
+"""
+ComfyUI WebSocket 事件中心单元测试
+"""
+import asyncio
+
+import pytest
+from app.services.comfyui import client as client_module
+from app.services.comfyui.client import ComfyUIClient
+from app.services.comfyui.events import ComfyUIEventHub
+
+
+def _make_hub(connected: bool = True) -> ComfyUIEventHub:
+    hub = ComfyUIEventHub()
+    # 测试中不建立真实连接
+    hub._running = True
+    hub.ensure_started = lambda: None
+    hub.connected = connected
+    hub.connection_epoch = 1 if connected else 0
+    return hub
+
+
+IMAGE_OUTPUTS = {"9": {"images": [{"filename": "out.png", "subfolder": "", "type": "output"}]}}
+
+
+class TestEventHub:
+    @pytest.mark.asyncio
+    async def test_executing_none_resolves_waiter(self):
+        hub = _make_hub()
+        waiter = hub.register("p1")
+        hub.handle_message({"type": "executing", "data": {"node": "3", "prompt_id": "p1"}})
+        assert not waiter.future.done()
+        hub.handle_message({"type": "executed", "data": {"node": "9", "prompt_id": "p1", "output": {"images": []}}})
+        hub.handle_message({"type": "executing", "data": {"node": None, "prompt_id": "p1"}})
+        assert waiter.future.result() == {"status": "success"}
+        assert "9" in waiter.outputs
+
+    @pytest.mark.asyncio
+    async def test_execution_error(self):
+        hub = _make_hub()
+        waiter = hub.register("p2")
+        hub.handle_message({"type": "execution_error", "data": {
+            "prompt_id": "p2", "node_type": "KSampler", "exception_message": "OOM"
+        }})
+        assert waiter.future.result() == {"status": "error", "message": "KSampler: OOM"}
+
+    @pytest.mark.asyncio
+    async def test_completion_before_register(self):
+        """提交后事件先于注册到达时不丢失"""
+        hub = _make_hub()
+        hub.handle_message({"type": "executing", "data": {"node": None, "prompt_id": "p3"}})
+        waiter = hub.register("p3")
+        assert waiter.future.done()
+
+    @pytest.mark.asyncio
+    async def test_other_prompts_ignored(self):
+        hub = _make_hub()
+        waiter = hub.register("p4")
+        hub.handle_message({"type": "executing", "data": {"node": None, "prompt_id": "other"}})
+        hub.handle_message({"type": "status", "data": {"status": {}}})
+        assert not waiter.future.done()
+
+
+class TestWaitForResult:
+    @pytest.mark.asyncio
+    async def test_history_fetched_once_after_event(self, monkeypatch):
+        hub = _make_hub()
+        monkeypatch.setattr(client_module, "get_event_hub", lambda: hub)
+        client = ComfyUIClient()
+        calls = []
+
+        async def fake_history(prompt_id):
+            calls.append(prompt_id)
+            if len(calls) == 1:
+                return None  # 首次核对时尚未完成
+            return {"outputs": IMAGE_OUTPUTS, "status": {"completed": True}}
+
+        monkeypatch.setattr(client, "_fetch_history", fake_history)
+
+        async def finish():
+            await asyncio.sleep(0.05)
+            hub.handle_message({"type": "executing", "data": {"node": None, "prompt_id": "p5"}})
+
+        asyncio.get_running_loop().create_task(finish())
+        result = await client.wait_for_result("p5", timeout=5)
+        assert result["success"] is True
+        assert result["image_url"].endswith("filename=out.png&type=output")
+        assert len(calls) == 2
+
+    @pytest.mark.asyncio
+    async def test_polling_fallback_when_disconnected(self, monkeypatch):
+        hub = _make_hub(connected=False)
+        monkeypatch.setattr(client_module, "get_event_hub", lambda: hub)
+        client = ComfyUIClient()
+        calls = []
+
+        async def fake_history(prompt_id):
+            calls.append(prompt_id)
+            if len(calls) < 3:
+                return None
+            return {"outputs": {}, "status": {"status_str": "error", "messages": [["execution_error", "boom"]]}}
+
+        monkeypatch.setattr(client, "_fetch_history", fake_history)
+        result = await client.wait_for_result("p6", timeout=5, poll_interval=0.01)
+        assert result == {"success": False, "message": "boom"}
+        assert len(calls) == 3
+
+    @pytest.mark.asyncio
+    async def test_consecutive_history_failures_mark_host_unhealthy(self, monkeypatch):
+        from app.core.config import get_settings
+
+        hub = _make_hub(connected=False)
+        monkeypatch.setattr(client_module, "get_event_hub", lambda host=None: hub)
+        monkeypatch.setattr(get_settings(), "COMFYUI_HISTORY_MAX_FAILURES", 3)
+        unhealthy = []
+
+        class FakePool:
+            def mark_unhealthy(self, url):
+                unhealthy.append(url)
+
+        monkeypatch.setattr(client_module, "get_backend_pool", lambda: FakePool())
+        client = ComfyUIClient(host="http://gpu-1:8188")
+        calls = []
+
+        async def fake_history(prompt_id):
+            calls.append(prompt_id)
+            raise ConnectionError("connection refused")
+
+        monkeypatch.setattr(client, "_fetch_history", fake_history)
+        result = await client.wait_for_result("p7", timeout=3600, poll_interval=0.01)
+        assert result["success"] is False
+        assert "connection refused" in result["message"]
+        assert len(calls) == 3
+        assert unhealthy == ["http://gpu-1:8188"]
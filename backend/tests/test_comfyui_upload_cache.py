@@ -0,0 +1,135 @@
+"""
+ComfyUI 上传缓存单元测试
+"""
+import os
+
+import pytest
+from app.services.comfyui import client as client_module
+from app.services.comfyui.client import ComfyUIClient
+from app.services.comfyui.upload_cache import ComfyUIUploadCache
+
+
+@pytest.fixture
+def cache(monkeypatch):
+    cache = ComfyUIUploadCache(max_entries=8, ttl=3600)
+    monkeypatch.setattr(client_module, "get_upload_cache", lambda: cache)
+    return cache
+
+
+@pytest.fixture
+def uploads(monkeypatch):
+    """记录实际发生的上传请求"""
+    calls = []
+
+    async def fake_post_upload(self, path, filename, kind, mime_type, timeout):
+        calls.append(filename)
+        return {"success": True, "filename": filename, "message": "上传成功"}
+
+    monkeypatch.setattr(ComfyUIClient, "_post_upload", fake_post_upload)
+    return calls
+
+
+def _write(path, content: bytes) -> str:
+    with open(path, "wb") as f:
+        f.write(content)
+    return str(path)
+
+
+class TestUploadCache:
+    @pytest.mark.asyncio
+    async def test_same_content_uploaded_once(self, tmp_path, cache, uploads):
+        client = ComfyUIClient()
+        path = _write(tmp_path / "merged.png", b"character sheet")
+
+        first = await client.upload_image(path)
+        second = await client.upload_image(path)
+
+        assert len(uploads) == 1
+        assert first["filename"] == second["filename"]
+        assert first["filename"].startswith("merged_") and first["filename"].endswith(".png")
+        assert second.get("cached") is True
+
+    @pytest.mark.asyncio
+    async def test_changed_content_gets_new_filename(self, tmp_path, cache, uploads):
+        client = ComfyUIClient()
+        path = _write(tmp_path / "merged.png", b"version 1")
+        first = await client.upload_image(path)
+
+        _write(tmp_path / "merged.png", b"version 2 with more bytes")
+        os.utime(path, ns=(1, 1))
+        second = await client.upload_image(path)
+
+        assert len(uploads) == 2
+        assert first["filename"] != second["filename"]
+
+    @pytest.mark.asyncio
+    async def test_expired_entry_is_reuploaded(self, tmp_path, cache, uploads):
+        cache.ttl = 0.000001
+        client = ComfyUIClient()
+        path = _write(tmp_path / "voice.flac", b"audio")
+
+        await client.upload_audio(path)
+        await client.upload_audio(path)
+
+        assert len(uploads) == 2
+
+    @pytest.mark.asyncio
+    async def test_missing_input_invalidates_and_reuploads(self, tmp_path, cache, uploads):
+        client = ComfyUIClient()
+        path = _write(tmp_path / "scene.png", b"scene")
+        filename = (await client.upload_image(path))["filename"]
+
+        error_text = f'{{"node_errors": {{"12": {{"errors": [{{"message": "Invalid image file: {filename}"}}]}}}}}}'
+        assert await client._reupload_stale_inputs(error_text) is True
+        assert uploads == [filename, filename]
+
+        # 与缓存无关的错误不触发重新上传
+        assert await client._reupload_stale_inputs("Prompt outputs failed validation") is False
+
+    @pytest.mark.asyncio
+    async def test_lock_is_kept_for_waiters_and_dropped_on_exit(self, tmp_path, cache, monkeypatch):
+        import asyncio
+
+        client = ComfyUIClient()
+        path = _write(tmp_path / "ref.png", b"reference")
+        gates = [asyncio.Event(), asyncio.Event()]
+        calls = []
+
+        async def slow_post_upload(self, path, filename, kind, mime_type, timeout):
+            gate = gates[len(calls)]
+            calls.append(filename)
+            await gate.wait()
+            return {"success": True, "filename": filename, "message": "上传成功"}
+
+        monkeypatch.setattr(ComfyUIClient, "_post_upload", slow_post_upload)
+
+        def upload(force=False):
+            return asyncio.create_task(
+                client._upload_file(path, "image", "image/png", timeout=30.0, force=force)
+            )
+
+        # 第二个上传在锁上等待，第一个完成后锁仍由它持有，新的上传不能绕过
+        first, second = upload(), upload(force=True)
+        await asyncio.sleep(0.01)
+        gates[0].set()
+        await first
+        await asyncio.sleep(0.01)
+        assert len(calls) == 2 and len(cache._locks) == 1
+        third = upload()
+        await asyncio.sleep(0.01)
+        assert len(calls) == 2
+        gates[1].set()
+        await asyncio.gather(second, third)
+        assert third.result()["cached"] is True
+        assert cache._locks == {} and cache._lock_users == {}
+
+        # 命中缓存的提前返回与上传异常同样释放锁
+        await client.upload_image(path)
+
+        async def failing_post_upload(self, *args):
+            raise RuntimeError("connection reset")
+
+        monkeypatch.setattr(ComfyUIClient, "_post_upload", failing_post_upload)
+        with pytest.raises(RuntimeError):
+            await client._upload_file(path, "image", "image/png", timeout=30.0, force=True)
+        assert cache._locks == {} and cache._lock_users == {}
@@ -0,0 +1,90 @@
+"""
+ComfyUI 工作流模板编译缓存单元测试
+"""
+import json
+import os
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from app.services.comfyui import compiled as compiled_module
+from app.services.comfyui import workflows as workflows_module
+from app.services.comfyui.compiled import get_compiled_workflow, workflow_cache_key
+from app.services.comfyui.workflows import WorkflowBuilder
+
+WORKFLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workflows")
+
+
+def _bundled(name: str) -> str:
+    with open(os.path.join(WORKFLOWS_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    compiled_module.clear_compiled_workflows()
+    yield
+    compiled_module.clear_compiled_workflows()
+
+
+class TestCompiledWorkflow:
+    def test_builds_do_not_share_state_with_template(self):
+        workflow_json = _bundled("shot_flux2_klein.json")
+        mapping = {"prompt_node_id": "110"}
+        builder = WorkflowBuilder()
+
+        first = builder.build_shot_workflow("第一个分镜", workflow_json, mapping, seed=1)
+        second = builder.build_shot_workflow("第二个分镜", workflow_json, mapping, seed=2)
+
+        compiled = get_compiled_workflow(workflow_json)
+        assert compiled.graph == json.loads(workflow_json)
+        assert first["110"]["inputs"]["text"] == "第一个分镜"
+        assert second["110"]["inputs"]["text"] == "第二个分镜"
+        for node_id, name in compiled.seed_inputs:
+            assert first[node_id]["inputs"][name] == 1
+            assert second[node_id]["inputs"][name] == 2
+
+    def test_placeholders_and_prompt_patch_points(self):
+        workflow_json = json.dumps({
+            "1": {"class_type": "CLIPTextEncode", "inputs": {"text": "", "clip": ["9", 0]}},
+            "2": {"class_type": "CR Text", "inputs": {"text": "##STYLE##, ##SCENE##, ##CHARACTERS##, ##PROPS##"}},
+            "3": {"class_type": "RandomNoise", "inputs": {"noise_seed": 0}},
+            "4": {"class_type": "LoadImage", "inputs": {"image": "a.png"}},
+        })
+        workflow = WorkflowBuilder().build_shot_workflow(
+            "分镜描述", workflow_json, {"prompt_node_id": "1"}, seed=7, style="水墨",
+            character_appearances={"林风": "白衣", "苏晴": ""}, scene_setting="竹林",
+        )
+
+        assert workflow["1"]["inputs"]["text"] == "分镜描述"
+        assert workflow["2"]["inputs"]["text"] == "水墨, 竹林, 白衣, ##PROPS##"
+        assert workflow["3"]["inputs"]["noise_seed"] == 7
+        assert compiled_module.find_nodes_by_type(workflow, "LoadImage") == ["4"]
+
+    def test_character_build_matches_inject_prompt(self, monkeypatch):
+        monkeypatch.setattr(workflows_module.random, "randint", lambda a, b: 42)
+        workflow_json = _bundled("character_default.json")
+        builder = WorkflowBuilder()
+        kwargs = dict(novel_id="n1", character_name="林风", aspect_ratio="16:9", style="anime")
+
+        built = builder.build_character_workflow("少年剑客", workflow_json=workflow_json, **kwargs)
+        injected = builder.inject_prompt(
+            json.loads(workflow_json), "少年剑客", kwargs["novel_id"], kwargs["character_name"],
+            kwargs["aspect_ratio"], None, kwargs["style"]
+        )
+
+        assert dict(built) == injected
+        assert built["133"]["inputs"]["text"] == "少年剑客"
+        assert built["117"]["inputs"]["text"].endswith("anime")
+
+    def test_cache_keyed_by_workflow_update(self):
+        record = SimpleNamespace(
+            id="wf-1", workflow_json=_bundled("scene_default.json"),
+            created_at=datetime(2025, 1, 1), updated_at=None,
+        )
+        first = get_compiled_workflow(record.workflow_json, workflow_cache_key(record))
+        assert get_compiled_workflow(record.workflow_json, workflow_cache_key(record)) is first
+
+        record.updated_at = datetime(2025, 1, 2)
+        assert get_compiled_workflow(record.workflow_json, workflow_cache_key(record)) is not first
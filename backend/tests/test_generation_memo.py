@@ -0,0 +1,159 @@
+"""
+ComfyUI 生成结果记忆单元测试
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models.generation_memo import GenerationMemo
+from app.services.comfyui import service as service_module
+from app.services.comfyui.memo import ComfyUIGenerationMemo, canonical_workflow_digest, upload_digests
+from app.services.comfyui.service import ComfyUIService
+
+
+def _workflow(image: str, prefix: str = "NovelFlow", seed: int = 1) -> dict:
+    return {
+        "1": {"class_type": "LoadImage", "inputs": {"image": image}},
+        "2": {"class_type": "KSampler", "inputs": {"seed": seed, "model": ["3", 0]}},
+        "9": {"class_type": "SaveImage", "inputs": {"filename_prefix": prefix, "images": ["2", 0]},
+              "_meta": {"title": "保存"}},
+    }
+
+
+@pytest.fixture
+def memo(tmp_path, monkeypatch):
+    # 记忆在数据库线程中读写，使用文件数据库使各线程看到同一份数据
+    engine = create_engine(f"sqlite:///{tmp_path / 'memo.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[GenerationMemo.__table__])
+    memo = ComfyUIGenerationMemo(sessionmaker(bind=engine), memo_dir=str(tmp_path / "memo"))
+    monkeypatch.setattr(service_module, "get_generation_memo", lambda: memo)
+    monkeypatch.setattr(get_settings(), "COMFYUI_MEMO_ENABLED", True)
+    yield memo
+    engine.dispose()
+
+
+class FakeClient:
+    def __init__(self, output_path):
+        self.queued = 0
+        self.output_path = output_path
+
+    async def queue_prompt(self, workflow):
+        self.queued += 1
+        return {"success": True, "prompt_id": f"p{self.queued}"}
+
+    async def wait_for_result(self, prompt_id, workflow, output_node_id, timeout=7200):
+        return {"success": True, "image_url": self.output_path.as_uri(), "message": "生成成功"}
+
+
+class TestGenerationMemo:
+    def test_digest_ignores_prefix_and_uploaded_filename(self):
+        same_content = {"a_1.png": "d1", "b_2.png": "d1", "c.png": "d2"}
+
+        base = canonical_workflow_digest(_workflow("a_1.png"), same_content, "9")
+        assert canonical_workflow_digest(_workflow("b_2.png", prefix="other"), same_content, "9") == base
+        assert canonical_workflow_digest(_workflow("c.png"), same_content, "9") != base
+        assert canonical_workflow_digest(_workflow("a_1.png", seed=2), same_content, "9") != base
+        assert canonical_workflow_digest(_workflow("a_1.png"), same_content, "2") != base
+
+    def test_upload_digests_only_from_successful_uploads(self):
+        digests = upload_digests(
+            {"success": True, "filename": "a_1.png", "digest": "d1"},
+            {"success": False, "filename": "b.png", "digest": "d2"},
+            {"success": True, "filename": "c.png"},
+            None,
+        )
+        assert digests == {"a_1.png": "d1"}
+
+    @pytest.mark.asyncio
+    async def test_hit_skips_queue(self, memo, tmp_path):
+        output = tmp_path / "ComfyUI_00001_.png"
+        output.write_bytes(b"png")
+        service = ComfyUIService()
+        service.client = FakeClient(output)
+
+        first = await service.run_workflow(_workflow("a.png"), "9")
+        second = await service.run_workflow(_workflow("a.png", prefix="retry"), "9")
+        bypass = await service.run_workflow(_workflow("a.png"), "9", use_memo=False)
+
+        assert first["prompt_id"] == "p1" and not first.get("memo_hit")
+        assert second["memo_hit"] and service.client.queued == 2
+        assert bypass["prompt_id"] == "p2"
+        pinned = memo.memo_dir / f"{canonical_workflow_digest(_workflow('a.png'), {}, '9')}.png"
+        assert pinned.read_bytes() == b"png"
+        assert second["image_url"] == pinned.as_uri()
+
+        # 同名上传文件内容不同时不命中
+        other = await service.run_workflow(_workflow("a.png"), "9", input_digests={"a.png": "d2"})
+        assert other["prompt_id"] == "p3"
+        renamed = await service.run_workflow(_workflow("b.png"), "9", input_digests={"b.png": "d2"})
+        assert renamed["memo_hit"]
+
+        # 固定的文件丢失时视为未命中并重新生成
+        pinned.unlink()
+        third = await service.run_workflow(_workflow("a.png"), "9")
+        assert third["prompt_id"] == "p4"
+
+    @pytest.mark.asyncio
+    async def test_evicts_by_total_size(self, memo, tmp_path, monkeypatch):
+        monkeypatch.setattr(get_settings(), "COMFYUI_MEMO_MAX_BYTES", 10)
+        outputs = []
+        for i in range(3):
+            output = tmp_path / f"out_{i}.png"
+            output.write_bytes(b"x" * 6)
+            outputs.append(output)
+            memo._writes = 0  # 每次写入都执行淘汰
+            await memo.store(f"digest{i}", {"image_url": output.as_uri()})
+
+        stats = await memo.stats()
+        assert stats["entries"] == 1 and stats["total_bytes"] == 6
+        assert [p.name for p in sorted(memo.memo_dir.iterdir())] == ["digest2.png"]
+        assert await memo.lookup("digest2") is not None
+        assert await memo.lookup("digest0") is None
+
+
+class TestRegenerateBypass:
+    def _retry(self, db_session, monkeypatch, status, payload='{"shot_id": "s1", "workflow_id": "w1"}'):
+        from app.models.task import Task
+        from app.services import task_service as task_service_module
+
+        task = Task(type="shot_image", name="分镜图", status=status, payload=payload)
+        db_session.add(task)
+        db_session.commit()
+        enqueued = []
+        monkeypatch.setattr(task_service_module, "enqueue_task",
+                            lambda task, priority, **payload: enqueued.append(payload))
+        result = task_service_module.TaskService(db_session).retry_task(task.id)
+        assert result["success"]
+        return enqueued[0]
+
+    def test_retry_completed_task_skips_memo(self, db_session, monkeypatch):
+        assert self._retry(db_session, monkeypatch, "completed")["use_memo"] is False
+
+    def test_retry_failed_task_keeps_payload(self, db_session, monkeypatch):
+        assert self._retry(db_session, monkeypatch, "failed") == {"shot_id": "s1", "workflow_id": "w1"}
+
+    def test_retry_failed_task_reuses_seed(self, db_session, monkeypatch):
+        payload = self._retry(db_session, monkeypatch, "failed", '{"shot_id": "s1", "seed": 42}')
+        assert payload == {"shot_id": "s1", "seed": 42}
+
+    def test_retry_completed_task_draws_new_seed(self, db_session, monkeypatch):
+        payload = self._retry(db_session, monkeypatch, "completed", '{"shot_id": "s1", "seed": 42}')
+        assert "seed" not in payload
+
+
+class TestFallbackUrl:
+    def test_memo_file_uri_maps_to_files_api(self):
+        from app.services.file_storage import file_storage
+
+        pinned = file_storage.base_dir / ".cache" / "generation_memo" / "abc.png"
+        assert file_storage.fallback_url(pinned.as_uri()) == "/api/files/.cache/generation_memo/abc.png"
+
+    def test_remote_and_foreign_urls_are_kept(self, tmp_path):
+        from app.services.file_storage import file_storage
+
+        remote = "http://127.0.0.1:8188/view?filename=a.png"
+        assert file_storage.fallback_url(remote) == remote
+        outside = (tmp_path / "a.png").as_uri()
+        assert file_storage.fallback_url(outside) == outside
@@ -0,0 +1,81 @@
+"""
+HTTP 连接池单元测试
+"""
+import pytest
+from app.core.config import get_settings, update_settings
+from app.core.http_client import HTTPClientPool, get_http_pool
+
+
+class TestHTTPClientPool:
+    @pytest.mark.asyncio
+    async def test_same_upstream_shares_client(self):
+        pool = HTTPClientPool()
+        a = pool.get_client("http://127.0.0.1:8188/prompt")
+        b = pool.get_client("http://127.0.0.1:8188/history/abc")
+        assert a is b
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_upstream_and_proxy_isolated(self):
+        pool = HTTPClientPool()
+        base = pool.get_client("http://127.0.0.1:8188")
+        assert pool.get_client("http://127.0.0.1:8189") is not base
+        assert pool.get_client("http://127.0.0.1:8188", proxy="http://127.0.0.1:7890") is not base
+        assert pool.get_client("http://127.0.0.1:8188", trust_env=False) is not base
+        await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_update_settings_invalidates_pool(self):
+        pool = get_http_pool()
+        settings = get_settings()
+        original_host = settings.COMFYUI_HOST
+        before = pool.get_client(original_host)
+        try:
+            update_settings({"comfyui_host": "http://10.0.0.2:8188"})
+            update_settings({"comfyui_host": original_host})
+            assert pool.get_client(original_host) is not before
+        finally:
+            settings.COMFYUI_HOST = original_host
+            await pool.close()
+
+    @pytest.mark.asyncio
+    async def test_retired_client_closed_after_last_borrow(self):
+        import asyncio
+        from app.core import http_client as http_client_module
+
+        pool = HTTPClientPool()
+        original = http_client_module._http_pool
+        http_client_module._http_pool = pool
+        try:
+            async with http_client_module.http_client("http://127.0.0.1:8188") as busy:
+                idle = pool.get_client("http://127.0.0.1:8189")
+                pool.invalidate()
+                await asyncio.sleep(0)
+                # 空闲的退役客户端立即关闭，仍在使用的等待归还
+                assert idle.is_closed and not busy.is_closed
+            await asyncio.sleep(0)
+            assert busy.is_closed
+            assert pool._retired == [] and pool._borrowed == {}
+        finally:
+            http_client_module._http_pool = original
+            await pool.close()
+
+    def test_loop_change_closes_previous_clients(self):
+        import asyncio
+
+        pool = HTTPClientPool()
+
+        async def get():
+            return pool.get_client("http://127.0.0.1:8188")
+
+        first = asyncio.run(get())
+
+        async def switch():
+            second = pool.get_client("http://127.0.0.1:8188")
+            await asyncio.sleep(0)
+            await pool.close()
+            return second
+
+        second = asyncio.run(switch())
+        assert second is not first
+        assert first.is_closed and second.is_closed
@@ -0,0 +1,92 @@
+"""
+章节内容指纹增量解析单元测试
+"""
+import pytest
+
+from app.models.novel import Chapter, Novel
+from app.repositories import ChapterExtractionRepository, SceneRepository
+from app.services.novel_service import NovelService
+
+
+class FakeLLMService:
+    def __init__(self, calls, fail_titles=()):
+        self.calls = calls
+        self.fail_titles = fail_titles
+
+    async def parse_scenes(self, novel_id, chapter_content, chapter_title, prompt_template=None):
+        self.calls.append(chapter_title)
+        if any(title in chapter_content for title in self.fail_titles):
+            return {"error": "timeout", "scenes": []}
+        name = chapter_content.split("】", 1)[1].strip()[:4]
+        return {"scenes": [{"name": name, "description": chapter_content[-10:], "setting": ""}]}
+
+
+@pytest.fixture
+def novel_chapters(db_session):
+    novel = Novel(title="测试小说")
+    db_session.add(novel)
+    db_session.flush()
+    chapters = [
+        Chapter(novel_id=novel.id, number=1, title="山门", content="青云山门，晨钟响起。"),
+        Chapter(novel_id=novel.id, number=2, title="客栈", content="悦来客栈，人声鼎沸。"),
+        Chapter(novel_id=novel.id, number=3, title="竹林", content="紫竹林中，风声萧萧。"),
+    ]
+    db_session.add_all(chapters)
+    db_session.commit()
+    return novel, chapters
+
+
+async def _parse(db_session, novel, chapters, calls, mode="incremental", fail_titles=()):
+    service = NovelService(db_session)
+    service.get_llm_service = lambda: FakeLLMService(calls, fail_titles)
+    return await service.parse_scenes_from_chapters(
+        novel_id=novel.id,
+        chapters=chapters,
+        mode=mode,
+        scene_repo=SceneRepository(db_session)
+    )
+
+
+class TestIncrementalExtraction:
+    @pytest.mark.asyncio
+    async def test_only_changed_chapters_reparsed(self, db_session, novel_chapters):
+        novel, chapters = novel_chapters
+        calls = []
+        first = await _parse(db_session, novel, chapters, calls)
+        assert first["success"] and first["statistics"]["skippedChapters"] == 0
+        records = ChapterExtractionRepository(db_session).get_map_by_novel(novel.id, "scenes")
+        assert set(records) == {c.id for c in chapters}
+
+        # 未修改任何章节：不调用 LLM
+        calls.clear()
+        unchanged = await _parse(db_session, novel, chapters, calls)
+        assert calls == []
+        assert unchanged["statistics"]["skippedChapters"] == 3
+
+        # 修改第二章：只解析第二章
+        chapters[1].content = "悦来客栈，掌柜拨着算盘。"
+        db_session.commit()
+        result = await _parse(db_session, novel, chapters, calls)
+        assert calls == ["第2章"]
+        assert result["statistics"]["skippedChapters"] == 2
+        assert "跳过 2 个未变化章节" in result["message"]
+
+        # 覆盖模式始终全部解析
+        calls.clear()
+        await _parse(db_session, novel, chapters, calls, mode="overwrite")
+        assert calls == ["第1章至第3章"]
+
+    @pytest.mark.asyncio
+    async def test_failed_chunk_chapters_not_recorded(self, db_session, novel_chapters, monkeypatch):
+        novel, chapters = novel_chapters
+        # 每章单独成块，第三章所在块失败
+        monkeypatch.setattr("app.services.novel_service.CHAPTER_CONTENT_MAX_LENGTH", 20)
+        calls = []
+        await _parse(db_session, novel, chapters, calls, fail_titles=("竹林",))
+        records = ChapterExtractionRepository(db_session).get_map_by_novel(novel.id, "scenes")
+        assert set(records) == {chapters[0].id, chapters[1].id}
+
+        # 下次增量解析只重试失败的章节
+        calls.clear()
+        await _parse(db_session, novel, chapters, calls)
+        assert calls == ["第3章"]
@@ -0,0 +1,121 @@
+"""
+LLM 响应缓存单元测试
+"""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models.llm_cache import LLMCacheEntry
+from app.services.llm import client as client_module
+from app.services.llm.base import LLMConfig, LLMResponse
+from app.services.llm.cache import LLMResponseCache, make_cache_key
+from app.services.llm.client import LLMClient
+
+
+@pytest.fixture
+def cache(tmp_path, monkeypatch):
+    # 缓存在数据库线程中读写，使用文件数据库使各线程看到同一份数据
+    engine = create_engine(f"sqlite:///{tmp_path / 'cache.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine, tables=[LLMCacheEntry.__table__])
+    cache = LLMResponseCache(sessionmaker(bind=engine))
+    monkeypatch.setattr(client_module, "get_llm_cache", lambda: cache)
+    monkeypatch.setattr(get_settings(), "LLM_CACHE_ENABLED", True)
+    yield cache
+    engine.dispose()
+
+
+class FakeProvider:
+    def __init__(self):
+        self.calls = 0
+
+    async def chat_completion(self, **kwargs):
+        self.calls += 1
+        return LLMResponse(success=True, content=f"response {self.calls}")
+
+
+@pytest.fixture
+def llm(monkeypatch):
+    logs = []
+    monkeypatch.setattr(client_module, "save_llm_log", lambda **kwargs: logs.append(kwargs))
+    client = LLMClient(LLMConfig(provider="openai", model="gpt-test", api_url="http://llm", api_key="k"))
+    client._provider = FakeProvider()
+    return client, logs
+
+
+class TestLLMCache:
+    def test_key_covers_request_fields(self):
+        base = ("openai", "gpt", "sys", "user", 0.7, None)
+        assert make_cache_key(*base) == make_cache_key(*base)
+        assert make_cache_key(*base) != make_cache_key("openai", "gpt", "sys", "user", 0.2, None)
+        assert make_cache_key(*base) != make_cache_key("openai", "gpt", "sys", "user", 0.7, "json_object")
+        assert make_cache_key(*base) != make_cache_key("deepseek", "gpt", "sys", "user", 0.7, None)
+        assert make_cache_key(*base, api_url="http://a/v1") != make_cache_key(*base, api_url="http://b/v1")
+        assert make_cache_key(*base, api_url="http://a/v1") == make_cache_key(*base, api_url="http://a/v1/")
+        assert make_cache_key(*base, max_tokens=1000) != make_cache_key(*base, max_tokens=4000)
+
+    @pytest.mark.asyncio
+    async def test_hit_skips_provider_and_is_logged(self, cache, llm):
+        client, logs = llm
+
+        first = await client.chat_completion("sys", "chapter text", task_type="split_chapter")
+        second = await client.chat_completion("sys", "chapter text", task_type="split_chapter")
+
+        assert client._provider.calls == 1
+        assert second["content"] == first["content"]
+        assert second["cached"] is True
+        assert logs[-1]["cached"] is True and logs[-1]["duration"] == 0.0
+        assert (cache.hits, cache.misses) == (1, 1)
+
+    @pytest.mark.asyncio
+    async def test_bypass_refreshes_entry(self, cache, llm):
+        client, _ = llm
+
+        await client.chat_completion("sys", "text")
+        refreshed = await client.chat_completion("sys", "text", use_cache=False)
+        again = await client.chat_completion("sys", "text")
+
+        assert client._provider.calls == 2
+        assert again["content"] == refreshed["content"] == "response 2"
+
+    @pytest.mark.asyncio
+    async def test_disabled_cache_not_used(self, cache, llm, monkeypatch):
+        monkeypatch.setattr(get_settings(), "LLM_CACHE_ENABLED", False)
+        client, _ = llm
+
+        await client.chat_completion("sys", "text")
+        await client.chat_completion("sys", "text")
+
+        assert client._provider.calls == 2
+
+    @pytest.mark.asyncio
+    async def test_eviction_by_size_and_age(self, cache, monkeypatch):
+        monkeypatch.setattr(get_settings(), "LLM_CACHE_MAX_ENTRIES", 2)
+        for i in range(3):
+            await cache.put(f"k{i}", "openai", "gpt", f"r{i}")
+        # 读取 k0 使其成为最近使用
+        assert await cache.get("k0") == "r0"
+
+        assert cache._run("evict", 2, 3600) == 1
+        assert await cache.get("k1") is None
+        assert await cache.get("k0") == "r0"
+
+        monkeypatch.setattr(get_settings(), "LLM_CACHE_TTL", 0)
+        assert await cache.get("k2") is None
+
+    @pytest.mark.asyncio
+    async def test_responses_failing_validation_are_not_cached(self, cache, llm):
+        client, _ = llm
+        is_json = lambda content: content.startswith("{")
+
+        await client.chat_completion("sys", "text", validate=is_json)
+        await client.chat_completion("sys", "text", validate=is_json)
+        assert client._provider.calls == 2
+
+        # 之前缓存的不可用条目在命中时删除并重新调用
+        await client.chat_completion("sys", "other")
+        await client.chat_completion("sys", "other", validate=is_json)
+        assert client._provider.calls == 4
+        assert (cache.hits, cache.misses) == (0, 4)
+        assert cache._run("count") == 0
@@ -0,0 +1,169 @@
+"""
+LLM 限流、自适应并发与重试单元测试
+"""
+import json
+import time
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from app.core.config import get_settings
+from app.services.llm import base as base_module
+from app.services.llm import client as client_module
+from app.services.llm.base import LLMConfig
+from app.services.llm.client import LLMClient
+from app.services.llm.providers import openai as openai_module
+from app.services.llm.limiter import LLMLimiterRegistry, TokenBucket
+
+CONFIG = LLMConfig(provider="openai", model="gpt-test", api_url="http://llm/v1", api_key="sk-test-aaaa1111,sk-test-bbbb2222")
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    settings = get_settings()
+    monkeypatch.setattr(settings, "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(settings, "LLM_RATE_LIMIT_ENABLED", True)
+    monkeypatch.setattr(settings, "LLM_KEY_INITIAL_CONCURRENCY", 4)
+    monkeypatch.setattr(settings, "LLM_RETRY_BASE_DELAY", 0.0)
+    monkeypatch.setattr(base_module, "save_llm_log", lambda **kwargs: None)
+    monkeypatch.setattr(openai_module, "save_llm_log", lambda **kwargs: None)
+    registry = LLMLimiterRegistry()
+    monkeypatch.setattr(client_module, "get_llm_limiter", lambda: registry)
+    return registry
+
+
+def _client(handler) -> LLMClient:
+    client = LLMClient(CONFIG)
+
+    @asynccontextmanager
+    async def mock_http_client():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            yield http
+
+    client._provider._http_client = mock_http_client
+    return client
+
+
+def _ok(text="ok"):
+    return httpx.Response(200, json={"choices": [{"message": {"content": text}}], "usage": {"total_tokens": 10}})
+
+
+class TestTokenBucket:
+    def test_wait_time_and_unlimited(self):
+        bucket = TokenBucket(60)
+        bucket.consume(60)
+        # 每秒补充 1 个令牌
+        assert bucket.wait_time(1, bucket._updated) == pytest.approx(1.0)
+        assert TokenBucket(0).wait_time(10 ** 9, 0) == 0.0
+        # 超过容量的请求按桶满放行
+        assert TokenBucket(100).wait_time(500, time.monotonic()) == 0.0
+
+
+class TestProviderLimiter:
+    @pytest.mark.asyncio
+    async def test_spreads_across_keys_and_backs_off_on_429(self, registry):
+        limiter = registry.for_config(CONFIG)
+        first = await limiter.acquire(10)
+        second = await limiter.acquire(10)
+        assert {first.key, second.key} == {"sk-test-aaaa1111", "sk-test-bbbb2222"}
+
+        first.release(False, status_code=429, retry_after=30)
+        second.release(True)
+        stats = {k["key"]: k for k in limiter.stats()["keys"]}
+        throttled = stats[f"sk-t***{first.key[-4:]}"]
+        assert throttled["concurrency_limit"] == 2 and throttled["saturated"]
+
+        # 冷却中的 Key 不再被选中
+        for _ in range(3):
+            lease = await limiter.acquire(10)
+            assert lease.key == second.key
+            lease.release(True)
+
+
+    @pytest.mark.asyncio
+    async def test_cancelled_lease_is_not_a_failure(self, registry):
+        import asyncio
+
+        limiter = registry.for_config(CONFIG)
+        entered = asyncio.Event()
+
+        async def hold():
+            async with limiter.lease(10):
+                entered.set()
+                await asyncio.sleep(3600)
+
+        task = asyncio.create_task(hold())
+        await entered.wait()
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        keys = limiter.stats()["keys"]
+        assert sum(k["in_flight"] for k in keys) == 0
+        assert sum(k["errors"] for k in keys) == 0 and sum(k["requests"] for k in keys) == 0
+
+    @pytest.mark.asyncio
+    async def test_stream_latency_is_time_to_first_chunk(self, registry, monkeypatch):
+        import asyncio
+
+        monkeypatch.setattr(get_settings(), "LLM_LATENCY_TARGET", 0.5)
+        client = LLMClient(CONFIG)
+
+        async def slow_stream(**kwargs):
+            yield "{"
+            await asyncio.sleep(1.0)
+            yield "}"
+
+        client._provider.stream_chat_completion = slow_stream
+        stream = client.stream_chat_completion("sys", "hi")
+        assert await stream.__anext__() == "{"
+        # 调用方读到首个片段后提前结束
+        await stream.aclose()
+
+        (key,) = [k for k in registry.for_config(CONFIG).stats()["keys"] if k["requests"]]
+        assert key["in_flight"] == 0 and key["errors"] == 0
+        assert key["avg_latency"] < 0.5 and key["concurrency_limit"] == 4
+
+
+class TestClientRetry:
+    @pytest.mark.asyncio
+    async def test_retries_429_on_another_key(self, registry):
+        calls = []
+
+        def handler(request):
+            calls.append(request.headers["Authorization"])
+            if len(calls) == 1:
+                return httpx.Response(429, text="slow down", headers={"Retry-After": "60"})
+            return _ok()
+
+        result = await _client(handler).chat_completion("sys", "hi")
+
+        assert result["success"] and result["content"] == "ok"
+        assert len(calls) == 2 and calls[0] != calls[1]
+
+    @pytest.mark.asyncio
+    async def test_client_errors_not_retried(self, registry):
+        calls = []
+
+        def handler(request):
+            calls.append(json.loads(request.content))
+            return httpx.Response(400, text="bad request")
+
+        result = await _client(handler).chat_completion("sys", "hi")
+
+        assert not result["success"] and len(calls) == 1
+
+    @pytest.mark.asyncio
+    async def test_gives_up_after_max_retries(self, registry, monkeypatch):
+        monkeypatch.setattr(get_settings(), "LLM_MAX_RETRIES", 1)
+        calls = []
+
+        def handler(request):
+            calls.append(1)
+            return httpx.Response(503, text="unavailable")
+
+        result = await _client(handler).chat_completion("sys", "hi")
+
+        assert not result["success"] and "503" in result["error"]
+        assert len(calls) == 2
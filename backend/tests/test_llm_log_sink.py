@@ -0,0 +1,154 @@
+"""
+LLM 调用日志批量写入与调用统计单元测试
+"""
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.core import database as database_module
+from app.core.database import Base
+from app.models.llm_log import LLMLog, LLMLogRollup
+from app.repositories import LLMLogRollupRepository
+from app.services.llm import analytics
+from app.services.llm.log_sink import LLMLogSink
+
+
+@pytest.fixture
+def sink(monkeypatch):
+    sink = LLMLogSink()
+    batches = []
+    monkeypatch.setattr(sink, "_write", lambda records: batches.append(list(records)))
+    monkeypatch.setattr(get_settings(), "LLM_LOG_BATCH_SIZE", 3)
+    monkeypatch.setattr(get_settings(), "LLM_LOG_QUEUE_SIZE", 5)
+    yield sink, batches
+
+
+def _record(i: int) -> dict:
+    return {"provider": "openai", "model": "gpt", "user_prompt": f"prompt {i}"}
+
+
+class TestLLMLogSink:
+    @pytest.mark.asyncio
+    async def test_flush_writes_in_batches(self, sink):
+        sink, batches = sink
+        for i in range(4):
+            sink.submit(_record(i))
+
+        await sink.stop()
+
+        assert [len(b) for b in batches] == [3, 1]
+        assert [r["user_prompt"] for b in batches for r in b] == [f"prompt {i}" for i in range(4)]
+
+    @pytest.mark.asyncio
+    async def test_backpressure_drops_oldest(self, sink, monkeypatch):
+        sink, batches = sink
+        # 不触发批量写入，模拟数据库写入跟不上
+        monkeypatch.setattr(get_settings(), "LLM_LOG_BATCH_SIZE", 100)
+        for i in range(8):
+            sink.submit(_record(i))
+
+        assert sink.dropped == 3
+        await sink.stop()
+        assert [r["user_prompt"] for b in batches for r in b] == [f"prompt {i}" for i in range(3, 8)]
+
+    def test_submit_outside_event_loop_writes_immediately(self, sink, monkeypatch):
+        import threading
+
+        sink, batches = sink
+        threads = []
+        monkeypatch.setattr(
+            sink, "_write", lambda records: (batches.append(list(records)), threads.append(threading.current_thread()))
+        )
+        sink.submit(_record(0))
+        assert len(batches) == 1
+        # 与其他数据库写入一样在数据库执行线程中执行
+        assert threads[0].name.startswith("db-writer")
+
+    @pytest.mark.asyncio
+    async def test_stop_waits_for_in_flight_batch(self, sink, monkeypatch):
+        import asyncio
+        import time
+
+        sink, batches = sink
+
+        def slow_write(records):
+            time.sleep(0.05)
+            batches.append(list(records))
+
+        monkeypatch.setattr(sink, "_write", slow_write)
+        for i in range(3):
+            sink.submit(_record(i))
+        # 等待写入协程取出批次并开始写入
+        while sink._queue:
+            await asyncio.sleep(0.001)
+
+        await sink.stop()
+
+        assert [r["user_prompt"] for b in batches for r in b] == [f"prompt {i}" for i in range(3)]
+
+
+class TestCompressedText:
+    def test_long_text_round_trip(self, tmp_path, monkeypatch):
+        monkeypatch.setattr(get_settings(), "LLM_LOG_COMPRESS_MIN_LENGTH", 100)
+        engine = create_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+        Base.metadata.create_all(bind=engine, tables=[LLMLog.__table__])
+        db = sessionmaker(bind=engine)()
+        long_text = "林风站在山门前，云雾翻涌。" * 200
+
+        db.add(LLMLog(provider="openai", model="gpt", user_prompt=long_text, response="短响应"))
+        db.commit()
+        db.expunge_all()
+
+        stored = db.execute(text("SELECT user_prompt, response FROM llm_logs")).one()
+        assert stored[0].startswith("zlib+b64:") and len(stored[0]) < len(long_text.encode("utf-8"))
+        assert stored[1] == "短响应"
+
+        log = db.query(LLMLog).one()
+        assert log.user_prompt == long_text
+        db.close()
+        engine.dispose()
+
+
+class TestLLMLogRollup:
+    def test_histogram_percentile_interpolates(self):
+        bounds = (1, 2, 4)
+        # 1 个 ≤1s，8 个 1~2s，1 个 >4s（最大 9s）
+        counts = [1, 8, 0, 1]
+
+        assert analytics.histogram_percentile(bounds, counts, 0.5, max_value=9) == 1.5
+        assert analytics.histogram_percentile(bounds, counts, 1.0, max_value=9) == 9
+        assert analytics.histogram_percentile(bounds, [0, 0, 0, 0], 0.5) is None
+
+    def test_write_maintains_hourly_rollup(self, tmp_path, monkeypatch):
+        engine = create_engine(f"sqlite:///{tmp_path / 'logs.db'}")
+        Base.metadata.create_all(bind=engine, tables=[LLMLog.__table__, LLMLogRollup.__table__])
+        factory = sessionmaker(bind=engine)
+        monkeypatch.setattr(database_module, "SessionLocal", factory)
+        sink = LLMLogSink()
+        base = {"provider": "openai", "model": "gpt", "user_prompt": "p", "task_type": "split_chapter"}
+
+        sink._write([
+            {**base, "duration": 1.0, "response": "a" * 300},
+            {**base, "duration": 3.0, "response": "b" * 300},
+        ])
+        sink._write([
+            {**base, "status": "error", "duration": 30.0, "error_message": "HTTP 429"},
+            {**base, "cached": True, "duration": 0, "response": "a" * 300},
+            {**base, "model": "gpt-mini", "duration": 0.5, "response": "c"},
+        ])
+
+        db = factory()
+        rows = LLMLogRollupRepository(db).list_range()
+        assert len(rows) == 2
+        data = analytics.summarize_rollups(rows, group_by=["model"])
+        gpt = next(g for g in data["groups"] if g["model"] == "gpt")
+        assert gpt["summary"]["requests"] == 4
+        assert gpt["summary"]["error_rate"] == 0.25
+        assert gpt["summary"]["cached"] == 1
+        # 缓存命中不计入耗时统计
+        assert gpt["summary"]["latency"]["count"] == 3
+        assert gpt["summary"]["latency"]["max"] == 30.0
+        assert data["total"]["requests"] == 5
+        db.close()
+        engine.dispose()
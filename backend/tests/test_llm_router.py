@@ -0,0 +1,132 @@
+"""
+LLM 多厂商路由（对冲请求、故障切换、熔断）单元测试
+"""
+import asyncio
+
+import pytest
+
+from app.core.config import get_settings
+from app.services.llm import LLMConfig
+from app.services.llm import router as router_module
+
+
+def _config(provider: str) -> LLMConfig:
+    return LLMConfig(provider=provider, model=f"{provider}-model", api_url="http://x", api_key="k")
+
+
+class FakeClient:
+    """按厂商名返回预设行为的 LLMClient"""
+    behaviors = {}
+    calls = []
+
+    def __init__(self, config):
+        self.config = config
+
+    async def chat_completion(self, **kwargs):
+        FakeClient.calls.append((self.config.provider, router_module.get_route_note()))
+        delay, result = FakeClient.behaviors[self.config.provider]
+        await asyncio.sleep(delay)
+        return result
+
+    async def stream_chat_completion(self, **kwargs):
+        FakeClient.calls.append((self.config.provider, router_module.get_route_note()))
+        delay, chunks = FakeClient.behaviors[self.config.provider]
+        await asyncio.sleep(delay)
+        for chunk in chunks:
+            yield chunk
+
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    FakeClient.behaviors = {}
+    FakeClient.calls = []
+    cancelled = []
+    monkeypatch.setattr(router_module, "LLMClient", FakeClient)
+    monkeypatch.setattr(router_module, "_route_stats", None)
+    monkeypatch.setattr(router_module, "save_llm_log", lambda **kwargs: cancelled.append(kwargs))
+    monkeypatch.setattr(get_settings(), "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+    monkeypatch.setattr(get_settings(), "LLM_HEDGE_MIN_DELAY", 0.0)
+    monkeypatch.setattr(get_settings(), "LLM_CIRCUIT_FAILURE_THRESHOLD", 2)
+    yield FakeClient, cancelled
+
+
+def _ok(content: str = '{"shots": []}') -> dict:
+    return {"success": True, "content": content}
+
+
+class TestLLMRouter:
+    @pytest.mark.asyncio
+    async def test_slow_primary_hedged_and_cancelled(self, fake_llm):
+        client, cancelled = fake_llm
+        client.behaviors = {"deepseek": (5.0, _ok()), "openai": (0.0, _ok('{"shots": [1]}'))}
+        router = router_module.LLMRouter([_config("deepseek"), _config("openai")])
+
+        result = await router.chat_completion(system_prompt="s", user_content="u", response_format="json_object")
+
+        assert result["content"] == '{"shots": [1]}'
+        assert result["provider"] == "openai"
+        assert result["route"].startswith("hedge: openai/openai-model")
+        # 每个请求的日志都带有路由决策，慢请求被取消并单独记录
+        assert client.calls[0] == ("deepseek", "primary: deepseek/deepseek-model")
+        assert client.calls[1][1].startswith("hedge:")
+        assert [c["provider"] for c in cancelled] == ["deepseek"]
+        assert cancelled[0]["status"] == "cancelled"
+
+    @pytest.mark.asyncio
+    async def test_invalid_json_fails_over(self, fake_llm):
+        client, _ = fake_llm
+        client.behaviors = {"deepseek": (0.0, _ok("抱歉，我无法完成")), "openai": (0.0, _ok())}
+        router = router_module.LLMRouter([_config("deepseek"), _config("openai")])
+
+        result = await router.chat_completion(system_prompt="s", user_content="u", response_format="json_object")
+
+        assert result["success"] and result["provider"] == "openai"
+        assert result["route"].startswith("failover:")
+
+    @pytest.mark.asyncio
+    async def test_circuit_breaker_skips_failing_provider(self, fake_llm):
+        client, _ = fake_llm
+        failure = {"success": False, "error": "HTTP 503", "content": ""}
+        client.behaviors = {"deepseek": (0.0, failure), "openai": (0.0, _ok())}
+        router = router_module.LLMRouter([_config("deepseek"), _config("openai")])
+
+        for _ in range(2):
+            await router.chat_completion(system_prompt="s", user_content="u")
+        client.calls.clear()
+        result = await router.chat_completion(system_prompt="s", user_content="u")
+
+        assert [p for p, _ in client.calls] == ["openai"]
+        assert result["route"] == "primary: openai/openai-model"
+        assert router_module.get_llm_route_stats().breaker(_config("deepseek")).state == "open"
+
+    @pytest.mark.asyncio
+    async def test_stream_hedges_on_first_chunk(self, fake_llm):
+        client, cancelled = fake_llm
+        client.behaviors = {"deepseek": (5.0, ["慢"]), "openai": (0.0, ['{"shots"', ": []}"])}
+        router = router_module.LLMRouter([_config("deepseek"), _config("openai")])
+
+        chunks = [c async for c in router.stream_chat_completion(system_prompt="s", user_content="u")]
+
+        assert "".join(chunks) == '{"shots": []}'
+        assert [c["provider"] for c in cancelled] == ["deepseek"]
+
+
+class TestBuildRouter:
+    def test_other_provider_does_not_inherit_primary_credentials(self):
+        primary = LLMConfig(provider="openai", model="gpt-4o", api_url="https://api.openai.com/v1", api_key="sk-primary")
+
+        router = router_module.build_llm_router(primary, [
+            {"provider": "openai", "model": "gpt-4o-mini"},
+            {"provider": "gemini", "model": "gemini-2.5-flash"},
+            {"provider": "deepseek", "model": "deepseek-chat"},
+            {"provider": "anthropic", "model": "claude", "api_url": "https://api.anthropic.com/v1", "api_key": "sk-ant"},
+            {"provider": "ollama", "model": "qwen", "api_url": "http://localhost:11434"},
+        ])
+
+        routes = [(c.provider, c.api_url, c.api_key) for c in router.configs]
+        assert routes == [
+            ("openai", "https://api.openai.com/v1", "sk-primary"),
+            ("openai", "https://api.openai.com/v1", "sk-primary"),
+            ("anthropic", "https://api.anthropic.com/v1", "sk-ant"),
+            ("ollama", "http://localhost:11434", ""),
+        ]
@@ -0,0 +1,182 @@
+"""
+LLM 流式输出与增量 JSON 解析单元测试
+"""
+import asyncio
+import json
+import re
+from contextlib import asynccontextmanager
+
+import httpx
+import pytest
+
+from app.core.config import get_settings
+from app.services.llm import base as base_module
+from app.services.llm.base import LLMConfig, LLMStreamError
+from app.services.llm.client import LLMClient
+from app.services.llm_service import LLMService, stitch_window_shots
+from app.utils.json_parser import JsonArrayStreamParser
+
+SPLIT_RESULT = {
+    "chapter": "第一章",
+    "characters": ["林风"],
+    "scenes": ["山门"],
+    "shots": [
+        {"description": "林风站在山门前 {远景}", "characters": ["林风"], "dialogues": [{"text": "走吧]"}]},
+        {"description": "云雾翻涌", "characters": []},
+    ],
+}
+
+
+def _chunks(text: str, size: int = 7):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestJsonArrayStreamParser:
+    def test_elements_emitted_as_they_close(self):
+        text = "```json\n" + json.dumps(SPLIT_RESULT, ensure_ascii=False) + "\n```"
+        parser = JsonArrayStreamParser("shots")
+        emitted_at = []
+        received = 0
+        for chunk in _chunks(text):
+            received += len(chunk)
+            for item in parser.feed(chunk):
+                emitted_at.append((received, item))
+
+        assert [item for _, item in emitted_at] == SPLIT_RESULT["shots"]
+        # 第一个分镜在完整响应结束前就已产出
+        assert emitted_at[0][0] < len(text) - 20
+
+    def test_think_block_and_other_arrays_ignored(self):
+        text = '<think>先列出 {"shots": [{"x": 1}]}</think>{"characters": [{"name": "a"}], "shots": [{"id": 2}]}'
+        parser = JsonArrayStreamParser("shots")
+        items = []
+        for chunk in _chunks(text, 3):
+            items += parser.feed(chunk)
+
+        assert items == [{"id": 2}]
+
+
+@pytest.fixture
+def no_log(monkeypatch):
+    monkeypatch.setattr(base_module, "save_llm_log", lambda **kwargs: None)
+    monkeypatch.setattr(get_settings(), "LLM_CACHE_ENABLED", False)
+    monkeypatch.setattr(get_settings(), "LLM_RETRY_BASE_DELAY", 0.0)
+
+
+def _openai_client(handler) -> LLMClient:
+    client = LLMClient(LLMConfig(provider="openai", model="gpt-test", api_url="http://llm/v1", api_key="k"))
+
+    @asynccontextmanager
+    async def mock_http_client():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as http:
+            yield http
+
+    client._provider._http_client = mock_http_client
+    return client
+
+
+class TestProviderStreaming:
+    @pytest.mark.asyncio
+    async def test_openai_sse_deltas(self, no_log):
+        def handler(request):
+            assert json.loads(request.content)["stream"] is True
+            events = [{"choices": [{"delta": {"content": part}}]} for part in ["你好", "，", "世界"]]
+            body = "".join(f"data: {json.dumps(e, ensure_ascii=False)}\n\n" for e in events) + "data: [DONE]\n\n"
+            return httpx.Response(200, text=body, headers={"Content-Type": "text/event-stream"})
+
+        client = _openai_client(handler)
+        deltas = [d async for d in client.stream_chat_completion("sys", "hi")]
+
+        assert deltas == ["你好", "，", "世界"]
+
+    @pytest.mark.asyncio
+    async def test_http_error_raises(self, no_log):
+        client = _openai_client(lambda request: httpx.Response(429, text="rate limited"))
+
+        with pytest.raises(LLMStreamError, match="429"):
+            async for _ in client.stream_chat_completion("sys", "hi"):
+                pass
+
+
+class TestStreamingSplit:
+    @pytest.mark.asyncio
+    async def test_shots_delivered_before_completion(self, no_log, monkeypatch):
+        text = json.dumps(SPLIT_RESULT, ensure_ascii=False)
+        progress = {"sent": 0}
+
+        async def fake_stream(self, **kwargs):
+            for chunk in _chunks(text):
+                progress["sent"] += len(chunk)
+                yield chunk
+
+        monkeypatch.setattr(LLMService, "stream_chat_completion", fake_stream)
+        delivered = []
+
+        async def on_shot(shot):
+            delivered.append((progress["sent"], shot))
+
+        result = await LLMService().split_chapter_with_prompt_stream(
+            chapter_title="第一章",
+            chapter_content="……",
+            prompt_template="拆分 {每个分镜对应拆分故事字数}",
+            on_shot=on_shot,
+        )
+
+        assert result["shots"] == SPLIT_RESULT["shots"]
+        assert result["characters"] == ["林风"]
+        assert result["streamed_count"] == 2
+        assert delivered[0][0] < len(text)
+
+
+def _shot_text(part: int, n: int) -> str:
+    return "甲乙丙丁戊己庚辛"[part] + "天地"[n] + "之景"
+
+
+class TestWindowedSplit:
+    def test_stitch_dedups_overlap_and_renumbers(self):
+        first = [{"index": 1, "description": "林风推门而入"}, {"index": 2, "description": "掌柜抬头，露出笑容。"}]
+        second = [{"index": 1, "description": "掌柜抬头露出笑容"}, {"index": 2, "description": "林风坐到窗边"}]
+
+        shots = stitch_window_shots([first, second])
+
+        assert [s["description"] for s in shots] == ["林风推门而入", "掌柜抬头，露出笑容。", "林风坐到窗边"]
+        assert [s["index"] for s in shots] == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_long_chapter_windows_run_concurrently_in_order(self, no_log, monkeypatch):
+        chapter = "\n".join(f"第{i}段" + "字" * 995 for i in range(40))
+        started, seen_content = [], []
+
+        async def fake_stream(self, user_content, **kwargs):
+            part, total = map(int, re.search(r"第 (\d+)/(\d+) 段", user_content).groups())
+            started.append(part)
+            seen_content.append(user_content)
+            # 第一个窗口最慢，验证并发执行且按窗口顺序回调
+            await asyncio.sleep(0.05 if part == 1 else 0)
+            shots = [{"description": _shot_text(part, n)} for n in range(2)]
+            if part > 1:
+                # 衔接上下文被重复拆分出的分镜
+                shots.insert(0, {"description": _shot_text(part - 1, 1)})
+            yield json.dumps({"characters": [f"角色{part}", "林风"], "shots": shots}, ensure_ascii=False)
+
+        monkeypatch.setattr(LLMService, "stream_chat_completion", fake_stream)
+        delivered = []
+
+        async def on_shot(shot):
+            delivered.append(shot["description"])
+
+        result = await LLMService().split_chapter_with_prompt_stream(
+            chapter_title="第一章",
+            chapter_content=chapter,
+            prompt_template="拆分",
+            on_shot=on_shot,
+        )
+
+        windows = len(started)
+        assert windows >= 3 and len(chapter) > 15000
+        assert delivered == [_shot_text(p, n) for p in range(1, windows + 1) for n in range(2)]
+        assert result["streamed_count"] == len(delivered)
+        assert result["characters"][:2] == ["角色1", "林风"] and "角色2" in result["characters"]
+        # 末尾章节内容未被截断，后续窗口带有衔接上下文
+        assert "第39段" in seen_content[started.index(windows)]
+        assert all("前文衔接" in c for c, p in zip(seen_content, started) if p > 1)
@@ -0,0 +1,229 @@
+"""
+章节批量分镜图生成单元测试
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.core.config import get_settings
+from app.core.database import Base
+from app.models.novel import Chapter, Character, Novel
+from app.models.shot import Shot
+from app.models.task import Task
+from app.repositories import TaskRepository
+from app.services import shot_batch_service
+
+
+def _shot(shot_id, characters=(), scene="", props=()):
+    return SimpleNamespace(
+        id=shot_id,
+        characters=json.dumps(list(characters), ensure_ascii=False),
+        scene=scene,
+        props=json.dumps(list(props), ensure_ascii=False),
+    )
+
+
+class TestShotBatchService:
+    def test_collect_references_deduplicates(self):
+        shots = [
+            _shot("s1", ["张三", "李四"], "客栈", ["长剑"]),
+            _shot("s2", ["李四"], "客栈"),
+            _shot("s3", [], "山道", ["长剑", "包袱"]),
+        ]
+
+        refs = shot_batch_service.collect_shot_references(shots)
+
+        assert refs == {
+            "characters": ["张三", "李四"],
+            "scenes": ["客栈", "山道"],
+            "props": ["长剑", "包袱"],
+        }
+
+    def test_group_by_character_combination(self):
+        shots = [
+            _shot("s1", ["张三", "李四"]),
+            _shot("s2", ["李四", "张三"]),
+            _shot("s3", ["李四"]),
+            _shot("s4"),
+        ]
+
+        groups = shot_batch_service.group_shots_by_characters(shots)
+
+        assert {key: [s.id for s in group] for key, group in groups.items()} == {
+            ("张三", "李四"): ["s1", "s2"],
+            ("李四",): ["s3"],
+        }
+
+    def test_summarize_child_status(self):
+        assert shot_batch_service.summarize_child_status({"pending": 4}, 4) == (0, 0, 10)
+        assert shot_batch_service.summarize_child_status({"completed": 1, "failed": 1, "running": 2}, 4) == (1, 1, 55)
+        assert shot_batch_service.summarize_child_status({"completed": 4}, 4) == (4, 0, 100)
+
+    def test_count_by_status(self, db_session):
+        repo = TaskRepository(db_session)
+        tasks = [
+            repo.create(Task(type="shot_image", name=f"shot {i}", status=status))
+            for i, status in enumerate(["pending", "completed", "completed", "failed"])
+        ]
+
+        counts = repo.count_by_status([t.id for t in tasks[:3]])
+
+        assert counts == {"pending": 1, "completed": 2}
+        assert repo.count_by_status([]) == {}
+
+
+@pytest.fixture
+def session_factory(tmp_path, monkeypatch):
+    # 汇总任务在数据库执行线程中读写，使用文件数据库使各线程看到同一份数据
+    engine = create_engine(f"sqlite:///{tmp_path / 'batch.db'}", connect_args={"check_same_thread": False})
+    Base.metadata.create_all(bind=engine)
+    factory = sessionmaker(bind=engine)
+    monkeypatch.setattr(shot_batch_service, "SessionLocal", factory)
+    monkeypatch.setattr(shot_batch_service, "report_progress", lambda task_id, **kwargs: None)
+    monkeypatch.setattr(shot_batch_service.file_storage, "delete_shot_image", lambda *args, **kwargs: True)
+    monkeypatch.setattr(get_settings(), "TASK_POLL_INTERVAL", 0.01)
+    yield factory
+    engine.dispose()
+
+
+def _seed_batch(factory):
+    """两个分镜：镜1 已有用户发起的生图任务，且引用的角色缺少图片并已有用户发起的人设图任务"""
+    db = factory()
+    novel = Novel(title="测试小说")
+    db.add(novel)
+    db.flush()
+    chapter = Chapter(novel_id=novel.id, number=1, title="第一章")
+    db.add(chapter)
+    db.flush()
+    character = Character(novel_id=novel.id, name="张三")
+    db.add(character)
+    db.flush()
+    shots = [
+        Shot(chapter_id=chapter.id, index=1, description="镜头一", characters=json.dumps(["张三"], ensure_ascii=False)),
+        Shot(chapter_id=chapter.id, index=2, description="镜头二"),
+    ]
+    db.add_all(shots)
+    portrait = Task(type="character_portrait", name="生成角色形象: 张三", status="pending",
+                    novel_id=novel.id, character_id=character.id)
+    user_shot = Task(type="shot_image", name="生成分镜图: 镜1", status="pending",
+                     novel_id=novel.id, chapter_id=chapter.id)
+    batch = Task(type="chapter_shot_images", name="批量生成分镜图", status="pending",
+                 novel_id=novel.id, chapter_id=chapter.id)
+    db.add_all([portrait, user_shot, batch])
+    db.commit()
+    ids = SimpleNamespace(
+        novel=novel.id, chapter=chapter.id, shots=[shot.id for shot in shots],
+        portrait=portrait.id, user_shot=user_shot.id, batch=batch.id,
+    )
+    db.close()
+    return ids
+
+
+def _set_status(factory, task_id, status):
+    db = factory()
+    db.get(Task, task_id).status = status
+    db.commit()
+    db.close()
+
+
+async def _wait_until(predicate):
+    for _ in range(500):
+        if predicate():
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError("等待超时")
+
+
+class TestShotBatchCancel:
+    def _start(self, ids):
+        return asyncio.create_task(shot_batch_service.generate_chapter_shot_images_task(
+            ids.batch, ids.novel, ids.chapter, ids.shots, workflow_id="wf"
+        ))
+
+    @pytest.mark.asyncio
+    async def test_cancel_keeps_reused_prerequisite(self, session_factory):
+        ids = _seed_batch(session_factory)
+        batch = self._start(ids)
+
+        def batch_running():
+            db = session_factory()
+            try:
+                return db.get(Task, ids.batch).status == "running"
+            finally:
+                db.close()
+
+        await _wait_until(batch_running)
+        _set_status(session_factory, ids.batch, "cancelled")
+        await asyncio.wait_for(batch, timeout=5)
+
+        db = session_factory()
+        assert db.get(Task, ids.portrait).status == "pending"
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_cancel_dequeues_only_created_shot_tasks(self, session_factory):
+        ids = _seed_batch(session_factory)
+        batch = self._start(ids)
+        await asyncio.sleep(0.05)
+        _set_status(session_factory, ids.portrait, "completed")
+
+        def created_shot_tasks():
+            db = session_factory()
+            try:
+                return db.query(Task).filter(Task.type == "shot_image", Task.id != ids.user_shot).all()
+            finally:
+                db.close()
+
+        await _wait_until(lambda: len(created_shot_tasks()) == 1)
+        _set_status(session_factory, ids.batch, "cancelled")
+        await asyncio.wait_for(batch, timeout=5)
+
+        (created,) = created_shot_tasks()
+        db = session_factory()
+        assert created.status == "failed" and created.error_message == "批量任务已终止"
+        # 批量任务复用的用户任务不受影响
+        assert db.get(Task, ids.user_shot).status == "pending"
+        db.close()
+
+    @pytest.mark.asyncio
+    async def test_submission_runs_on_db_executor_and_batch_completes(self, session_factory, monkeypatch):
+        import threading
+
+        ids = _seed_batch(session_factory)
+        _set_status(session_factory, ids.portrait, "completed")
+        db = session_factory()
+        db.query(Character).update({Character.image_url: "/api/files/zhangsan.png"})
+        db.commit()
+        db.close()
+        submit_threads = []
+        submit_shot_tasks = shot_batch_service._submit_shot_tasks
+
+        def recording_submit(*args, **kwargs):
+            submit_threads.append(threading.current_thread().name)
+            return submit_shot_tasks(*args, **kwargs)
+
+        monkeypatch.setattr(shot_batch_service, "_submit_shot_tasks", recording_submit)
+        batch = self._start(ids)
+
+        def shot_tasks():
+            db = session_factory()
+            try:
+                return [t.id for t in db.query(Task).filter(Task.type == "shot_image").all()]
+            finally:
+                db.close()
+
+        await _wait_until(lambda: len(shot_tasks()) == 2)
+        for task_id in shot_tasks():
+            _set_status(session_factory, task_id, "completed")
+        await asyncio.wait_for(batch, timeout=5)
+
+        db = session_factory()
+        finished = db.get(Task, ids.batch)
+        assert finished.status == "completed" and finished.current_step == "完成 2/2"
+        assert db.get(Shot, ids.shots[1]).image_status == "generating"
+        db.close()
+        assert submit_threads and submit_threads[0].startswith("db-writer")
@@ -0,0 +1,102 @@
+"""
+任务事件推送单元测试
+"""
+import pytest
+
+from app.core.config import get_settings
+from app.models.task import Task
+from app.repositories import TaskRepository
+from app.services.scheduler import events as events_module
+from app.services.scheduler.events import TaskEventBus, reset_current_task, set_current_task
+
+
+@pytest.fixture
+def bus(monkeypatch):
+    bus = TaskEventBus()
+    monkeypatch.setattr(events_module, "get_task_event_bus", lambda: bus)
+    monkeypatch.setattr(get_settings(), "TASK_EVENT_COALESCE_INTERVAL", 0.01)
+    return bus
+
+
+class TestTaskEvents:
+    @pytest.mark.asyncio
+    async def test_filter_and_coalesce(self, bus):
+        subscription = bus.subscribe(chapter_id="c1")
+
+        bus.publish({"id": "t1", "novelId": "n1", "chapterId": "c1", "status": "running", "progress": 0})
+        bus.publish({"id": "t1", "progress": 40})
+        bus.publish({"id": "t2", "novelId": "n1", "chapterId": "c2", "status": "running"})
+
+        batch = await subscription.next_batch(timeout=1)
+
+        assert len(batch) == 1
+        assert batch[0]["id"] == "t1"
+        assert batch[0]["status"] == "running"
+        assert batch[0]["progress"] == 40
+
+    @pytest.mark.asyncio
+    async def test_no_events_returns_empty_batch(self, bus):
+        subscription = bus.subscribe()
+        assert await subscription.next_batch(timeout=0.01) == []
+
+    @pytest.mark.asyncio
+    async def test_committed_task_changes_are_published(self, bus, db_session):
+        subscription = bus.subscribe(novel_id="n1")
+        task = Task(type="shot_image", name="shot", status="pending", novel_id="n1", chapter_id="c1")
+        db_session.add(task)
+        db_session.commit()
+
+        task.status = "running"
+        task.current_step = "正在生成..."
+        db_session.commit()
+
+        batch = await subscription.next_batch(timeout=1)
+
+        assert len(batch) == 1
+        assert batch[0]["id"] == task.id
+        assert batch[0]["status"] == "running"
+        assert batch[0]["currentStep"] == "正在生成..."
+
+    @pytest.mark.asyncio
+    async def test_bulk_updates_are_published(self, bus, db_session):
+        subscription = bus.subscribe(novel_id="n1")
+        claimed = Task(type="shot_image", name="a", status="pending", payload="{}", novel_id="n1")
+        queued = Task(type="shot_image", name="b", status="pending", payload="{}", novel_id="n1")
+        db_session.add_all([claimed, queued])
+        db_session.commit()
+        repo = TaskRepository(db_session)
+
+        assert repo.claim(claimed.id, "me:1:x", 60) is True
+        assert repo.dequeue_pending([claimed.id, queued.id], "批量任务已终止", "已终止") == 1
+
+        batch = {event_data["id"]: event_data for event_data in await subscription.next_batch(timeout=1)}
+
+        assert batch[claimed.id]["status"] == "running"
+        assert batch[queued.id]["status"] == "failed"
+        assert batch[queued.id]["errorMessage"] == "批量任务已终止"
+
+    @pytest.mark.asyncio
+    async def test_comfyui_steps_follow_bound_prompt(self, bus):
+        subscription = bus.subscribe(chapter_id="c1")
+        task = Task(id="t1", type="shot_image", name="shot", novel_id="n1", chapter_id="c1")
+
+        token = set_current_task(task)
+        try:
+            bus.bind_prompt("p1")
+        finally:
+            reset_current_task(token)
+
+        bus.handle_comfyui_message("progress", {"prompt_id": "p1", "node": "3", "value": 5, "max": 20})
+        bus.handle_comfyui_message("progress", {"prompt_id": "other", "node": "3", "value": 1, "max": 20})
+
+        batch = await subscription.next_batch(timeout=1)
+
+        assert batch == [{
+            "id": "t1", "type": "shot_image", "novelId": "n1", "chapterId": "c1",
+            "node": "3", "step": 5, "maxSteps": 20,
+        }]
+
+        # prompt 执行结束后不再关联
+        bus.handle_comfyui_message("executing", {"prompt_id": "p1", "node": None})
+        bus.handle_comfyui_message("progress", {"prompt_id": "p1", "node": "3", "value": 6, "max": 20})
+        assert await subscription.next_batch(timeout=0.05) == []
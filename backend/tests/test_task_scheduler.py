@@ -0,0 +1,416 @@
+"""
+任务调度器单元测试
+"""
+import json
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy.orm import sessionmaker
+
+from app.constants import TASK_PRIORITY_LOW, TASK_PRIORITY_NORMAL
+from app.core.config import get_settings
+from app.models.task import Task
+from app.models.workflow import Workflow
+from app.repositories import TaskRepository
+from app.services.scheduler import progress as progress_module
+from app.services.scheduler import scheduler as scheduler_module
+from app.services.comfyui.client import ComfyUIClient
+from app.services.scheduler.affinity import ModelAffinityPlanner
+from app.services.scheduler.events import reset_current_task, set_current_task
+from app.services.scheduler.progress import TaskProgressWriter
+from app.services.scheduler.scheduler import TaskScheduler
+
+
+class RecordingBackend:
+    """只记录提交、不实际执行的后端"""
+
+    is_local = True
+
+    def __init__(self):
+        self.submitted = []
+
+    def submit(self, task_id, owner, priority=0):
+        self.submitted.append(task_id)
+
+    async def shutdown(self):
+        return list(self.submitted)
+
+
+@pytest.fixture
+def session_factory(db_engine, monkeypatch):
+    factory = sessionmaker(autocommit=False, autoflush=False, bind=db_engine)
+    monkeypatch.setattr(scheduler_module, "SessionLocal", factory)
+    monkeypatch.setattr(progress_module, "SessionLocal", factory)
+    return factory
+
+
+@pytest.fixture
+def task_scheduler(session_factory):
+    scheduler = TaskScheduler(backend_name="sqlite")
+    scheduler.backend = RecordingBackend()
+    return scheduler
+
+
+def _add_task(db, task_type="scene_image", priority=0, payload=None, **fields):
+    task = Task(
+        type=task_type,
+        name=f"{task_type} task",
+        status=fields.pop("status", "pending"),
+        priority=priority,
+        payload=json.dumps(payload if payload is not None else {}),
+        **fields
+    )
+    db.add(task)
+    db.commit()
+    return task
+
+
+class TestTaskRepositoryLease:
+    def test_claim_is_exclusive(self, db_session):
+        task = _add_task(db_session)
+        repo = TaskRepository(db_session)
+
+        assert repo.claim(task.id, "a:1:x", 60) is True
+        assert repo.claim(task.id, "b:2:y", 60) is False
+
+        db_session.refresh(task)
+        assert task.status == "running"
+        assert task.lease_owner == "a:1:x"
+        assert task.attempts == 1
+
+    def test_renew_and_release_require_owner(self, db_session):
+        task = _add_task(db_session)
+        repo = TaskRepository(db_session)
+        repo.claim(task.id, "a:1:x", 60)
+
+        assert repo.renew_lease(task.id, "b:2:y", 60) is False
+        assert repo.renew_lease(task.id, "a:1:x", 60) is True
+
+        repo.release_lease(task.id, "a:1:x")
+        db_session.refresh(task)
+        assert task.lease_owner is None
+
+    def test_tasks_without_payload_are_not_claimable(self, db_session):
+        legacy = Task(type="scene_image", name="legacy", status="pending")
+        db_session.add(legacy)
+        db_session.commit()
+
+        assert TaskRepository(db_session).list_claimable(["scene_image"]) == []
+
+
+class TestDispatch:
+    def test_enqueue_stores_payload_and_priority(self, db_session, task_scheduler):
+        task = Task(type="scene_image", name="scene", status="pending")
+        db_session.add(task)
+        db_session.commit()
+
+        task_scheduler.enqueue(task, priority=TASK_PRIORITY_LOW, scene_id="s1", name="街道")
+
+        db_session.refresh(task)
+        assert json.loads(task.payload) == {"scene_id": "s1", "name": "街道"}
+        assert task.priority == TASK_PRIORITY_LOW
+        assert task.max_attempts == get_settings().TASK_MAX_ATTEMPTS
+
+    def test_per_type_limit(self, db_session, task_scheduler):
+        ids = [_add_task(db_session, "shot_video").id for _ in range(3)]
+
+        assert task_scheduler.dispatch_pending() == 1
+        assert len(task_scheduler.backend.submitted) == 1
+        assert task_scheduler.backend.submitted[0] in ids
+        # 上一个任务仍持有租约，不再领取
+        assert task_scheduler.dispatch_pending() == 0
+
+    def test_comfyui_limit_and_priority_order(self, db_session, task_scheduler, monkeypatch):
+        monkeypatch.setattr(get_settings(), "TASK_COMFYUI_CONCURRENCY", 2)
+        low = _add_task(db_session, "scene_image", priority=TASK_PRIORITY_LOW)
+        normal = _add_task(db_session, "prop_image")
+        high = _add_task(db_session, "character_portrait", priority=TASK_PRIORITY_NORMAL + 10)
+
+        assert task_scheduler.dispatch_pending() == 2
+        assert task_scheduler.backend.submitted == [high.id, normal.id]
+
+        db_session.refresh(low)
+        assert low.status == "pending"
+
+    def test_aggregate_tasks_do_not_hold_worker_slots(self, db_session, task_scheduler, monkeypatch):
+        monkeypatch.setattr(get_settings(), "TASK_MAX_WORKERS", 1)
+        batch = _add_task(db_session, "chapter_shot_images", priority=TASK_PRIORITY_LOW)
+
+        assert task_scheduler.dispatch_pending() == 1
+        # 汇总任务执行期间，其子任务仍能领取全局名额
+        child = _add_task(db_session, "shot_image", priority=TASK_PRIORITY_LOW)
+        assert task_scheduler.dispatch_pending() == 1
+        assert task_scheduler.backend.submitted == [batch.id, child.id]
+        # 全局名额已满时不再领取普通任务，但汇总任务仍受单类型上限约束
+        _add_task(db_session, "prop_image")
+        _add_task(db_session, "chapter_shot_images")
+        _add_task(db_session, "chapter_shot_images")
+        assert task_scheduler.dispatch_pending() == 1
+        assert task_scheduler.dispatch_pending() == 0
+
+    @pytest.mark.asyncio
+    async def test_notify_from_db_executor_wakes_loop(self, task_scheduler):
+        import asyncio
+
+        from app.core.db_executor import run_db
+
+        task_scheduler._wakeup = asyncio.Event()
+        task_scheduler._loop = asyncio.get_running_loop()
+
+        await run_db(task_scheduler.notify)
+
+        await asyncio.wait_for(task_scheduler._wakeup.wait(), timeout=1)
+
+    @pytest.mark.asyncio
+    async def test_run_loop_claims_on_db_executor(self, task_scheduler, monkeypatch):
+        import asyncio
+        import threading
+
+        claim_threads = []
+
+        def recording_claim():
+            claim_threads.append(threading.get_ident())
+            return [] if len(claim_threads) > 1 else [("t1", 0)]
+
+        monkeypatch.setattr(task_scheduler, "claim_pending", recording_claim)
+        monkeypatch.setattr(task_scheduler, "recover_interrupted_tasks", lambda *args, **kwargs: None)
+        task_scheduler._running = True
+        task_scheduler._wakeup = asyncio.Event()
+        loop_task = asyncio.create_task(task_scheduler._run_loop())
+        try:
+            while not task_scheduler.backend.submitted:
+                await asyncio.sleep(0.01)
+        finally:
+            task_scheduler._running = False
+            loop_task.cancel()
+            await asyncio.gather(loop_task, return_exceptions=True)
+
+        # 领取在数据库执行线程中完成，提交执行回到事件循环
+        assert task_scheduler.backend.submitted == ["t1"]
+        assert claim_threads and threading.get_ident() not in claim_threads
+
+
+class TestPriorityLanes:
+    def test_bulk_tasks_leave_reserved_slot(self, db_session, task_scheduler, monkeypatch):
+        monkeypatch.setattr(get_settings(), "TASK_COMFYUI_CONCURRENCY", 2)
+        bulk = [_add_task(db_session, "scene_image", priority=TASK_PRIORITY_LOW) for _ in range(3)]
+
+        assert task_scheduler.dispatch_pending() == 1
+        # 预留名额只能由交互任务占用
+        assert task_scheduler.dispatch_pending() == 0
+        interactive = _add_task(db_session, "prop_image")
+        assert task_scheduler.dispatch_pending() == 1
+        assert task_scheduler.backend.submitted[0] in {t.id for t in bulk}
+        assert task_scheduler.backend.submitted[1] == interactive.id
+
+        stats = task_scheduler.lane_stats()
+        assert stats["bulk_comfyui_limit"] == 1
+        assert stats["lanes"]["bulk"]["pending"] == 2 and stats["lanes"]["bulk"]["running"] == 1
+        assert stats["lanes"]["interactive"]["claimed"] == 1 and "wait_p50" in stats["lanes"]["interactive"]
+
+    def test_interactive_prompts_are_submitted_to_front(self, db_session, monkeypatch):
+        monkeypatch.setattr(get_settings(), "COMFYUI_INTERACTIVE_FRONT", True)
+        assert ComfyUIClient._submit_front() is False
+
+        for priority, front in ((TASK_PRIORITY_NORMAL, True), (TASK_PRIORITY_LOW, False)):
+            token = set_current_task(_add_task(db_session, "shot_image", priority=priority))
+            try:
+                assert ComfyUIClient._submit_front() is front
+            finally:
+                reset_current_task(token)
+
+
+def _add_workflow(db, *model_files):
+    workflow = Workflow(name="wf", type="shot", workflow_json=json.dumps({
+        str(i): {"class_type": "UNETLoader", "inputs": {"unet_name": name, "weight_dtype": "default"}}
+        for i, name in enumerate(model_files)
+    }))
+    db.add(workflow)
+    db.commit()
+    return workflow
+
+
+def _finish(db, task):
+    db.refresh(task)
+    task.status, task.lease_owner = "completed", None
+    db.commit()
+
+
+class TestModelAffinity:
+    def _queue(self, db, task_scheduler, monkeypatch):
+        monkeypatch.setattr(get_settings(), "TASK_COMFYUI_CONCURRENCY", 1)
+        flux = _add_workflow(db, "flux-2-klein-9b.safetensors")
+        z_image = _add_workflow(db, "z_image_turbo_bf16.safetensors")
+        now = datetime.utcnow()
+        return [
+            _add_task(db, "scene_image", workflow_id=wf.id, created_at=now - timedelta(seconds=30 - i))
+            for i, wf in enumerate([flux, z_image, flux])
+        ]
+
+    def test_same_model_group_is_drained_first(self, db_session, task_scheduler, monkeypatch):
+        first, other, same = self._queue(db_session, task_scheduler, monkeypatch)
+
+        for _ in range(3):
+            assert task_scheduler.dispatch_pending() == 1
+            _finish(db_session, db_session.get(Task, task_scheduler.backend.submitted[-1]))
+
+        assert task_scheduler.backend.submitted == [first.id, same.id, other.id]
+        stats = task_scheduler.model_affinity.stats()
+        assert (stats["model_swaps"], stats["swaps_avoided"]) == (1, 1)
+        assert stats["current_models"] == ["z_image_turbo_bf16.safetensors"]
+
+    def test_starvation_bound_and_wait_slo(self, db_session, task_scheduler, monkeypatch):
+        first, other, same = self._queue(db_session, task_scheduler, monkeypatch)
+        task_scheduler.dispatch_pending()
+        _finish(db_session, first)
+
+        # 插队次数用尽后切换到等待最久的其他模型组
+        monkeypatch.setattr(get_settings(), "TASK_MODEL_AFFINITY_MAX_SKIPS", 0)
+        task_scheduler.dispatch_pending()
+        assert task_scheduler.backend.submitted[-1] == other.id
+        assert task_scheduler.model_affinity.starvation_switches == 1
+
+        # 同一优先级内超过等待时间目标的任务优先于当前组
+        _finish(db_session, other)
+        monkeypatch.setattr(get_settings(), "TASK_MODEL_AFFINITY_MAX_SKIPS", 8)
+        monkeypatch.setattr(get_settings(), "TASK_WAIT_SLO", {"prop_image": 10})
+        _add_task(db_session, "scene_image", workflow_id=other.workflow_id)
+        late = _add_task(db_session, "prop_image", workflow_id=first.workflow_id,
+                         created_at=datetime.utcnow() - timedelta(seconds=15))
+        task_scheduler.dispatch_pending()
+        assert task_scheduler.backend.submitted[-1] == late.id
+        assert task_scheduler.model_affinity.slo_overrides == 1
+        assert task_scheduler.model_affinity.slo_misses == 1
+
+    def test_overdue_bulk_task_does_not_jump_higher_priority(self):
+        now = datetime.utcnow()
+        interactive = Task(id="i", type="shot_image", priority=0, created_at=now - timedelta(seconds=5))
+        bulk = Task(id="b", type="shot_video", priority=TASK_PRIORITY_LOW, created_at=now - timedelta(hours=1))
+        planner = ModelAffinityPlanner()
+
+        order = planner.order([interactive, bulk], {"i": "flux", "b": "ltx"}, now=now)
+
+        assert [(task.id, reason) for task, reason in order] == [("i", "fifo"), ("b", "fifo")]
+
+
+class TestRecovery:
+    def test_expired_lease_is_requeued_until_max_attempts(self, db_session, task_scheduler):
+        expired = datetime.utcnow() - timedelta(seconds=10)
+        retry = _add_task(
+            db_session, status="running", lease_owner="other:1:x",
+            lease_expires_at=expired, attempts=1, max_attempts=2
+        )
+        exhausted = _add_task(
+            db_session, status="running", lease_owner="other:1:x",
+            lease_expires_at=expired, attempts=2, max_attempts=2
+        )
+
+        result = task_scheduler.recover_interrupted_tasks()
+
+        assert result == {"requeued": 1, "failed": 1}
+        db_session.refresh(retry)
+        db_session.refresh(exhausted)
+        assert retry.status == "pending" and retry.lease_owner is None
+        assert exhausted.status == "failed"
+
+    def test_live_lease_is_kept(self, db_session, task_scheduler):
+        task = _add_task(
+            db_session, status="running", lease_owner="other:1:x",
+            lease_expires_at=datetime.utcnow() + timedelta(seconds=60), attempts=1, max_attempts=2
+        )
+
+        assert task_scheduler.recover_interrupted_tasks() == {"requeued": 0, "failed": 0}
+        db_session.refresh(task)
+        assert task.status == "running"
+
+    def test_unleased_running_task_fails_on_startup(self, db_session, task_scheduler):
+        task = Task(type="shot_image", name="legacy", status="running")
+        db_session.add(task)
+        db_session.commit()
+
+        assert task_scheduler.recover_interrupted_tasks() == {"requeued": 0, "failed": 0}
+        assert task_scheduler.recover_interrupted_tasks(startup=True) == {"requeued": 0, "failed": 1}
+
+
+class TestRunner:
+    @pytest.mark.asyncio
+    async def test_cancelled_task_releases_lease_on_db_executor(self, db_session, session_factory, monkeypatch):
+        import asyncio
+        import threading
+
+        from app.services.scheduler import runner as runner_module
+
+        monkeypatch.setattr(runner_module, "SessionLocal", session_factory)
+        task = _add_task(db_session, status="running", lease_owner="me:1:x")
+        started = asyncio.Event()
+        released = []
+
+        async def blocking_handler(task_id, **payload):
+            started.set()
+            await asyncio.sleep(3600)
+
+        monkeypatch.setattr(runner_module, "get_task_handler", lambda task_type: blocking_handler)
+        monkeypatch.setattr(
+            runner_module, "_release_lease",
+            lambda task_id, owner: released.append((task_id, owner, threading.get_ident()))
+        )
+
+        running = asyncio.create_task(runner_module.run_claimed_task(task.id, "me:1:x"))
+        await started.wait()
+        running.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await running
+
+        assert [(task_id, owner) for task_id, owner, _ in released] == [(task.id, "me:1:x")]
+        assert released[0][2] != threading.get_ident()
+
+
+    @pytest.mark.asyncio
+    async def test_generation_seed_is_persisted_and_reused(self, db_session, session_factory, monkeypatch):
+        from app.services.comfyui.workflows import WorkflowBuilder
+        from app.services.scheduler import runner as runner_module
+
+        monkeypatch.setattr(runner_module, "SessionLocal", session_factory)
+        monkeypatch.setattr(runner_module, "_release_lease", lambda task_id, owner: None)
+        task = _add_task(db_session, payload={"scene_id": "s1"})
+        calls = []
+
+        async def handler(task_id, **payload):
+            calls.append((payload, WorkflowBuilder._task_seed()))
+
+        monkeypatch.setattr(runner_module, "get_task_handler", lambda task_type: handler)
+
+        await runner_module.run_claimed_task(task.id, "me:1:x")
+        db_session.expire_all()
+        seed = json.loads(task.payload)["seed"]
+        await runner_module.run_claimed_task(task.id, "me:1:x")
+
+        # 种子不传给处理函数，两次执行使用同一种子
+        assert calls == [({"scene_id": "s1"}, seed), ({"scene_id": "s1"}, seed)]
+
+
+class TestProgressWriter:
+    def test_updates_are_coalesced_per_task(self):
+        writer = TaskProgressWriter()
+        writer.update("t1", current_step="构建工作流...")
+        writer.update("t1", current_step="上传参考图...", progress=30)
+        writer.update("t2", progress=80)
+
+        assert writer._pending == {
+            "t1": {"current_step": "上传参考图...", "progress": 30},
+            "t2": {"progress": 80},
+        }
+
+    def test_write_skips_finished_tasks(self, db_session, session_factory):
+        running = _add_task(db_session, status="running")
+        completed = _add_task(db_session, status="completed", progress=100, current_step="生成完成")
+
+        TaskProgressWriter._write({
+            running.id: {"current_step": "正在调用 ComfyUI 生成图片...", "progress": 30},
+            completed.id: {"current_step": "正在下载生成的图片...", "progress": 80},
+        })
+
+        db_session.refresh(running)
+        db_session.refresh(completed)
+        assert (running.progress, running.current_step) == (30, "正在调用 ComfyUI 生成图片...")
+        assert (completed.progress, completed.current_step) == (100, "生成完成")
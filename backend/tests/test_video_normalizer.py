@@ -0,0 +1,61 @@
+"""
+视频片段标准化单元测试（不依赖 ffmpeg 的部分）
+"""
+import os
+
+from app.utils import video_normalizer
+
+
+def _info(**overrides):
+    info = {
+        "width": 1280, "height": 720, "codec": "h264", "pix_fmt": "yuv420p", "fps": 24.0,
+        "has_audio": True, "audio_codec": "aac", "sample_rate": 48000, "channels": 2,
+    }
+    info.update(overrides)
+    return info
+
+
+class TestVideoNormalizer:
+    def test_matches_target(self):
+        assert video_normalizer.matches_target(_info(), 1280, 720)
+        assert not video_normalizer.matches_target(_info(fps=25.0), 1280, 720)
+        assert not video_normalizer.matches_target(_info(has_audio=False, audio_codec=None), 1280, 720)
+        assert not video_normalizer.matches_target(_info(), 1920, 1080)
+
+    def test_cache_key_depends_on_source_and_target(self):
+        key = video_normalizer.cache_key("abc", 1280, 720)
+        assert key == video_normalizer.cache_key("abc", 1280, 720)
+        assert key != video_normalizer.cache_key("abd", 1280, 720)
+        assert key != video_normalizer.cache_key("abc", 1920, 1080)
+
+    def test_matching_clip_is_reused(self, tmp_path, monkeypatch):
+        source = tmp_path / "shot.mp4"
+        source.write_bytes(b"video")
+        monkeypatch.setattr(video_normalizer, "probe_video", lambda path: _info())
+
+        result = video_normalizer.normalize_clip(str(source), str(tmp_path / "cache"), 1280, 720)
+
+        assert result == {"success": True, "path": str(source), "status": "reused", "message": ""}
+
+    def test_cached_clip_skips_encoding(self, tmp_path, monkeypatch):
+        source = tmp_path / "shot.mp4"
+        source.write_bytes(b"video")
+        cache_dir = tmp_path / "cache"
+        cache_dir.mkdir()
+        key = video_normalizer.cache_key(video_normalizer.file_digest(str(source)), 1920, 1080)
+        (cache_dir / f"{key}.mp4").write_bytes(b"normalized")
+        monkeypatch.setattr(video_normalizer, "probe_video", lambda path: _info())
+
+        result = video_normalizer.normalize_clip(str(source), str(cache_dir), 1920, 1080)
+
+        assert result["status"] == "cached"
+        assert result["path"] == str(cache_dir / f"{key}.mp4")
+
+    def test_prune_cache_removes_least_recently_used(self, tmp_path):
+        for index, name in enumerate(["old.mp4", "mid.mp4", "new.mp4"]):
+            path = tmp_path / name
+            path.write_bytes(b"x" * 100)
+            os.utime(path, (index, index))
+
+        assert video_normalizer.prune_cache(str(tmp_path), 200) == 1
+        assert sorted(os.listdir(tmp_path)) == ["mid.mp4", "new.mp4"]
@@ -0,0 +1,61 @@
+"""
+工作流连接索引（参考图链路断开、无用节点剪枝）单元测试
+"""
+import json
+import os
+
+from app.utils.workflow_disconnect import (
+    WorkflowGraph,
+    classify_input,
+    disconnect_all_reference_nodes,
+    prune_unreachable_nodes,
+)
+
+WORKFLOWS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "workflows")
+
+
+def _dual_reference_workflow() -> dict:
+    with open(os.path.join(WORKFLOWS_DIR, "shot_flux2_klein_dual_reference.json"), encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _links(workflow: dict):
+    return [
+        (node_id, name, value[0])
+        for node_id, node in workflow.items()
+        for name, value in node["inputs"].items()
+        if isinstance(value, list)
+    ]
+
+
+class TestWorkflowGraph:
+    def test_classify_input(self):
+        assert [classify_input(n) for n in ("latent", "Pixels", "image", "image2", "image_1", "images", "imagex")] == [
+            "latent", "pixels", "image", "image", "image", None, None,
+        ]
+
+    def test_disconnect_chain_keeps_other_branches(self):
+        workflow = _dual_reference_workflow()
+        graph = WorkflowGraph(workflow)
+
+        removed = graph.disconnect_reference_chain("76")
+
+        assert sorted(removed) == [("107", "image"), ("114", "latent"), ("115", "pixels"), ("116", "latent")]
+        # 第二张参考图的链路与非参考类型的连接不受影响
+        assert workflow["129"]["inputs"]["latent"] == ["126", 0]
+        assert workflow["116"]["inputs"]["conditioning"] == ["110", 0]
+        assert ("115", "pixels") not in graph.consumers_of("107")
+
+    def test_prune_removes_detached_subgraph(self):
+        workflow = _dual_reference_workflow()
+        workflow["200"] = {"class_type": "PreviewImage", "inputs": {}}
+        mapping = {"character_reference_image_node_id": "76", "save_image_node_id": "9"}
+        graph = WorkflowGraph(workflow)
+
+        disconnect_all_reference_nodes(workflow, mapping, graph=graph)
+        pruned = prune_unreachable_nodes(workflow, graph, mapping)
+
+        assert sorted(pruned) == ["107", "115", "76"]
+        # 原本就没有下游的节点视为输出节点保留；剩余连接均指向存在的节点
+        assert "200" in workflow and "9" in workflow
+        assert all(source in workflow for _, _, source in _links(workflow))
@@ -146,4 +146,14 @@ export const chapterApi = {
       chapters: any[];
     }>(`/novels/${novelId}/chapters/batch-import`, formData);
   },
+
+  /** 批量拆分章节（创建后台任务，内容未变化的章节默认跳过） */
+  splitBatch: (
+    novelId: string,
+    options: { start_chapter?: number; end_chapter?: number; chapter_ids?: string[]; force?: boolean } = {}
+  ) =>
+    api.post<{ taskId: string | null; status?: string; chapterCount?: number }>(
+      `/novels/${novelId}/chapters/split-batch`,
+      options
+    ),
 };
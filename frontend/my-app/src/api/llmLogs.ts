@@ -19,6 +19,10 @@ export interface LLMLog {
   character_id: string;
   used_proxy: boolean;
   duration: number;
+  /** 命中响应缓存（未实际调用 LLM） */
+  cached?: boolean;
+  /** 多厂商路由决策（primary / hedge / failover 及原因） */
+  route?: string | null;
 }
 
 export interface Pagination {
@@ -39,6 +43,38 @@ export interface FilterOptions {
   task_types: string[];
 }
 
+export interface LLMAnalyticsMetrics {
+  requests: number;
+  errors: number;
+  error_rate: number;
+  cached: number;
+  latency: { count: number; avg: number | null; p50: number | null; p95: number | null; p99: number | null; max: number | null };
+  response_chars: {
+    avg: number | null;
+    p50: number | null;
+    p95: number | null;
+    max: number | null;
+    histogram: { le: number | null; count: number }[];
+  };
+}
+
+export interface LLMAnalyticsGroup {
+  provider?: string;
+  model?: string;
+  task_type?: string;
+  summary: LLMAnalyticsMetrics;
+  series: (LLMAnalyticsMetrics & { time: string })[];
+}
+
+export interface LLMAnalyticsResponse {
+  groups: LLMAnalyticsGroup[];
+  total: LLMAnalyticsMetrics;
+  start: string;
+  end: string;
+  interval: 'hour' | 'day';
+  group_by: string[];
+}
+
 export const llmLogsApi = {
   /** 获取日志列表 */
   fetchList: (page: number, pageSize: number, filters: Record<string, string>) => {
@@ -53,4 +89,13 @@ export const llmLogsApi = {
 
   /** 获取筛选选项 */
   fetchFilterOptions: () => api.get<FilterOptions>('/llm-logs/filters'),
+
+  /** 获取调用统计（耗时分位数、错误率、请求量、响应长度分布） */
+  fetchAnalytics: (params: Record<string, string> = {}) => {
+    const query = new URLSearchParams();
+    Object.entries(params).forEach(([key, value]) => {
+      if (value) query.append(key, value);
+    });
+    return api.get<LLMAnalyticsResponse>(`/llm-logs/analytics?${query}`);
+  },
 };
@@ -38,4 +38,14 @@ export const novelApi = {
     });
     return api.post(`/novels/${novelId}/parse-characters/?${searchParams.toString()}`);
   },
+
+  /** 批量补全缺失的角色外貌、场景设定、道具外观（创建后台任务） */
+  fillAppearances: (
+    novelId: string,
+    options: { entity_types?: ('character' | 'scene' | 'prop')[]; style?: string } = {}
+  ) =>
+    api.post<{ taskId: string | null; status?: string; entityCount: number; counts?: Record<string, number> }>(
+      `/novels/${novelId}/fill-appearances`,
+      options
+    ),
 };
@@ -111,6 +111,25 @@ export const shotsApi = {
     return response.json();
   },
 
+  /**
+   * 章节批量生成分镜图（后端统一准备角色/场景/道具参考图后排队生成）
+   */
+  generateAllImages: async (
+    novelId: string,
+    chapterId: string,
+    shotIds?: string[]
+  ): Promise<{ success: boolean; data?: { taskId: string | null; shotCount: number; shotIds?: string[] }; message?: string }> => {
+    const response = await fetch(
+      `/api/novels/${novelId}/chapters/${chapterId}/shots/generate-batch`,
+      {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ shot_ids: shotIds }),
+      }
+    );
+    return response.json();
+  },
+
   /**
    * 生成分镜视频
    */
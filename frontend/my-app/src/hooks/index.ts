@@ -4,3 +4,5 @@
 export { useImagePreview } from './useImagePreview';
 export type { ImagePreviewState } from './useImagePreview';
 export { usePolling } from './usePolling';
+export { useTaskEvents } from './useTaskEvents';
+export type { TaskEvent } from './useTaskEvents';
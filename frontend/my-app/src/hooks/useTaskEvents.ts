@@ -0,0 +1,78 @@
+/**
+ * 任务事件订阅 Hook
+ * 通过 SSE 接收后端推送的任务状态变化，替代定时轮询任务列表
+ */
+import { useEffect, useRef, useState } from 'react';
+
+export interface TaskEvent {
+  id: string;
+  type?: string;
+  name?: string;
+  status?: string;
+  progress?: number;
+  currentStep?: string | null;
+  errorMessage?: string | null;
+  resultUrl?: string | null;
+  novelId?: string | null;
+  chapterId?: string | null;
+  shotId?: string | null;
+  /** ComfyUI 当前执行节点 */
+  node?: string | null;
+  /** 采样步数 */
+  step?: number | null;
+  maxSteps?: number | null;
+  deleted?: boolean;
+}
+
+interface TaskEventsOptions {
+  novelId?: string;
+  chapterId?: string;
+  /** 为 false 时不建立连接 */
+  enabled?: boolean;
+  /** 连接建立后的进行中任务快照 */
+  onSnapshot?: (tasks: TaskEvent[]) => void;
+  /** 合并后的增量事件 */
+  onEvents: (events: TaskEvent[]) => void;
+}
+
+/**
+ * 订阅任务事件
+ * @returns connected 为 false 时（连接中或已断开）调用方应退回轮询
+ */
+export function useTaskEvents({ novelId, chapterId, enabled = true, onSnapshot, onEvents }: TaskEventsOptions) {
+  const [connected, setConnected] = useState(false);
+  const handlersRef = useRef({ onSnapshot, onEvents });
+  handlersRef.current = { onSnapshot, onEvents };
+
+  useEffect(() => {
+    if (!enabled || typeof EventSource === 'undefined') return;
+
+    const params = new URLSearchParams();
+    if (novelId) params.set('novel_id', novelId);
+    if (chapterId) params.set('chapter_id', chapterId);
+    const source = new EventSource(`/api/events/tasks/stream?${params.toString()}`);
+
+    source.onmessage = (message) => {
+      try {
+        const data = JSON.parse(message.data);
+        if (data.type === 'snapshot') {
+          setConnected(true);
+          handlersRef.current.onSnapshot?.(data.tasks || []);
+        } else if (data.type === 'tasks') {
+          handlersRef.current.onEvents(data.events || []);
+        }
+      } catch (error) {
+        console.error('[useTaskEvents] 解析任务事件失败:', error);
+      }
+    };
+    // EventSource 会自动重连，重连成功后重新收到快照
+    source.onerror = () => setConnected(false);
+
+    return () => {
+      source.close();
+      setConnected(false);
+    };
+  }, [novelId, chapterId, enabled]);
+
+  return { connected };
+}
@@ -41,6 +41,7 @@ export default {
     llmResponse: 'LLM Response',
     proxy: 'Proxy',
     duration: 'Duration',
+    cached: 'Cached',
     yes: 'Yes',
     no: 'No',
   },
@@ -42,6 +42,7 @@ export default {
     errorMessage: 'エラーメッセージ',
     llmResponse: 'LLMレスポンス',
     proxy: 'プロキシ',
+    cached: 'キャッシュ',
     yes: 'はい',
     no: 'いいえ',
   },
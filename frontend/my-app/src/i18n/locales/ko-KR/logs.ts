@@ -42,6 +42,7 @@ export default {
     errorMessage: '오류 메시지',
     llmResponse: 'LLM 응답',
     proxy: '프록시',
+    cached: '캐시',
     yes: '예',
     no: '아니오',
   },
@@ -41,6 +41,7 @@ export default {
     llmResponse: 'LLM 响应',
     proxy: '代理',
     duration: '耗时',  // 新增耗时字段
+    cached: '缓存命中',
     yes: '是',
     no: '否',
   },
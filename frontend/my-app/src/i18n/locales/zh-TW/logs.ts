@@ -42,6 +42,7 @@ export default {
     errorMessage: '錯誤訊息',
     llmResponse: 'LLM 回應',
     proxy: '代理',
+    cached: '快取命中',
     yes: '是',
     no: '否',
   },
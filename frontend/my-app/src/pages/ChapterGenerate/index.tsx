@@ -1,6 +1,7 @@
-import { useEffect, useRef, useState } from 'react';
+import { useCallback, useEffect, useRef, useState } from 'react';
 import { useParams } from 'react-router-dom';
 import { useTranslation } from '../../stores/i18nStore';
+import { useTaskEvents, type TaskEvent } from '../../hooks/useTaskEvents';
 
 // 导入 Store
 import { useChapterGenerateStore } from './stores';
@@ -60,9 +61,30 @@ export default function ChapterGenerate() {
   const [isGeneratingAll, setIsGeneratingAll] = useState(false);
   const [showResourcesModal, setShowResourcesModal] = useState(false);
 
-  // 轮询任务状态
+  // 订阅本章节的任务事件：任务结束时只刷新对应类型的状态，无需定时轮询
+  const handleTaskEvents = useCallback((events: TaskEvent[]) => {
+    if (!cid) return;
+    const finishedTypes = new Set(
+      events
+        .filter(e => e.status === 'completed' || e.status === 'failed' || e.deleted)
+        .map(e => e.type)
+    );
+    if (finishedTypes.has('shot_image')) checkShotTaskStatus(cid);
+    if (finishedTypes.has('shot_video')) checkVideoTaskStatus(cid);
+    if (finishedTypes.has('transition_video')) checkTransitionTaskStatus(cid);
+    if (finishedTypes.has('character_audio') || finishedTypes.has('narrator_audio')) checkAudioTaskStatus(cid);
+  }, [cid, checkShotTaskStatus, checkVideoTaskStatus, checkTransitionTaskStatus, checkAudioTaskStatus]);
+
+  const { connected: taskEventsConnected } = useTaskEvents({
+    novelId: id,
+    chapterId: cid,
+    enabled: !!cid && !!id,
+    onEvents: handleTaskEvents,
+  });
+
+  // 推送连接不可用时轮询任务状态
   useEffect(() => {
-    if (!cid || !id) return;
+    if (!cid || !id || taskEventsConnected) return;
 
     // 如果有生成中的任务，开始轮询
     const hasGeneratingTasks = generatingShots.size > 0 ||
@@ -93,7 +115,7 @@ export default function ChapterGenerate() {
     }, 2000);
 
     return () => clearInterval(intervalId);
-  }, [cid, id, generatingShots.size, generatingVideos.size, generatingTransitions.size, generatingAudios.size]);
+  }, [cid, id, taskEventsConnected, generatingShots.size, generatingVideos.size, generatingTransitions.size, generatingAudios.size]);
 
   // 获取真实章节数据和角色列表
   useEffect(() => {
@@ -70,10 +70,41 @@ export const createChapterActionsSlice: StateCreator<
 
     set({ isSplitting: true });
     try {
-      const res = await fetch(`${API_BASE}/novels/${novelId}/chapters/${chapterId}/split/`, {
+      // 流式拆分：每个分镜生成后立即推送，先展示已生成的分镜
+      const res = await fetch(`${API_BASE}/novels/${novelId}/chapters/${chapterId}/split/stream`, {
         method: 'POST',
       });
-      const data = await res.json();
+      if (!res.ok || !res.body) {
+        throw new Error(`HTTP ${res.status}`);
+      }
+
+      const reader = res.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      let data: any = null;
+      let streamedShots: Shot[] = [];
+      set({ shots: [] });
+
+      while (!data) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop() || '';
+        for (const raw of events) {
+          if (!raw.startsWith('data:')) continue;
+          const event = JSON.parse(raw.slice(5).trim());
+          if (event.type === 'shot') {
+            streamedShots = [...streamedShots, event.shot];
+            set({ shots: streamedShots });
+          } else if (event.type === 'done') {
+            data = event;
+          }
+        }
+      }
+      if (!data) {
+        throw new Error('split stream closed');
+      }
 
       if (data.success) {
         // 从返回数据中提取 shots 数组
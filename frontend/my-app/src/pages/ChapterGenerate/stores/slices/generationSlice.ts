@@ -206,12 +206,28 @@ export const createGenerationSlice: StateCreator<
       ])
     }));
 
-    // 顺序执行生成
-    for (const shot of pendingShots) {
-      await get().generateShotImage(novelId, chapterId, shot.id);
+    try {
+      // 一次提交整章，由后端汇总任务排队生成（进度通过分镜任务轮询获取）
+      const result = await shotsApi.generateAllImages(novelId, chapterId, pendingShots.map(s => s.id));
+      if (!result.success) {
+        throw new Error(result.message || '生成失败');
+      }
+      const submittedIds = new Set(result.data?.shotIds || []);
+      set(state => ({
+        generatingShots: new Set([...state.generatingShots, ...submittedIds]),
+        shots: state.shots.map(s =>
+          submittedIds.has(s.id) ? { ...s, imageStatus: 'generating' as const } : s
+        )
+      }));
+    } catch (error) {
+      console.error('批量生成分镜图片失败:', error);
+    } finally {
+      set(state => {
+        const newSet = new Set(state.pendingShots);
+        pendingShots.forEach(s => newSet.delete(s.id));
+        return { pendingShots: newSet, isGeneratingAll: false };
+      });
     }
-
-    set({ isGeneratingAll: false });
   },
 
   uploadShotImage: async (novelId: string, chapterId: string, shotId: string, file: File) => {
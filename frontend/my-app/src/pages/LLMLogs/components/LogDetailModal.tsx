@@ -33,7 +33,7 @@ export function LogDetailModal({ log, activeTab, onTabChange, onClose, formatDat
             <span className={`px-2 py-1 text-xs ${getStatusBadgeConfig(log.status).bg} ${getStatusBadgeConfig(log.status).text} rounded-full`}>{getStatusBadgeConfig(log.status).label}</span>
             <span className="text-gray-500">{t('llmLogs.proxy')}:</span><span className="font-medium">{log.used_proxy ? t('llmLogs.yes') : t('llmLogs.no')}</span>
             <span className="text-gray-500">{t('llmLogs.duration')}:</span>
-            <span className="font-medium">{log.duration ? `${log.duration.toFixed(2)}s` : '-'}</span>
+            <span className="font-medium">{log.cached ? t('llmLogs.cached') : log.duration ? `${log.duration.toFixed(2)}s` : '-'}</span>
           </div>
           {log.error_message && (
             <div className="bg-red-50 border border-red-200 rounded-lg p-4">
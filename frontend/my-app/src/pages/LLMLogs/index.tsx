@@ -19,7 +19,7 @@ function LogTableRow({ log, onView, formatDate, truncateText, getTaskTypeLabel,
       <td className="px-4 py-3 whitespace-nowrap text-sm text-gray-600">{getTaskTypeLabel(log.task_type)}</td>
       <td className="px-4 py-3 whitespace-nowrap"><span className={`px-2 py-1 text-xs ${badge.bg} ${badge.text} rounded-full`}>{badge.label}</span></td>
       <td className="px-4 py-3 whitespace-nowrap text-sm text-gray-600">{log.used_proxy ? t('llmLogs.yes') : t('llmLogs.no')}</td>
-      <td className="px-4 py-3 whitespace-nowrap text-sm text-gray-600">{log.duration ? `${log.duration.toFixed(2)}s` : '-'}</td>
+      <td className="px-4 py-3 whitespace-nowrap text-sm text-gray-600">{log.cached ? t('llmLogs.cached') : log.duration ? `${log.duration.toFixed(2)}s` : '-'}</td>
       <td className="px-4 py-3 text-sm text-gray-600 max-w-[150px]">
         <div className="truncate" title={log.user_prompt}>{truncateText(log.user_prompt, 50)}</div>
       </td>
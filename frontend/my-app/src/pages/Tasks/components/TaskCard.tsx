@@ -87,7 +87,10 @@ export function TaskCard({
           {task.status === 'running' && (
             <div className="mt-2">
               <div className="flex items-center justify-between text-xs mb-1">
-                <span>{task.currentStep || '处理中...'}</span>
+                <span>
+                  {task.currentStep || '处理中...'}
+                  {task.step != null && task.maxSteps ? ` (${task.step}/${task.maxSteps})` : ''}
+                </span>
                 <span>{task.progress}%</span>
               </div>
               <div className="h-2 bg-white rounded-full overflow-hidden">
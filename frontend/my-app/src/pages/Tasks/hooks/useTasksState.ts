@@ -1,7 +1,8 @@
-import { useState, useEffect, useCallback } from 'react';
+import { useState, useEffect, useCallback, useRef } from 'react';
 import { useTranslation } from '../../../stores/i18nStore';
 import { toast } from '../../../stores/toastStore';
 import { taskApi } from '../../../api/tasks';
+import { useTaskEvents, type TaskEvent } from '../../../hooks/useTaskEvents';
 import type { Task } from '../../../types';
 import type { TaskFilter, ImageInfo, WorkflowData, TaskStats } from '../types';
 
@@ -61,11 +62,50 @@ export function useTasksState() {
     }
   }, []);
 
+  // 新任务或已不在列表中的任务需要重新获取完整信息（合并多次请求）
+  const refetchTimerRef = useRef<ReturnType<typeof setTimeout> | null>(null);
+  const scheduleRefetch = useCallback(() => {
+    if (refetchTimerRef.current) return;
+    refetchTimerRef.current = setTimeout(() => {
+      refetchTimerRef.current = null;
+      fetchTasks();
+    }, 500);
+  }, [fetchTasks]);
+
+  const applyTaskEvents = useCallback((events: TaskEvent[]) => {
+    setTasks(prev => {
+      const known = new Set(prev.map(t => t.id));
+      if (events.some(e => !e.deleted && !known.has(e.id))) {
+        scheduleRefetch();
+      }
+      const byId = new Map(events.map(e => [e.id, e]));
+      return prev
+        .filter(t => !byId.get(t.id)?.deleted)
+        .map(t => {
+          const event = byId.get(t.id);
+          if (!event) return t;
+          const { id: _id, deleted: _deleted, ...fields } = event;
+          return { ...t, ...fields } as Task;
+        });
+    });
+  }, [scheduleRefetch]);
+
+  const { connected } = useTaskEvents({ onEvents: applyTaskEvents });
+
   useEffect(() => {
     fetchTasks();
+  }, [fetchTasks]);
+
+  // 推送连接不可用时退回轮询
+  useEffect(() => {
+    if (connected) return;
     const interval = setInterval(fetchTasks, 3000);
     return () => clearInterval(interval);
-  }, [fetchTasks]);
+  }, [connected, fetchTasks]);
+
+  useEffect(() => () => {
+    if (refetchTimerRef.current) clearTimeout(refetchTimerRef.current);
+  }, []);
 
   const handleRefresh = () => {
     setRefreshing(true);
@@ -208,12 +208,16 @@ export interface Shot {
 
 export interface Task {
   id: string;
-  type: 'character_portrait' | 'character_voice' | 'character_audio' | 'narrator_audio' | 'scene_image' | 'shot_image' | 'keyframe_image' | 'shot_video' | 'chapter_video' | 'transition_video' | 'prop_image';
+  type: 'character_portrait' | 'character_voice' | 'character_audio' | 'narrator_audio' | 'scene_image' | 'shot_image' | 'keyframe_image' | 'shot_video' | 'chapter_video' | 'transition_video' | 'prop_image' | 'chapter_shot_images' | 'novel_split_chapters' | 'novel_fill_appearances';
   name: string;
   description?: string;
   status: 'pending' | 'running' | 'completed' | 'failed';
   progress: number;
   currentStep?: string;
+  /** ComfyUI 执行进度（仅实时推送提供） */
+  node?: string | null;
+  step?: number | null;
+  maxSteps?: number | null;
   resultUrl?: string;
   errorMessage?: string;
   workflowId?: string;